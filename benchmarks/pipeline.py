@@ -0,0 +1,476 @@
+"""
+Benchmark du pipeline capteurs → détection → stockage.
+
+Chaque cas est mesuré pour plusieurs tailles de parc et de lot : débit
+(mesures traitées par seconde), latences p50/p99 par appel et pic de
+mémoire allouée (tracemalloc) pendant un appel. Les générateurs sont
+initialisés avec des graines fixes, les résultats sont écrits en JSON et
+peuvent être comparés à une référence sauvegardée pour détecter les
+régressions (code de sortie 1).
+
+Le stockage est mesuré sans serveur : MongoDBHandler écrit dans une
+collection factice en mémoire (coût de conversion et de traitement du
+gestionnaire seul), ColumnarStore dans un répertoire temporaire.
+
+La référence benchmarks/baseline.json couvre les petites tailles ; elle
+dépend de la machine et se régénère avec --save-baseline avant de
+comparer sur une autre machine.
+
+Usage:
+    python -m benchmarks.pipeline --fleet-sizes 1000 10000 \\
+        --output results.json --baseline benchmarks/baseline.json
+
+    python -m benchmarks.pipeline --fleet-sizes 1000 \\
+        --batch-sizes 1000 10000 --min-time 0.5 \\
+        --baseline benchmarks/baseline.json --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.analysis.anomaly_detector import AnomalyDetector
+from src.core.measurement_batch import MeasurementBatch, datetime_to_micros
+from src.sensors.iot_sensor import IoTSensor, SensorNetwork
+from src.storage.columnar_store import ColumnarStore
+from src.storage.mongodb_handler import MongoDBHandler
+
+FLEET_SIZES = (1000, 10000, 100000, 1000000)
+BATCH_SIZES = (1000, 10000, 100000)
+SEED = 12345
+
+# Écart relatif toléré avant de signaler une régression
+DEFAULT_TOLERANCE = 0.2
+
+# Capteurs de l'historique de calculate_baseline
+_BASELINE_SENSORS = 8
+
+# Répertoires temporaires des cas en cours, supprimés après chaque mesure
+_TEMPORARY: List[str] = []
+
+
+class _InsertResult:
+    def __init__(self, count: int):
+        self.inserted_ids = range(count)
+
+
+class _NullCollection:
+    """Collection factice : compte les documents sans les conserver."""
+
+    def __init__(self):
+        self.count = 0
+
+    def insert_many(self, documents, ordered=True):
+        self.count += len(documents)
+        return _InsertResult(len(documents))
+
+
+class _StatisticsCollection:
+    """Collection factice : statistiques précalculées par capteur."""
+
+    def __init__(self, sensor_ids: Sequence[str], means: np.ndarray):
+        self.stats = {
+            sensor_id: {'_id': sensor_id, 'avg_consumption': mean,
+                        'max_consumption': mean, 'min_consumption': mean,
+                        'count': 1}
+            for sensor_id, mean in zip(sensor_ids, means.tolist())
+        }
+
+    def aggregate(self, pipeline):
+        wanted = pipeline[0]['$match']['sensor_id']['$in']
+        return [self.stats[sensor_id] for sensor_id in wanted
+                if sensor_id in self.stats]
+
+
+def _network(fleet_size: int) -> SensorNetwork:
+    """Réseau vectorisé de `fleet_size` capteurs aux paramètres variés."""
+    network = SensorNetwork(vectorized=True, seed=SEED)
+    rng = np.random.default_rng(SEED)
+    base = rng.uniform(50.0, 500.0, fleet_size).tolist()
+    for i in range(fleet_size):
+        network.add_sensor(IoTSensor(f"SENSOR_{i:07d}", f"Zone {i % 100}",
+                                     base[i], base[i] * 0.2))
+    return network
+
+
+def _history(network: SensorNetwork, batch_size: int) -> MeasurementBatch:
+    """Lot de `batch_size` mesures réparties sur les capteurs du réseau."""
+    rng = np.random.default_rng(SEED)
+    fleet = network.fleet
+    size = len(fleet)
+    indexes = np.arange(batch_size) % size
+    consumption = np.round(fleet.base_consumption[indexes] + rng.uniform(
+        -fleet.variance[indexes], fleet.variance[indexes]
+    ), 2)
+    start = datetime_to_micros(datetime(2024, 1, 1))
+    timestamp = start + (np.arange(batch_size) // size) * 1_000_000
+    return MeasurementBatch(network.registry, indexes, consumption,
+                            timestamp)
+
+
+def _sensor_history(network: SensorNetwork, sensors: int,
+                    rows_per_sensor: int) -> MeasurementBatch:
+    """
+    Historique de `rows_per_sensor` mesures pour chacun des `sensors`
+    premiers capteurs du réseau, entrelacées dans le temps.
+    """
+    rng = np.random.default_rng(SEED)
+    fleet = network.fleet
+    size = sensors * rows_per_sensor
+    indexes = np.arange(size) % sensors
+    consumption = np.round(fleet.base_consumption[indexes] + rng.uniform(
+        -fleet.variance[indexes], fleet.variance[indexes]
+    ), 2)
+    start = datetime_to_micros(datetime(2024, 1, 1))
+    timestamp = start + (np.arange(size) // sensors) * 1_000_000
+    return MeasurementBatch(network.registry, indexes, consumption,
+                            timestamp)
+
+
+# Un cas prépare ses données et retourne (appel, mesures par appel) ;
+# l'appel est exécuté hors préparation
+Case = Callable[[SensorNetwork, int], Tuple[Callable[[], object], int]]
+
+
+def _read_all_sensors(network, batch_size):
+    return network.read_all_sensors, len(network.sensors)
+
+
+def _read_batch(network, batch_size):
+    return network.read_batch, len(network.sensors)
+
+
+def _calculate_baseline(network, batch_size):
+    # `batch_size` mesures par capteur ; l'appel parcourt tout
+    # l'historique pour en extraire celles du capteur demandé
+    detector = AnomalyDetector(registry=network.registry)
+    sensors = min(_BASELINE_SENSORS, len(network.sensors))
+    history = _sensor_history(network, sensors, batch_size)
+    sensor_ids = network.registry.ids[:sensors]
+    return (lambda: detector.calculate_baseline(
+        history, random.choice(sensor_ids)
+    )), len(history)
+
+
+def _calculate_baselines(network, batch_size):
+    detector = AnomalyDetector(registry=network.registry)
+    history = _history(network, batch_size)
+    return (lambda: detector.calculate_baselines(history)), batch_size
+
+
+def _analyze_batch(network, batch_size):
+    detector = AnomalyDetector(registry=network.registry)
+    detector.calculate_baselines(_history(network, 2 * len(network.sensors)))
+    batch = network.read_batch()
+    return (lambda: detector.analyze_batch(batch)), len(batch)
+
+
+def _insert_mongodb(network, batch_size):
+    handler = MongoDBHandler(stats_cache_ttl=60.0)
+    handler.collection = _NullCollection()
+    batch = _history(network, batch_size)
+    return (lambda: handler.insert_measurements(batch,
+                                                ordered=False)), batch_size
+
+
+def _columnar_store() -> ColumnarStore:
+    directory = tempfile.mkdtemp(prefix='bench_columnar_')
+    _TEMPORARY.append(directory)
+    store = ColumnarStore(directory)
+    store.connect()
+    return store
+
+
+def _insert_columnar(network, batch_size):
+    store = _columnar_store()
+    batch = _history(network, batch_size)
+    sequence = iter(range(1, sys.maxsize))
+
+    def insert():
+        # Horodatages croissants d'un appel à l'autre (ajout chronologique)
+        offset = next(sequence) * 86_400_000_000
+        store.insert_measurements(MeasurementBatch(
+            batch.registry, batch.sensor_index, batch.consumption,
+            batch.timestamp + offset
+        ))
+    return insert, batch_size
+
+
+def _get_statistics_columnar(network, batch_size):
+    store = _columnar_store()
+    store.insert_measurements(_history(network, batch_size))
+    sensor_ids = network.registry.ids
+    return (lambda: store.get_statistics(random.choice(sensor_ids))), 1
+
+
+def _get_statistics_range_columnar(network, batch_size):
+    store = _columnar_store()
+    store.insert_measurements(_history(network, batch_size))
+    sensor_ids = network.registry.ids
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(seconds=max(1, batch_size // len(sensor_ids)))
+    return (lambda: store.get_statistics_range(
+        random.choice(sensor_ids), start, end
+    )), 1
+
+
+def _get_statistics_mongodb(network, batch_size):
+    # Sans cache : chaque appel construit et exécute l'agrégation (coût du
+    # gestionnaire seul, le serveur étant remplacé par une collection
+    # factice)
+    handler = MongoDBHandler(stats_cache_ttl=0)
+    handler.collection = _StatisticsCollection(
+        network.registry.ids, network.fleet.base_consumption
+    )
+    sensor_ids = network.registry.ids
+    return (lambda: handler.get_statistics(random.choice(sensor_ids))), 1
+
+
+# Cas disponibles ; les cas marqués False ne dépendent pas de la taille
+# de lot et ne sont mesurés qu'une fois par taille de parc
+CASES: Dict[str, Tuple[Case, bool]] = {
+    'read_all_sensors': (_read_all_sensors, False),
+    'read_batch': (_read_batch, False),
+    'calculate_baseline': (_calculate_baseline, True),
+    'calculate_baselines': (_calculate_baselines, True),
+    'analyze_batch': (_analyze_batch, False),
+    'insert_measurements[mongodb]': (_insert_mongodb, True),
+    'insert_measurements[columnar]': (_insert_columnar, True),
+    'get_statistics[mongodb]': (_get_statistics_mongodb, False),
+    'get_statistics[columnar]': (_get_statistics_columnar, True),
+    'get_statistics_range[columnar]': (_get_statistics_range_columnar,
+                                       True),
+}
+
+
+def measure(call: Callable[[], object], ops_per_call: int,
+            min_repeats: int = 5, max_repeats: int = 1000,
+            min_time: float = 1.0) -> Dict[str, float]:
+    """
+    Mesure un appel : débit, latences et pic de mémoire.
+
+    L'appel est répété au moins `min_repeats` fois et jusqu'à cumuler
+    `min_time` secondes (dans la limite de `max_repeats`). Le pic de
+    mémoire est mesuré sur un appel supplémentaire, sous tracemalloc,
+    pour ne pas fausser les latences.
+
+    Args:
+        call: Appel à mesurer
+        ops_per_call: Nombre de mesures traitées par appel
+        min_repeats: Nombre minimal de répétitions
+        max_repeats: Nombre maximal de répétitions
+        min_time: Durée cumulée visée en secondes
+
+    Returns:
+        ops_per_sec, p50_ms, p99_ms, peak_memory_mb et repeats
+    """
+    call()  # Échauffement
+    samples = []
+    total = 0.0
+    while len(samples) < max_repeats and (len(samples) < min_repeats
+                                          or total < min_time):
+        started = time.perf_counter()
+        call()
+        elapsed = time.perf_counter() - started
+        samples.append(elapsed)
+        total += elapsed
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies = np.array(samples) * 1000.0
+    return {
+        'ops_per_sec': ops_per_call * len(samples) / total if total else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'peak_memory_mb': max(0, peak - before) / 2 ** 20,
+        'repeats': len(samples)
+    }
+
+
+def environment() -> Dict:
+    """
+    Décrit l'environnement d'exécution, pour comparer des résultats
+    comparables.
+
+    Returns:
+        Versions et caractéristiques de la machine
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'seed': SEED
+    }
+
+
+def run(fleet_sizes: Sequence[int] = FLEET_SIZES,
+        batch_sizes: Sequence[int] = BATCH_SIZES,
+        cases: Optional[Sequence[str]] = None,
+        min_time: float = 1.0, verbose: bool = True) -> Dict:
+    """
+    Exécute les cas pour chaque taille de parc et de lot.
+
+    Args:
+        fleet_sizes: Nombres de capteurs
+        batch_sizes: Nombres de mesures par lot
+        cases: Cas à exécuter (tous si absent)
+        min_time: Durée cumulée visée par mesure en secondes
+        verbose: Afficher chaque résultat dès qu'il est mesuré
+
+    Returns:
+        Environnement et liste des résultats
+    """
+    selected = cases or list(CASES)
+    unknown = set(selected) - set(CASES)
+    if unknown:
+        raise ValueError(f"Cas inconnus: {', '.join(sorted(unknown))}")
+
+    results = []
+    for fleet_size in fleet_sizes:
+        network = _network(fleet_size)
+        for name in selected:
+            case, per_batch = CASES[name]
+            for batch_size in (batch_sizes if per_batch else (None,)):
+                random.seed(SEED)
+                try:
+                    call, ops = case(network, batch_size or fleet_size)
+                    result = dict(case=name, fleet_size=fleet_size,
+                                  batch_size=batch_size,
+                                  **measure(call, ops, min_time=min_time))
+                finally:
+                    while _TEMPORARY:
+                        shutil.rmtree(_TEMPORARY.pop(), ignore_errors=True)
+                results.append(result)
+                if verbose:
+                    print(_format(result), flush=True)
+    return {'environment': environment(), 'results': results}
+
+
+def _key(result: Dict) -> Tuple:
+    return result['case'], result['fleet_size'], result['batch_size']
+
+
+def _format(result: Dict) -> str:
+    batch = result['batch_size'] if result['batch_size'] else '-'
+    return (f"{result['case']:<32} {result['fleet_size']:>8} {batch:>7} "
+            f"{result['ops_per_sec']:>14,.0f}/s "
+            f"p50 {result['p50_ms']:>9.3f} ms "
+            f"p99 {result['p99_ms']:>9.3f} ms "
+            f"{result['peak_memory_mb']:>8.1f} Mo")
+
+
+def compare(results: Dict, baseline: Dict,
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Dict]:
+    """
+    Compare des résultats à une référence.
+
+    Un cas régresse si son débit baisse ou si sa latence p99 ou son pic
+    de mémoire augmentent de plus de `tolerance` (relatif).
+
+    Args:
+        results: Résultats de run
+        baseline: Résultats de référence
+        tolerance: Écart relatif toléré
+
+    Returns:
+        Régressions : cas, métrique, valeur de référence et valeur
+        mesurée
+    """
+    reference = {_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        previous = reference.get(_key(result))
+        if previous is None:
+            continue
+        checks = (
+            ('ops_per_sec', result['ops_per_sec']
+             < previous['ops_per_sec'] * (1 - tolerance)),
+            # Marges absolues : les latences de quelques microsecondes et
+            # les petits pics de mémoire varient d'une exécution à l'autre
+            ('p99_ms', result['p99_ms']
+             > previous['p99_ms'] * (1 + tolerance) + 0.05),
+            ('peak_memory_mb', result['peak_memory_mb']
+             > previous['peak_memory_mb'] * (1 + tolerance) + 1.0),
+        )
+        for metric, regressed in checks:
+            if regressed:
+                regressions.append({
+                    'case': result['case'],
+                    'fleet_size': result['fleet_size'],
+                    'batch_size': result['batch_size'],
+                    'metric': metric,
+                    'baseline': previous[metric],
+                    'current': result[metric]
+                })
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """
+    Point d'entrée en ligne de commande.
+
+    Args:
+        argv: Arguments (sys.argv si absent)
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--fleet-sizes', type=int, nargs='+',
+                        default=list(FLEET_SIZES))
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=list(BATCH_SIZES))
+    parser.add_argument('--cases', nargs='+', choices=list(CASES))
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help="durée cumulée visée par mesure (s)")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--baseline', help="résultats de référence")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="écrire les résultats dans --baseline")
+    parser.add_argument('--tolerance', type=float,
+                        default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run(args.fleet_sizes, args.batch_sizes, args.cases,
+                  args.min_time)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+        print(f"Référence enregistrée dans {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"RÉGRESSION {regression['case']} "
+                  f"(parc {regression['fleet_size']}, "
+                  f"lot {regression['batch_size']}) "
+                  f"{regression['metric']}: {regression['baseline']:.3f} "
+                  f"→ {regression['current']:.3f}")
+        if regressions:
+            raise SystemExit(1)
+        print("Aucune régression")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark de latence des requêtes MongoDB selon la taille de la collection.
+
+Pour chaque taille, la collection est remplie de mesures synthétiques
+puis les requêtes de MongoDBHandler sont chronométrées. Avec les index
+créés par connect(), la latence de get_measurements et de
+get_recent_measurements (sur un nombre fixe de mesures récentes) ne doit
+pas croître avec la taille de la collection.
+
+Usage:
+    python -m benchmarks.query_latency --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from src.storage.mongodb_handler import MongoDBHandler
+
+BENCH_DATABASE = 'energy_monitoring_bench'
+
+
+def _fill(handler: MongoDBHandler, size: int, sensors: int, recent: int,
+          chunk: int = 10000):
+    """
+    Remplit la collection : `recent` mesures dans la dernière demi-heure,
+    les autres plus de deux heures auparavant.
+    """
+    now = datetime.now()
+    for start in range(0, size, chunk):
+        documents = []
+        for i in range(start, min(size, start + chunk)):
+            if i < recent:
+                timestamp = now - timedelta(seconds=i % 1800)
+            else:
+                timestamp = now - timedelta(hours=2, seconds=i)
+            documents.append({
+                'sensor_id': f"SENSOR_{i % sensors:06d}",
+                'location': 'Benchmark',
+                'consumption_kwh': 100.0 + (i % 50),
+                'timestamp': timestamp,
+                'status': 'active'
+            })
+        handler.collection.insert_many(documents, ordered=False)
+
+
+def _time(call, repeats: int) -> Dict[str, float]:
+    """Chronomètre un appel et retourne p50/p99 en millisecondes."""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    samples.sort()
+    return {
+        'p50_ms': statistics.median(samples),
+        'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    }
+
+
+def run(connection_string: str, sizes: List[int], sensors: int = 1000,
+        recent: int = 1000, repeats: int = 50,
+        time_series: bool = False) -> List[Dict]:
+    """
+    Exécute le benchmark pour chaque taille de collection.
+
+    Args:
+        connection_string: URL de connexion MongoDB
+        sizes: Tailles de collection à tester
+        sensors: Nombre de capteurs simulés
+        recent: Nombre de mesures dans la dernière heure
+        repeats: Nombre de répétitions par requête
+        time_series: Utiliser une collection time-series
+
+    Returns:
+        Résultats par taille
+    """
+    results = []
+    for size in sizes:
+        handler = MongoDBHandler(connection_string, BENCH_DATABASE,
+                                 time_series=time_series)
+        if not handler.connect():
+            raise SystemExit(1)
+        handler.db.drop_collection(handler.collection_name)
+        handler.connect()
+        _fill(handler, size, sensors, min(recent, size))
+
+        sensor_ids = [f"SENSOR_{i:06d}" for i in range(sensors)]
+        plan = handler.collection.find(
+            {'sensor_id': sensor_ids[0]}
+        ).sort('timestamp', -1).limit(100).explain()
+        result = {
+            'size': size,
+            'plan': plan.get('queryPlanner', {}).get('winningPlan', {}),
+            'get_measurements': _time(
+                lambda: handler.get_measurements(random.choice(sensor_ids)),
+                repeats
+            ),
+            'get_recent_measurements': _time(
+                lambda: handler.get_recent_measurements(hours=1), repeats
+            ),
+            'get_statistics': _time(
+                lambda: handler.get_statistics(random.choice(sensor_ids)),
+                repeats
+            ),
+        }
+        results.append(result)
+        handler.db.drop_collection(handler.collection_name)
+        handler.disconnect()
+    return results
+
+
+def main():
+    """Point d'entrée en ligne de commande."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--connection-string',
+                        default='mongodb://localhost:27017/')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--sensors', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--time-series', action='store_true')
+    args = parser.parse_args()
+
+    results = run(args.connection_string, args.sizes, args.sensors,
+                  repeats=args.repeats, time_series=args.time_series)
+    print(f"{'taille':>10} {'get_measurements':>18} "
+          f"{'get_recent':>12} {'get_statistics':>16}")
+    for result in results:
+        print(f"{result['size']:>10} "
+              f"{result['get_measurements']['p50_ms']:>15.2f} ms "
+              f"{result['get_recent_measurements']['p50_ms']:>9.2f} ms "
+              f"{result['get_statistics']['p50_ms']:>13.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
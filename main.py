@@ -1,64 +1,368 @@
 """
 Application principale de suivi de consommation énergétique.
+
+Usage :
+    python main.py [--set section.clé=valeur ...] <commande> [options]
+
+Commandes :
+    simulate   lectures simulées des capteurs, sans stockage ni détection
+    monitor    surveillance en temps réel (commande par défaut)
+    baseline   calcul des baselines à partir des mesures stockées et
+               enregistrement d'un instantané
+    stats      statistiques par capteur des mesures stockées
+    replay     rejeu de la détection sur les mesures stockées
+    compact    compactage des mesures brutes expirées (MongoDB)
+    bench      benchmark du pipeline (options de benchmarks.pipeline)
+
+La configuration vient de src/config/settings.py, surchargée par les
+variables d'environnement ENERGY_<SECTION>__<CLÉ> puis par les options
+(voir src/config/overrides.py).
+
+Les modules de stockage et d'analyse (NumPy, pymongo) ne sont importés
+que par les commandes qui s'en servent : l'aide et l'analyse des options
+restent quasi instantanées.
 """
-import time
-from src.sensors.iot_sensor import IoTSensor, SensorNetwork
-from src.storage.mongodb_handler import MongoDBHandler
-from src.analysis.anomaly_detector import AnomalyDetector
+import argparse
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+
+from src.config import overrides
+from src.config.settings import (
+    AGGREGATION_CONFIG, ANOMALY_CONFIG, INGESTION_CONFIG, LOGGING_CONFIG,
+    METRICS_CONFIG, MONGODB_CONFIG, MONITORING_CONFIG, PROFILING_CONFIG,
+    REPLAY_CONFIG, RETENTION_CONFIG, SENSOR_CONFIG, SNAPSHOT_CONFIG,
+    STORAGE_CONFIG
+)
+
+# Parc de démonstration : (identifiant, localisation, consommation de
+# base, variance)
+DEMO_SENSORS = (
+    ("SENSOR_001", "Bureau Principal", 150.0, 30.0),
+    ("SENSOR_002", "Entrepôt", 250.0, 50.0),
+    ("SENSOR_003", "Salle Serveurs", 500.0, 75.0),
+    ("SENSOR_004", "Cafétéria", 100.0, 20.0),
+)
+
+
+def open_storage():
+    """
+    Ouvre le moteur de stockage configuré.
+
+    Returns:
+        Moteur connecté, ou None si le stockage est indisponible
+    """
+    from src.storage.base import create_storage
+
+    backend = STORAGE_CONFIG['backend']
+    if backend == 'mongodb':
+        print("Connexion à MongoDB...")
+        options = dict(MONGODB_CONFIG)
+        if RETENTION_CONFIG['enabled']:
+            options['retention'] = {
+                name: RETENTION_CONFIG[name]
+                for name in ('retention_days', 'bucket_seconds',
+                             'slice_seconds', 'batch_size')
+            }
+        db_handler = create_storage(backend, **options)
+        if not db_handler.connect():
+            print("Impossible de se connecter à MongoDB. Vérifiez que "
+                  "MongoDB est en cours d'exécution, ou choisissez le "
+                  "stockage 'columnar' dans STORAGE_CONFIG.")
+            return None
+        print("✓ Connecté à MongoDB\n")
+    else:
+        print(f"Ouverture du stockage {backend}...")
+        db_handler = create_storage(backend, **STORAGE_CONFIG[backend])
+        if not db_handler.connect():
+            print("Impossible d'ouvrir le stockage.")
+            return None
+        print("✓ Stockage prêt\n")
+    return db_handler
+
+
+def create_detector(registry=None):
+    """
+    Crée le détecteur d'anomalies configuré.
+
+    Args:
+        registry: Registre des capteurs partagé avec les lots analysés
+            (nouveau si absent)
+
+    Returns:
+        Détecteur (ParallelAnomalyDetector si configuré)
+    """
+    from src.analysis.anomaly_detector import AnomalyDetector
+
+    detector_options = dict(
+        threshold_multiplier=ANOMALY_CONFIG['threshold_multiplier'],
+        registry=registry,
+        baseline_mode=ANOMALY_CONFIG['baseline_mode'],
+        half_life=ANOMALY_CONFIG['half_life'],
+        window_size=ANOMALY_CONFIG['window_size'],
+        quantiles=ANOMALY_CONFIG['quantiles'],
+        relative_accuracy=ANOMALY_CONFIG['relative_accuracy'],
+        seasonality=ANOMALY_CONFIG['seasonality']
+    )
+    if ANOMALY_CONFIG['detection_workers'] > 1:
+        from src.analysis.parallel_detector import ParallelAnomalyDetector
+        return ParallelAnomalyDetector(
+            workers=ANOMALY_CONFIG['detection_workers'],
+            min_parallel_rows=ANOMALY_CONFIG['min_parallel_rows'],
+            **detector_options
+        )
+    return AnomalyDetector(**detector_options)
+
+
+def close_detector(detector):
+    """Arrête les processus d'un détecteur réparti."""
+    close = getattr(detector, 'close', None)
+    if close is not None:
+        close()
+
+
+def create_network(sensors: int = 0, verbose: bool = True):
+    """
+    Crée le réseau de capteurs simulés.
+
+    Le parc vient du fichier SENSOR_CONFIG['fleet_file'] s'il est
+    configuré, sinon de `sensors` capteurs générés, sinon du parc de
+    démonstration.
+
+    Args:
+        sensors: Nombre de capteurs générés (sans fichier de parc)
+        verbose: Afficher les capteurs ajoutés
+
+    Returns:
+        Réseau de capteurs (SensorNetwork)
+    """
+    from src.sensors.iot_sensor import SensorNetwork
+
+    network = SensorNetwork(vectorized=True,
+                            seed=SENSOR_CONFIG['simulation_seed'],
+                            workers=SENSOR_CONFIG['simulation_workers'])
+    if SENSOR_CONFIG['fleet_file']:
+        from src.sensors.loader import load_fleet
 
+        loaded = load_fleet(network, SENSOR_CONFIG['fleet_file'],
+                            SENSOR_CONFIG['fleet_chunk_size'])
+        print(f"✓ {loaded} capteurs chargés depuis "
+              f"{SENSOR_CONFIG['fleet_file']} "
+              f"({len(network.locations())} localisations)")
+        return network
+    fleet = [record + (True,) for record in DEMO_SENSORS] if not sensors \
+        else ((f"SENSOR_{number:06d}", f"Zone {number % 100:02d}",
+               SENSOR_CONFIG['default_base_consumption'],
+               SENSOR_CONFIG['default_variance'], True)
+              for number in range(1, sensors + 1))
+    network.add_sensors(fleet)
+    if verbose:
+        for sensor_id, sensor in network.sensors.items():
+            print(f"✓ Capteur {sensor_id} ajouté ({sensor.location})")
+    return network
+
+
+def simulate(args: argparse.Namespace):
+    """
+    Produit des lectures simulées, sans stockage ni détection.
+
+    Args:
+        args: Options de la ligne de commande (sensors, cycles,
+            interval, output)
+    """
+    import json
+    import time
+
+    network = create_network(args.sensors, verbose=False)
+    interval = SENSOR_CONFIG['reading_interval'] \
+        if args.interval is None else args.interval
+    output = sys.stdout if args.output in (None, '-') \
+        else open(args.output, 'w', encoding='utf-8')
+    total = 0
+    started = time.perf_counter()
+    try:
+        for cycle in range(args.cycles):
+            if cycle and interval > 0:
+                time.sleep(interval)
+            batch = network.read_batch()
+            total += len(batch)
+            if args.output is not None:
+                for measurement in batch.to_dicts():
+                    output.write(json.dumps(measurement, default=str)
+                                 + '\n')
+    finally:
+        network.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    print(f"{total} mesures simulées pour {len(network.sensors)} capteurs "
+          f"en {elapsed:.2f} s", file=sys.stderr)
+
+
+def replay(args: argparse.Namespace):
+    """
+    Rejoue la détection d'anomalies sur les mesures stockées.
+
+    Args:
+        args: Options de la ligne de commande (start, end,
+            training_hours, run_id)
+    """
+    print("=== Rejeu de la détection d'anomalies ===\n")
+    db_handler = open_storage()
+    if db_handler is None:
+        return
+
+    from src.analysis.replay import AnomalyReplay
+
+    training_hours = args.training_hours
+    if training_hours is None:
+        training_hours = REPLAY_CONFIG['training_hours']
+    detector = create_detector()
+    runner = AnomalyReplay(db_handler, detector,
+                           batch_size=REPLAY_CONFIG['batch_size'],
+                           write_batch_size=REPLAY_CONFIG['write_batch_size'])
+    try:
+        summary = runner.run(timedelta(hours=training_hours),
+                             start=args.start, end=args.end,
+                             run_id=args.run_id)
+    finally:
+        close_detector(detector)
+        db_handler.disconnect()
+
+    print(f"Rejeu {summary['run_id']}:")
+    print(f"  Mesures d'apprentissage: {summary['trained']}")
+    print(f"  Mesures analysées: {summary['analyzed']}")
+    print(f"  Anomalies enregistrées: {summary['anomalies']}")
+    print(f"  Durée: {summary['seconds']:.1f} s "
+          f"({summary['speedup']:.0f} fois le temps réel)")
+
+
+def monitor(args: argparse.Namespace):
+    """
+    Surveillance en temps réel des capteurs.
+
+    Args:
+        args: Options de la ligne de commande (sensors, cycles)
+    """
+    from src.analysis.location_aggregator import FLEET, LocationAggregator
+    from src.analysis.snapshots import BaselineSnapshots
+    from src.core.metrics import MetricsServer
+    from src.core.profiling import CycleProfiler
+    from src.core.runtime import MonitoringRuntime, group_by_interval
+    from src.storage.ingestion import WriteBehindIngestor
+    from src.storage.snapshots import SnapshotFiles
 
-def main():
-    """Fonction principale de l'application."""
     print("=== Système de Suivi Énergétique ===\n")
 
-    # Initialisation de MongoDB
-    print("Connexion à MongoDB...")
-    db_handler = MongoDBHandler()
-    if not db_handler.connect():
-        print("Impossible de se connecter à MongoDB. Vérifiez que MongoDB "
-              "est en cours d'exécution.")
+    metrics_server = None
+    if METRICS_CONFIG['enabled']:
+        metrics_server = MetricsServer(host=METRICS_CONFIG['host'],
+                                       port=METRICS_CONFIG['port'])
+        try:
+            port = metrics_server.start()
+            print(f"✓ Métriques sur http://{METRICS_CONFIG['host']}:{port}"
+                  f"/metrics\n")
+        except OSError as e:
+            print(f"Métriques indisponibles: {e}\n")
+            metrics_server = None
+
+    # Initialisation du stockage
+    db_handler = open_storage()
+    if db_handler is None:
         return
 
-    print("✓ Connecté à MongoDB\n")
+    # Écriture asynchrone : la surveillance n'attend plus le stockage
+    ingestor = WriteBehindIngestor(db_handler, **INGESTION_CONFIG)
+    ingestor.start()
+
+    # Compactage des mesures expirées en arrière-plan, par tranches
+    retention = getattr(db_handler, 'retention', None)
+    if retention is not None:
+        retention.start(RETENTION_CONFIG['interval'],
+                        RETENTION_CONFIG['pause'])
 
     # Création du réseau de capteurs
     print("Initialisation des capteurs...")
-    sensor_network = SensorNetwork()
+    sensor_network = create_network(args.sensors,
+                                    verbose=args.sensors <= 20)
+    print()
 
-    # Ajout de capteurs avec différentes caractéristiques
-    sensors_config = [
-        ("SENSOR_001", "Bureau Principal", 150.0, 30.0),
-        ("SENSOR_002", "Entrepôt", 250.0, 50.0),
-        ("SENSOR_003", "Salle Serveurs", 500.0, 75.0),
-        ("SENSOR_004", "Cafétéria", 100.0, 20.0),
-    ]
+    # Initialisation du détecteur d'anomalies
+    anomaly_detector = create_detector(sensor_network.registry)
 
-    for sensor_id, location, base, variance in sensors_config:
-        sensor = IoTSensor(sensor_id, location, base, variance)
-        sensor_network.add_sensor(sensor)
-        print(f"✓ Capteur {sensor_id} ajouté ({location})")
+    sensor_ids = list(sensor_network.sensors.keys())
 
-    print()
+    # Reprise des baselines (instantané, sinon historique stocké)
+    snapshots = None
+    if SNAPSHOT_CONFIG['enabled']:
+        targets = [db_handler]
+        if SNAPSHOT_CONFIG['directory']:
+            targets.append(SnapshotFiles(SNAPSHOT_CONFIG['directory']))
+        snapshots = BaselineSnapshots(anomaly_detector, targets,
+                                      interval=SNAPSHOT_CONFIG['interval'],
+                                      keep=SNAPSHOT_CONFIG['keep'])
+        resumed = snapshots.warm_start(
+            db_handler, catch_up=SNAPSHOT_CONFIG['catch_up']
+        )
+        if resumed['source'] is not None:
+            print(f"✓ Baselines reprises ({resumed['source']}) pour "
+                  f"{resumed['sensors']} capteurs en "
+                  f"{resumed['seconds']:.2f} s\n")
 
-    # Initialisation du détecteur d'anomalies
-    anomaly_detector = AnomalyDetector(threshold_multiplier=2.0)
+    # Étapes du pipeline, enveloppées seulement si le profilage est actif
+    read = sensor_network.read_batch
+    persist = ingestor.submit
+    ingest = anomaly_detector.ingest
+    analyze = anomaly_detector.analyze_batch
+    profiler = None
+    if PROFILING_CONFIG['enabled']:
+        profiler = CycleProfiler(
+            sample_rate=PROFILING_CONFIG['sample_rate'],
+            output_dir=PROFILING_CONFIG['output_dir'],
+            memory=PROFILING_CONFIG['memory'],
+            top=PROFILING_CONFIG['top']
+        )
+        read = profiler.wrap('sensors', read)
+        # Écriture synchrone : le temps du stockage est attribué au lot
+        # qui l'a produit au lieu d'être regroupé par le thread d'écriture
+        persist = profiler.wrap('storage', db_handler.insert_measurements)
+        ingest = profiler.wrap('analysis', ingest)
+        analyze = profiler.wrap('analysis', analyze)
+        print(f"Profilage de {PROFILING_CONFIG['sample_rate']:.0%} des "
+              f"cycles\n")
 
-    # Phase 1: Collecte de données de référence
-    print("Phase 1: Collecte des données de référence...")
-    baseline_measurements = []
+    # Phase 1: Collecte de données de référence, seulement si des
+    # capteurs n'ont pas de baseline reprise
+    known = sum(anomaly_detector.get_sensor_baseline(sensor_id) is not None
+                for sensor_id in sensor_ids)
+    if known < len(sensor_ids):
+        print("Phase 1: Collecte des données de référence...")
+        baseline_count = 0
 
-    for i in range(20):
-        measurements = sensor_network.read_all_sensors()
-        baseline_measurements.extend(measurements)
-        db_handler.insert_measurements(measurements)
-        time.sleep(0.1)
+        def count_baseline(batch, _):
+            nonlocal baseline_count
+            baseline_count += len(batch)
 
-    print(f"✓ {len(baseline_measurements)} mesures collectées\n")
+        # Mise à jour incrémentale des baselines, sans garder
+        # l'historique
+        baseline_runtime = MonitoringRuntime(
+            read, persist,
+            group_by_interval(sensor_ids,
+                              MONITORING_CONFIG['baseline_interval']),
+            queue_size=MONITORING_CONFIG['queue_size']
+        )
+        baseline_runtime.run(cycles=ANOMALY_CONFIG['baseline_samples'],
+                             detect=ingest,
+                             on_result=count_baseline)
 
-    # Calcul des baselines pour chaque capteur
+        print(f"✓ {baseline_count} mesures collectées\n")
+        if snapshots is not None:
+            snapshots.save()
+
+    # Affichage des baselines de chaque capteur
     print("Calcul des baselines...")
-    for sensor_id in sensor_network.sensors.keys():
-        anomaly_detector.calculate_baseline(baseline_measurements, sensor_id)
+    for sensor_id in sensor_ids:
         baseline = anomaly_detector.get_sensor_baseline(sensor_id)
         if baseline:
             print(f"✓ {sensor_id}: Moyenne = {baseline['mean']:.2f} kWh, "
@@ -68,19 +372,31 @@ def main():
     print()
 
     # Phase 2: Surveillance en temps réel
-    print("Phase 2: Surveillance en temps réel (30 cycles)...")
+    cycles = ANOMALY_CONFIG['monitoring_cycles'] if args.cycles is None \
+        else args.cycles
+    print(f"Phase 2: Surveillance en temps réel ({cycles} cycles)...")
     print("-" * 60)
 
-    for cycle in range(30):
-        measurements = sensor_network.read_all_sensors()
-        db_handler.insert_measurements(measurements)
+    # Charges par localisation et pour le parc, sur fenêtres fixe et
+    # glissante
+    aggregator = None
+    if AGGREGATION_CONFIG['enabled']:
+        aggregator = LocationAggregator(
+            tumbling_window=AGGREGATION_CONFIG['tumbling_window'],
+            sliding_window=AGGREGATION_CONFIG['sliding_window'],
+            threshold_multiplier=AGGREGATION_CONFIG['threshold_multiplier'],
+            half_life=AGGREGATION_CONFIG['half_life'],
+            min_cycles=AGGREGATION_CONFIG['min_cycles']
+        )
 
-        # Détection d'anomalies
-        anomalies = anomaly_detector.analyze_batch(measurements)
+    cycle = 0
 
+    def report_anomalies(batch, anomalies):
+        nonlocal cycle
+        cycle += 1
         if anomalies:
             for anomaly in anomalies:
-                print(f"\n⚠ ANOMALIE DÉTECTÉE!")
+                print("\n⚠ ANOMALIE DÉTECTÉE!")
                 print(f"  Capteur: {anomaly['sensor_id']}")
                 print(f"  Type: {anomaly['type']}")
                 print(f"  Sévérité: {anomaly['severity']}")
@@ -89,16 +405,70 @@ def main():
                       f"{anomaly['expected_range'][0]:.2f} - "
                       f"{anomaly['expected_range'][1]:.2f} kWh")
         else:
-            print(f"Cycle {cycle + 1}: Toutes les mesures normales")
+            print(f"Cycle {cycle}: Toutes les mesures normales")
+        if aggregator is not None:
+            for anomaly in aggregator.update(batch):
+                print(f"\n⚠ CHARGE ANORMALE: {anomaly['location']} "
+                      f"({anomaly['type']}, {anomaly['severity']}) "
+                      f"{anomaly['load']:.2f} kWh, attendu "
+                      f"{anomaly['expected_range'][0]:.2f} - "
+                      f"{anomaly['expected_range'][1]:.2f} kWh")
+            for window in aggregator.completed_windows():
+                fleet = window[FLEET]
+                print(f"Fenêtre {fleet['window_start']:%H:%M:%S}: "
+                      f"{fleet['total_kwh']:.2f} kWh pour le parc, "
+                      f"{len(window) - 1} localisations")
+        if snapshots is not None:
+            # Entre deux lots : l'état copié est cohérent
+            snapshots.maybe_save()
 
-        time.sleep(0.5)
+    # Cadence fixe par groupe de capteurs ; lecture, écriture et
+    # détection se recouvrent
+    monitoring_runtime = MonitoringRuntime(
+        read, persist,
+        group_by_interval(sensor_ids, SENSOR_CONFIG['reading_interval'],
+                          SENSOR_CONFIG['sensor_intervals']),
+        queue_size=MONITORING_CONFIG['queue_size']
+    )
+    try:
+        timing = monitoring_runtime.run(cycles=cycles,
+                                        detect=analyze,
+                                        on_result=report_anomalies)
+    finally:
+        # Instantané final, y compris sur interruption
+        if snapshots is not None:
+            snapshots.close()
+    for name, stats in timing.items():
+        print(f"\nCadence {name}: {stats['ticks']} cycles, "
+              f"{stats['missed']} manqués, retard moyen "
+              f"{stats['mean_lag'] * 1000:.1f} ms, "
+              f"max {stats['max_lag'] * 1000:.1f} ms")
 
     print("\n" + "-" * 60)
 
+    if aggregator is not None:
+        print("\nCharge moyenne par cycle (fenêtre glissante):")
+        for location, summary in sorted(aggregator.sliding().items())[:20]:
+            print(f"  {'Parc' if location == FLEET else location}: "
+                  f"{summary['mean_load_kwh']:.2f} kWh "
+                  f"[{summary['min_kwh']:.2f} - {summary['max_kwh']:.2f}] "
+                  f"sur {summary['cycles']} cycles")
+
+    if profiler is not None:
+        summary = profiler.close()
+        print(f"\nProfilage par étape ({summary}):\n")
+        print(profiler.summary())
+
+    # Vidange de la file d'écriture avant les statistiques
+    sensor_network.close()
+    ingestor.close()
+    close_detector(anomaly_detector)
+
     # Affichage des statistiques finales
     print("\n=== Statistiques Finales ===\n")
-    for sensor_id in sensor_network.sensors.keys():
-        stats = db_handler.get_statistics(sensor_id)
+    all_stats = db_handler.get_statistics_bulk(sensor_ids)
+    for sensor_id in sensor_ids:
+        stats = all_stats.get(sensor_id)
         if stats:
             print(f"{sensor_id}:")
             print(f"  Nombre de mesures: {stats['count']}")
@@ -111,8 +481,304 @@ def main():
     # Nettoyage
     print("Fermeture des connexions...")
     db_handler.disconnect()
+    if metrics_server is not None:
+        metrics_server.stop()
     print("✓ Terminé")
 
 
+def baseline(args: argparse.Namespace):
+    """
+    Calcule les baselines à partir des mesures stockées et enregistre un
+    instantané, repris au prochain démarrage de la surveillance.
+
+    Args:
+        args: Options de la ligne de commande (rebuild, show)
+    """
+    from src.analysis.snapshots import BaselineSnapshots
+    from src.storage.snapshots import SnapshotFiles
+
+    db_handler = open_storage()
+    if db_handler is None:
+        return
+    detector = create_detector()
+    targets = [db_handler]
+    if SNAPSHOT_CONFIG['directory']:
+        targets.append(SnapshotFiles(SNAPSHOT_CONFIG['directory']))
+    snapshots = BaselineSnapshots(detector, targets,
+                                  keep=SNAPSHOT_CONFIG['keep'])
+    try:
+        summary = snapshots.warm_start(
+            db_handler, batch_size=REPLAY_CONFIG['batch_size'],
+            from_snapshot=not args.rebuild
+        )
+        if summary['source'] is None:
+            print("Aucune mesure stockée : baselines non calculées")
+            return
+        versions = snapshots.save()
+        print(f"✓ Baselines de {summary['sensors']} capteurs "
+              f"({summary['source']}, {summary['measurements']} mesures) "
+              f"en {summary['seconds']:.2f} s, instantané {versions}")
+        for sensor_id in detector.registry.ids[:args.show]:
+            stats = detector.get_sensor_baseline(sensor_id)
+            if stats:
+                print(f"  {sensor_id}: Moyenne = {stats['mean']:.2f} kWh, "
+                      f"Seuil = [{stats['threshold_low']:.2f}, "
+                      f"{stats['threshold_high']:.2f}]")
+    finally:
+        snapshots.close(save=False)
+        close_detector(detector)
+        db_handler.disconnect()
+
+
+def stats(args: argparse.Namespace):
+    """
+    Affiche les statistiques par capteur des mesures stockées.
+
+    Args:
+        args: Options de la ligne de commande (sensor, limit)
+    """
+    db_handler = open_storage()
+    if db_handler is None:
+        return
+    try:
+        all_stats = db_handler.get_statistics_bulk(args.sensor or None)
+    finally:
+        db_handler.disconnect()
+    if not all_stats:
+        print("Aucune mesure stockée")
+        return
+    for sensor_id in sorted(all_stats)[:args.limit]:
+        sensor_stats = all_stats[sensor_id]
+        print(f"{sensor_id}: {sensor_stats['count']} mesures, moyenne "
+              f"{sensor_stats['avg_consumption']:.2f} kWh, min "
+              f"{sensor_stats['min_consumption']:.2f}, max "
+              f"{sensor_stats['max_consumption']:.2f}")
+    if len(all_stats) > args.limit:
+        print(f"... {len(all_stats) - args.limit} autres capteurs")
+
+
+def compact(args: argparse.Namespace):
+    """
+    Compacte les mesures brutes expirées en agrégats (rétention MongoDB).
+
+    Args:
+        args: Options de la ligne de commande (max_steps)
+    """
+    if STORAGE_CONFIG['backend'] != 'mongodb':
+        print("La rétention ne concerne que le stockage MongoDB")
+        return
+    RETENTION_CONFIG['enabled'] = True
+    db_handler = open_storage()
+    if db_handler is None:
+        return
+    try:
+        retention = db_handler.retention
+        compacted = db_handler.compact(max_steps=args.max_steps)
+        print(f"✓ {compacted} mesures compactées en agrégats de "
+              f"{retention.bucket_seconds} s (mesures brutes conservées "
+              f"depuis le {retention.cutoff():%Y-%m-%d %H:%M})")
+    finally:
+        db_handler.disconnect()
+
+
+def bench(args: argparse.Namespace):
+    """
+    Lance le benchmark du pipeline.
+
+    Args:
+        args: Options de la ligne de commande (options transmises à
+            benchmarks.pipeline)
+    """
+    from benchmarks.pipeline import main as run_benchmarks
+
+    run_benchmarks(args.options)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Construit l'analyseur de la ligne de commande.
+
+    Les valeurs par défaut absentes (None) sont lues dans la
+    configuration au moment de l'exécution, après les surcharges.
+
+    Returns:
+        Analyseur avec une sous-commande par commande
+    """
+    parser = argparse.ArgumentParser(
+        description="Suivi de consommation énergétique"
+    )
+    parser.add_argument(
+        '--set', dest='assignments', action='append', default=[],
+        metavar='SECTION.CLÉ=VALEUR',
+        help="Surcharger une valeur de configuration (répétable), par "
+             "exemple anomaly.threshold_multiplier=3"
+    )
+    parser.add_argument('--storage', choices=('mongodb', 'columnar'),
+                        help="Moteur de stockage (storage.backend)")
+    parser.add_argument('--log-level',
+                        help="Niveau de journalisation (logging.level)")
+    commands = parser.add_subparsers(dest='command')
+
+    simulate_parser = commands.add_parser(
+        'simulate', help="Lectures simulées, sans stockage ni détection"
+    )
+    simulate_parser.add_argument(
+        '--sensors', type=int, default=0,
+        help="Nombre de capteurs générés (parc de démonstration si 0)"
+    )
+    simulate_parser.add_argument(
+        '--fleet', help="Fichier CSV ou JSON Lines du parc "
+                        "(sensor.fleet_file)"
+    )
+    simulate_parser.add_argument('--cycles', type=int, default=10,
+                                 help="Nombre de cycles de lecture")
+    simulate_parser.add_argument(
+        '--interval', type=float,
+        help="Pause entre deux cycles (s, sensor.reading_interval par "
+             "défaut)"
+    )
+    simulate_parser.add_argument(
+        '--output', help="Fichier JSON Lines des mesures ('-' : sortie "
+                         "standard)"
+    )
+
+    monitor_parser = commands.add_parser(
+        'monitor', help="Surveillance en temps réel"
+    )
+    monitor_parser.add_argument(
+        '--sensors', type=int, default=0,
+        help="Nombre de capteurs générés (parc de démonstration si 0)"
+    )
+    monitor_parser.add_argument(
+        '--fleet', help="Fichier CSV ou JSON Lines du parc "
+                        "(sensor.fleet_file)"
+    )
+    monitor_parser.add_argument(
+        '--cycles', type=int,
+        help="Cycles de surveillance (anomaly.monitoring_cycles par "
+             "défaut)"
+    )
+
+    baseline_parser = commands.add_parser(
+        'baseline',
+        help="Calculer les baselines à partir des mesures stockées"
+    )
+    baseline_parser.add_argument(
+        '--rebuild', action='store_true',
+        help="Ignorer l'instantané existant et tout recalculer"
+    )
+    baseline_parser.add_argument('--show', type=int, default=10,
+                                 help="Nombre de baselines affichées")
+
+    stats_parser = commands.add_parser(
+        'stats', help="Statistiques des mesures stockées"
+    )
+    stats_parser.add_argument('--sensor', action='append',
+                              help="Capteur (répétable ; tous si absent)")
+    stats_parser.add_argument('--limit', type=int, default=50,
+                              help="Nombre de capteurs affichés")
+
+    replay_parser = commands.add_parser(
+        'replay', help="Rejouer la détection sur les mesures stockées"
+    )
+    replay_parser.add_argument(
+        '--start', type=datetime.fromisoformat,
+        help="Début de la période (ISO 8601, première mesure si absent)"
+    )
+    replay_parser.add_argument(
+        '--end', type=datetime.fromisoformat,
+        help="Fin de la période, exclue (ISO 8601)"
+    )
+    replay_parser.add_argument(
+        '--training-hours', type=float,
+        help="Durée de la fenêtre d'apprentissage des baselines (heures, "
+             "replay.training_hours par défaut)"
+    )
+    replay_parser.add_argument(
+        '--run-id', help="Identifiant enregistré avec les anomalies"
+    )
+
+    compact_parser = commands.add_parser(
+        'compact', help="Compacter les mesures brutes expirées "
+                        "(retention.retention_days)"
+    )
+    compact_parser.add_argument(
+        '--max-steps', type=int,
+        help="Nombre maximal de tranches compactées (toutes si absent)"
+    )
+
+    bench_parser = commands.add_parser(
+        'bench', help="Benchmark du pipeline",
+        description="Options transmises à benchmarks.pipeline "
+                    "(python main.py bench -- --help)"
+    )
+    bench_parser.add_argument('options', nargs=argparse.REMAINDER,
+                              help="Options de benchmarks.pipeline")
+    return parser
+
+
+COMMANDS = {
+    'simulate': simulate,
+    'monitor': monitor,
+    'baseline': baseline,
+    'stats': stats,
+    'replay': replay,
+    'compact': compact,
+    'bench': bench,
+}
+
+
+def configure(args: argparse.Namespace,
+              environ: Optional[dict] = None) -> List[str]:
+    """
+    Applique les surcharges de configuration : variables
+    d'environnement, puis options de la ligne de commande.
+
+    Args:
+        args: Options analysées
+        environ: Variables d'environnement (os.environ si absent)
+
+    Returns:
+        Chemins de configuration modifiés
+
+    Raises:
+        ValueError: Si une surcharge est invalide
+    """
+    assignments = list(args.assignments)
+    if args.storage:
+        assignments.append(f"storage.backend={args.storage}")
+    if args.log_level:
+        assignments.append(f"logging.level={args.log_level.upper()}")
+    if getattr(args, 'fleet', None):
+        assignments.append(f"sensor.fleet_file={args.fleet}")
+    return overrides.apply_environment(environ) \
+        + overrides.apply_assignments(assignments)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """
+    Fonction principale de l'application.
+
+    Args:
+        argv: Arguments de la ligne de commande (sys.argv si absent)
+    """
+    parser = build_parser()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args = parser.parse_args(argv + ['monitor'])
+    if args.command == 'bench' and args.options[:1] == ['--']:
+        args.options = args.options[1:]
+    try:
+        configure(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging.basicConfig(level=LOGGING_CONFIG['level'],
+                        format=LOGGING_CONFIG['format'],
+                        filename=LOGGING_CONFIG['file'])
+    COMMANDS[args.command](args)
+
+
 if __name__ == "__main__":
     main()
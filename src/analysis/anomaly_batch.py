@@ -0,0 +1,99 @@
+"""
+Résultat en colonnes d'une détection d'anomalies sur un lot.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from src.core.measurement_batch import TIMESTAMP_UNIT
+
+SEVERITY_LEVELS = ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+
+_HIGH_MESSAGE = "Consommation élevée détectée: "
+_LOW_MESSAGE = "Consommation faible détectée: "
+
+
+class AnomalyBatch:
+    """Anomalies d'un lot, conservées en tableaux jusqu'à conversion."""
+
+    __slots__ = ('sensor_ids', 'rows', 'sensor_index', 'consumption',
+                 'timestamps', 'is_high', 'severity', 'threshold_low',
+                 'threshold_high')
+
+    def __init__(self, sensor_ids: Sequence[str], rows: np.ndarray,
+                 sensor_index: np.ndarray, consumption: Sequence,
+                 timestamps: Sequence, is_high: np.ndarray,
+                 severity: np.ndarray, threshold_low: np.ndarray,
+                 threshold_high: np.ndarray):
+        """
+        Initialise le résultat.
+
+        Args:
+            sensor_ids: Identifiants des capteurs, indexés par sensor_index
+            rows: Positions des mesures anormales dans le lot analysé
+            sensor_index: Index des capteurs concernés
+            consumption: Consommations anormales (tableau, ou valeurs
+                d'origine en liste)
+            timestamps: Horodatages des mesures anormales (datetime, ou
+                microsecondes depuis l'epoch en tableau int64)
+            is_high: True pour une anomalie HIGH, False pour LOW
+            severity: Niveaux de sévérité (index dans SEVERITY_LEVELS)
+            threshold_low: Seuils bas des capteurs concernés
+            threshold_high: Seuils hauts des capteurs concernés
+        """
+        self.sensor_ids = sensor_ids
+        self.rows = rows
+        self.sensor_index = sensor_index
+        self.consumption = consumption
+        self.timestamps = timestamps
+        self.is_high = is_high
+        self.severity = severity
+        self.threshold_low = threshold_low
+        self.threshold_high = threshold_high
+
+    def __len__(self) -> int:
+        """Nombre d'anomalies."""
+        return self.rows.shape[0]
+
+    def to_dicts(self) -> List[Dict]:
+        """
+        Convertit les anomalies au format de detect_anomaly.
+
+        Les colonnes sont converties en listes Python en bloc, puis les
+        dictionnaires sont construits en une seule compréhension.
+
+        Returns:
+            Liste des anomalies sous forme de dictionnaires
+        """
+        sensor_ids = self.sensor_ids
+        timestamps = self.timestamps
+        if isinstance(timestamps, np.ndarray):
+            timestamps = timestamps.astype(TIMESTAMP_UNIT).tolist()
+        values = self.consumption
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+        high = self.is_high.tolist()
+
+        ids = [sensor_ids[index] for index in self.sensor_index.tolist()]
+        levels = [SEVERITY_LEVELS[level]
+                  for level in self.severity.tolist()]
+        ranges = list(zip(self.threshold_low.tolist(),
+                          self.threshold_high.tolist()))
+        messages = [
+            (_HIGH_MESSAGE if is_high else _LOW_MESSAGE) + text + ' kWh'
+            for is_high, text in zip(high, map(str, values))
+        ]
+        return [
+            {
+                'sensor_id': sensor_id,
+                'timestamp': timestamp,
+                'consumption': value,
+                'expected_range': expected_range,
+                'type': 'HIGH' if is_high else 'LOW',
+                'severity': level,
+                'message': message
+            }
+            for sensor_id, timestamp, value, expected_range, is_high,
+            level, message in zip(ids, timestamps, values, ranges, high,
+                                  levels, messages)
+        ]
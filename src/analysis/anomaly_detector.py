@@ -1,54 +1,589 @@
 """
 Module de détection d'anomalies dans la consommation énergétique.
+
+Les baselines sont tenues par capteur ou, avec une saisonnalité, par
+capteur et heure de la journée ou de la semaine : chaque mesure est
+comparée au profil de l'intervalle de son horodatage.
 """
-import statistics
-from typing import List, Dict, Optional
+import json
+from datetime import datetime
+from typing import (
+    Iterable, List, Dict, Mapping, Optional, Sequence, Tuple, Union
+)
+
+import numpy as np
+
+from src.analysis.anomaly_batch import SEVERITY_LEVELS, AnomalyBatch
+from src.analysis.baseline_table import BaselineTable
+from src.analysis.streaming_stats import (
+    EWMAArray, QuantileSketchArray, RollingWindowArray, WelfordArray
+)
+from src.core.measurement_batch import (
+    TIMESTAMP_UNIT, MeasurementBatch, SensorRegistry
+)
+from src.core.metrics import ANOMALIES, SENSORS_WITH_BASELINE, timed
+
+Measurements = Union[List[Dict], MeasurementBatch]
+
+BASELINE_MODES = ('static', 'ewma', 'window', 'mad', 'quantile')
+# Modes dont les baselines évoluent avec les mesures analysées
+ADAPTIVE_MODES = ('ewma', 'window')
+# Modes robustes, calculés sur des esquisses de quantiles
+ROBUST_MODES = ('mad', 'quantile')
+
+# Facteur reliant l'écart absolu médian à l'écart-type d'une loi normale
+MAD_TO_STDEV = 1.4826
+
+# Saisonnalités : nombre d'intervalles d'une heure par période
+SEASONALITIES = {'hour_of_day': 24, 'hour_of_week': 168}
+
+_HOUR = 3_600_000_000
+# L'epoch (1970-01-01) est un jeudi : décalage pour que lundi 0 h soit
+# l'intervalle 0
+_EPOCH_HOUR_OF_WEEK = 3 * 24
+
+# Paramètres enregistrés avec l'état du détecteur (export_state)
+STATE_SETTINGS = ('baseline_mode', 'seasonality', 'window_size',
+                  'relative_accuracy', 'half_life', 'threshold_multiplier',
+                  'quantiles')
+# Paramètres déterminant la forme des accumulateurs, par mode : ils
+# doivent être identiques à la restauration
+_STATE_LAYOUT = {'window': ('window_size',),
+                 'mad': ('relative_accuracy',),
+                 'quantile': ('relative_accuracy',)}
+
+
+def seasonal_buckets(timestamps: Union[np.ndarray, Sequence[datetime]],
+                     buckets: int) -> np.ndarray:
+    """
+    Calcule l'intervalle saisonnier (heure de la journée ou de la
+    semaine, lundi 0 h = 0) de chaque horodatage.
+
+    Args:
+        timestamps: Microsecondes depuis l'epoch (int64) ou datetime
+        buckets: 24 (heure de la journée) ou 168 (heure de la semaine)
+
+    Returns:
+        Intervalles (int64)
+    """
+    return (_micros(timestamps) // _HOUR + _EPOCH_HOUR_OF_WEEK) % buckets
+
+
+def _padded(array: np.ndarray, size: int) -> np.ndarray:
+    """Copie les `size` premières lignes d'un tableau, complétées de 0."""
+    padded = np.zeros((size,) + array.shape[1:], dtype=array.dtype)
+    stored = min(size, array.shape[0])
+    padded[:stored] = array[:stored]
+    return padded
+
+
+def _micros(timestamps: Union[np.ndarray, Sequence[datetime]]
+            ) -> np.ndarray:
+    """Convertit des horodatages en microsecondes depuis l'epoch."""
+    if isinstance(timestamps, np.ndarray) and timestamps.dtype == np.int64:
+        return timestamps
+    return np.asarray(timestamps, dtype=TIMESTAMP_UNIT).astype(np.int64)
+
+
+def classify_rows(table: BaselineTable, indexes: np.ndarray,
+                  consumption: np.ndarray
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Classe des mesures par comparaison aux seuils d'une table.
+
+    Reproduit detect_anomaly et _calculate_severity sur des tableaux.
+
+    Args:
+        table: Baselines des capteurs
+        indexes: Index des capteurs (registre de la table)
+        consumption: Consommations
+
+    Returns:
+        Tuple (lignes anormales, indicateur HIGH, niveau de sévérité
+        sous forme d'index dans SEVERITY_LEVELS)
+    """
+    if table.defined.shape[0] == 0:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=bool),
+                np.empty(0, dtype=np.int64))
+
+    known = table.lookup(indexes)
+    safe = np.where(known, indexes, 0)
+
+    high = known & (consumption > table.threshold_high[safe])
+    low = known & ~high & (consumption < table.threshold_low[safe])
+    rows = np.flatnonzero(high | low)
+
+    is_high = high[rows]
+    mean = table.mean[indexes[rows]]
+    # Pour une anomalie basse, l'écart est mesuré depuis le seuil bas
+    value = np.where(is_high, consumption[rows],
+                     table.threshold_low[indexes[rows]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation = np.abs(value - mean) / mean
+    severity = np.select(
+        [deviation > 2.0, deviation > 1.0, deviation > 0.5], [3, 2, 1], 0
+    )
+    return rows, is_high, severity
 
 
 class AnomalyDetector:
     """Détecteur d'anomalies basé sur des méthodes statistiques."""
 
-    def __init__(self, threshold_multiplier: float = 2.0):
+    def __init__(self, threshold_multiplier: float = 2.0,
+                 registry: Optional[SensorRegistry] = None,
+                 baseline_mode: str = 'static',
+                 half_life: Optional[float] = None,
+                 window_size: Optional[int] = None,
+                 adapt_on_anomalies: bool = False,
+                 quantiles: Tuple[float, float] = (0.01, 0.99),
+                 relative_accuracy: float = 0.01,
+                 seasonality: Optional[str] = None):
         """
         Initialise le détecteur d'anomalies.
 
         Args:
             threshold_multiplier: Multiplicateur pour le seuil de détection
+            registry: Registre des capteurs partagé avec le réseau
+                (nouveau si absent)
+            baseline_mode: 'static' (baseline figée, Welford), 'ewma'
+                (moyenne/variance à décroissance exponentielle),
+                'window' (fenêtre glissante de taille fixe), 'mad'
+                (médiane ± multiplicateur × 1,4826 × écart absolu
+                médian) ou 'quantile' (bande entre deux quantiles) ;
+                les modes robustes sont figés et insensibles aux pics
+            half_life: Demi-vie en nombre de mesures (mode 'ewma')
+            window_size: Taille de la fenêtre par capteur (mode 'window')
+            adapt_on_anomalies: En mode adaptatif, intégrer aussi les
+                mesures signalées comme anormales
+            quantiles: Quantiles bas et haut de la bande (mode
+                'quantile')
+            relative_accuracy: Erreur relative des esquisses de
+                quantiles (modes 'mad' et 'quantile')
+            seasonality: None (une baseline par capteur), 'hour_of_day'
+                ou 'hour_of_week' (une baseline par capteur et heure,
+                choisie d'après l'horodatage de chaque mesure)
+
+        Raises:
+            ValueError: Si le mode est inconnu ou mal paramétré
         """
+        if baseline_mode not in BASELINE_MODES:
+            raise ValueError(f"Mode de baseline inconnu: {baseline_mode}")
+        if baseline_mode == 'ewma' and half_life is None:
+            raise ValueError("Le mode 'ewma' requiert half_life")
+        if baseline_mode == 'window' and window_size is None:
+            raise ValueError("Le mode 'window' requiert window_size")
+        if not 0 <= quantiles[0] < quantiles[1] <= 1:
+            raise ValueError("Les quantiles doivent vérifier "
+                             "0 <= bas < haut <= 1")
+        if seasonality is not None and seasonality not in SEASONALITIES:
+            raise ValueError(f"Saisonnalité inconnue: {seasonality}")
+
         self.threshold_multiplier = threshold_multiplier
-        self.baseline_stats = {}
+        self.registry = registry if registry is not None \
+            else SensorRegistry()
+        self.baseline_mode = baseline_mode
+        self.half_life = half_life
+        self.window_size = window_size
+        self.adapt_on_anomalies = adapt_on_anomalies
+        self.quantiles = tuple(quantiles)
+        self.relative_accuracy = relative_accuracy
+        self.seasonality = seasonality
+        self.buckets = SEASONALITIES.get(seasonality, 1)
+        self.baseline_stats = BaselineTable(self.registry, self.buckets)
+        self._stats = self._new_stats()
+        # Horodatage (µs) de la dernière mesure intégrée, par capteur
+        self.updated_at = np.zeros(0, dtype=np.int64)
+
+        # Jauge calculée à l'export (somme des détecteurs vivants)
+        SENSORS_WITH_BASELINE.track(
+            self, lambda detector: detector.baseline_stats.sensor_count()
+        )
+
+    def _new_stats(self, capacity: int = 0):
+        """
+        Crée les accumulateurs correspondant au mode de baseline.
+
+        Args:
+            capacity: Nombre initial de baselines allouées
+
+        Returns:
+            Accumulateurs par baseline
+        """
+        if self.baseline_mode == 'ewma':
+            return EWMAArray(self.half_life, capacity)
+        if self.baseline_mode == 'window':
+            return RollingWindowArray(self.window_size, capacity)
+        if self.baseline_mode in ROBUST_MODES:
+            return QuantileSketchArray(self.relative_accuracy,
+                                       capacity=capacity)
+        return WelfordArray(capacity)
+
+    def _keys(self, indexes: np.ndarray, timestamps) -> np.ndarray:
+        """
+        Calcule la ligne de baseline de chaque mesure.
+
+        Args:
+            indexes: Index des capteurs
+            timestamps: Horodatages en microsecondes (ignorés sans
+                saisonnalité)
+
+        Returns:
+            Lignes de la table des baselines
+        """
+        if self.buckets == 1:
+            return indexes
+        return indexes.astype(np.int64) * self.buckets \
+            + seasonal_buckets(timestamps, self.buckets)
+
+    def _columns(self, measurements: Measurements, intern: bool = True
+                 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Extrait les index (dans le registre du détecteur), les
+        consommations, les lignes de baseline et les horodatages d'un
+        ensemble de mesures.
+
+        Args:
+            measurements: Liste de mesures ou lot en colonnes
+            intern: Ajouter au registre les capteurs inconnus d'une liste
+                de mesures ; sinon leur index est -1 (pas de baseline)
+
+        Returns:
+            Tuple (index des capteurs, consommations, lignes de baseline,
+            horodatages en microsecondes)
+        """
+        if isinstance(measurements, MeasurementBatch):
+            batch = measurements.with_registry(self.registry)
+            return (batch.sensor_index, batch.consumption,
+                    self._keys(batch.sensor_index, batch.timestamp),
+                    batch.timestamp)
+        if intern:
+            indexes = np.asarray([self.registry.intern(m['sensor_id'])
+                                  for m in measurements], dtype=np.int32)
+        else:
+            found = map(self.registry.index_of,
+                        [m['sensor_id'] for m in measurements])
+            indexes = np.asarray([-1 if index is None else index
+                                  for index in found], dtype=np.int32)
+        values = np.asarray([m['consumption_kwh'] for m in measurements],
+                            dtype=np.float64)
+        timestamps = _micros([m['timestamp'] for m in measurements])
+        return (indexes, values, self._keys(indexes, timestamps),
+                timestamps)
+
+    def _sensor_columns(self, measurements: Measurements, sensor_id: str
+                        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Extrait les lignes de baseline, les consommations et les
+        horodatages d'un capteur.
 
-    def calculate_baseline(self, measurements: List[Dict],
+        Args:
+            measurements: Liste de mesures ou lot en colonnes
+            sensor_id: Identifiant du capteur
+
+        Returns:
+            Tuple (lignes de baseline, consommations, horodatages en
+            microsecondes)
+        """
+        if isinstance(measurements, MeasurementBatch):
+            local = measurements.registry.index_of(sensor_id)
+            rows = measurements.sensor_index == local if local is not None \
+                else np.zeros(len(measurements), dtype=bool)
+            values = measurements.consumption[rows]
+            timestamps = measurements.timestamp[rows]
+        else:
+            selected = [m for m in measurements
+                        if m.get('sensor_id') == sensor_id]
+            values = np.asarray([m['consumption_kwh'] for m in selected],
+                                dtype=np.float64)
+            timestamps = _micros([m['timestamp'] for m in selected])
+        indexes = np.full(values.shape[0], self.registry.intern(sensor_id),
+                          dtype=np.int64)
+        return self._keys(indexes, timestamps), values, timestamps
+
+    def _touch(self, indexes: np.ndarray, timestamps: np.ndarray):
+        """
+        Avance l'horodatage de dernière mise à jour des capteurs.
+
+        Args:
+            indexes: Index des capteurs des mesures intégrées
+            timestamps: Horodatages des mesures en microsecondes
+        """
+        if not indexes.shape[0]:
+            return
+        self._reserve_sensors(int(indexes.max()) + 1)
+        np.maximum.at(self.updated_at, indexes, timestamps)
+
+    def _reserve_sensors(self, size: int):
+        """Agrandit les horodatages par capteur jusqu'à `size`."""
+        current = self.updated_at.shape[0]
+        if size > current:
+            self.updated_at = _padded(self.updated_at,
+                                      max(size, 2 * current))
+
+    def _sensor_rows(self, sensor_id: str) -> np.ndarray:
+        """Lignes de baseline d'un capteur (une par intervalle)."""
+        index = self.registry.intern(sensor_id)
+        return np.arange(index * self.buckets, (index + 1) * self.buckets)
+
+    def calculate_baseline(self, measurements: Measurements,
                            sensor_id: str):
         """
         Calcule les statistiques de base pour un capteur.
 
         Args:
-            measurements: Liste des mesures historiques
+            measurements: Mesures historiques (liste ou lot en colonnes)
             sensor_id: Identifiant du capteur
         """
-        sensor_data = [
-            m['consumption_kwh'] for m in measurements
-            if m.get('sensor_id') == sensor_id
-        ]
+        keys, sensor_data, timestamps = self._sensor_columns(measurements,
+                                                             sensor_id)
 
         if len(sensor_data) < 2:
             return
 
-        mean = statistics.mean(sensor_data)
-        stdev = statistics.stdev(sensor_data)
+        rows = self._sensor_rows(sensor_id)
+        self._stats.reset(rows)
+        self._stats.update(keys, sensor_data)
+        self.baseline_stats.ensure_capacity(int(rows[-1]) + 1)
+        self.baseline_stats.defined[rows] = False
+        self._refresh_baselines(rows)
+        self._touch(keys // self.buckets, timestamps)
+
+    def calculate_baselines(self, measurements: Measurements):
+        """
+        Calcule les baselines de tous les capteurs en un seul passage.
+
+        Args:
+            measurements: Mesures historiques (liste ou lot en colonnes)
+        """
+        self._stats = self._new_stats(len(self.registry) * self.buckets)
+        self.baseline_stats.clear()
+        self.updated_at = np.zeros(len(self.registry), dtype=np.int64)
+        self.ingest(measurements)
+
+    def train(self, batches: Iterable[Measurements]) -> int:
+        """
+        Reconstruit les baselines (et les profils saisonniers) à partir
+        d'un historique parcouru par blocs, en un seul passage.
+
+        Args:
+            batches: Blocs de mesures, par exemple
+                storage.iter_measurements(columnar=True,
+                registry=detector.registry)
+
+        Returns:
+            Nombre de mesures intégrées
+        """
+        self.calculate_baselines(MeasurementBatch.empty(self.registry))
+        total = 0
+        for batch in batches:
+            self.ingest(batch)
+            total += len(batch)
+        return total
+
+    def seed_baselines(self, statistics: Dict[str, Dict],
+                       updated_at: Optional[datetime] = None) -> int:
+        """
+        Initialise les baselines à partir de statistiques agrégées par le
+        stockage (get_statistics_bulk), sans relire les mesures.
+
+        Seuls les modes dont l'état se résume à des moments ('static' et
+        'ewma', sans saisonnalité) peuvent être initialisés ainsi.
 
-        self.baseline_stats[sensor_id] = {
-            'mean': mean,
-            'stdev': stdev,
-            'threshold_high': mean + (self.threshold_multiplier * stdev),
-            'threshold_low': max(0, mean - (self.threshold_multiplier * stdev))
+        Args:
+            statistics: Statistiques par capteur (count,
+                avg_consumption, stdev_consumption)
+            updated_at: Instant couvert par les statistiques (maintenant
+                si absent), enregistré comme dernière mise à jour
+
+        Returns:
+            Nombre de capteurs initialisés
+
+        Raises:
+            ValueError: Si le mode ne se déduit pas des moments
+        """
+        if self.buckets > 1 or \
+                not isinstance(self._stats, (WelfordArray, EWMAArray)):
+            raise ValueError("Seules les baselines 'static' et 'ewma' sans "
+                             "saisonnalité s'initialisent depuis des "
+                             "statistiques")
+        usable = {sensor_id: stats for sensor_id, stats in statistics.items()
+                  if stats.get('stdev_consumption') is not None}
+        if not usable:
+            return 0
+        indexes = self.registry.intern_many(usable)
+        usable = list(usable.values())
+        count = np.array([stats['count'] for stats in usable],
+                         dtype=np.int64)
+        stdev = np.array([stats['stdev_consumption'] for stats in usable])
+        self._stats.set_moments(
+            indexes, count,
+            np.array([stats['avg_consumption'] for stats in usable]),
+            stdev * stdev
+        )
+        self.baseline_stats.ensure_capacity(int(indexes.max()) + 1)
+        self.baseline_stats.defined[indexes] = False
+        self._refresh_baselines(indexes)
+        self._touch(indexes, np.full(
+            indexes.shape[0], _micros([updated_at or datetime.now()])[0]
+        ))
+        return len(usable)
+
+    def export_state(self) -> Dict[str, np.ndarray]:
+        """
+        Copie l'état des baselines de tous les capteurs du registre :
+        accumulateurs, table des seuils et horodatage de la dernière
+        mesure intégrée par capteur.
+
+        Returns:
+            Tableaux par nom (sensor_ids, settings, updated_at,
+            table_<colonne>, stats_<champ>), prêts pour np.savez
+        """
+        sensors = len(self.registry)
+        rows = sensors * self.buckets
+        settings = {name: getattr(self, name) for name in STATE_SETTINGS}
+        state = {
+            'sensor_ids': np.array(self.registry.ids, dtype=str),
+            'settings': np.array(json.dumps(settings)),
+            'updated_at': _padded(self.updated_at, sensors)
         }
+        for name, column in self.baseline_stats.export().items():
+            state[f'table_{name}'] = column
+        for name in self._stats.FIELDS:
+            state[f'stats_{name}'] = _padded(getattr(self._stats, name),
+                                             rows)
+        return state
+
+    def restore_state(self, state: Mapping[str, np.ndarray]) -> int:
+        """
+        Restaure un état produit par export_state.
+
+        Les capteurs sont rattachés au registre du détecteur (internés au
+        besoin) et leurs baselines remplacées. Si le multiplicateur ou les
+        quantiles ont changé depuis l'export, les seuils sont recalculés.
+
+        Args:
+            state: Tableaux par nom
+
+        Returns:
+            Nombre de capteurs restaurés
+
+        Raises:
+            ValueError: Si l'état provient d'un mode, d'une saisonnalité
+                ou d'accumulateurs de forme différente
+        """
+        settings = json.loads(str(state['settings']))
+        layout = ('baseline_mode', 'seasonality') \
+            + _STATE_LAYOUT.get(self.baseline_mode, ())
+        for name in layout:
+            if settings[name] != getattr(self, name):
+                raise ValueError(f"État incompatible ({name}: "
+                                 f"{settings[name]!r} au lieu de "
+                                 f"{getattr(self, name)!r})")
+        mapping = self.registry.intern_many(state['sensor_ids'].tolist())
+        if not mapping.shape[0]:
+            return 0
+        table = self.baseline_stats
+        rows = table.rows_of(mapping)
+        self._stats.ensure_capacity((int(mapping.max()) + 1) * self.buckets)
+        for name in self._stats.FIELDS:
+            getattr(self._stats, name)[rows] = state[f'stats_{name}']
+        table.restore(mapping, {key[len('table_'):]: value
+                                for key, value in state.items()
+                                if key.startswith('table_')})
+        self._reserve_sensors(int(mapping.max()) + 1)
+        self.updated_at[mapping] = state['updated_at']
+
+        if settings['threshold_multiplier'] != self.threshold_multiplier \
+                or tuple(settings['quantiles']) != self.quantiles:
+            restored = np.arange(table.defined.shape[0])[rows]
+            table.defined[restored] = False
+            self._refresh_baselines(restored)
+        return mapping.shape[0]
+
+    def ingest(self, measurements: Measurements):
+        """
+        Intègre de nouvelles mesures aux baselines en O(lot).
+
+        Seuls les compteurs, moyennes et M2 par capteur sont conservés :
+        aucun historique n'est gardé en mémoire.
+
+        Args:
+            measurements: Nouvelles mesures (liste ou lot en colonnes)
+        """
+        indexes, values, keys, timestamps = self._columns(measurements)
+        self._refresh_baselines(self._stats.update(keys, values))
+        self._touch(indexes, timestamps)
+
+    def merge_baselines(self, other: 'AnomalyDetector'):
+        """
+        Fusionne les baselines partielles d'un autre détecteur.
+
+        Args:
+            other: Détecteur ayant agrégé une autre partie des données
+
+        Raises:
+            ValueError: Si les détecteurs ne sont pas dans le même mode
+                'static', 'mad' ou 'quantile', avec la même saisonnalité
+        """
+        if type(self._stats) is not type(other._stats) or \
+                not isinstance(self._stats,
+                               (WelfordArray, QuantileSketchArray)) or \
+                self.buckets != other.buckets:
+            raise ValueError("Seules les baselines 'static', 'mad' et "
+                             "'quantile' d'un même mode se fusionnent")
+        mapping = self.registry.translate(other.registry)
+        if self.buckets > 1:
+            mapping = (mapping[:, None].astype(np.int64) * self.buckets
+                       + np.arange(self.buckets)).ravel()
+        self._stats.merge(other._stats, mapping)
+        self._refresh_baselines(mapping[np.flatnonzero(other._stats.count)])
+
+    def _refresh_baselines(self, indexes: np.ndarray):
+        """
+        Recalcule les seuils des baselines dont les statistiques ont
+        changé.
+
+        Args:
+            indexes: Lignes de baseline concernées
+        """
+        indexes = indexes[self._stats.count[indexes] >= 2]
+        if self.baseline_mode in ROBUST_MODES:
+            self._refresh_robust(indexes)
+            return
+        self.baseline_stats.set_many(
+            indexes, self._stats.mean[indexes], self._stats.stdev(indexes),
+            self._stats.count[indexes], self.threshold_multiplier
+        )
+
+    def _refresh_robust(self, indexes: np.ndarray):
+        """
+        Recalcule les seuils robustes à partir des esquisses.
+
+        La médiane tient lieu de moyenne (sévérité comprise) et
+        1,4826 × écart absolu médian d'écart-type.
+
+        Args:
+            indexes: Lignes de baseline concernées (au moins deux mesures)
+        """
+        if indexes.shape[0] == 0:
+            return
+        median, low, high = self._stats.quantiles(
+            indexes, (0.5,) + self.quantiles
+        )
+        stdev = MAD_TO_STDEV * self._stats.mad(indexes, median)
+        if self.baseline_mode == 'mad':
+            low = np.maximum(0, median - self.threshold_multiplier * stdev)
+            high = median + self.threshold_multiplier * stdev
+        self.baseline_stats.set_bands(indexes, median, stdev,
+                                      self._stats.count[indexes], low, high)
 
     def detect_anomaly(self, measurement: Dict) -> Optional[Dict]:
         """
         Détecte si une mesure est anormale.
 
+        Avec une saisonnalité, la mesure est comparée au profil de
+        l'intervalle de son horodatage.
+
         Args:
             measurement: Mesure à analyser
 
@@ -58,13 +593,18 @@ class AnomalyDetector:
         sensor_id = measurement.get('sensor_id')
         consumption = measurement.get('consumption_kwh')
 
-        if sensor_id not in self.baseline_stats:
+        key = sensor_id
+        if self.buckets > 1:
+            key = (sensor_id, int(seasonal_buckets(
+                [measurement['timestamp']], self.buckets
+            )[0]))
+        stats = self.baseline_stats.get(key)
+        if stats is None:
             return None
 
-        stats = self.baseline_stats[sensor_id]
-
+        anomaly = None
         if consumption > stats['threshold_high']:
-            return {
+            anomaly = {
                 'sensor_id': sensor_id,
                 'timestamp': measurement['timestamp'],
                 'consumption': consumption,
@@ -77,7 +617,7 @@ class AnomalyDetector:
                 'message': f"Consommation élevée détectée: {consumption} kWh"
             }
         elif consumption < stats['threshold_low']:
-            return {
+            anomaly = {
                 'sensor_id': sensor_id,
                 'timestamp': measurement['timestamp'],
                 'consumption': consumption,
@@ -90,7 +630,9 @@ class AnomalyDetector:
                 'message': f"Consommation faible détectée: {consumption} kWh"
             }
 
-        return None
+        if anomaly is not None:
+            ANOMALIES.inc(1, (anomaly['type'], anomaly['severity']))
+        return anomaly
 
     def _calculate_severity(self, value: float, threshold: float,
                             mean: float) -> str:
@@ -116,41 +658,172 @@ class AnomalyDetector:
         else:
             return 'LOW'
 
-    def analyze_batch(self, measurements: List[Dict]) -> List[Dict]:
+    @timed('analyze_batch')
+    def analyze_batch(self, measurements: Measurements) -> List[Dict]:
         """
         Analyse un lot de mesures pour détecter les anomalies.
 
+        La classification est celle de detect_batch ; le coût restant est
+        la construction d'un dictionnaire (et de son message) par
+        anomalie, proportionnel au nombre de lignes signalées. Les
+        traitements en volume gagnent à rester sur le résultat en
+        colonnes de detect_batch.
+
         Args:
-            measurements: Liste de mesures à analyser
+            measurements: Liste de mesures ou lot en colonnes à analyser
 
         Returns:
             Liste des anomalies détectées
         """
-        anomalies = []
-        for measurement in measurements:
-            anomaly = self.detect_anomaly(measurement)
-            if anomaly:
-                anomalies.append(anomaly)
+        return self.detect_batch(measurements).to_dicts()
+
+    def detect_batch(self, measurements: Measurements) -> AnomalyBatch:
+        """
+        Détecte les anomalies d'un lot par comparaisons de tableaux.
+
+        Le type (HIGH/LOW) et la sévérité sont calculés sur les seuils de
+        chaque capteur (de l'intervalle saisonnier de chaque mesure, le
+        cas échéant) ; le résultat reste en colonnes et les
+        dictionnaires ne sont construits qu'à la demande (to_dicts), pour
+        les seules lignes signalées. En mode adaptatif ('ewma' ou
+        'window'), les baselines sont ensuite mises à jour avec le lot.
+
+        Args:
+            measurements: Liste de mesures ou lot en colonnes à analyser
+
+        Returns:
+            Anomalies détectées, en colonnes
+        """
+        indexes, consumption, keys, micros = self._columns(measurements,
+                                                           intern=False)
+        # Capteurs absents du registre : sans baseline, ni classés ni
+        # appris
+        known = None
+        if indexes.shape[0] and int(indexes.min()) < 0:
+            known = np.flatnonzero(indexes >= 0)
+            indexes, consumption, keys, micros = (
+                indexes[known], consumption[known], keys[known],
+                micros[known]
+            )
+        rows, is_high, severity = self._classify(keys, consumption)
+        positions = rows if known is None else known[rows]
+
+        if isinstance(measurements, MeasurementBatch):
+            timestamps = micros[rows]
+            values = consumption[rows]
+        else:
+            flagged_measurements = [measurements[position]
+                                    for position in positions.tolist()]
+            timestamps = [m['timestamp'] for m in flagged_measurements]
+            # Valeurs d'origine : messages identiques à detect_anomaly
+            values = [m['consumption_kwh'] for m in flagged_measurements]
+
+        table = self.baseline_stats
+        flagged = keys[rows]
+        anomalies = AnomalyBatch(
+            self.registry.ids, positions, indexes[rows], values,
+            timestamps, is_high, severity, table.threshold_low[flagged],
+            table.threshold_high[flagged]
+        )
+
+        if rows.shape[0]:
+            # Comptage par (type, sévérité) en un seul passage
+            counts = np.bincount(
+                is_high.astype(np.int64) * len(SEVERITY_LEVELS) + severity,
+                minlength=2 * len(SEVERITY_LEVELS)
+            )
+            for code in np.flatnonzero(counts).tolist():
+                high, level = divmod(code, len(SEVERITY_LEVELS))
+                ANOMALIES.inc(int(counts[code]),
+                              ('HIGH' if high else 'LOW',
+                               SEVERITY_LEVELS[level]))
+
+        if self.baseline_mode in ADAPTIVE_MODES:
+            self._adapt(keys, consumption, rows)
+            self._touch(indexes, micros)
         return anomalies
 
-    def get_sensor_baseline(self, sensor_id: str) -> Optional[Dict]:
+    def _adapt(self, indexes: np.ndarray, consumption: np.ndarray,
+               anomalous_rows: np.ndarray):
+        """
+        Fait évoluer les baselines adaptatives avec un lot analysé.
+
+        Args:
+            indexes: Lignes de baseline des mesures du lot
+            consumption: Consommations du lot
+            anomalous_rows: Lignes signalées comme anormales
+        """
+        if not self.adapt_on_anomalies and anomalous_rows.shape[0]:
+            normal = np.ones(indexes.shape[0], dtype=bool)
+            normal[anomalous_rows] = False
+            indexes = indexes[normal]
+            consumption = consumption[normal]
+        self._refresh_baselines(self._stats.update(indexes, consumption))
+
+    def _classify(self, indexes: np.ndarray, consumption: np.ndarray
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Classe un lot de mesures par comparaison aux seuils.
+
+        Args:
+            indexes: Lignes de baseline (index des capteurs du registre
+                du détecteur, sans saisonnalité)
+            consumption: Consommations
+
+        Returns:
+            Tuple (lignes anormales, indicateur HIGH, niveau de sévérité
+            sous forme d'index dans SEVERITY_LEVELS)
+        """
+        return classify_rows(self.baseline_stats, indexes, consumption)
+
+    def get_sensor_baseline(self, sensor_id: str,
+                            timestamp: Optional[datetime] = None
+                            ) -> Optional[Dict]:
         """
         Récupère les statistiques de base d'un capteur.
 
         Args:
             sensor_id: Identifiant du capteur
+            timestamp: Instant dont l'intervalle saisonnier est demandé
+                (maintenant si absent ; ignoré sans saisonnalité)
 
         Returns:
             Statistiques ou None
         """
-        return self.baseline_stats.get(sensor_id)
+        if self.buckets == 1:
+            return self.baseline_stats.get(sensor_id)
+        bucket = seasonal_buckets([timestamp or datetime.now()],
+                                  self.buckets)[0]
+        return self.baseline_stats.get((sensor_id, int(bucket)))
+
+    def get_sensor_profile(self, sensor_id: str) -> List[Optional[Dict]]:
+        """
+        Récupère le profil saisonnier d'un capteur.
+
+        Args:
+            sensor_id: Identifiant du capteur
+
+        Returns:
+            Statistiques de chaque intervalle (None si non défini) ; une
+            seule entrée sans saisonnalité
+        """
+        if self.buckets == 1:
+            return [self.baseline_stats.get(sensor_id)]
+        return [self.baseline_stats.get((sensor_id, bucket))
+                for bucket in range(self.buckets)]
 
-    def update_baseline(self, sensor_id: str, measurements: List[Dict]):
+    def update_baseline(self, sensor_id: str, measurements: Measurements):
         """
         Met à jour les statistiques de base d'un capteur.
 
+        Les nouvelles mesures sont combinées aux statistiques existantes :
+        l'historique déjà intégré n'a pas besoin d'être fourni à nouveau.
+
         Args:
             sensor_id: Identifiant du capteur
             measurements: Nouvelles mesures
         """
-        self.calculate_baseline(measurements, sensor_id)
+        keys, sensor_data, timestamps = self._sensor_columns(measurements,
+                                                             sensor_id)
+        self._refresh_baselines(self._stats.update(keys, sensor_data))
+        self._touch(keys // self.buckets, timestamps)
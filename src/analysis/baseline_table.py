@@ -0,0 +1,296 @@
+"""
+Table des baselines par capteur, stockée en tableaux NumPy.
+
+La table se comporte comme le dictionnaire `baseline_stats` historique
+(sensor_id -> statistiques) tout en conservant moyennes et seuils dans
+des tableaux indexés par capteur, directement utilisables pour la
+détection vectorisée.
+
+Avec des profils saisonniers, chaque capteur possède `buckets` baselines
+(une par heure de la journée ou de la semaine) : la clé de la ligne
+(index du capteur * buckets + intervalle) est calculée en O(1), et les
+clés du dictionnaire deviennent des couples (sensor_id, intervalle).
+"""
+from collections.abc import MutableMapping
+from typing import Dict, Hashable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from src.core.measurement_batch import SensorRegistry
+
+
+class BaselineTable(MutableMapping):
+    """Baselines indexées par capteur, vue comme un dictionnaire."""
+
+    _COLUMNS = (
+        ('mean', np.float64),
+        ('stdev', np.float64),
+        ('count', np.int64),
+        ('threshold_low', np.float64),
+        ('threshold_high', np.float64),
+        ('defined', bool),
+    )
+
+    def __init__(self, registry: SensorRegistry, buckets: int = 1):
+        """
+        Initialise une table vide.
+
+        Args:
+            registry: Registre donnant l'index de chaque capteur
+            buckets: Nombre de baselines par capteur (profil saisonnier)
+        """
+        self.registry = registry
+        self.buckets = buckets
+        for name, dtype in self._COLUMNS:
+            setattr(self, name, self._allocate(name, dtype, 0))
+
+    def _allocate(self, name: str, dtype, capacity: int,
+                  previous: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Alloue une colonne remplie de zéros.
+
+        Args:
+            name: Nom de la colonne
+            dtype: Type des éléments
+            capacity: Nombre d'éléments
+            previous: Contenu à recopier en tête (agrandissement)
+
+        Returns:
+            Tableau de la colonne
+        """
+        array = np.zeros(capacity, dtype=dtype)
+        if previous is not None:
+            array[:previous.shape[0]] = previous
+        return array
+
+    def ensure_capacity(self, size: int):
+        """
+        Alloue les index manquants jusqu'à `size`.
+
+        Args:
+            size: Nombre d'index requis
+        """
+        current = self.defined.shape[0]
+        if size <= current:
+            return
+        capacity = max(size, 2 * current)
+        for name, dtype in self._COLUMNS:
+            setattr(self, name, self._allocate(name, dtype, capacity,
+                                               getattr(self, name)))
+
+    def set_many(self, indexes: np.ndarray, mean: np.ndarray,
+                 stdev: np.ndarray, count: np.ndarray,
+                 threshold_multiplier: float):
+        """
+        Met à jour les baselines de plusieurs capteurs.
+
+        Args:
+            indexes: Index des capteurs
+            mean: Moyennes
+            stdev: Écarts-types
+            count: Nombre de mesures agrégées
+            threshold_multiplier: Multiplicateur du seuil de détection
+        """
+        self.set_bands(indexes, mean, stdev, count,
+                       np.maximum(0, mean - threshold_multiplier * stdev),
+                       mean + threshold_multiplier * stdev)
+
+    def set_bands(self, indexes: np.ndarray, mean: np.ndarray,
+                  stdev: np.ndarray, count: np.ndarray,
+                  threshold_low: np.ndarray, threshold_high: np.ndarray):
+        """
+        Met à jour les baselines de plusieurs capteurs avec des seuils
+        explicites (bandes de quantiles).
+
+        Args:
+            indexes: Index des capteurs
+            mean: Valeurs centrales (moyennes ou médianes)
+            stdev: Écarts-types (ou estimations robustes)
+            count: Nombre de mesures agrégées
+            threshold_low: Seuils bas
+            threshold_high: Seuils hauts
+        """
+        if indexes.shape[0] == 0:
+            return
+        self.ensure_capacity(int(indexes.max()) + 1)
+        self.mean[indexes] = mean
+        self.stdev[indexes] = stdev
+        self.count[indexes] = count
+        self.threshold_low[indexes] = threshold_low
+        self.threshold_high[indexes] = threshold_high
+        self.defined[indexes] = True
+
+    def lookup(self, indexes: np.ndarray) -> np.ndarray:
+        """
+        Indique quels index possèdent une baseline.
+
+        Args:
+            indexes: Index des capteurs
+
+        Returns:
+            Masque booléen
+        """
+        size = self.defined.shape[0]
+        known = indexes < size
+        known[known] = self.defined[indexes[known]]
+        return known
+
+    def _split(self, key: Hashable) -> Tuple[str, int]:
+        """Capteur et intervalle d'une clé du dictionnaire."""
+        if self.buckets == 1:
+            return key, 0
+        sensor_id, bucket = key
+        if not 0 <= bucket < self.buckets:
+            raise KeyError(key)
+        return sensor_id, bucket
+
+    def _row(self, key: Hashable) -> Optional[int]:
+        """Ligne d'une clé existante, ou None."""
+        sensor_id, bucket = self._split(key)
+        index = self.registry.index_of(sensor_id)
+        if index is None:
+            return None
+        row = index * self.buckets + bucket
+        if row >= self.defined.shape[0] or not self.defined[row]:
+            return None
+        return row
+
+    def __getitem__(self, key: Hashable) -> Dict:
+        index = self._row(key)
+        if index is None:
+            raise KeyError(key)
+        return {
+            'mean': float(self.mean[index]),
+            'stdev': float(self.stdev[index]),
+            'count': int(self.count[index]),
+            'threshold_high': float(self.threshold_high[index]),
+            'threshold_low': float(self.threshold_low[index]),
+        }
+
+    def __setitem__(self, key: Hashable, stats: Dict):
+        sensor_id, bucket = self._split(key)
+        index = self.registry.intern(sensor_id) * self.buckets + bucket
+        self.ensure_capacity(index + 1)
+        self.mean[index] = stats['mean']
+        self.stdev[index] = stats['stdev']
+        self.count[index] = stats.get('count', 0)
+        self.threshold_high[index] = stats['threshold_high']
+        self.threshold_low[index] = stats['threshold_low']
+        self.defined[index] = True
+
+    def __delitem__(self, key: Hashable):
+        index = self._row(key)
+        if index is None:
+            raise KeyError(key)
+        self.defined[index] = False
+
+    def __iter__(self) -> Iterator[Hashable]:
+        sensor_ids = self.registry.ids
+        for row in np.flatnonzero(self.defined).tolist():
+            if self.buckets == 1:
+                yield sensor_ids[row]
+            else:
+                index, bucket = divmod(row, self.buckets)
+                yield sensor_ids[index], bucket
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.defined))
+
+    def sensor_count(self) -> int:
+        """Nombre de capteurs ayant au moins une baseline."""
+        if self.buckets == 1:
+            return len(self)
+        rows = np.flatnonzero(self.defined)
+        return np.unique(rows // self.buckets).shape[0]
+
+    def rows_of(self, mapping: np.ndarray) -> Union[slice, np.ndarray]:
+        """
+        Lignes de la table correspondant à des index de capteurs.
+
+        Args:
+            mapping: Index des capteurs, dans l'ordre des données à placer
+
+        Returns:
+            Tranche contiguë si les capteurs sont les premiers du registre
+            dans l'ordre, tableau de lignes sinon
+        """
+        if np.array_equal(mapping, np.arange(mapping.shape[0])):
+            return slice(0, mapping.shape[0] * self.buckets)
+        return (mapping[:, None].astype(np.int64) * self.buckets
+                + np.arange(self.buckets)).ravel()
+
+    def export(self) -> Dict[str, np.ndarray]:
+        """
+        Copie les colonnes de tous les capteurs du registre.
+
+        Returns:
+            Colonnes par nom, de len(registre) * buckets lignes (les
+            lignes jamais allouées sont à zéro)
+        """
+        rows = len(self.registry) * self.buckets
+        stored = min(rows, self.defined.shape[0])
+        columns = {}
+        for name, dtype in self._COLUMNS:
+            column = np.zeros(rows, dtype=dtype)
+            column[:stored] = getattr(self, name)[:stored]
+            columns[name] = column
+        return columns
+
+    def restore(self, mapping: np.ndarray, columns: Dict[str, np.ndarray]):
+        """
+        Replace des colonnes produites par export.
+
+        Args:
+            mapping: Index (dans le registre de la table) des capteurs
+                des colonnes, dans leur ordre
+            columns: Colonnes par nom
+        """
+        if not mapping.shape[0]:
+            return
+        self.ensure_capacity((int(mapping.max()) + 1) * self.buckets)
+        rows = self.rows_of(mapping)
+        for name, _ in self._COLUMNS:
+            getattr(self, name)[rows] = columns[name]
+
+    def save(self, path: str):
+        """
+        Enregistre la table dans un fichier .npz non compressé.
+
+        Les colonnes sont écrites telles quelles avec les identifiants des
+        capteurs : le chargement ne fait que lire et replacer les
+        tableaux.
+
+        Args:
+            path: Chemin du fichier
+        """
+        with open(path, 'wb') as handle:
+            np.savez(handle, sensor_ids=np.array(
+                self.registry.ids, dtype=str
+            ), buckets=np.int64(self.buckets), **self.export())
+
+    def load(self, path: str):
+        """
+        Charge une table enregistrée par save.
+
+        Les capteurs sont rattachés au registre de la table (internés au
+        besoin) ; les baselines présentes sont remplacées.
+
+        Args:
+            path: Chemin du fichier
+
+        Raises:
+            ValueError: Si le nombre de baselines par capteur diffère
+        """
+        with np.load(path) as data:
+            if int(data['buckets']) != self.buckets:
+                raise ValueError(
+                    f"Profil de {int(data['buckets'])} intervalles, "
+                    f"{self.buckets} attendus"
+                )
+            mapping = self.registry.intern_many(data['sensor_ids'].tolist())
+            self.restore(mapping, {name: data[name]
+                                   for name, _ in self._COLUMNS})
+
+    def clear(self):
+        """Supprime toutes les baselines."""
+        self.defined[:] = False
@@ -0,0 +1,415 @@
+"""
+Agrégation incrémentale de la consommation par localisation et pour le
+parc entier.
+
+Chaque lot est traité comme un cycle de lecture : la charge d'une
+localisation est la somme des consommations de ses mesures dans le
+cycle. Les sommes, nombres de mesures et extrêmes par localisation sont
+calculés en O(lot) (bincount et ufunc.at), puis intégrés :
+
+- à une fenêtre fixe (tumbling) alignée sur l'horloge, dont le résumé
+  est émis à sa clôture ;
+- à une fenêtre glissante, dont les cycles trop anciens sont retirés
+  des sommes au fil de l'eau (minimum et maximum sont recalculés à la
+  lecture, à partir des cycles conservés).
+
+La charge de chaque localisation est enfin comparée à sa propre
+baseline (moyenne et écart-type EWMA des charges des cycles
+précédents) avec les seuils et niveaux de sévérité du détecteur par
+capteur. La localisation d'une mesure est celle qu'elle porte (champ
+`location`, ou registre du lot).
+"""
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.analysis.anomaly_batch import SEVERITY_LEVELS
+from src.analysis.anomaly_detector import classify_rows
+from src.analysis.baseline_table import BaselineTable
+from src.analysis.streaming_stats import EWMAArray
+from src.core.measurement_batch import (
+    MeasurementBatch, SensorRegistry, datetime_to_micros, micros_to_datetime
+)
+from src.core.metrics import LOCATION_ANOMALIES, LOCATION_LOAD
+
+Measurements = Union[List[Dict], MeasurementBatch]
+
+# Clé des agrégats du parc entier
+FLEET = '*'
+
+_MICROS = 1_000_000
+
+
+class _Cycle:
+    """Agrégats d'un cycle, restreints aux localisations présentes."""
+
+    __slots__ = ('timestamp', 'rows', 'total', 'count', 'low', 'high')
+
+    def __init__(self, timestamp: int, rows: np.ndarray, total: np.ndarray,
+                 count: np.ndarray, low: np.ndarray, high: np.ndarray):
+        """
+        Initialise les agrégats.
+
+        Args:
+            timestamp: Horodatage du cycle (µs, dernière mesure)
+            rows: Lignes des localisations présentes, par ordre croissant
+            total: Charge (somme des consommations) par ligne
+            count: Nombre de mesures par ligne
+            low: Consommation minimale par ligne
+            high: Consommation maximale par ligne
+        """
+        self.timestamp = timestamp
+        self.rows = rows
+        self.total = total
+        self.count = count
+        self.low = low
+        self.high = high
+
+
+class _Totals:
+    """Sommes, nombres de mesures et de cycles, extrêmes par ligne."""
+
+    FIELDS = (('total', np.float64, 0.0), ('count', np.int64, 0),
+              ('cycles', np.int64, 0), ('low', np.float64, np.inf),
+              ('high', np.float64, -np.inf))
+
+    def __init__(self):
+        for name, dtype, fill in self.FIELDS:
+            setattr(self, name, np.full(0, fill, dtype=dtype))
+
+    def ensure_capacity(self, size: int):
+        """Alloue les lignes manquantes jusqu'à `size`."""
+        current = self.total.shape[0]
+        if size <= current:
+            return
+        capacity = max(size, 2 * current)
+        for name, dtype, fill in self.FIELDS:
+            new = np.full(capacity, fill, dtype=dtype)
+            new[:current] = getattr(self, name)
+            setattr(self, name, new)
+
+    def add(self, cycle: _Cycle, sign: int = 1):
+        """
+        Ajoute (ou retire, avec sign=-1) un cycle des sommes.
+
+        Les extrêmes ne sont tenus qu'à l'ajout.
+        """
+        rows = cycle.rows
+        self.ensure_capacity(int(rows[-1]) + 1)
+        self.total[rows] += sign * cycle.total
+        self.count[rows] += sign * cycle.count
+        self.cycles[rows] += sign
+        if sign > 0:
+            np.minimum.at(self.low, rows, cycle.low)
+            np.maximum.at(self.high, rows, cycle.high)
+
+    def clear(self):
+        """Remet toutes les lignes à zéro."""
+        for name, _, fill in self.FIELDS:
+            getattr(self, name).fill(fill)
+
+
+class LocationAggregator:
+    """Agrégats par localisation et baselines de charge, en continu."""
+
+    def __init__(self, tumbling_window: float = 60.0,
+                 sliding_window: float = 300.0,
+                 threshold_multiplier: float = 3.0,
+                 half_life: float = 30.0, min_cycles: int = 10,
+                 adapt_on_anomalies: bool = False):
+        """
+        Initialise l'agrégateur.
+
+        Args:
+            tumbling_window: Durée des fenêtres fixes (s)
+            sliding_window: Durée de la fenêtre glissante (s)
+            threshold_multiplier: Multiplicateur du seuil de détection
+            half_life: Demi-vie des baselines de charge (en cycles)
+            min_cycles: Cycles observés avant de détecter des anomalies
+                sur une localisation
+            adapt_on_anomalies: Intégrer aux baselines les charges
+                signalées comme anormales
+
+        Raises:
+            ValueError: Si une durée de fenêtre n'est pas strictement
+                positive
+        """
+        if tumbling_window <= 0 or sliding_window <= 0:
+            raise ValueError("Les fenêtres doivent être strictement "
+                             "positives")
+        self.tumbling_window = int(tumbling_window * _MICROS)
+        self.sliding_window = int(sliding_window * _MICROS)
+        self.threshold_multiplier = threshold_multiplier
+        self.min_cycles = min_cycles
+        self.adapt_on_anomalies = adapt_on_anomalies
+        self.locations = SensorRegistry()
+        self.locations.intern(FLEET)
+        self.baseline = EWMAArray(half_life)
+        self.thresholds = BaselineTable(self.locations)
+        self.cycles = 0
+        self._tumbling = _Totals()
+        self._window_start: Optional[int] = None
+        self._closed: List[Dict[str, Dict]] = []
+        self._sliding = _Totals()
+        self._recent: Deque[_Cycle] = deque()
+        # Localisation de chaque capteur du registre des lots
+        self._sensor_registry: Optional[SensorRegistry] = None
+        self._sensor_location = np.empty(0, dtype=np.int64)
+
+    def _location_index(self, measurements: Measurements
+                        ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Extrait la localisation et la consommation de chaque mesure.
+
+        Args:
+            measurements: Liste de mesures ou lot en colonnes
+
+        Returns:
+            Tuple (index des localisations, consommations, horodatage
+            du cycle en microsecondes)
+        """
+        if not isinstance(measurements, MeasurementBatch):
+            intern = self.locations.intern
+            locations = np.fromiter(
+                (intern(m.get('location')) for m in measurements),
+                dtype=np.int64, count=len(measurements)
+            )
+            consumption = np.fromiter(
+                (m['consumption_kwh'] for m in measurements),
+                dtype=np.float64, count=len(measurements)
+            )
+            timestamp = max(m['timestamp'] for m in measurements)
+            return locations, consumption, datetime_to_micros(timestamp)
+
+        registry = measurements.registry
+        if registry is not self._sensor_registry:
+            self._sensor_registry = registry
+            self._sensor_location = np.empty(0, dtype=np.int64)
+        known = self._sensor_location.shape[0]
+        if known < len(registry):
+            # Les localisations sont internées une fois par capteur : un
+            # capteur déplacé garde sa première localisation
+            intern = self.locations.intern
+            self._sensor_location = np.concatenate((
+                self._sensor_location,
+                np.fromiter((intern(location) for location
+                             in registry.locations[known:]),
+                            dtype=np.int64)
+            ))
+        return (self._sensor_location[measurements.sensor_index],
+                measurements.consumption,
+                int(measurements.timestamp.max()))
+
+    def _aggregate(self, locations: np.ndarray, consumption: np.ndarray,
+                   timestamp: int) -> _Cycle:
+        """Agrège un cycle par localisation, parc entier en ligne 0."""
+        size = len(self.locations)
+        count = np.bincount(locations, minlength=size)
+        total = np.bincount(locations, weights=consumption, minlength=size)
+        low = np.full(size, np.inf)
+        high = np.full(size, -np.inf)
+        np.minimum.at(low, locations, consumption)
+        np.maximum.at(high, locations, consumption)
+        # Aucune mesure n'est rattachée à la ligne du parc
+        rows = np.concatenate(([0], np.flatnonzero(count)))
+        total[0] = consumption.sum()
+        count[0] = consumption.shape[0]
+        low[0] = consumption.min()
+        high[0] = consumption.max()
+        return _Cycle(timestamp, rows, total[rows], count[rows], low[rows],
+                      high[rows])
+
+    def update(self, measurements: Measurements) -> List[Dict]:
+        """
+        Intègre les mesures d'un cycle et détecte les charges anormales.
+
+        Args:
+            measurements: Mesures du cycle (liste ou lot en colonnes)
+
+        Returns:
+            Anomalies de charge des localisations (et du parc), au
+            format des anomalies par capteur avec 'location' et 'load'
+            au lieu de 'sensor_id' et 'consumption'
+        """
+        if len(measurements) == 0:
+            return []
+        cycle = self._aggregate(*self._location_index(measurements))
+        self.cycles += 1
+        self._roll_tumbling(cycle)
+        self._slide(cycle)
+        for location, load in zip(cycle.rows.tolist(), cycle.total.tolist()):
+            LOCATION_LOAD.set(load, (self.locations.ids[location],))
+        return self._detect(cycle)
+
+    def _roll_tumbling(self, cycle: _Cycle):
+        """Intègre un cycle à la fenêtre fixe, en clôturant la
+        précédente si le cycle n'en fait plus partie."""
+        start = cycle.timestamp - cycle.timestamp % self.tumbling_window
+        if self._window_start is not None and start != self._window_start:
+            self._closed.append(self._summaries(
+                self._tumbling, self._window_start,
+                self._window_start + self.tumbling_window
+            ))
+            self._tumbling.clear()
+        self._window_start = start
+        self._tumbling.add(cycle)
+
+    def _slide(self, cycle: _Cycle):
+        """Ajoute un cycle à la fenêtre glissante et retire les cycles
+        sortis de la fenêtre."""
+        self._recent.append(cycle)
+        self._sliding.add(cycle)
+        oldest = cycle.timestamp - self.sliding_window
+        while self._recent[0].timestamp <= oldest:
+            self._sliding.add(self._recent.popleft(), sign=-1)
+
+    def _detect(self, cycle: _Cycle) -> List[Dict]:
+        """
+        Compare les charges d'un cycle aux baselines puis met à jour
+        celles-ci.
+
+        Args:
+            cycle: Agrégats du cycle
+
+        Returns:
+            Anomalies de charge
+        """
+        rows, is_high, severity = classify_rows(self.thresholds, cycle.rows,
+                                                cycle.total)
+        anomalies = []
+        table = self.thresholds
+        timestamp = micros_to_datetime(cycle.timestamp)
+        for row, high, level in zip(rows.tolist(), is_high.tolist(),
+                                    severity.tolist()):
+            location = int(cycle.rows[row])
+            load = float(cycle.total[row])
+            anomaly_type = 'HIGH' if high else 'LOW'
+            anomalies.append({
+                'location': self.locations.ids[location],
+                'timestamp': timestamp,
+                'load': load,
+                'sensors': int(cycle.count[row]),
+                'expected_range': (float(table.threshold_low[location]),
+                                   float(table.threshold_high[location])),
+                'type': anomaly_type,
+                'severity': SEVERITY_LEVELS[level],
+                'message': f"Charge {'élevée' if high else 'faible'} "
+                           f"détectée: {load!r} kWh"
+            })
+            LOCATION_ANOMALIES.inc(1, (anomaly_type,
+                                       SEVERITY_LEVELS[level]))
+
+        indexes, loads = cycle.rows, cycle.total
+        if not self.adapt_on_anomalies and rows.shape[0]:
+            normal = np.ones(indexes.shape[0], dtype=bool)
+            normal[rows] = False
+            indexes, loads = indexes[normal], loads[normal]
+        updated = self.baseline.update(indexes, loads)
+        updated = updated[self.baseline.count[updated] >= self.min_cycles]
+        table.set_many(updated, self.baseline.mean[updated],
+                       self.baseline.stdev(updated),
+                       self.baseline.count[updated],
+                       self.threshold_multiplier)
+        return anomalies
+
+    def _summaries(self, totals: _Totals, start: int, end: int,
+                   low: Optional[np.ndarray] = None,
+                   high: Optional[np.ndarray] = None) -> Dict[str, Dict]:
+        """
+        Résume les agrégats d'une fenêtre.
+
+        Args:
+            totals: Agrégats de la fenêtre
+            start: Début de la fenêtre (µs)
+            end: Fin de la fenêtre (µs)
+            low: Minimums par ligne (ceux de totals si absents)
+            high: Maximums par ligne (ceux de totals si absents)
+
+        Returns:
+            Résumé par localisation (FLEET pour le parc) : cycles,
+            mesures, charge totale, moyenne par mesure et par cycle,
+            minimum et maximum d'une mesure
+        """
+        low = totals.low if low is None else low
+        high = totals.high if high is None else high
+        window = (micros_to_datetime(start), micros_to_datetime(end))
+        ids = self.locations.ids
+        summaries = {}
+        for row in np.flatnonzero(totals.cycles > 0).tolist():
+            total = float(totals.total[row])
+            summaries[ids[row]] = {
+                'window_start': window[0],
+                'window_end': window[1],
+                'cycles': int(totals.cycles[row]),
+                'count': int(totals.count[row]),
+                'total_kwh': total,
+                'mean_kwh': total / int(totals.count[row]),
+                'mean_load_kwh': total / int(totals.cycles[row]),
+                'min_kwh': float(low[row]),
+                'max_kwh': float(high[row]),
+            }
+        return summaries
+
+    def completed_windows(self) -> List[Dict[str, Dict]]:
+        """
+        Retourne puis oublie les fenêtres fixes clôturées depuis
+        l'appel précédent.
+
+        Returns:
+            Résumés des fenêtres, de la plus ancienne à la plus récente
+        """
+        closed, self._closed = self._closed, []
+        return closed
+
+    def tumbling(self) -> Dict[str, Dict]:
+        """
+        Résume la fenêtre fixe en cours.
+
+        Returns:
+            Résumé par localisation (voir _summaries)
+        """
+        if self._window_start is None:
+            return {}
+        return self._summaries(self._tumbling, self._window_start,
+                               self._window_start + self.tumbling_window)
+
+    def sliding(self) -> Dict[str, Dict]:
+        """
+        Résume la fenêtre glissante terminée au dernier cycle.
+
+        Returns:
+            Résumé par localisation (voir _summaries)
+        """
+        if not self._recent:
+            return {}
+        size = self._sliding.total.shape[0]
+        low = np.full(size, np.inf)
+        high = np.full(size, -np.inf)
+        for cycle in self._recent:
+            np.minimum.at(low, cycle.rows, cycle.low)
+            np.maximum.at(high, cycle.rows, cycle.high)
+        end = self._recent[-1].timestamp
+        return self._summaries(self._sliding, end - self.sliding_window, end,
+                               low, high)
+
+    def get_location_baseline(self, location: str) -> Optional[Dict]:
+        """
+        Retourne la baseline de charge d'une localisation.
+
+        Args:
+            location: Localisation (FLEET pour le parc entier)
+
+        Returns:
+            Statistiques de la baseline ou None
+        """
+        index = self.locations.index_of(location)
+        if index is None or not self.thresholds.lookup(
+                np.array([index]))[0]:
+            return None
+        table = self.thresholds
+        return {'mean': float(table.mean[index]),
+                'stdev': float(table.stdev[index]),
+                'count': int(table.count[index]),
+                'threshold_low': float(table.threshold_low[index]),
+                'threshold_high': float(table.threshold_high[index])}
@@ -0,0 +1,386 @@
+"""
+Détection d'anomalies répartie sur plusieurs processus.
+
+Les colonnes de la table des baselines (moyennes, seuils) résident en
+mémoire partagée : les processus de détection les lisent directement, sans
+qu'elles soient sérialisées à chaque lot. Les mesures d'un lot sont
+copiées dans un tampon partagé, regroupées par tranche de capteurs
+(plages contiguës d'index, une par processus), et chaque processus ne
+renvoie que les lignes anormales de sa tranche. Le résultat fusionné est
+identique à celui d'AnomalyDetector.
+
+Seule la classification est répartie : l'intégration des mesures aux
+baselines et la construction des anomalies restent dans le processus
+principal, qui est le seul à écrire dans la mémoire partagée.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.analysis.anomaly_detector import AnomalyDetector, classify_rows
+from src.analysis.baseline_table import BaselineTable
+from src.core.measurement_batch import SensorRegistry
+
+# Colonne partagée : (nom du segment, type, nombre d'éléments)
+Layout = Dict[str, Tuple[str, str, int]]
+
+# Colonnes lues par la classification
+_SHARED_COLUMNS = ('mean', 'threshold_low', 'threshold_high', 'defined')
+
+
+class SharedBlocks:
+    """Tableaux NumPy alloués dans des segments de mémoire partagée."""
+
+    def __init__(self):
+        """Initialise un ensemble vide."""
+        self._blocks: Dict[str, shared_memory.SharedMemory] = {}
+        self._retired: List[shared_memory.SharedMemory] = []
+        self.layout: Layout = {}
+
+    def allocate(self, name: str, dtype, capacity: int,
+                 previous: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Alloue (ou remplace) un tableau partagé rempli de zéros.
+
+        Le contenu précédent est recopié dans le nouveau segment avant que
+        l'ancien ne soit détaché de son nom. L'ancien segment reste projeté
+        jusqu'à close() : des vues peuvent encore le référencer, et la
+        capacité doublant à chaque agrandissement, les segments retirés
+        occupent au plus la taille du segment courant.
+
+        Args:
+            name: Nom du tableau
+            dtype: Type des éléments
+            capacity: Nombre d'éléments
+            previous: Contenu à recopier en tête (agrandissement)
+
+        Returns:
+            Vue NumPy sur le segment
+        """
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(
+            create=True, size=max(1, capacity * dtype.itemsize)
+        )
+        array = np.ndarray(capacity, dtype=dtype, buffer=block.buf)
+        array[:] = 0
+        if previous is not None:
+            array[:previous.shape[0]] = previous
+
+        retired = self._blocks.pop(name, None)
+        if retired is not None:
+            retired.unlink()
+            self._retired.append(retired)
+        self._blocks[name] = block
+        self.layout[name] = (block.name, dtype.str, capacity)
+        return array
+
+    def close(self):
+        """
+        Détache et libère tous les segments.
+
+        Les vues NumPy obtenues par allocate ne doivent plus être utilisées
+        ensuite.
+        """
+        for block in self._blocks.values():
+            block.unlink()
+            self._retired.append(block)
+        for block in self._retired:
+            try:
+                block.close()
+            except BufferError:
+                # Une vue vit encore : le segment sera libéré avec elle
+                pass
+        self._blocks = {}
+        self._retired = []
+        self.layout = {}
+
+
+class SharedBaselineTable(BaselineTable):
+    """Table des baselines dont les colonnes sont en mémoire partagée."""
+
+    def __init__(self, registry: SensorRegistry, buckets: int = 1):
+        """
+        Initialise une table vide.
+
+        Args:
+            registry: Registre donnant l'index de chaque capteur
+            buckets: Nombre de baselines par capteur (profil saisonnier)
+        """
+        self.blocks = SharedBlocks()
+        super().__init__(registry, buckets)
+
+    def _allocate(self, name: str, dtype, capacity: int,
+                  previous: Optional[np.ndarray] = None) -> np.ndarray:
+        if name not in _SHARED_COLUMNS:
+            return super()._allocate(name, dtype, capacity, previous)
+        return self.blocks.allocate(name, dtype, capacity, previous)
+
+    def close(self):
+        """Libère la mémoire partagée."""
+        self.blocks.close()
+
+
+def _attach(layout: Layout, attached: Dict[str, shared_memory.SharedMemory]
+            ) -> Dict[str, np.ndarray]:
+    """
+    Ouvre des vues sur les segments d'une disposition.
+
+    Args:
+        layout: Disposition des tableaux partagés
+        attached: Segments déjà ouverts par ce processus (complété)
+
+    Returns:
+        Vue NumPy de chaque tableau
+    """
+    views = {}
+    for column, (name, dtype, length) in layout.items():
+        block = attached.get(name)
+        if block is None:
+            block = attached[name] = shared_memory.SharedMemory(name=name)
+        views[column] = np.ndarray(length, dtype=dtype, buffer=block.buf)
+    return views
+
+
+def _classify_range(table: BaselineTable, views: Dict[str, np.ndarray],
+                    start: int, stop: int
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Classe les lignes [start, stop) du tampon d'entrée partagé."""
+    for column in _SHARED_COLUMNS:
+        setattr(table, column, views[column])
+    rows, is_high, severity = classify_rows(
+        table, views['indexes'][start:stop], views['consumption'][start:stop]
+    )
+    return rows + start, is_high, severity
+
+
+def _detect_worker(connection):
+    """
+    Boucle d'un processus : une plage de lignes reçue, ses anomalies
+    rendues.
+
+    Args:
+        connection: Extrémité du tube vers le processus principal
+    """
+    attached: Dict[str, shared_memory.SharedMemory] = {}
+    table = BaselineTable(SensorRegistry())
+    try:
+        while True:
+            request = connection.recv()
+            if request is None:
+                return
+            layout, start, stop = request
+            try:
+                views = _attach(layout, attached)
+                result = _classify_range(table, views, start, stop)
+            except Exception as error:  # renvoyée au processus principal
+                result = error
+            views = None
+            for column in _SHARED_COLUMNS:
+                setattr(table, column, None)
+            # Segments remplacés (table agrandie) : plus de vue ouverte
+            current = {name for name, _, _ in layout.values()}
+            for name in set(attached) - current:
+                try:
+                    attached.pop(name).close()
+                except BufferError:
+                    pass
+            connection.send(result)
+    except (EOFError, KeyboardInterrupt):
+        return
+    finally:
+        for block in attached.values():
+            block.close()
+        connection.close()
+
+
+class ParallelAnomalyDetector(AnomalyDetector):
+    """Détecteur d'anomalies dont la classification est répartie."""
+
+    def __init__(self, workers: int = 2, min_parallel_rows: int = 50_000,
+                 **kwargs):
+        """
+        Initialise le détecteur.
+
+        Les processus sont lancés au premier lot réparti.
+
+        Args:
+            workers: Nombre de processus de détection ; 1 classe dans le
+                processus courant
+            min_parallel_rows: Taille de lot en dessous de laquelle la
+                classification reste locale (l'aller-retour entre
+                processus coûterait plus qu'il ne rapporte)
+            **kwargs: Paramètres d'AnomalyDetector
+        """
+        super().__init__(**kwargs)
+        self.workers = max(1, workers)
+        self.min_parallel_rows = min_parallel_rows
+        self.baseline_stats = SharedBaselineTable(self.registry,
+                                                  self.buckets)
+        self._inputs = SharedBlocks()
+        self._input_capacity = 0
+        self._staged_indexes = None
+        self._staged_consumption = None
+        self._connections = []
+        self._processes: List[multiprocessing.Process] = []
+
+    @property
+    def running(self) -> bool:
+        """Indique si les processus de détection sont lancés."""
+        return bool(self._processes)
+
+    def start(self):
+        """Lance les processus de détection."""
+        if self.running or self.workers == 1:
+            return
+        for _ in range(self.workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_detect_worker,
+                                              args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def stop(self):
+        """Arrête les processus de détection."""
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+        self._connections = []
+        self._processes = []
+
+    def _receive(self, connection):
+        """
+        Attend la réponse d'un processus de détection.
+
+        Raises:
+            RuntimeError: Si le processus s'est arrêté
+            Exception: Erreur levée par la classification dans le processus
+        """
+        process = self._processes[self._connections.index(connection)]
+        while not connection.poll(0.5):
+            if not process.is_alive():
+                self.stop()
+                raise RuntimeError(
+                    f"Processus de détection arrêté (code {process.exitcode})"
+                )
+        result = connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        """Arrête les processus et libère la mémoire partagée."""
+        self.stop()
+        self._staged_indexes = self._staged_consumption = None
+        self._inputs.close()
+        self._input_capacity = 0
+        table = self.baseline_stats
+        if isinstance(table, SharedBaselineTable):
+            # La table reste consultable après fermeture
+            local = BaselineTable(self.registry, self.buckets)
+            local.ensure_capacity(table.defined.shape[0])
+            for name, _ in BaselineTable._COLUMNS:
+                getattr(local, name)[:] = getattr(table, name)
+            self.baseline_stats = local
+            table.close()
+
+    def _stage_inputs(self, indexes: np.ndarray, consumption: np.ndarray
+                      ) -> Layout:
+        """Copie un lot dans le tampon d'entrée partagé."""
+        size = indexes.shape[0]
+        if size > self._input_capacity:
+            capacity = max(size, 2 * self._input_capacity)
+            self._staged_indexes = self._inputs.allocate('indexes', np.int64,
+                                                         capacity)
+            self._staged_consumption = self._inputs.allocate(
+                'consumption', np.float64, capacity
+            )
+            self._input_capacity = capacity
+        self._staged_indexes[:size] = indexes
+        self._staged_consumption[:size] = consumption
+        layout = dict(self._inputs.layout)
+        layout.update({column: self.baseline_stats.blocks.layout[column]
+                       for column in _SHARED_COLUMNS})
+        return layout
+
+    def _classify(self, indexes: np.ndarray, consumption: np.ndarray
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Classe un lot, réparti par tranche de capteurs entre processus.
+
+        Args:
+            indexes: Lignes de baseline (index des capteurs du registre
+                du détecteur, sans saisonnalité)
+            consumption: Consommations
+
+        Returns:
+            Tuple (lignes anormales, indicateur HIGH, niveau de sévérité),
+            identique à la classification locale
+        """
+        table = self.baseline_stats
+        if self.workers == 1 or indexes.shape[0] < self.min_parallel_rows \
+                or table.defined.shape[0] == 0 \
+                or not isinstance(table, SharedBaselineTable):
+            return super()._classify(indexes, consumption)
+        self.start()
+
+        # Tranches contiguës d'index de capteurs ; un lot déjà trié par
+        # capteur (cas d'un cycle de lecture) est routé sans copie
+        # supplémentaire
+        # (la tranche de l'index i est i * workers // taille)
+        size = len(self.registry) * self.buckets
+        if indexes.shape[0] < 2 or bool(np.all(indexes[1:] >= indexes[:-1])):
+            order = None
+            first = -(-np.arange(self.workers + 1) * size // self.workers)
+            starts = np.searchsorted(indexes, first)
+        else:
+            shard = indexes * self.workers // size
+            # Clés sur 16 bits : tri par base (radix), linéaire
+            order = np.argsort(shard.astype(np.uint16), kind='stable')
+            indexes = indexes[order]
+            consumption = consumption[order]
+            starts = np.concatenate(([0], np.cumsum(
+                np.bincount(shard, minlength=self.workers)
+            )))
+
+        layout = self._stage_inputs(indexes, consumption)
+        pending = []
+        for connection, start, stop in zip(self._connections,
+                                           starts[:-1].tolist(),
+                                           starts[1:].tolist()):
+            if stop > start:
+                connection.send((layout, start, stop))
+                pending.append(connection)
+        # Toutes les réponses sont lues, même après une erreur : une
+        # réponse restée dans un tube serait prise pour celle du lot
+        # suivant
+        results, error = [], None
+        for connection in pending:
+            if not self.running:
+                break  # processus relancés au prochain lot
+            try:
+                results.append(self._receive(connection))
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+        rows = np.concatenate([result[0] for result in results])
+        is_high = np.concatenate([result[1] for result in results])
+        severity = np.concatenate([result[2] for result in results])
+        if order is not None:
+            rows = order[rows]
+            ordered = np.argsort(rows, kind='stable')
+            rows, is_high, severity = (rows[ordered], is_high[ordered],
+                                       severity[ordered])
+        return rows, is_high, severity
@@ -0,0 +1,272 @@
+"""
+Instantanés des baselines et reprise à chaud du détecteur d'anomalies.
+
+L'état du détecteur (accumulateurs, seuils et horodatage de la dernière
+mesure intégrée par capteur) est sérialisé en .npz non compressé :
+l'écriture comme la relecture ne sont que des copies de tableaux (en
+mode 'static', environ 10 Mo et 0,1 s pour 100 000 capteurs).
+Les instantanés sont versionnés par leurs cibles (stockage MongoDB ou
+en colonnes, fichiers locaux).
+
+Au démarrage, warm_start restaure le plus récent puis intègre les
+mesures stockées depuis, capteur par capteur, à partir de son
+horodatage : la détection peut commencer dès le premier cycle. Sans
+instantané, les baselines sont calculées par une seule agrégation du
+stockage quand le mode se résume à des moments ('static', 'ewma'),
+sinon en un seul passage sur l'historique.
+"""
+import io
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.analysis.anomaly_detector import AnomalyDetector
+from src.analysis.replay import REPLAY_FIELDS
+from src.core.measurement_batch import micros_to_datetime
+from src.storage.base import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Version du format des instantanés
+SNAPSHOT_FORMAT = 1
+
+
+def dump_baselines(detector: AnomalyDetector) -> bytes:
+    """
+    Sérialise l'état des baselines d'un détecteur.
+
+    Args:
+        detector: Détecteur à enregistrer
+
+    Returns:
+        Contenu .npz de l'instantané
+    """
+    buffer = io.BytesIO()
+    np.savez(buffer, format=np.int64(SNAPSHOT_FORMAT),
+             **detector.export_state())
+    return buffer.getvalue()
+
+
+def load_baselines(detector: AnomalyDetector, data: bytes) -> int:
+    """
+    Restaure dans un détecteur un instantané produit par dump_baselines.
+
+    Args:
+        detector: Détecteur à restaurer
+        data: Contenu de l'instantané
+
+    Returns:
+        Nombre de capteurs restaurés
+
+    Raises:
+        ValueError: Si le format ou le mode de l'instantané diffère
+    """
+    with np.load(io.BytesIO(data)) as archive:
+        if int(archive['format']) != SNAPSHOT_FORMAT:
+            raise ValueError(f"Format d'instantané {int(archive['format'])}"
+                             f" non pris en charge")
+        return detector.restore_state(
+            {name: archive[name] for name in archive.files}
+        )
+
+
+class BaselineSnapshots:
+    """Sauvegarde périodique et reprise des baselines d'un détecteur."""
+
+    def __init__(self, detector: AnomalyDetector, targets: Sequence,
+                 interval: float = 300.0, keep: int = 3):
+        """
+        Initialise les instantanés.
+
+        Args:
+            detector: Détecteur dont les baselines sont enregistrées
+            targets: Cibles des instantanés (moteurs de stockage ou
+                SnapshotFiles : méthodes save_snapshot et load_snapshot)
+            interval: Période minimale entre deux sauvegardes (s)
+            keep: Nombre de versions conservées par cible
+        """
+        self.detector = detector
+        self.targets = list(targets)
+        self.interval = interval
+        self.keep = keep
+        self._last_save = time.monotonic()
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending: Optional[Future] = None
+
+    def _metadata(self) -> Dict:
+        """Métadonnées enregistrées avec un instantané."""
+        detector = self.detector
+        return {'format': SNAPSHOT_FORMAT,
+                'sensors': len(detector.registry),
+                'baseline_mode': detector.baseline_mode,
+                'seasonality': detector.seasonality}
+
+    def _write(self, data: bytes, metadata: Dict) -> List[int]:
+        """Écrit un instantané sur chaque cible."""
+        versions = [target.save_snapshot(data, metadata, self.keep)
+                    for target in self.targets]
+        logger.info(f"Instantané des baselines ({len(data)} octets): "
+                    f"versions {versions}")
+        return versions
+
+    def save(self) -> List[int]:
+        """
+        Enregistre immédiatement un instantané.
+
+        Returns:
+            Version écrite sur chaque cible (0 en cas d'erreur)
+        """
+        self._wait()
+        self._last_save = time.monotonic()
+        return self._write(dump_baselines(self.detector), self._metadata())
+
+    def maybe_save(self) -> bool:
+        """
+        Enregistre un instantané si la période est écoulée.
+
+        L'état est copié dans le thread appelant, entre deux lots, puis
+        écrit en arrière-plan ; une sauvegarde encore en cours reporte la
+        suivante.
+
+        Returns:
+            True si une sauvegarde a été lancée
+        """
+        if time.monotonic() - self._last_save < self.interval:
+            return False
+        if self._pending is not None and not self._pending.done():
+            return False
+        self._wait()
+        self._last_save = time.monotonic()
+        self._pending = self._writer.submit(
+            self._write, dump_baselines(self.detector), self._metadata()
+        )
+        return True
+
+    def _wait(self):
+        """Attend la fin de la sauvegarde en arrière-plan."""
+        if self._pending is not None:
+            try:
+                self._pending.result()
+            except Exception as e:
+                logger.error(f"Erreur de sauvegarde de l'instantané: {e}")
+            self._pending = None
+
+    def restore(self) -> Optional[Dict]:
+        """
+        Restaure l'instantané le plus récent des cibles.
+
+        Returns:
+            Métadonnées de l'instantané restauré (version, created_at,
+            sensors...), ou None si aucun n'est utilisable
+        """
+        found = [snapshot for snapshot in (target.load_snapshot()
+                                           for target in self.targets)
+                 if snapshot is not None]
+        for data, metadata in sorted(found, reverse=True,
+                                     key=lambda s: s[1]['created_at']):
+            try:
+                metadata['sensors'] = load_baselines(self.detector, data)
+            except (ValueError, KeyError, OSError) as e:
+                logger.warning(f"Instantané {metadata.get('version')} "
+                               f"ignoré: {e}")
+                continue
+            return metadata
+        return None
+
+    def catch_up(self, storage: StorageBackend,
+                 batch_size: int = 50_000) -> int:
+        """
+        Intègre les mesures stockées depuis la dernière mise à jour de
+        chaque capteur.
+
+        Args:
+            storage: Stockage des mesures
+            batch_size: Nombre de mesures lues par bloc
+
+        Returns:
+            Nombre de mesures intégrées
+        """
+        detector = self.detector
+        known = detector.updated_at[detector.updated_at > 0]
+        if not known.shape[0]:
+            return 0
+        total = 0
+        for batch in storage.iter_measurements(
+                start=micros_to_datetime(int(known.min())),
+                batch_size=batch_size, fields=REPLAY_FIELDS, columnar=True,
+                ascending=True, registry=detector.registry):
+            seen = np.zeros(len(detector.registry), dtype=np.int64)
+            stored = min(seen.shape[0], detector.updated_at.shape[0])
+            seen[:stored] = detector.updated_at[:stored]
+            fresh = np.flatnonzero(batch.timestamp > seen[batch.sensor_index])
+            if fresh.shape[0]:
+                detector.ingest(batch.select(fresh))
+                total += fresh.shape[0]
+        return total
+
+    def warm_start(self, storage: StorageBackend, catch_up: bool = True,
+                   batch_size: int = 50_000,
+                   from_snapshot: bool = True) -> Dict:
+        """
+        Prépare les baselines au démarrage, sans collecte préalable.
+
+        Args:
+            storage: Stockage des mesures
+            catch_up: Intégrer les mesures stockées après l'instantané
+            batch_size: Nombre de mesures lues par bloc
+            from_snapshot: Reprendre l'instantané le plus récent (sinon,
+                les baselines sont recalculées à partir du stockage)
+
+        Returns:
+            Résumé : source ('snapshot', 'statistics', 'history' ou None
+            si le stockage est vide), version de l'instantané, capteurs
+            avec baseline, mesures intégrées et durée (s)
+        """
+        started = time.perf_counter()
+        detector = self.detector
+        summary = {'source': None, 'version': None, 'sensors': 0,
+                   'measurements': 0}
+        restored = self.restore() if from_snapshot else None
+        if restored is not None:
+            summary.update(source='snapshot', version=restored['version'])
+            if catch_up:
+                summary['measurements'] = self.catch_up(storage,
+                                                        batch_size)
+        else:
+            try:
+                seeded = detector.seed_baselines(
+                    storage.get_statistics_bulk(), datetime.now()
+                )
+                if seeded:
+                    summary['source'] = 'statistics'
+            except ValueError:
+                trained = detector.train(storage.iter_measurements(
+                    batch_size=batch_size, fields=REPLAY_FIELDS,
+                    columnar=True, ascending=True, registry=detector.registry
+                ))
+                summary['measurements'] = trained
+                if trained:
+                    summary['source'] = 'history'
+        summary['sensors'] = detector.baseline_stats.sensor_count()
+        summary['seconds'] = time.perf_counter() - started
+        logger.info(f"Reprise des baselines: {summary}")
+        return summary
+
+    def close(self, save: bool = True):
+        """
+        Termine les sauvegardes en cours et enregistre l'état final.
+
+        Args:
+            save: Enregistrer un dernier instantané
+        """
+        if self._writer is None:
+            return
+        self._wait()
+        if save:
+            self.save()
+        self._writer.shutdown()
+        self._writer = None
@@ -0,0 +1,782 @@
+"""
+Statistiques incrémentales pour les baselines.
+
+Les accumulateurs de Welford conservent uniquement le nombre de mesures,
+la moyenne et la somme des carrés des écarts (M2). Ils se mettent à jour
+en O(lot) et se combinent entre eux (formule de Chan) sans conserver
+l'historique. Les variantes EWMA et fenêtre glissante oublient les
+mesures anciennes avec une mémoire constante par capteur.
+
+Les esquisses de quantiles (histogrammes à intervalles logarithmiques,
+comme DDSketch) donnent médiane, quantiles et écart absolu médian avec
+une erreur relative bornée, dans une taille fixe par capteur quel que
+soit le nombre de mesures ; deux esquisses se fusionnent en additionnant
+leurs compteurs.
+"""
+import math
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+
+class RunningStats:
+    """Accumulateur de Welford pour une série de valeurs."""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        """
+        Initialise l'accumulateur.
+
+        Args:
+            count: Nombre de valeurs déjà agrégées
+            mean: Moyenne des valeurs agrégées
+            m2: Somme des carrés des écarts à la moyenne
+        """
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, value: float):
+        """
+        Ajoute une valeur.
+
+        Args:
+            value: Valeur à agréger
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def update_many(self, values: Iterable[float]):
+        """
+        Ajoute plusieurs valeurs.
+
+        Args:
+            values: Valeurs à agréger
+        """
+        for value in values:
+            self.update(value)
+
+    def merge(self, other: 'RunningStats'):
+        """
+        Combine un autre accumulateur dans celui-ci.
+
+        Args:
+            other: Accumulateur partiel à fusionner
+        """
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Variance d'échantillon, ou None avec moins de deux valeurs."""
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+    @property
+    def stdev(self) -> Optional[float]:
+        """Écart-type d'échantillon, ou None avec moins de deux valeurs."""
+        variance = self.variance
+        return None if variance is None else math.sqrt(variance)
+
+
+class WelfordArray:
+    """Accumulateurs de Welford indexés (un par capteur) en NumPy."""
+
+    # Tableaux formant l'état des accumulateurs (instantanés)
+    FIELDS = ('count', 'mean', 'm2')
+
+    def __init__(self, capacity: int = 0):
+        """
+        Initialise des accumulateurs vides.
+
+        Args:
+            capacity: Nombre initial d'index alloués
+        """
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros(capacity, dtype=np.float64)
+        self.m2 = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        """Nombre d'index alloués."""
+        return self.count.shape[0]
+
+    def ensure_capacity(self, size: int):
+        """
+        Alloue les index manquants jusqu'à `size`.
+
+        Args:
+            size: Nombre d'index requis
+        """
+        current = len(self)
+        if size <= current:
+            return
+        capacity = max(size, 2 * current)
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:current] = old
+            setattr(self, name, new)
+
+    def reset(self, indexes: np.ndarray):
+        """
+        Remet à zéro certains accumulateurs.
+
+        Args:
+            indexes: Index à réinitialiser
+        """
+        self.ensure_capacity(int(np.max(indexes, initial=-1)) + 1)
+        self.count[indexes] = 0
+        self.mean[indexes] = 0.0
+        self.m2[indexes] = 0.0
+
+    def set_moments(self, indexes: np.ndarray, count: np.ndarray,
+                    mean: np.ndarray, variance: np.ndarray):
+        """
+        Remplace certains accumulateurs par des moments agrégés
+        (statistiques calculées par le stockage).
+
+        Args:
+            indexes: Index concernés
+            count: Nombre de valeurs
+            mean: Moyennes
+            variance: Variances d'échantillon
+        """
+        self.reset(indexes)
+        self.count[indexes] = count
+        self.mean[indexes] = mean
+        self.m2[indexes] = variance * np.maximum(count - 1, 0)
+
+    def update(self, indexes: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Agrège un lot de valeurs en un seul passage.
+
+        Les statistiques du lot sont calculées par index (bincount) puis
+        combinées aux accumulateurs existants.
+
+        Args:
+            indexes: Index de l'accumulateur de chaque valeur
+            values: Valeurs à agréger
+
+        Returns:
+            Index mis à jour par le lot
+        """
+        if indexes.shape[0] == 0:
+            return np.empty(0, dtype=np.int64)
+        size = int(indexes.max()) + 1
+        self.ensure_capacity(size)
+
+        batch_count = np.bincount(indexes, minlength=size)
+        touched = np.flatnonzero(batch_count)
+        batch_sum = np.bincount(indexes, weights=values, minlength=size)
+        batch_mean = batch_sum[touched] / batch_count[touched]
+        local_mean = np.zeros(size, dtype=np.float64)
+        local_mean[touched] = batch_mean
+        deviations = values - local_mean[indexes]
+        batch_m2 = np.bincount(indexes, weights=deviations * deviations,
+                               minlength=size)[touched]
+
+        self._combine(touched, batch_count[touched], batch_mean, batch_m2)
+        return touched
+
+    def merge(self, other: 'WelfordArray',
+              mapping: Optional[np.ndarray] = None):
+        """
+        Combine des accumulateurs partiels dans ceux-ci.
+
+        Args:
+            other: Accumulateurs à fusionner
+            mapping: Correspondance des index de `other` vers ceux-ci
+                (identité si absente)
+        """
+        source = np.flatnonzero(other.count)
+        target = source if mapping is None else mapping[source]
+        if target.shape[0] == 0:
+            return
+        self.ensure_capacity(int(target.max()) + 1)
+        self._combine(target, other.count[source], other.mean[source],
+                      other.m2[source])
+
+    def _combine(self, indexes: np.ndarray, count: np.ndarray,
+                 mean: np.ndarray, m2: np.ndarray):
+        """Applique la formule de combinaison de Chan sur des index."""
+        old_count = self.count[indexes]
+        total = old_count + count
+        delta = mean - self.mean[indexes]
+        self.mean[indexes] += delta * count / total
+        self.m2[indexes] += m2 + delta * delta * old_count * count / total
+        self.count[indexes] = total
+
+    def stdev(self, indexes: np.ndarray) -> np.ndarray:
+        """
+        Écart-type d'échantillon de certains accumulateurs.
+
+        Args:
+            indexes: Index concernés
+
+        Returns:
+            Écarts-types (NaN avec moins de deux valeurs)
+        """
+        count = self.count[indexes]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.where(count > 1,
+                                self.m2[indexes] / (count - 1), np.nan)
+        return np.sqrt(np.maximum(variance, 0.0))
+
+
+# En dessous de ce nombre d'index par passage, la mise à jour EWMA est
+# faite valeur par valeur : le coût fixe des opérations NumPy dominerait
+_VECTOR_MIN_SIZE = 16
+
+
+def _occurrence_rank(indexes: np.ndarray) -> np.ndarray:
+    """
+    Rang de chaque valeur parmi celles du même index, dans l'ordre du lot.
+
+    Args:
+        indexes: Index de l'accumulateur de chaque valeur
+
+    Returns:
+        Tableau tel que rank[i] == nombre de valeurs précédentes de même
+        index
+    """
+    order = np.argsort(indexes, kind='stable')
+    sorted_indexes = indexes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_indexes[1:]
+                                  != sorted_indexes[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, order.shape[0]]))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.shape[0]) - group_start
+    return rank
+
+
+class EWMAArray:
+    """Moyenne et variance à pondération exponentielle, par index."""
+
+    FIELDS = ('count', 'mean', 'variance')
+
+    def __init__(self, half_life: float, capacity: int = 0):
+        """
+        Initialise les accumulateurs.
+
+        Args:
+            half_life: Demi-vie en nombre de mesures : le poids d'une
+                mesure est divisé par deux après `half_life` mesures
+            capacity: Nombre initial d'index alloués
+
+        Raises:
+            ValueError: Si la demi-vie n'est pas strictement positive
+        """
+        if half_life <= 0:
+            raise ValueError("La demi-vie doit être strictement positive")
+        self.half_life = half_life
+        self.alpha = 1.0 - 0.5 ** (1.0 / half_life)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros(capacity, dtype=np.float64)
+        self.variance = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        """Nombre d'index alloués."""
+        return self.count.shape[0]
+
+    def ensure_capacity(self, size: int):
+        """
+        Alloue les index manquants jusqu'à `size`.
+
+        Args:
+            size: Nombre d'index requis
+        """
+        current = len(self)
+        if size <= current:
+            return
+        capacity = max(size, 2 * current)
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:current] = old
+            setattr(self, name, new)
+
+    def reset(self, indexes: np.ndarray):
+        """
+        Remet à zéro certains accumulateurs.
+
+        Args:
+            indexes: Index à réinitialiser
+        """
+        self.ensure_capacity(int(np.max(indexes, initial=-1)) + 1)
+        self.count[indexes] = 0
+        self.mean[indexes] = 0.0
+        self.variance[indexes] = 0.0
+
+    def set_moments(self, indexes: np.ndarray, count: np.ndarray,
+                    mean: np.ndarray, variance: np.ndarray):
+        """
+        Remplace certains accumulateurs par des moments agrégés, qui
+        tiennent lieu d'historique pondéré.
+
+        Args:
+            indexes: Index concernés
+            count: Nombre de valeurs
+            mean: Moyennes
+            variance: Variances
+        """
+        self.reset(indexes)
+        self.count[indexes] = count
+        self.mean[indexes] = mean
+        self.variance[indexes] = variance
+
+    def update(self, indexes: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Intègre un lot de valeurs, dans l'ordre du lot pour chaque index.
+
+        Tant qu'un index a reçu moins de 1/alpha valeurs, le poids 1/n
+        est utilisé : la moyenne démarre comme une moyenne cumulée puis
+        bascule vers la pondération exponentielle.
+
+        Args:
+            indexes: Index de l'accumulateur de chaque valeur
+            values: Valeurs à agréger
+
+        Returns:
+            Index mis à jour par le lot
+        """
+        if indexes.shape[0] == 0:
+            return np.empty(0, dtype=np.int64)
+        self.ensure_capacity(int(indexes.max()) + 1)
+
+        # Un tri par rang d'occurrence : le n-ième passage met à jour en
+        # bloc tous les index ayant au moins n valeurs, dans l'ordre du lot
+        rank = _occurrence_rank(indexes)
+        order = np.argsort(rank, kind='stable')
+        indexes = indexes[order]
+        values = values[order]
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(rank))))
+
+        level = 0
+        levels = offsets.shape[0] - 1
+        while level < levels and \
+                offsets[level + 1] - offsets[level] >= _VECTOR_MIN_SIZE:
+            rows = slice(offsets[level], offsets[level + 1])
+            self._step(indexes[rows], values[rows])
+            level += 1
+        if level < levels:
+            # Longues séries de quelques index : récurrence scalaire
+            rest = slice(offsets[level], None)
+            tail_indexes = indexes[rest]
+            tail_values = values[rest]
+            grouped = np.argsort(tail_indexes, kind='stable')
+            tail_indexes = tail_indexes[grouped]
+            tail_values = tail_values[grouped]
+            bounds = np.flatnonzero(np.diff(tail_indexes)) + 1
+            for run in np.split(np.arange(tail_indexes.shape[0]), bounds):
+                self._run(int(tail_indexes[run[0]]),
+                          tail_values[run].tolist())
+        return np.unique(indexes)
+
+    def _step(self, targets: np.ndarray, sample: np.ndarray):
+        """Intègre une valeur pour chacun des index (distincts) donnés."""
+        self.count[targets] += 1
+        alpha = np.maximum(self.alpha, 1.0 / self.count[targets])
+        diff = sample - self.mean[targets]
+        increment = alpha * diff
+        self.mean[targets] += increment
+        self.variance[targets] = (1.0 - alpha) * (
+            self.variance[targets] + diff * increment
+        )
+
+    def _run(self, index: int, sample: Iterable[float]):
+        """Intègre une suite de valeurs d'un seul index (mêmes calculs)."""
+        count = int(self.count[index])
+        mean = float(self.mean[index])
+        variance = float(self.variance[index])
+        for value in sample:
+            count += 1
+            alpha = max(self.alpha, 1.0 / count)
+            diff = value - mean
+            increment = alpha * diff
+            mean += increment
+            variance = (1.0 - alpha) * (variance + diff * increment)
+        self.count[index] = count
+        self.mean[index] = mean
+        self.variance[index] = variance
+
+    def stdev(self, indexes: np.ndarray) -> np.ndarray:
+        """
+        Écart-type pondéré de certains accumulateurs.
+
+        Args:
+            indexes: Index concernés
+
+        Returns:
+            Écarts-types (NaN avec moins de deux valeurs)
+        """
+        return np.where(self.count[indexes] > 1,
+                        np.sqrt(self.variance[indexes]), np.nan)
+
+
+class RollingWindowArray:
+    """Fenêtre glissante de taille fixe (tampon circulaire), par index."""
+
+    FIELDS = ('buffer', 'position', 'count', 'mean', '_stdev')
+
+    def __init__(self, window_size: int, capacity: int = 0):
+        """
+        Initialise les tampons.
+
+        Args:
+            window_size: Nombre de mesures conservées par index
+            capacity: Nombre initial d'index alloués
+
+        Raises:
+            ValueError: Si la fenêtre contient moins de deux mesures
+        """
+        if window_size < 2:
+            raise ValueError("La fenêtre doit contenir au moins 2 mesures")
+        self.window_size = window_size
+        self.buffer = np.zeros((capacity, window_size), dtype=np.float64)
+        self.position = np.zeros(capacity, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros(capacity, dtype=np.float64)
+        self._stdev = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        """Nombre d'index alloués."""
+        return self.count.shape[0]
+
+    def ensure_capacity(self, size: int):
+        """
+        Alloue les index manquants jusqu'à `size`.
+
+        Args:
+            size: Nombre d'index requis
+        """
+        current = len(self)
+        if size <= current:
+            return
+        capacity = max(size, 2 * current)
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:current] = old
+            setattr(self, name, new)
+
+    def reset(self, indexes: np.ndarray):
+        """
+        Vide certains tampons.
+
+        Args:
+            indexes: Index à réinitialiser
+        """
+        self.ensure_capacity(int(np.max(indexes, initial=-1)) + 1)
+        self.position[indexes] = 0
+        self.count[indexes] = 0
+        self.mean[indexes] = 0.0
+        self._stdev[indexes] = 0.0
+
+    def update(self, indexes: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Ajoute un lot de valeurs aux fenêtres, en écrasant les plus
+        anciennes.
+
+        Args:
+            indexes: Index de l'accumulateur de chaque valeur
+            values: Valeurs à agréger
+
+        Returns:
+            Index mis à jour par le lot
+        """
+        if indexes.shape[0] == 0:
+            return np.empty(0, dtype=np.int64)
+        self.ensure_capacity(int(indexes.max()) + 1)
+
+        size = int(indexes.max()) + 1
+        added = np.bincount(indexes, minlength=size)
+        touched = np.flatnonzero(added)
+        rank = _occurrence_rank(indexes)
+        # Seules les `window_size` dernières valeurs d'un index comptent
+        kept = rank >= added[indexes] - self.window_size
+        targets = indexes[kept]
+        slots = (self.position[targets] + rank[kept]) % self.window_size
+        self.buffer[targets, slots] = values[kept]
+
+        added = added[touched]
+        self.position[touched] = (self.position[touched] + added) \
+            % self.window_size
+        self.count[touched] = np.minimum(self.count[touched] + added,
+                                         self.window_size)
+        self._summarize(touched)
+        return touched
+
+    def _summarize(self, indexes: np.ndarray):
+        """Recalcule moyenne et écart-type des fenêtres modifiées."""
+        count = self.count[indexes]
+        filled = np.arange(self.window_size) < count[:, None]
+        window = self.buffer[indexes]
+        total = np.where(filled, window, 0.0).sum(axis=1)
+        mean = total / count
+        deviations = np.where(filled, window - mean[:, None], 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (deviations * deviations).sum(axis=1) / (count - 1)
+        self.mean[indexes] = mean
+        self._stdev[indexes] = np.sqrt(np.maximum(variance, 0.0))
+
+    def stdev(self, indexes: np.ndarray) -> np.ndarray:
+        """
+        Écart-type d'échantillon de certaines fenêtres.
+
+        Args:
+            indexes: Index concernés
+
+        Returns:
+            Écarts-types (NaN avec moins de deux valeurs)
+        """
+        return np.where(self.count[indexes] > 1, self._stdev[indexes],
+                        np.nan)
+
+
+# Nombre de capteurs traités ensemble par les calculs de quantiles
+# (borne la taille des tableaux intermédiaires capteurs x intervalles)
+_SKETCH_BLOCK = 4096
+
+
+class QuantileSketchArray:
+    """
+    Esquisses de quantiles indexées (une par capteur), fusionnables.
+
+    Chaque esquisse compte les valeurs par intervalle [γ^(k-1), γ^k],
+    avec γ = (1 + α) / (1 - α) : le représentant d'un intervalle est à
+    moins de α (erreur relative) de toute valeur qu'il contient. Les
+    valeurs inférieures à min_value (zéro compris) partagent un intervalle
+    représenté par 0 ; celles supérieures à max_value sont comptées dans
+    le dernier intervalle.
+    """
+
+    FIELDS = ('count', 'counts')
+
+    def __init__(self, relative_accuracy: float = 0.01,
+                 min_value: float = 1e-3, max_value: float = 1e6,
+                 capacity: int = 0):
+        """
+        Initialise des esquisses vides.
+
+        Avec les valeurs par défaut, une esquisse compte 1037 intervalles
+        sur 32 bits, soit environ 4 Ko par capteur.
+
+        Args:
+            relative_accuracy: Erreur relative α des quantiles
+            min_value: Plus petite valeur distinguée de zéro
+            max_value: Plus grande valeur représentée exactement
+            capacity: Nombre initial d'index alloués
+
+        Raises:
+            ValueError: Si les paramètres sont hors de leurs bornes
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("La précision relative doit être entre 0 et 1")
+        if not 0 < min_value < max_value:
+            raise ValueError("Il faut 0 < min_value < max_value")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        # La colonne 0 reçoit les valeurs sous min_value
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma) - 1
+        self.buckets = math.ceil(math.log(max_value) / self._log_gamma) \
+            - self._offset + 1
+        exponents = np.arange(1, self.buckets) + self._offset
+        self.values = np.concatenate(
+            ([0.0], 2 * gamma ** exponents / (gamma + 1))
+        )
+        # Bornes des intervalles (la colonne c couvre [bounds[c],
+        # bounds[c + 1]])
+        self.bounds = np.concatenate(
+            ([0.0], gamma ** np.arange(self._offset, self._offset
+                                       + self.buckets))
+        )
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros((capacity, self.buckets), dtype=np.uint32)
+
+    def __len__(self) -> int:
+        """Nombre d'index alloués."""
+        return self.count.shape[0]
+
+    def ensure_capacity(self, size: int):
+        """
+        Alloue les index manquants jusqu'à `size`.
+
+        Args:
+            size: Nombre d'index requis
+        """
+        current = len(self)
+        if size <= current:
+            return
+        capacity = max(size, 2 * current)
+        count = np.zeros(capacity, dtype=np.int64)
+        count[:current] = self.count
+        counts = np.zeros((capacity, self.buckets), dtype=np.uint32)
+        counts[:current] = self.counts
+        self.count, self.counts = count, counts
+
+    def reset(self, indexes: np.ndarray):
+        """
+        Vide certaines esquisses.
+
+        Args:
+            indexes: Index à réinitialiser
+        """
+        self.ensure_capacity(int(np.max(indexes, initial=-1)) + 1)
+        self.count[indexes] = 0
+        self.counts[indexes] = 0
+
+    def _columns(self, values: np.ndarray) -> np.ndarray:
+        """Intervalle de chaque valeur."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            exponents = np.ceil(np.log(values) / self._log_gamma)
+        columns = np.where(values >= self.min_value,
+                           exponents - self._offset, 0)
+        return np.minimum(columns, self.buckets - 1).astype(np.int64)
+
+    def update(self, indexes: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Agrège un lot de valeurs.
+
+        Args:
+            indexes: Index de l'esquisse de chaque valeur
+            values: Valeurs à agréger
+
+        Returns:
+            Index mis à jour par le lot
+        """
+        if indexes.shape[0] == 0:
+            return np.empty(0, dtype=np.int64)
+        size = int(indexes.max()) + 1
+        self.ensure_capacity(size)
+        np.add.at(self.counts, (indexes, self._columns(values)), 1)
+        batch_count = np.bincount(indexes, minlength=size)
+        touched = np.flatnonzero(batch_count)
+        self.count[touched] += batch_count[touched]
+        return touched
+
+    def merge(self, other: 'QuantileSketchArray',
+              mapping: Optional[np.ndarray] = None):
+        """
+        Combine des esquisses partielles dans celles-ci.
+
+        Args:
+            other: Esquisses à fusionner
+            mapping: Correspondance des index de `other` vers ceux-ci
+                (identité si absente)
+
+        Raises:
+            ValueError: Si les esquisses n'ont pas les mêmes intervalles
+        """
+        if (other.relative_accuracy, other.min_value, other.max_value) != \
+                (self.relative_accuracy, self.min_value, self.max_value):
+            raise ValueError("Esquisses de paramètres différents")
+        source = np.flatnonzero(other.count)
+        target = source if mapping is None else mapping[source]
+        if target.shape[0] == 0:
+            return
+        self.ensure_capacity(int(target.max()) + 1)
+        self.count[target] += other.count[source]
+        self.counts[target] += other.counts[source]
+
+    @staticmethod
+    def _ranked(weights: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+        """
+        Position, dans chaque ligne, de la valeur de rang donné.
+
+        Args:
+            weights: Effectifs par colonne (une ligne par esquisse)
+            ranks: Rang recherché (à partir de 0) par ligne
+
+        Returns:
+            Colonne contenant la valeur de ce rang
+        """
+        cumulative = np.cumsum(weights, axis=1, dtype=np.int64)
+        return np.count_nonzero(cumulative <= ranks[:, None], axis=1)
+
+    def quantiles(self, indexes: np.ndarray,
+                  fractions: Sequence[float]) -> np.ndarray:
+        """
+        Quantiles de certaines esquisses.
+
+        Args:
+            indexes: Index concernés (esquisses non vides)
+            fractions: Quantiles demandés, entre 0 et 1
+
+        Returns:
+            Tableau (len(fractions), len(indexes)) des quantiles
+        """
+        result = np.empty((len(fractions), indexes.shape[0]))
+        for start in range(0, indexes.shape[0], _SKETCH_BLOCK):
+            block = indexes[start:start + _SKETCH_BLOCK]
+            counts = self.counts[block]
+            last = self.count[block] - 1
+            for row, fraction in enumerate(fractions):
+                columns = self._ranked(counts, np.floor(fraction * last))
+                result[row, start:start + block.shape[0]] = \
+                    self.values[columns]
+        return result
+
+    def _cdf(self, rows: np.ndarray, cumulative: np.ndarray,
+             counts: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Nombre de valeurs inférieures à `values`, les valeurs d'un
+        intervalle étant supposées réparties uniformément.
+        """
+        columns = self._columns(values)
+        lower, upper = self.bounds[columns], self.bounds[columns + 1]
+        fraction = np.clip((values - lower) / (upper - lower), 0.0, 1.0)
+        before = cumulative[rows, columns] - counts[rows, columns]
+        return before + counts[rows, columns] * fraction
+
+    def mad(self, indexes: np.ndarray, median: np.ndarray,
+            iterations: int = 40) -> np.ndarray:
+        """
+        Écart absolu médian de certaines esquisses.
+
+        Le demi-intervalle d autour de la médiane contenant la moitié des
+        valeurs est cherché par dichotomie sur la fonction de répartition,
+        interpolée linéairement dans chaque intervalle : l'écart n'est pas
+        limité à la résolution des intervalles (≈ α fois les valeurs), qui
+        dépasse souvent la dispersion des consommations.
+
+        Args:
+            indexes: Index concernés (esquisses non vides)
+            median: Médiane de chaque esquisse
+            iterations: Nombre d'étapes de dichotomie
+
+        Returns:
+            Écarts absolus médians
+        """
+        result = np.empty(indexes.shape[0])
+        for start in range(0, indexes.shape[0], _SKETCH_BLOCK):
+            block = indexes[start:start + _SKETCH_BLOCK]
+            stop = start + block.shape[0]
+            counts = self.counts[block].astype(np.int64)
+            cumulative = np.cumsum(counts, axis=1)
+            rows = np.arange(block.shape[0])
+            center = median[start:stop]
+            half = 0.5 * self.count[block]
+            low = np.zeros(block.shape[0])
+            high = np.maximum(center, self.bounds[-1] - center)
+            for _ in range(iterations):
+                middle = 0.5 * (low + high)
+                inside = self._cdf(rows, cumulative, counts,
+                                   center + middle) \
+                    - self._cdf(rows, cumulative, counts, center - middle)
+                enough = inside >= half
+                high = np.where(enough, middle, high)
+                low = np.where(enough, low, middle)
+            result[start:stop] = high
+        return result
@@ -0,0 +1,152 @@
+"""
+Surcharge de la configuration par variables d'environnement et options.
+
+Chaque dictionnaire <SECTION>_CONFIG de settings forme une section
+('anomaly' pour ANOMALY_CONFIG, 'storage' pour STORAGE_CONFIG...). Une
+affectation `section.clé=valeur` (ou `section.clé.sous_clé=valeur`)
+remplace la valeur en place : les modules qui ont déjà importé le
+dictionnaire voient la nouvelle valeur.
+
+Les variables d'environnement ENERGY_<SECTION>__<CLÉ> (par exemple
+ENERGY_STORAGE__BACKEND=columnar ou
+ENERGY_STORAGE__COLUMNAR__DIRECTORY=/data) sont appliquées avant les
+options de la ligne de commande.
+
+La valeur est convertie d'après la valeur actuelle : booléen (true/false,
+1/0, yes/no, on/off), entier, réel ou texte ; les autres types (None,
+tuples, dictionnaires) sont lus en JSON, ou gardés tels quels si ce n'est
+pas du JSON.
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from src.config import settings
+
+# Préfixe des variables d'environnement ; '__' sépare section et clés
+ENV_PREFIX = 'ENERGY_'
+ENV_SEPARATOR = '__'
+
+_SUFFIX = '_CONFIG'
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off')
+
+
+def sections() -> Dict[str, Dict]:
+    """
+    Sections de la configuration.
+
+    Returns:
+        Dictionnaires de settings par nom de section
+    """
+    return {name[:-len(_SUFFIX)].lower(): value
+            for name, value in vars(settings).items()
+            if name.endswith(_SUFFIX) and isinstance(value, dict)}
+
+
+def convert(current, text: str):
+    """
+    Convertit un texte dans le type d'une valeur de configuration.
+
+    Args:
+        current: Valeur actuelle
+        text: Nouvelle valeur sous forme de texte
+
+    Returns:
+        Nouvelle valeur
+
+    Raises:
+        ValueError: Si le texte ne correspond pas au type attendu
+    """
+    if isinstance(current, bool):
+        if text.lower() in _TRUE:
+            return True
+        if text.lower() in _FALSE:
+            return False
+        raise ValueError(f"Booléen attendu: {text!r}")
+    if isinstance(current, int):
+        return int(text)
+    if isinstance(current, float):
+        return float(text)
+    if isinstance(current, str):
+        return text
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    if isinstance(current, tuple) and isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def set_value(path: str, text: str):
+    """
+    Remplace une valeur de configuration.
+
+    Args:
+        path: Chemin 'section.clé' ou 'section.clé.sous_clé'
+        text: Nouvelle valeur sous forme de texte
+
+    Raises:
+        ValueError: Si la section ou la clé est inconnue, ou si la
+            valeur ne correspond pas au type attendu
+    """
+    names = path.lower().split('.')
+    container = sections().get(names[0])
+    if container is None or len(names) < 2:
+        raise ValueError(f"Section de configuration inconnue: {path}")
+    for name in names[1:-1]:
+        container = container.get(name)
+        if not isinstance(container, dict):
+            raise ValueError(f"Clé de configuration inconnue: {path}")
+    if names[-1] not in container:
+        raise ValueError(f"Clé de configuration inconnue: {path}")
+    container[names[-1]] = convert(container[names[-1]], text)
+
+
+def apply_assignments(assignments: Iterable[str]) -> List[str]:
+    """
+    Applique des affectations 'section.clé=valeur'.
+
+    Args:
+        assignments: Affectations, dans l'ordre d'application
+
+    Returns:
+        Chemins modifiés
+
+    Raises:
+        ValueError: Si une affectation est mal formée ou invalide
+    """
+    applied = []
+    for assignment in assignments:
+        path, separator, text = assignment.partition('=')
+        if not separator:
+            raise ValueError(f"Affectation attendue (section.clé=valeur): "
+                             f"{assignment}")
+        path = path.strip().lower()
+        set_value(path, text)
+        applied.append(path)
+    return applied
+
+
+def apply_environment(environ: Optional[Mapping[str, str]] = None
+                      ) -> List[str]:
+    """
+    Applique les variables d'environnement ENERGY_<SECTION>__<CLÉ>.
+
+    Args:
+        environ: Variables à lire (os.environ si absent)
+
+    Returns:
+        Chemins modifiés
+
+    Raises:
+        ValueError: Si une variable désigne une clé inconnue ou une
+            valeur invalide
+    """
+    environ = os.environ if environ is None else environ
+    return apply_assignments(
+        f"{name[len(ENV_PREFIX):].replace(ENV_SEPARATOR, '.')}={value}"
+        for name, value in sorted(environ.items())
+        if name.startswith(ENV_PREFIX) and ENV_SEPARATOR in name
+    )
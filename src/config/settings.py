@@ -6,7 +6,53 @@ Configuration globale du projet.
 MONGODB_CONFIG = {
     'connection_string': 'mongodb://localhost:27017/',
     'database_name': 'energy_monitoring',
-    'collection_name': 'measurements'
+    'collection_name': 'measurements',
+    'anomalies_collection_name': 'anomalies',
+    'snapshots_collection_name': 'baseline_snapshots',
+    # Collection time-series (MongoDB 5.0+) avec sensor_id en metaField
+    'time_series': False,
+    'granularity': 'seconds',
+    # Agrégats minute/heure/jour maintenus à l'insertion
+    'rollups': True,
+    # Cache des statistiques (durée de vie en secondes, 0 = désactivé)
+    'stats_cache_ttl': 5.0,
+    'stats_cache_size': 100000
+}
+
+# Rétention (MongoDB) : mesures brutes conservées `retention_days` jours,
+# puis compactées en agrégats de `bucket_seconds` secondes par tranches
+# de `slice_seconds`, toutes les `interval` secondes en arrière-plan
+# pendant la surveillance (ou par python main.py compact)
+RETENTION_CONFIG = {
+    'enabled': False,
+    'retention_days': 30.0,
+    'bucket_seconds': 300,
+    'slice_seconds': 3600,
+    'batch_size': 10000,
+    'interval': 3600.0,
+    # Pause entre deux tranches, laissée à l'ingestion (s)
+    'pause': 0.1
+}
+
+# Choix du moteur de stockage : 'mongodb' ou 'columnar' (fichiers
+# locaux projetés en mémoire, sans serveur)
+STORAGE_CONFIG = {
+    'backend': 'mongodb',
+    'columnar': {
+        'directory': 'data/columnar',
+        'segment_rows': 1000000
+    }
+}
+
+# Configuration de l'ingestion asynchrone (write-behind)
+INGESTION_CONFIG = {
+    'max_queue_size': 1000,
+    'writers': 2,
+    'batch_size': 5000,
+    'flush_interval': 0.5,
+    # 'block', 'drop_oldest' ou 'spill'
+    'backpressure': 'block',
+    'spill_directory': None
 }
 
 # Configuration des capteurs
@@ -14,14 +60,85 @@ SENSOR_CONFIG = {
     'default_base_consumption': 100.0,
     'default_variance': 20.0,
     'anomaly_probability': 0.05,
-    'reading_interval': 0.5
+    'anomaly_factor_range': (2.0, 3.0),
+    'reading_interval': 0.5,
+    # Simulation répartie : nombre de processus (0 = désactivée) et
+    # graine maîtresse (aléatoire si None)
+    'simulation_workers': 0,
+    'simulation_seed': None,
+    # Intervalle de lecture propre à certains capteurs (sensor_id -> s)
+    'sensor_intervals': {},
+    # Parc chargé depuis un fichier CSV ou JSON Lines (parc de
+    # démonstration si None) et taille des blocs de chargement
+    'fleet_file': None,
+    'fleet_chunk_size': 10_000
+}
+
+# Boucle de surveillance à cadence fixe
+MONITORING_CONFIG = {
+    # Période des lectures de la phase de référence (s)
+    'baseline_interval': 0.1,
+    # Lots en attente par étape (persistance, détection)
+    'queue_size': 64
 }
 
 # Configuration de la détection d'anomalies
 ANOMALY_CONFIG = {
     'threshold_multiplier': 2.0,
     'baseline_samples': 20,
-    'monitoring_cycles': 30
+    'monitoring_cycles': 30,
+    # 'static', 'ewma' (demi-vie en mesures), 'window' (taille fixe), ou
+    # les modes robustes aux pics 'mad' (médiane ± écart absolu médian)
+    # et 'quantile' (bande entre deux quantiles)
+    'baseline_mode': 'static',
+    'half_life': 100,
+    'window_size': 200,
+    'quantiles': (0.01, 0.99),
+    # Erreur relative des esquisses de quantiles (~4 Ko par capteur)
+    'relative_accuracy': 0.01,
+    # Profils saisonniers : None, 'hour_of_day' ou 'hour_of_week' (une
+    # baseline par capteur et par heure)
+    'seasonality': None,
+    # Processus de classification (0 : dans le processus principal) et
+    # taille de lot minimale pour répartir
+    'detection_workers': 0,
+    'min_parallel_rows': 50000
+}
+
+# Agrégation par localisation et pour le parc : fenêtres fixe et
+# glissante (s) et baselines de charge (demi-vie et cycles d'amorçage en
+# cycles)
+AGGREGATION_CONFIG = {
+    'enabled': True,
+    'tumbling_window': 60.0,
+    'sliding_window': 300.0,
+    'threshold_multiplier': 3.0,
+    'half_life': 30,
+    'min_cycles': 10
+}
+
+# Instantanés des baselines : au démarrage, la surveillance reprend le
+# plus récent (puis les mesures stockées depuis) au lieu de la phase de
+# collecte de référence
+SNAPSHOT_CONFIG = {
+    'enabled': True,
+    # Période des sauvegardes pendant la surveillance (s) ; un instantané
+    # est aussi écrit à l'arrêt
+    'interval': 300.0,
+    'keep': 3,
+    # Copie en fichiers locaux en plus du stockage (None : aucune)
+    'directory': None,
+    # Intégrer les mesures stockées après l'instantané
+    'catch_up': True
+}
+
+# Rejeu de la détection sur les mesures stockées (python main.py replay)
+REPLAY_CONFIG = {
+    # Fenêtre d'apprentissage des baselines, à partir du début du rejeu
+    'training_hours': 24,
+    # Mesures lues par bloc et anomalies écrites par insertion
+    'batch_size': 50000,
+    'write_batch_size': 10000
 }
 
 # Configuration des tests
@@ -30,6 +147,24 @@ TEST_CONFIG = {
     'mock_mongodb': True
 }
 
+# Exposition des métriques au format Prometheus (http://host:port/metrics)
+METRICS_CONFIG = {
+    'enabled': True,
+    'host': '127.0.0.1',
+    'port': 9108
+}
+
+# Profilage d'une fraction des cycles (cProfile et tracemalloc), par
+# étape : lecture des capteurs, analyse, stockage
+PROFILING_CONFIG = {
+    'enabled': False,
+    'sample_rate': 0.1,
+    'memory': True,
+    'output_dir': 'profiles',
+    # Fonctions et lignes retenues par rapport
+    'top': 15
+}
+
 # Logging
 LOGGING_CONFIG = {
     'level': 'INFO',
@@ -0,0 +1,323 @@
+"""
+Représentation en colonnes d'un lot de mesures énergétiques.
+
+Un MeasurementBatch remplace une liste de dictionnaires : les identifiants
+et localisations des capteurs sont internés dans un SensorRegistry et
+chaque mesure n'occupe plus qu'un index, une consommation float64 et un
+horodatage int64 (microsecondes depuis l'epoch).
+"""
+import weakref
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+TIMESTAMP_UNIT = 'datetime64[us]'
+
+
+def datetime_to_micros(value: datetime) -> int:
+    """
+    Convertit un datetime en microsecondes depuis l'epoch.
+
+    Args:
+        value: Date à convertir
+
+    Returns:
+        Nombre de microsecondes
+    """
+    return int(np.datetime64(value, 'us').astype(np.int64))
+
+
+def micros_to_datetime(value: int) -> datetime:
+    """
+    Convertit des microsecondes depuis l'epoch en datetime.
+
+    Args:
+        value: Nombre de microsecondes
+
+    Returns:
+        Date correspondante
+    """
+    return np.int64(value).astype(TIMESTAMP_UNIT).item()
+
+
+class SensorRegistry:
+    """Table d'internement des identifiants et localisations de capteurs."""
+
+    def __init__(self):
+        """Initialise un registre vide."""
+        self.ids: List[str] = []
+        self.locations: List[Optional[str]] = []
+        self._index: Dict[str, int] = {}
+        self._translations = weakref.WeakKeyDictionary()
+
+    def __len__(self) -> int:
+        """Nombre de capteurs internés."""
+        return len(self.ids)
+
+    def __contains__(self, sensor_id: str) -> bool:
+        """Indique si un capteur est interné."""
+        return sensor_id in self._index
+
+    def intern(self, sensor_id: str, location: Optional[str] = None) -> int:
+        """
+        Retourne l'index d'un capteur, en l'ajoutant si nécessaire.
+
+        Args:
+            sensor_id: Identifiant du capteur
+            location: Localisation du capteur (optionnelle)
+
+        Returns:
+            Index stable du capteur
+        """
+        index = self._index.get(sensor_id)
+        if index is None:
+            index = len(self.ids)
+            self.ids.append(sensor_id)
+            self.locations.append(location)
+            self._index[sensor_id] = index
+        elif location is not None:
+            self.locations[index] = location
+        return index
+
+    def intern_many(self, sensor_ids: Iterable[str]) -> np.ndarray:
+        """
+        Retourne les index de plusieurs capteurs, en ajoutant les
+        inconnus.
+
+        Args:
+            sensor_ids: Identifiants des capteurs
+
+        Returns:
+            Index des capteurs (int64), dans l'ordre donné
+        """
+        intern = self.intern
+        return np.fromiter((intern(sensor_id) for sensor_id in sensor_ids),
+                           dtype=np.int64)
+
+    def index_of(self, sensor_id: str) -> Optional[int]:
+        """
+        Retourne l'index d'un capteur sans l'ajouter.
+
+        Args:
+            sensor_id: Identifiant du capteur
+
+        Returns:
+            Index du capteur ou None
+        """
+        return self._index.get(sensor_id)
+
+    def translate(self, other: 'SensorRegistry') -> np.ndarray:
+        """
+        Calcule la correspondance des index d'un autre registre vers
+        celui-ci, en internant les capteurs inconnus.
+
+        Le résultat est mis en cache et seules les nouvelles entrées du
+        registre source sont traitées lors des appels suivants.
+
+        Args:
+            other: Registre source
+
+        Returns:
+            Tableau tel que mapping[index_source] == index_local
+        """
+        if other is self:
+            return np.arange(len(self), dtype=np.int32)
+
+        mapping = self._translations.get(other)
+        if mapping is None:
+            mapping = np.empty(0, dtype=np.int32)
+        start = mapping.shape[0]
+        if start < len(other):
+            extra = np.fromiter(
+                (self.intern(other.ids[i], other.locations[i])
+                 for i in range(start, len(other))),
+                dtype=np.int32, count=len(other) - start
+            )
+            mapping = np.concatenate([mapping, extra])
+            self._translations[other] = mapping
+        return mapping
+
+
+class MeasurementBatch:
+    """Lot de mesures stocké en colonnes NumPy."""
+
+    __slots__ = ('registry', 'sensor_index', 'consumption', 'timestamp')
+
+    def __init__(self, registry: SensorRegistry,
+                 sensor_index: Union[np.ndarray, Sequence[int]],
+                 consumption: Union[np.ndarray, Sequence[float]],
+                 timestamp: Union[np.ndarray, Sequence[int]]):
+        """
+        Initialise un lot de mesures.
+
+        Args:
+            registry: Registre des capteurs référencés par le lot
+            sensor_index: Index des capteurs dans le registre
+            consumption: Consommations en kWh
+            timestamp: Horodatages en microsecondes depuis l'epoch
+        """
+        self.registry = registry
+        self.sensor_index = np.asarray(sensor_index, dtype=np.int32)
+        self.consumption = np.asarray(consumption, dtype=np.float64)
+        self.timestamp = np.asarray(timestamp, dtype=np.int64)
+
+    def __len__(self) -> int:
+        """Nombre de mesures du lot."""
+        return self.consumption.shape[0]
+
+    @classmethod
+    def empty(cls, registry: Optional[SensorRegistry] = None
+              ) -> 'MeasurementBatch':
+        """
+        Crée un lot vide.
+
+        Args:
+            registry: Registre des capteurs (nouveau si absent)
+
+        Returns:
+            Lot sans mesure
+        """
+        return cls(registry if registry is not None else SensorRegistry(),
+                   [], [], [])
+
+    @classmethod
+    def from_dicts(cls, measurements: Iterable[Dict],
+                   registry: Optional[SensorRegistry] = None
+                   ) -> 'MeasurementBatch':
+        """
+        Construit un lot à partir de mesures sous forme de dictionnaires.
+
+        Args:
+            measurements: Mesures contenant sensor_id, consumption_kwh et
+                timestamp (location optionnelle)
+            registry: Registre à utiliser (nouveau si absent)
+
+        Returns:
+            Lot de mesures
+        """
+        registry = registry if registry is not None else SensorRegistry()
+        indexes = []
+        consumption = []
+        timestamps = []
+        for measurement in measurements:
+            indexes.append(registry.intern(measurement['sensor_id'],
+                                           measurement.get('location')))
+            consumption.append(measurement['consumption_kwh'])
+            timestamps.append(measurement['timestamp'])
+        timestamp = np.array(timestamps, dtype=TIMESTAMP_UNIT)
+        return cls(registry, indexes, consumption,
+                   timestamp.astype(np.int64))
+
+    @classmethod
+    def concat(cls, batches: Sequence['MeasurementBatch']
+               ) -> 'MeasurementBatch':
+        """
+        Concatène plusieurs lots partageant le même registre.
+
+        Args:
+            batches: Lots à concaténer
+
+        Returns:
+            Lot unique
+
+        Raises:
+            ValueError: Si les lots utilisent des registres différents
+        """
+        if not batches:
+            return cls.empty()
+        registry = batches[0].registry
+        if any(batch.registry is not registry for batch in batches):
+            raise ValueError("Les lots doivent partager le même registre")
+        return cls(
+            registry,
+            np.concatenate([batch.sensor_index for batch in batches]),
+            np.concatenate([batch.consumption for batch in batches]),
+            np.concatenate([batch.timestamp for batch in batches])
+        )
+
+    def select(self, rows: np.ndarray) -> 'MeasurementBatch':
+        """
+        Extrait un sous-lot.
+
+        Args:
+            rows: Masque booléen ou index des lignes à conserver
+
+        Returns:
+            Sous-lot partageant le même registre
+        """
+        return MeasurementBatch(self.registry, self.sensor_index[rows],
+                                self.consumption[rows], self.timestamp[rows])
+
+    def with_registry(self, registry: SensorRegistry) -> 'MeasurementBatch':
+        """
+        Réexprime le lot dans un autre registre.
+
+        Args:
+            registry: Registre cible
+
+        Returns:
+            Lot dont les index référencent le registre cible
+        """
+        if registry is self.registry:
+            return self
+        mapping = registry.translate(self.registry)
+        return MeasurementBatch(registry, mapping[self.sensor_index],
+                                self.consumption, self.timestamp)
+
+    def values_for(self, sensor_id: str) -> np.ndarray:
+        """
+        Retourne les consommations d'un capteur.
+
+        Args:
+            sensor_id: Identifiant du capteur
+
+        Returns:
+            Tableau des consommations (vide si capteur inconnu)
+        """
+        index = self.registry.index_of(sensor_id)
+        if index is None:
+            return np.empty(0, dtype=np.float64)
+        return self.consumption[self.sensor_index == index]
+
+    def row(self, position: int) -> Dict:
+        """
+        Convertit une ligne du lot en dictionnaire.
+
+        Args:
+            position: Position de la ligne
+
+        Returns:
+            Mesure sous forme de dictionnaire
+        """
+        index = int(self.sensor_index[position])
+        return {
+            'sensor_id': self.registry.ids[index],
+            'location': self.registry.locations[index],
+            'consumption_kwh': float(self.consumption[position]),
+            'timestamp': micros_to_datetime(self.timestamp[position]),
+            'status': 'active'
+        }
+
+    def to_dicts(self) -> List[Dict]:
+        """
+        Convertit le lot en liste de dictionnaires.
+
+        Returns:
+            Liste de mesures au format des documents MongoDB
+        """
+        ids = self.registry.ids
+        locations = self.registry.locations
+        timestamps = self.timestamp.astype(TIMESTAMP_UNIT).tolist()
+        return [
+            {
+                'sensor_id': ids[index],
+                'location': locations[index],
+                'consumption_kwh': value,
+                'timestamp': timestamp,
+                'status': 'active'
+            }
+            for index, value, timestamp in zip(self.sensor_index.tolist(),
+                                               self.consumption.tolist(),
+                                               timestamps)
+        ]
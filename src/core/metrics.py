@@ -0,0 +1,577 @@
+"""
+Métriques du pipeline et export au format texte Prometheus.
+
+Compteurs, jauges et histogrammes sont mis à jour une fois par lot (et
+non par mesure), sous un verrou par métrique : le coût reste de l'ordre
+de la microseconde par appel instrumenté. Un serveur HTTP local expose
+le registre sur /metrics.
+"""
+import bisect
+import functools
+import math
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+
+# Bornes (s) des histogrammes de latence, de 50 µs à 10 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str],
+                   extra: str = '') -> str:
+    """Formate des étiquettes Prometheus ({nom="valeur",...})."""
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    """Formate une valeur Prometheus."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+class _Metric(ABC):
+    """Base commune : nom, aide, étiquettes et verrou."""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        """
+        Initialise la métrique.
+
+        Args:
+            name: Nom Prometheus de la métrique
+            documentation: Texte d'aide
+            labelnames: Noms des étiquettes
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _check(self, labels: Labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name} attend les étiquettes {self.labelnames}"
+            )
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Lignes d'échantillons au format texte."""
+
+    def render(self) -> str:
+        """
+        Formate la métrique au format texte Prometheus.
+
+        Returns:
+            Lignes HELP, TYPE et échantillons
+        """
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class _CounterChild:
+    """Série d'un compteur pour des étiquettes fixées."""
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self, lock: threading.Lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount: float = 1):
+        """Incrémente la série (les valeurs négatives sont ignorées)."""
+        if amount > 0:
+            with self._lock:
+                self.value += amount
+
+
+class Counter(_Metric):
+    """Compteur monotone."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._children: Dict[Labels, _CounterChild] = {}
+
+    def labels(self, labels: Labels = ()) -> _CounterChild:
+        """
+        Retourne la série de valeurs d'étiquettes données.
+
+        La série peut être conservée par l'appelant pour éviter la
+        recherche à chaque incrément sur un chemin critique.
+
+        Args:
+            labels: Valeurs des étiquettes
+
+        Returns:
+            Série du compteur
+        """
+        child = self._children.get(labels)
+        if child is None:
+            self._check(labels)
+            with self._lock:
+                child = self._children.setdefault(labels,
+                                                  _CounterChild(self._lock))
+        return child
+
+    def inc(self, amount: float = 1, labels: Labels = ()):
+        """
+        Incrémente le compteur.
+
+        Args:
+            amount: Valeur à ajouter (positive)
+            labels: Valeurs des étiquettes
+        """
+        if amount > 0:
+            self.labels(labels).inc(amount)
+
+    def value(self, labels: Labels = ()) -> float:
+        """
+        Retourne la valeur du compteur.
+
+        Args:
+            labels: Valeurs des étiquettes
+
+        Returns:
+            Valeur courante (0 si jamais incrémenté)
+        """
+        child = self._children.get(labels)
+        return child.value if child is not None else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, child.value) for labels, child
+                            in self._children.items() if child.value)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} "
+            f"{_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(_Metric):
+    """Valeur instantanée, fixée ou calculée à la lecture."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._functions: Dict[Labels, Callable[[], float]] = {}
+        self._sources: Dict[Labels, weakref.WeakKeyDictionary] = {}
+
+    def set(self, value: float, labels: Labels = ()):
+        """
+        Fixe la valeur de la jauge.
+
+        Args:
+            value: Nouvelle valeur
+            labels: Valeurs des étiquettes
+        """
+        with self._lock:
+            self._functions.pop(labels, None)
+            self._values[labels] = value
+
+    def set_function(self, function: Callable[[], float],
+                     labels: Labels = ()):
+        """
+        Calcule la jauge à chaque export plutôt qu'à chaque mise à jour.
+
+        Args:
+            function: Fonction sans argument retournant la valeur
+            labels: Valeurs des étiquettes
+        """
+        self._check(labels)
+        with self._lock:
+            self._functions[labels] = function
+
+    def track(self, owner: object, function: Callable[[object], float],
+              labels: Labels = ()):
+        """
+        Ajoute à la jauge la valeur d'un objet, tant qu'il existe.
+
+        La jauge vaut la somme des objets suivis : plusieurs instances
+        (détecteurs, ingestions...) y contribuent sans se remplacer, et
+        l'objet n'est pas retenu par la jauge.
+
+        Args:
+            owner: Objet suivi (référencé faiblement)
+            function: Fonction recevant l'objet et retournant sa valeur
+            labels: Valeurs des étiquettes
+        """
+        self._check(labels)
+        with self._lock:
+            self._sources.setdefault(
+                labels, weakref.WeakKeyDictionary()
+            )[owner] = function
+
+    def untrack(self, owner: object, labels: Labels = ()):
+        """
+        Retire un objet suivi par track.
+
+        Args:
+            owner: Objet suivi
+            labels: Valeurs des étiquettes
+        """
+        with self._lock:
+            self._sources.get(labels, {}).pop(owner, None)
+
+    def value(self, labels: Labels = ()) -> float:
+        """
+        Retourne la valeur de la jauge.
+
+        Args:
+            labels: Valeurs des étiquettes
+
+        Returns:
+            Valeur courante (0 si absente)
+        """
+        function = self._functions.get(labels)
+        if function is not None:
+            return function()
+        sources = self._sources.get(labels)
+        if sources is not None:
+            with self._lock:
+                tracked = list(sources.items())
+            return sum(function(owner) for owner, function in tracked)
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            labels = sorted(set(self._values) | set(self._functions)
+                            | set(self._sources))
+        return [
+            f"{self.name}{_format_labels(self.labelnames, label)} "
+            f"{_format_value(self.value(label))}"
+            for label in labels
+        ]
+
+
+class _HistogramChild:
+    """Série d'un histogramme pour des étiquettes fixées."""
+
+    __slots__ = ('buckets', 'counts', 'total', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...], lock: threading.Lock):
+        self.buckets = buckets
+        # Comptes par intervalle (non cumulés)
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self._lock = lock
+
+    def observe(self, value: float):
+        """Enregistre une observation."""
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.total += value
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif à bornes fixes."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        Initialise l'histogramme.
+
+        Args:
+            name: Nom Prometheus de la métrique
+            documentation: Texte d'aide
+            labelnames: Noms des étiquettes
+            buckets: Bornes supérieures croissantes (+Inf ajoutée)
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._children: Dict[Labels, _HistogramChild] = {}
+
+    def labels(self, labels: Labels = ()) -> _HistogramChild:
+        """
+        Retourne la série de valeurs d'étiquettes données.
+
+        Args:
+            labels: Valeurs des étiquettes
+
+        Returns:
+            Série de l'histogramme
+        """
+        child = self._children.get(labels)
+        if child is None:
+            self._check(labels)
+            with self._lock:
+                child = self._children.setdefault(
+                    labels, _HistogramChild(self.buckets, self._lock)
+                )
+        return child
+
+    def observe(self, value: float, labels: Labels = ()):
+        """
+        Enregistre une observation.
+
+        Args:
+            value: Valeur observée (secondes pour une latence)
+            labels: Valeurs des étiquettes
+        """
+        self.labels(labels).observe(value)
+
+    def count(self, labels: Labels = ()) -> int:
+        """
+        Retourne le nombre d'observations.
+
+        Args:
+            labels: Valeurs des étiquettes
+
+        Returns:
+            Nombre d'observations
+        """
+        child = self._children.get(labels)
+        return sum(child.counts) if child is not None else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, (list(child.counts), child.total))
+                            for labels, child in self._children.items())
+        lines = []
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket = _format_labels(self.labelnames, labels,
+                                        f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Ensemble de métriques exportées ensemble."""
+
+    def __init__(self):
+        """Initialise un registre vide."""
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(
+                        f"Métrique déjà déclarée: {metric.name}"
+                    )
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str,
+                labelnames: Sequence[str] = ()) -> Counter:
+        """Déclare (ou retrouve) un compteur."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str,
+              labelnames: Sequence[str] = ()) -> Gauge:
+        """Déclare (ou retrouve) une jauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str,
+                  labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Déclare (ou retrouve) un histogramme."""
+        return self._register(Histogram(name, documentation, labelnames,
+                                        buckets))
+
+    def render(self) -> str:
+        """
+        Formate toutes les métriques au format texte Prometheus.
+
+        Returns:
+            Document d'exposition (version 0.0.4)
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Métriques du pipeline
+READINGS = REGISTRY.counter(
+    'energy_readings_total', 'Mesures produites par les capteurs'
+)
+DOCUMENTS_INSERTED = REGISTRY.counter(
+    'energy_documents_inserted_total', 'Mesures écrites dans le stockage',
+    ('backend',)
+)
+INSERT_FAILURES = REGISTRY.counter(
+    'energy_insert_failures_total', "Mesures dont l'écriture a échoué",
+    ('backend',)
+)
+ANOMALIES = REGISTRY.counter(
+    'energy_anomalies_total', 'Anomalies détectées',
+    ('type', 'severity')
+)
+OPERATION_SECONDS = REGISTRY.histogram(
+    'energy_operation_seconds', 'Durée des lectures et analyses',
+    ('operation',)
+)
+STORAGE_SECONDS = REGISTRY.histogram(
+    'energy_storage_seconds', 'Durée des opérations de stockage',
+    ('operation', 'backend')
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    'energy_queue_depth', "Lots en attente dans les files du pipeline",
+    ('queue',)
+)
+LOCATION_LOAD = REGISTRY.gauge(
+    'energy_location_load_kwh',
+    'Charge du dernier cycle par localisation (* : parc entier)',
+    ('location',)
+)
+LOCATION_ANOMALIES = REGISTRY.counter(
+    'energy_location_anomalies_total',
+    'Anomalies de charge détectées par localisation',
+    ('type', 'severity')
+)
+SENSORS_WITH_BASELINE = REGISTRY.gauge(
+    'energy_sensors_with_baseline', 'Capteurs disposant d\'une baseline'
+)
+
+
+def timed(operation: str):
+    """
+    Décorateur enregistrant la durée d'une méthode de lecture ou
+    d'analyse dans OPERATION_SECONDS.
+
+    Args:
+        operation: Valeur de l'étiquette operation
+    """
+    observe = OPERATION_SECONDS.labels((operation,)).observe
+    clock = time.perf_counter
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                observe(clock() - started)
+        return wrapper
+    return decorator
+
+
+def timed_storage(operation: str):
+    """
+    Décorateur enregistrant la durée d'une méthode de stockage dans
+    STORAGE_SECONDS, étiquetée par le moteur (attribut backend_name).
+
+    Args:
+        operation: Valeur de l'étiquette operation
+    """
+    children: Dict[str, _HistogramChild] = {}
+    clock = time.perf_counter
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            started = clock()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                child = children.get(self.backend_name)
+                if child is None:
+                    child = children[self.backend_name] = \
+                        STORAGE_SECONDS.labels((operation,
+                                                self.backend_name))
+                child.observe(clock() - started)
+        return wrapper
+    return decorator
+
+
+class MetricsServer:
+    """Serveur HTTP local exposant un registre sur /metrics."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY,
+                 host: str = '127.0.0.1', port: int = 9108):
+        """
+        Initialise le serveur.
+
+        Args:
+            registry: Registre exporté
+            host: Adresse d'écoute
+            port: Port d'écoute (0 pour un port libre)
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        """
+        Démarre le serveur dans un thread.
+
+        Returns:
+            Port effectivement utilisé
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='metrics-server', daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Arrête le serveur."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
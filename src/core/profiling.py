@@ -0,0 +1,276 @@
+"""
+Profilage échantillonné des cycles de surveillance.
+
+Les étapes du pipeline (lecture des capteurs, analyse, stockage) sont
+enveloppées par CycleProfiler.wrap. Le n-ième appel de chaque étape
+correspond au n-ième lot : une fraction des lots est profilée avec
+cProfile (temps par fonction) et, en option, tracemalloc (allocations
+par ligne). Chaque lot échantillonné produit un rapport par étape, et un
+résumé agrégé des points chauds est écrit à la fermeture.
+
+Désactivé, le profilage ne coûte rien : les étapes ne sont pas
+enveloppées. Activé, les appels échantillonnés sont profilés un à la
+fois (cProfile n'accepte qu'un profileur actif à partir de Python 3.12)
+et s'attendent entre eux ; les appels non échantillonnés et les rapports
+ne prennent qu'un verrou de comptage, jamais tenu pendant un appel.
+
+tracemalloc ralentit toutes les allocations du processus, et ses
+photographies couvrent tout le processus : les allocations faites par
+d'autres threads pendant un appel profilé (étapes concurrentes du
+pipeline) sont comptées dans son rapport.
+"""
+import cProfile
+import functools
+import io
+import math
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+# Étapes du pipeline
+STAGES = ('sensors', 'analysis', 'storage')
+
+# Allocations du profileur lui-même, exclues des rapports
+_OWN_ALLOCATIONS = (tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__))
+
+
+class StageTotals:
+    """Cumul des échantillons d'une étape."""
+
+    def __init__(self):
+        """Initialise des cumuls vides."""
+        self.samples = 0
+        self.wall = 0.0
+        self.allocated = 0
+        self.stats: Optional[pstats.Stats] = None
+        self.allocations: Dict[str, int] = defaultdict(int)
+
+
+class CycleProfiler:
+    """Profileur d'une fraction des cycles, par étape du pipeline."""
+
+    def __init__(self, sample_rate: float = 0.1,
+                 output_dir: Optional[str] = 'profiles',
+                 memory: bool = True, top: int = 15):
+        """
+        Initialise le profileur.
+
+        Args:
+            sample_rate: Fraction des cycles profilés (0 à 1), répartis
+                régulièrement à partir du premier
+            output_dir: Répertoire des rapports (aucun fichier si None)
+            memory: Mesure aussi les allocations avec tracemalloc (tous
+                threads confondus)
+            top: Nombre de fonctions et de lignes retenues par rapport
+
+        Raises:
+            ValueError: Si la fraction n'est pas comprise entre 0 et 1
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("La fraction profilée doit être entre 0 et 1")
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.memory = memory
+        self.top = top
+        # Verrou des compteurs et cumuls ; le profileur a le sien, tenu
+        # pendant l'appel profilé
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._totals: Dict[str, StageTotals] = defaultdict(StageTotals)
+        self._started_tracemalloc = False
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        if memory and sample_rate > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def is_sampled(self, cycle: int) -> bool:
+        """
+        Indique si un cycle est profilé.
+
+        Args:
+            cycle: Numéro du cycle (à partir de 0)
+
+        Returns:
+            True si le cycle fait partie de l'échantillon
+        """
+        return math.floor(cycle * self.sample_rate) != \
+            math.floor((cycle - 1) * self.sample_rate)
+
+    def wrap(self, stage: str, function: Callable) -> Callable:
+        """
+        Enveloppe une étape du pipeline.
+
+        Args:
+            stage: Nom de l'étape (voir STAGES)
+            function: Fonction de l'étape
+
+        Returns:
+            Fonction profilant les cycles échantillonnés (la fonction
+            d'origine si aucun cycle n'est profilé)
+        """
+        if self.sample_rate == 0:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self._lock:
+                cycle = self._calls[stage]
+                self._calls[stage] += 1
+            if not self.is_sampled(cycle):
+                return function(*args, **kwargs)
+            return self._profile(stage, cycle, function, args, kwargs)
+        return wrapper
+
+    def _profile(self, stage: str, cycle: int, function: Callable,
+                 args, kwargs):
+        """Exécute un appel échantillonné sous cProfile et tracemalloc."""
+        self._profile_lock.acquire()
+        try:
+            before = self._snapshot() if self.memory else None
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            profile.enable()
+        except BaseException:
+            self._profile_lock.release()
+            raise
+        try:
+            return function(*args, **kwargs)
+        finally:
+            try:
+                profile.disable()
+                wall = time.perf_counter() - started
+                allocations = []
+                if before is not None:
+                    after = self._snapshot()
+                    allocations = [
+                        (str(diff.traceback[0]), diff.size_diff)
+                        for diff in after.compare_to(before, 'lineno')
+                        if diff.size_diff > 0
+                    ]
+            finally:
+                self._profile_lock.release()
+            self._record(stage, cycle, wall, profile, allocations)
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        """Photographie les allocations, hors profileur."""
+        return tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+
+    def _record(self, stage: str, cycle: int, wall: float,
+                profile: cProfile.Profile, allocations: List):
+        """Cumule un échantillon et écrit son rapport."""
+        with self._lock:
+            totals = self._totals[stage]
+            totals.samples += 1
+            totals.wall += wall
+            totals.allocated += sum(size for _, size in allocations)
+            for line, size in allocations:
+                totals.allocations[line] += size
+            if totals.stats is None:
+                totals.stats = pstats.Stats(profile)
+            else:
+                totals.stats.add(profile)
+
+        if not self.output_dir:
+            return
+        name = os.path.join(self.output_dir, f"cycle_{cycle:06d}.{stage}")
+        profile.dump_stats(name + '.prof')
+        with open(name + '.txt', 'w', encoding='utf-8') as report:
+            report.write(f"Cycle {cycle} - étape {stage}\n")
+            report.write(f"Durée: {wall * 1000:.3f} ms\n")
+            if self.memory:
+                report.write(
+                    f"Allocations: {sum(s for _, s in allocations)} o\n"
+                )
+                for line, size in allocations[:self.top]:
+                    report.write(f"  {size:>10} o  {line}\n")
+            report.write('\n')
+            report.write(self._format_stats(pstats.Stats(profile)))
+
+    def _format_stats(self, stats: pstats.Stats) -> str:
+        """Formate les fonctions les plus coûteuses (temps cumulé)."""
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats('cumulative').print_stats(self.top)
+        return stream.getvalue()
+
+    def report(self) -> Dict[str, Dict]:
+        """
+        Retourne le résumé agrégé par étape.
+
+        Returns:
+            Par étape : nombre d'échantillons, durée totale et moyenne (s),
+            octets alloués, fonctions les plus coûteuses (nom, temps
+            cumulé en s) et lignes allouant le plus (ligne, octets)
+        """
+        summary = {}
+        with self._lock:
+            for stage, totals in self._totals.items():
+                functions = []
+                if totals.stats is not None:
+                    entries = sorted(totals.stats.stats.items(),
+                                     key=lambda item: item[1][3],
+                                     reverse=True)
+                    functions = [
+                        (pstats.func_std_string(func), entry[3])
+                        for func, entry in entries[:self.top]
+                    ]
+                allocations = sorted(totals.allocations.items(),
+                                     key=lambda item: item[1],
+                                     reverse=True)[:self.top]
+                summary[stage] = {
+                    'samples': totals.samples,
+                    'wall_seconds': totals.wall,
+                    'mean_seconds': totals.wall / totals.samples,
+                    'allocated_bytes': totals.allocated,
+                    'functions': functions,
+                    'allocations': allocations
+                }
+        return summary
+
+    def summary(self) -> str:
+        """
+        Formate le résumé agrégé des points chauds.
+
+        Returns:
+            Texte du résumé, une section par étape
+        """
+        lines = []
+        for stage, data in sorted(self.report().items()):
+            lines.append(
+                f"== {stage}: {data['samples']} cycles profilés, "
+                f"{data['mean_seconds'] * 1000:.3f} ms en moyenne, "
+                f"{data['allocated_bytes']} o alloués"
+            )
+            for function, cumulative in data['functions']:
+                lines.append(f"  {cumulative * 1000:>10.3f} ms  {function}")
+            if data['allocations']:
+                lines.append("  Allocations:")
+                for line, size in data['allocations']:
+                    lines.append(f"  {size:>10} o  {line}")
+            lines.append('')
+        return '\n'.join(lines)
+
+    def close(self) -> Optional[str]:
+        """
+        Écrit le résumé agrégé et arrête tracemalloc s'il a été démarré ici.
+
+        Returns:
+            Chemin du résumé, ou None sans répertoire de rapports
+        """
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if not self.output_dir:
+            return None
+        path = os.path.join(self.output_dir, 'summary.txt')
+        with open(path, 'w', encoding='utf-8') as summary:
+            summary.write(self.summary())
+        return path
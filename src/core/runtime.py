@@ -0,0 +1,298 @@
+"""
+Boucle de surveillance asyncio à cadence fixe.
+
+Chaque groupe de capteurs possède son propre intervalle de lecture. Les
+échéances sont calculées depuis l'instant de départ (start + n * période)
+et non depuis la fin du cycle précédent : la cadence ne dérive pas. Une
+échéance dépassée d'une période complète ou plus est comptée comme
+manquée et sautée.
+
+Lecture, persistance et détection sont des étapes concurrentes reliées
+par des files bornées ; persistance et détection s'exécutent dans des
+threads, ce qui recouvre les entrées/sorties et le calcul.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from src.core.measurement_batch import MeasurementBatch
+from src.core.metrics import QUEUE_DEPTH
+
+_STOP = object()
+
+
+class SensorGroup:
+    """Capteurs lus ensemble à un intervalle donné."""
+
+    def __init__(self, name: str, interval: float,
+                 sensor_ids: Optional[Sequence[str]] = None):
+        """
+        Initialise un groupe.
+
+        Args:
+            name: Nom du groupe (clé des statistiques de cadence)
+            interval: Période de lecture en secondes
+            sensor_ids: Capteurs du groupe (tous si absent)
+
+        Raises:
+            ValueError: Si l'intervalle n'est pas strictement positif
+        """
+        if interval <= 0:
+            raise ValueError("L'intervalle de lecture doit être positif")
+        self.name = name
+        self.interval = interval
+        self.sensor_ids = list(sensor_ids) if sensor_ids is not None \
+            else None
+
+
+def group_by_interval(sensor_ids: Iterable[str], default_interval: float,
+                      intervals: Optional[Dict[str, float]] = None
+                      ) -> List[SensorGroup]:
+    """
+    Regroupe des capteurs par intervalle de lecture.
+
+    Args:
+        sensor_ids: Identifiants des capteurs
+        default_interval: Intervalle des capteurs sans réglage propre
+        intervals: Intervalle propre à certains capteurs
+
+    Returns:
+        Un groupe par intervalle distinct
+    """
+    intervals = intervals or {}
+    groups: Dict[float, List[str]] = defaultdict(list)
+    for sensor_id in sensor_ids:
+        groups[intervals.get(sensor_id, default_interval)].append(sensor_id)
+    return [SensorGroup(f"{interval:g}s", interval, members)
+            for interval, members in sorted(groups.items())]
+
+
+class TickStats:
+    """Statistiques de cadence d'un groupe."""
+
+    def __init__(self):
+        """Initialise des compteurs vides."""
+        self.ticks = 0
+        self.missed = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def record(self, lag: float):
+        """
+        Enregistre un cycle exécuté.
+
+        Args:
+            lag: Retard (s) du cycle sur son échéance
+        """
+        self.ticks += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def as_dict(self) -> Dict:
+        """
+        Retourne les statistiques sous forme de dictionnaire.
+
+        Returns:
+            Cycles exécutés, cycles manqués, retard moyen et maximal (s)
+        """
+        return {
+            'ticks': self.ticks,
+            'missed': self.missed,
+            'mean_lag': self.total_lag / self.ticks if self.ticks else 0.0,
+            'max_lag': self.max_lag
+        }
+
+
+class MonitoringRuntime:
+    """Pipeline lecture → persistance / détection cadencé par asyncio."""
+
+    def __init__(self, read: Callable[[Optional[Sequence[str]]],
+                                      MeasurementBatch],
+                 persist: Optional[Callable[[MeasurementBatch], object]]
+                 = None,
+                 groups: Optional[Sequence[SensorGroup]] = None,
+                 queue_size: int = 64):
+        """
+        Initialise le pipeline.
+
+        Args:
+            read: Lecture d'un groupe de capteurs (SensorNetwork.read_batch
+                par exemple), appelée dans la boucle d'événements
+            persist: Écriture d'un lot (WriteBehindIngestor.submit ou
+                insert_measurements d'un stockage), appelée dans un thread
+            groups: Groupes de capteurs (un seul groupe de tous les
+                capteurs à 1 s si absent)
+            queue_size: Nombre maximal de lots en attente par étape
+        """
+        self.read = read
+        self.persist = persist
+        self.groups = list(groups) if groups else [SensorGroup('all', 1.0)]
+        self.queue_size = queue_size
+        self.stats: Dict[str, TickStats] = {
+            group.name: TickStats() for group in self.groups
+        }
+
+    def run(self, cycles: Optional[int] = None,
+            duration: Optional[float] = None,
+            detect: Optional[Callable[[MeasurementBatch], object]] = None,
+            on_result: Optional[Callable[[MeasurementBatch, object], None]]
+            = None) -> Dict[str, Dict]:
+        """
+        Exécute le pipeline jusqu'à épuisement des cycles ou de la durée.
+
+        Args:
+            cycles: Nombre de cycles exécutés par groupe (optionnel)
+            duration: Durée maximale en secondes (optionnelle)
+            detect: Traitement d'un lot (AnomalyDetector.analyze_batch ou
+                ingest), appelé dans un thread, un lot à la fois
+            on_result: Rappel recevant chaque lot et le résultat de
+                detect, appelé dans la boucle d'événements
+
+        Returns:
+            Statistiques de cadence par groupe (voir report)
+
+        Raises:
+            ValueError: Si ni cycles ni duration n'est fourni
+        """
+        asyncio.run(self.run_async(cycles, duration, detect, on_result))
+        return self.report()
+
+    async def run_async(self, cycles: Optional[int] = None,
+                        duration: Optional[float] = None,
+                        detect: Optional[Callable] = None,
+                        on_result: Optional[Callable] = None):
+        """
+        Version coroutine de run, pour une boucle d'événements existante.
+
+        Args:
+            cycles: Nombre de cycles exécutés par groupe (optionnel)
+            duration: Durée maximale en secondes (optionnelle)
+            detect: Traitement d'un lot, appelé dans un thread
+            on_result: Rappel recevant chaque lot et le résultat de detect
+
+        Raises:
+            ValueError: Si ni cycles ni duration n'est fourni
+        """
+        if cycles is None and duration is None:
+            raise ValueError("cycles ou duration est requis")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration if duration is not None else None
+        queues = []
+        stages = []
+        names = []
+        if self.persist is not None:
+            queues.append(asyncio.Queue(self.queue_size))
+            stages.append(self._consume(queues[-1], self.persist))
+            names.append('persist')
+        if detect is not None:
+            queues.append(asyncio.Queue(self.queue_size))
+            stages.append(self._consume(queues[-1], detect, on_result))
+            names.append('detect')
+        for name, queue in zip(names, queues):
+            QUEUE_DEPTH.track(queue, asyncio.Queue.qsize, (name,))
+
+        self.stats = {group.name: TickStats() for group in self.groups}
+        consumers = [asyncio.ensure_future(stage) for stage in stages]
+        producers = asyncio.ensure_future(asyncio.gather(*(
+            self._tick(group, queues, cycles, deadline)
+            for group in self.groups
+        )))
+        try:
+            await self._supervise(producers, consumers)
+            for queue in queues:
+                await self._supervise(queue.put(_STOP), consumers)
+            await asyncio.gather(*consumers)
+        finally:
+            producers.cancel()
+            for consumer in consumers:
+                consumer.cancel()
+            # Les exceptions des tâches annulées ou en échec sont relevées
+            # ici pour ne pas être signalées comme jamais récupérées
+            await asyncio.gather(producers, *consumers,
+                                 return_exceptions=True)
+            for name, queue in zip(names, queues):
+                QUEUE_DEPTH.untrack(queue, (name,))
+
+    @staticmethod
+    async def _supervise(awaitable, consumers: List[asyncio.Future]):
+        """
+        Attend une tâche en surveillant les étapes de traitement.
+
+        Une étape en échec interrompt l'attente : une écriture dans une
+        file pleine dont l'étape est arrêtée ne bloque pas le pipeline.
+
+        Args:
+            awaitable: Tâche ou coroutine attendue
+            consumers: Tâches des étapes de traitement
+
+        Returns:
+            Résultat de la tâche
+
+        Raises:
+            Exception: Erreur de la première étape en échec
+        """
+        task = asyncio.ensure_future(awaitable)
+        try:
+            while not task.done():
+                running = [consumer for consumer in consumers
+                           if not consumer.done()]
+                await asyncio.wait([task, *running],
+                                   return_when=asyncio.FIRST_COMPLETED)
+                for consumer in consumers:
+                    if consumer.done():
+                        consumer.result()
+            return task.result()
+        finally:
+            task.cancel()
+
+    async def _tick(self, group: SensorGroup, queues: List[asyncio.Queue],
+                    cycles: Optional[int], deadline: Optional[float]):
+        """Lit un groupe à cadence fixe et diffuse ses lots."""
+        loop = asyncio.get_running_loop()
+        stats = self.stats[group.name]
+        start = loop.time()
+        tick = 0
+        executed = 0
+        while cycles is None or executed < cycles:
+            scheduled = start + tick * group.interval
+            if deadline is not None and scheduled >= deadline:
+                return
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag = loop.time() - scheduled
+            if lag >= group.interval:
+                # Échéances dépassées : rattrapage sans rafale
+                skipped = int(lag // group.interval)
+                stats.missed += skipped
+                tick += skipped
+                lag -= skipped * group.interval
+            stats.record(lag)
+            batch = self.read(group.sensor_ids)
+            for queue in queues:
+                await queue.put(batch)
+            tick += 1
+            executed += 1
+
+    async def _consume(self, queue: asyncio.Queue,
+                       handler: Callable[[MeasurementBatch], object],
+                       on_result: Optional[Callable] = None):
+        """Traite les lots d'une file dans un thread, un à la fois."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await queue.get()
+            if batch is _STOP:
+                return
+            result = await loop.run_in_executor(None, handler, batch)
+            if on_result is not None:
+                on_result(batch, result)
+
+    def report(self) -> Dict[str, Dict]:
+        """
+        Retourne les statistiques de cadence.
+
+        Returns:
+            Par groupe : cycles exécutés, cycles manqués, retard moyen et
+            maximal en secondes
+        """
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
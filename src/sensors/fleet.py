@@ -0,0 +1,276 @@
+"""
+Représentation vectorisée d'un parc de capteurs IoT.
+
+Les caractéristiques des capteurs (consommation de base, variance, état)
+sont conservées dans des tableaux NumPy afin de produire toutes les
+lectures d'un cycle en un seul tirage.
+
+Deux index secondaires (capteurs présents par localisation, capteurs
+inactifs) sont tenus à jour à chaque ajout, retrait ou changement
+d'état : la sélection d'une localisation et l'activation en masse
+coûtent O(sous-ensemble) et non O(parc).
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+import numpy as np
+
+from src.config.settings import SENSOR_CONFIG
+from src.core.measurement_batch import (
+    MeasurementBatch, SensorRegistry, datetime_to_micros
+)
+
+
+class SensorFleet:
+    """Parc de capteurs stocké sous forme de tableaux NumPy."""
+
+    def __init__(self, capacity: int = 64,
+                 registry: Optional[SensorRegistry] = None):
+        """
+        Initialise un parc vide.
+
+        Args:
+            capacity: Capacité initiale des tableaux
+            registry: Registre des capteurs (nouveau si absent)
+        """
+        self.registry = registry if registry is not None \
+            else SensorRegistry()
+        capacity = max(1, capacity)
+        self.base_consumption = np.zeros(capacity, dtype=np.float64)
+        self.variance = np.zeros(capacity, dtype=np.float64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.present = np.zeros(capacity, dtype=bool)
+        self._by_location: Dict[Optional[str], Set[int]] = {}
+        self._inactive: Set[int] = set()
+
+    def __len__(self) -> int:
+        """Nombre d'emplacements alloués (capteurs retirés inclus)."""
+        return len(self.registry)
+
+    @property
+    def sensor_ids(self):
+        """Identifiants des capteurs, dans l'ordre des index."""
+        return self.registry.ids
+
+    @property
+    def locations(self):
+        """Localisations des capteurs, dans l'ordre des index."""
+        return self.registry.locations
+
+    def _grow(self, needed: int):
+        """Agrandit les tableaux pour contenir au moins `needed` capteurs."""
+        capacity = self.base_consumption.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('base_consumption', 'variance', 'active', 'present'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:old.shape[0]] = old
+            setattr(self, name, new)
+
+    def add(self, sensor_id: str, location: str,
+            base_consumption: float, variance: float,
+            is_active: bool = True) -> int:
+        """
+        Ajoute (ou remplace) un capteur dans le parc.
+
+        Un identifiant déjà connu réutilise son emplacement, ce qui garde
+        les index stables pendant toute la vie du parc.
+
+        Args:
+            sensor_id: Identifiant unique du capteur
+            location: Localisation du capteur
+            base_consumption: Consommation de base en kWh
+            variance: Variance de la consommation
+            is_active: État initial du capteur
+
+        Returns:
+            Index du capteur dans les tableaux
+        """
+        return int(self.add_many([sensor_id], [location],
+                                 [base_consumption], [variance],
+                                 [is_active])[0])
+
+    def add_many(self, sensor_ids: Iterable[str],
+                 locations: Iterable[Optional[str]],
+                 base_consumption, variance,
+                 is_active=None) -> np.ndarray:
+        """
+        Ajoute (ou remplace) plusieurs capteurs en une fois.
+
+        Args:
+            sensor_ids: Identifiants des capteurs
+            locations: Localisations, dans le même ordre
+            base_consumption: Consommations de base en kWh
+            variance: Variances de la consommation
+            is_active: États initiaux (tous actifs si absent)
+
+        Returns:
+            Index des capteurs dans les tableaux (int64)
+        """
+        registry = self.registry
+        previous = registry.locations
+        indexes = []
+        for sensor_id, location in zip(sensor_ids, locations):
+            index = registry.index_of(sensor_id)
+            if index is not None:
+                self._unindex(index, previous[index])
+            index = registry.intern(sensor_id, location)
+            self._by_location.setdefault(location, set()).add(index)
+            indexes.append(index)
+        indexes = np.asarray(indexes, dtype=np.int64)
+        if not indexes.shape[0]:
+            return indexes
+        self._grow(int(indexes.max()) + 1)
+        self.base_consumption[indexes] = base_consumption
+        self.variance[indexes] = variance
+        self.present[indexes] = True
+        self.active[indexes] = True
+        if is_active is not None:
+            self.set_active(indexes, is_active)
+        return indexes
+
+    def _unindex(self, index: int, location: Optional[str]):
+        """Retire un capteur des index secondaires."""
+        members = self._by_location.get(location)
+        if members is not None:
+            members.discard(index)
+            if not members:
+                del self._by_location[location]
+        self._inactive.discard(index)
+
+    def remove(self, sensor_id: str):
+        """
+        Retire un capteur du parc sans déplacer les autres.
+
+        Args:
+            sensor_id: Identifiant du capteur à retirer
+        """
+        index = self.index_of(sensor_id)
+        if index is not None:
+            self._unindex(index, self.registry.locations[index])
+            self.present[index] = False
+
+    def set_active(self, indexes, is_active=True):
+        """
+        Change l'état de capteurs présents.
+
+        Args:
+            indexes: Index des capteurs (entier ou tableau)
+            is_active: Nouvel état (booléen ou tableau de booléens)
+        """
+        indexes = np.atleast_1d(np.asarray(indexes, dtype=np.int64))
+        states = np.broadcast_to(np.asarray(is_active, dtype=bool),
+                                 indexes.shape)
+        self.active[indexes] = states
+        self._inactive.difference_update(indexes[states].tolist())
+        self._inactive.update(indexes[~states].tolist())
+
+    def location_names(self) -> Dict[Optional[str], int]:
+        """
+        Localisations du parc.
+
+        Returns:
+            Nombre de capteurs présents par localisation
+        """
+        return {location: len(members)
+                for location, members in self._by_location.items()}
+
+    def at_location(self, location: Optional[str],
+                    active: Optional[bool] = None) -> np.ndarray:
+        """
+        Retourne les capteurs présents d'une localisation.
+
+        Args:
+            location: Localisation recherchée
+            active: Ne garder que les capteurs actifs (True) ou inactifs
+                (False) ; tous si absent
+
+        Returns:
+            Index des capteurs (int64), par ordre croissant
+        """
+        indexes = np.fromiter(self._by_location.get(location, ()),
+                              dtype=np.int64)
+        indexes.sort()
+        if active is None:
+            return indexes
+        return indexes[self.active[indexes] == active]
+
+    def inactive_indexes(self) -> np.ndarray:
+        """
+        Retourne les capteurs présents et inactifs.
+
+        Returns:
+            Index des capteurs (int64), par ordre croissant
+        """
+        indexes = np.fromiter(self._inactive, dtype=np.int64)
+        indexes.sort()
+        return indexes
+
+    def index_of(self, sensor_id: str) -> Optional[int]:
+        """
+        Retourne l'index d'un capteur présent dans le parc.
+
+        Args:
+            sensor_id: Identifiant du capteur
+
+        Returns:
+            Index du capteur ou None
+        """
+        index = self.registry.index_of(sensor_id)
+        if index is None or not self.present[index]:
+            return None
+        return index
+
+    def readable(self, indexes: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Retourne les index des capteurs présents et actifs.
+
+        Args:
+            indexes: Capteurs candidats (tous si absent)
+
+        Returns:
+            Index des capteurs lisibles, dans l'ordre des candidats
+        """
+        size = len(self.registry)
+        if indexes is None:
+            return np.flatnonzero(self.active[:size] & self.present[:size])
+        indexes = np.asarray(indexes, dtype=np.int64)
+        return indexes[self.active[indexes] & self.present[indexes]]
+
+    def read_cycle(self, rng: np.random.Generator,
+                   indexes: Optional[np.ndarray] = None) -> MeasurementBatch:
+        """
+        Génère les lectures des capteurs actifs en un tirage.
+
+        La distribution par capteur est identique à celle de
+        IoTSensor.read_consumption : variation uniforme autour de la
+        consommation de base, puis pic occasionnel multiplicatif.
+
+        Args:
+            rng: Générateur aléatoire NumPy
+            indexes: Capteurs à lire (tous si absent)
+
+        Returns:
+            Lot des mesures du cycle, partageant un horodatage commun
+        """
+        readable = self.readable(indexes)
+        variance = self.variance[readable]
+        consumption = self.base_consumption[readable] + rng.uniform(
+            -variance, variance
+        )
+
+        spikes = rng.random(readable.shape[0]) < \
+            SENSOR_CONFIG['anomaly_probability']
+        low, high = SENSOR_CONFIG['anomaly_factor_range']
+        consumption[spikes] *= rng.uniform(low, high,
+                                           np.count_nonzero(spikes))
+
+        np.round(consumption, 2, out=consumption)
+        timestamp = np.full(readable.shape[0],
+                            datetime_to_micros(datetime.now()),
+                            dtype=np.int64)
+        return MeasurementBatch(self.registry, readable, consumption,
+                                timestamp)
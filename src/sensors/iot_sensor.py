@@ -3,11 +3,33 @@ Module de simulation des capteurs IoT pour la consommation énergétique.
 """
 import random
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config.settings import SENSOR_CONFIG
+from src.core.measurement_batch import MeasurementBatch, SensorRegistry
+from src.core.metrics import READINGS, timed
+from src.sensors.fleet import SensorFleet
+from src.sensors.sharded import ShardedSimulator
+
+
+# Description d'un capteur : (identifiant, localisation, consommation de
+# base, variance, actif)
+SensorRecord = Tuple[str, str, float, float, bool]
 
 
 class IoTSensor:
-    """Classe représentant un capteur IoT simulé."""
+    """
+    Classe représentant un capteur IoT simulé.
+
+    Les attributs sont déclarés dans __slots__ : un capteur rattaché à un
+    parc ne garde que son identifiant, sa localisation et son index, ses
+    caractéristiques étant lues dans les tableaux du parc.
+    """
+
+    __slots__ = ('sensor_id', 'location', '_fleet', '_index',
+                 '_base_consumption', '_variance', '_is_active')
 
     def __init__(self, sensor_id: str, location: str,
                  base_consumption: float = 100.0,
@@ -23,9 +45,70 @@ class IoTSensor:
         """
         self.sensor_id = sensor_id
         self.location = location
-        self.base_consumption = base_consumption
-        self.variance = variance
-        self.is_active = True
+        self._fleet = None
+        self._index = None
+        self._base_consumption = base_consumption
+        self._variance = variance
+        self._is_active = True
+
+    def _attach(self, fleet: SensorFleet, index: int):
+        """
+        Rattache le capteur aux tableaux d'un parc vectorisé.
+
+        Args:
+            fleet: Parc contenant les caractéristiques du capteur
+            index: Index du capteur dans le parc
+        """
+        self._fleet = fleet
+        self._index = index
+
+    def _detach(self):
+        """Recopie l'état du parc dans le capteur et l'en détache."""
+        if self._fleet is not None:
+            self._base_consumption = self.base_consumption
+            self._variance = self.variance
+            self._is_active = self.is_active
+            self._fleet = None
+            self._index = None
+
+    @property
+    def base_consumption(self) -> float:
+        """Consommation de base en kWh."""
+        if self._fleet is not None:
+            return float(self._fleet.base_consumption[self._index])
+        return self._base_consumption
+
+    @base_consumption.setter
+    def base_consumption(self, value: float):
+        self._base_consumption = value
+        if self._fleet is not None:
+            self._fleet.base_consumption[self._index] = value
+
+    @property
+    def variance(self) -> float:
+        """Variance de la consommation."""
+        if self._fleet is not None:
+            return float(self._fleet.variance[self._index])
+        return self._variance
+
+    @variance.setter
+    def variance(self, value: float):
+        self._variance = value
+        if self._fleet is not None:
+            self._fleet.variance[self._index] = value
+
+    @property
+    def is_active(self) -> bool:
+        """Indique si le capteur produit des lectures."""
+        if self._fleet is not None:
+            return bool(self._fleet.active[self._index])
+        return self._is_active
+
+    @is_active.setter
+    def is_active(self, value: bool):
+        self._is_active = value
+        if self._fleet is not None:
+            self._fleet.set_active(self._index, value)
 
     def read_consumption(self) -> Optional[Dict]:
         """
@@ -43,8 +126,10 @@ class IoTSensor:
         )
 
         # Simulation d'anomalies occasionnelles (5% de chance)
-        if random.random() < 0.05:
-            consumption *= random.uniform(2.0, 3.0)
+        if random.random() < SENSOR_CONFIG['anomaly_probability']:
+            consumption *= random.uniform(
+                *SENSOR_CONFIG['anomaly_factor_range']
+            )
 
         measurement = {
             'sensor_id': self.sensor_id,
@@ -68,9 +153,30 @@ class IoTSensor:
 class SensorNetwork:
     """Gestion d'un réseau de capteurs IoT."""
 
-    def __init__(self):
-        """Initialise le réseau de capteurs."""
+    def __init__(self, vectorized: bool = False,
+                 seed: Optional[int] = None, workers: int = 0):
+        """
+        Initialise le réseau de capteurs.
+
+        Args:
+            vectorized: Lire tous les capteurs en un seul tirage NumPy
+            seed: Graine du générateur utilisé en mode vectorisé ou
+                réparti
+            workers: Nombre de processus de simulation ; au-delà de 0,
+                chaque capteur a son propre flux aléatoire et les
+                lectures ne dépendent que de la graine, pas du nombre
+                de processus (implique le mode vectorisé)
+        """
         self.sensors = {}
+        self.vectorized = vectorized or workers > 0
+        self.fleet = SensorFleet()
+        self.registry: SensorRegistry = self.fleet.registry
+        self._rng = np.random.default_rng(seed)
+        self.simulator: Optional[ShardedSimulator] = None
+        if workers > 0:
+            if seed is None:
+                seed = int(np.random.SeedSequence().entropy)
+            self.simulator = ShardedSimulator(self.fleet, seed, workers)
 
     def add_sensor(self, sensor: IoTSensor):
         """
@@ -79,7 +185,50 @@ class SensorNetwork:
         Args:
             sensor: Instance de IoTSensor à ajouter
         """
+        previous = self.sensors.get(sensor.sensor_id)
+        if previous is not None and previous is not sensor:
+            previous._detach()
+        sensor._detach()
+        index = self.fleet.add(sensor.sensor_id, sensor.location,
+                               sensor.base_consumption, sensor.variance,
+                               sensor.is_active)
+        sensor._attach(self.fleet, index)
         self.sensors[sensor.sensor_id] = sensor
+        self._reshard()
+
+    def add_sensors(self, records: Iterable[SensorRecord]) -> int:
+        """
+        Ajoute plusieurs capteurs au réseau en une fois.
+
+        Les caractéristiques sont écrites dans les tableaux du parc par
+        blocs ; chaque capteur créé y est directement rattaché.
+
+        Args:
+            records: Capteurs (identifiant, localisation, consommation
+                de base, variance, actif)
+
+        Returns:
+            Nombre de capteurs ajoutés ou remplacés
+        """
+        records = list(records)
+        if not records:
+            return 0
+        sensor_ids, locations, base, variance, active = zip(*records)
+        # Les capteurs remplacés gardent leurs caractéristiques : ils sont
+        # détachés avant que le parc ne les écrase
+        for sensor_id in sensor_ids:
+            previous = self.sensors.get(sensor_id)
+            if previous is not None:
+                previous._detach()
+        indexes = self.fleet.add_many(sensor_ids, locations, base, variance,
+                                      active)
+        for sensor_id, location, index in zip(sensor_ids, locations,
+                                              indexes.tolist()):
+            sensor = IoTSensor(sensor_id, location)
+            sensor._attach(self.fleet, index)
+            self.sensors[sensor_id] = sensor
+        self._reshard()
+        return len(records)
 
     def remove_sensor(self, sensor_id: str):
         """
@@ -89,8 +238,93 @@ class SensorNetwork:
             sensor_id: Identifiant du capteur à retirer
         """
         if sensor_id in self.sensors:
+            self.sensors[sensor_id]._detach()
+            self.fleet.remove(sensor_id)
             del self.sensors[sensor_id]
 
+    def locations(self) -> Dict[str, int]:
+        """
+        Localisations du réseau.
+
+        Returns:
+            Nombre de capteurs par localisation
+        """
+        return self.fleet.location_names()
+
+    def sensor_ids_at(self, location: str,
+                      active: Optional[bool] = None) -> List[str]:
+        """
+        Liste les capteurs d'une localisation, via l'index secondaire.
+
+        Args:
+            location: Localisation recherchée
+            active: Ne garder que les capteurs actifs (True) ou inactifs
+                (False) ; tous si absent
+
+        Returns:
+            Identifiants des capteurs
+        """
+        ids = self.registry.ids
+        return [ids[index] for index in
+                self.fleet.at_location(location, active).tolist()]
+
+    def inactive_sensor_ids(self) -> List[str]:
+        """
+        Liste les capteurs inactifs, via l'index secondaire.
+
+        Returns:
+            Identifiants des capteurs inactifs
+        """
+        ids = self.registry.ids
+        return [ids[index]
+                for index in self.fleet.inactive_indexes().tolist()]
+
+    def set_active(self, is_active: bool = True,
+                   sensor_ids: Optional[Sequence[str]] = None,
+                   location: Optional[str] = None) -> int:
+        """
+        Active ou désactive des capteurs en masse.
+
+        Args:
+            is_active: Nouvel état
+            sensor_ids: Capteurs visés (les identifiants inconnus sont
+                ignorés)
+            location: Localisation visée (sans sensor_ids)
+
+        Returns:
+            Nombre de capteurs dont l'état a changé
+
+        Raises:
+            ValueError: Si ni sensor_ids ni location n'est donné
+        """
+        if sensor_ids is not None:
+            indexes = self._indexes(sensor_ids)
+        elif location is not None:
+            indexes = self.fleet.at_location(location)
+        else:
+            raise ValueError("sensor_ids ou location attendu")
+        changed = indexes[self.fleet.active[indexes] != is_active]
+        self.fleet.set_active(changed, is_active)
+        return changed.shape[0]
+
+    def _indexes(self, sensor_ids: Sequence[str]) -> np.ndarray:
+        """Index des capteurs présents parmi des identifiants."""
+        return np.fromiter(
+            (index for index in map(self.fleet.index_of, sensor_ids)
+             if index is not None), dtype=np.int64
+        )
+
+    def _reshard(self):
+        """Redécoupe le parc au prochain cycle (simulation répartie)."""
+        if self.simulator is not None and self.simulator.running:
+            self.simulator.stop()
+
+    def close(self):
+        """Arrête les processus de simulation éventuels."""
+        if self.simulator is not None:
+            self.simulator.stop()
+
+    @timed('read_all_sensors')
     def read_all_sensors(self) -> list:
         """
         Lit tous les capteurs actifs.
@@ -98,13 +332,63 @@ class SensorNetwork:
         Returns:
             Liste des mesures de tous les capteurs
         """
+        if self.vectorized:
+            return self.read_batch().to_dicts()
+        measurements = self._read_sensors(self.sensors.values())
+        READINGS.inc(len(measurements))
+        return measurements
+
+    @staticmethod
+    def _read_sensors(sensors) -> list:
+        """Lit un à un des capteurs (mode non vectorisé)."""
         measurements = []
-        for sensor in self.sensors.values():
+        for sensor in sensors:
             reading = sensor.read_consumption()
             if reading:
                 measurements.append(reading)
         return measurements
 
+    @timed('read_batch')
+    def read_batch(self, sensor_ids: Optional[Sequence[str]] = None,
+                   location: Optional[str] = None) -> MeasurementBatch:
+        """
+        Lit les capteurs actifs sous forme de lot en colonnes.
+
+        En mode vectorisé, le lot est produit en un seul tirage NumPy et
+        toutes les mesures partagent l'horodatage du cycle. En mode
+        réparti, chaque processus produit sa tranche de capteurs et les
+        tranches sont rassemblées en un seul lot.
+
+        Args:
+            sensor_ids: Capteurs à lire (tous si absent) ; les
+                identifiants inconnus sont ignorés
+            location: Ne lire que les capteurs actifs de cette
+                localisation (sans sensor_ids)
+
+        Returns:
+            Lot des mesures, indexé dans le registre du réseau
+        """
+        indexes = None
+        if sensor_ids is not None:
+            indexes = self._indexes(sensor_ids)
+        elif location is not None:
+            indexes = self.fleet.at_location(location, active=True)
+            sensor_ids = [self.registry.ids[index]
+                          for index in indexes.tolist()]
+        if self.simulator is not None:
+            batch = self.simulator.read_cycle(indexes)
+        elif self.vectorized:
+            batch = self.fleet.read_cycle(self._rng, indexes)
+        else:
+            sensors = self.sensors.values() if sensor_ids is None else [
+                self.sensors[sensor_id] for sensor_id in sensor_ids
+                if sensor_id in self.sensors
+            ]
+            batch = MeasurementBatch.from_dicts(self._read_sensors(sensors),
+                                                self.registry)
+        READINGS.inc(len(batch))
+        return batch
+
     def get_sensor(self, sensor_id: str) -> Optional[IoTSensor]:
         """
         Récupère un capteur spécifique.
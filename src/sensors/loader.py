@@ -0,0 +1,127 @@
+"""
+Chargement d'un parc de capteurs depuis un fichier CSV ou JSON Lines.
+
+Le fichier est lu ligne à ligne et les capteurs sont ajoutés au réseau
+par blocs : la mémoire utilisée ne dépend que de la taille des blocs,
+pas de celle du fichier.
+
+Colonnes (ou clés JSON) : sensor_id et location obligatoires,
+base_consumption et variance (valeurs par défaut de SENSOR_CONFIG si
+absentes) et is_active (vrai si absent).
+"""
+import csv
+import json
+import os
+from itertools import islice
+from typing import Dict, Iterator, Optional
+
+from src.config.settings import SENSOR_CONFIG
+from src.sensors.iot_sensor import SensorNetwork, SensorRecord
+
+# Formats reconnus d'après l'extension du fichier
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+           '.json': 'jsonl'}
+
+_FALSE = ('0', 'false', 'no', 'off', 'inactive')
+
+
+def _record(row: Dict, line: int) -> SensorRecord:
+    """
+    Convertit une ligne du fichier en description de capteur.
+
+    Args:
+        row: Valeurs de la ligne par colonne
+        line: Numéro de la ligne (messages d'erreur)
+
+    Returns:
+        Description du capteur
+
+    Raises:
+        ValueError: Si une colonne obligatoire manque ou si une valeur
+            est invalide
+    """
+    try:
+        sensor_id = row['sensor_id']
+        location = row['location']
+        base = row.get('base_consumption')
+        variance = row.get('variance')
+        active = row.get('is_active')
+        if not sensor_id:
+            raise ValueError("sensor_id vide")
+        return (
+            str(sensor_id), str(location),
+            SENSOR_CONFIG['default_base_consumption']
+            if base in (None, '') else float(base),
+            SENSOR_CONFIG['default_variance']
+            if variance in (None, '') else float(variance),
+            True if active in (None, '') else (
+                active if isinstance(active, bool)
+                else str(active).strip().lower() not in _FALSE
+            ),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Ligne {line} invalide: {e!r}") from e
+
+
+def iter_sensor_records(path: str, file_format: Optional[str] = None
+                        ) -> Iterator[SensorRecord]:
+    """
+    Lit en continu les capteurs d'un fichier.
+
+    Args:
+        path: Chemin du fichier
+        file_format: 'csv' ou 'jsonl' (déduit de l'extension si absent)
+
+    Yields:
+        Description de chaque capteur, dans l'ordre du fichier
+
+    Raises:
+        ValueError: Si le format est inconnu ou si une ligne est invalide
+    """
+    if file_format is None:
+        file_format = FORMATS.get(os.path.splitext(path)[1].lower())
+    if file_format not in ('csv', 'jsonl'):
+        raise ValueError(f"Format de parc inconnu: {path}")
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            for line, row in enumerate(csv.DictReader(handle), start=2):
+                yield _record(row, line)
+            return
+        for line, text in enumerate(handle, start=1):
+            if text.strip():
+                try:
+                    row = json.loads(text)
+                except ValueError as e:
+                    raise ValueError(f"Ligne {line} invalide: {e}") from e
+                if not isinstance(row, dict):
+                    raise ValueError(f"Ligne {line} invalide: objet "
+                                     f"JSON attendu")
+                yield _record(row, line)
+
+
+def load_fleet(network: SensorNetwork, path: str,
+               chunk_size: int = 10_000,
+               file_format: Optional[str] = None) -> int:
+    """
+    Ajoute au réseau les capteurs d'un fichier, par blocs.
+
+    Args:
+        network: Réseau de capteurs
+        path: Chemin du fichier CSV ou JSON Lines
+        chunk_size: Nombre de capteurs ajoutés par bloc
+        file_format: 'csv' ou 'jsonl' (déduit de l'extension si absent)
+
+    Returns:
+        Nombre de capteurs chargés
+
+    Raises:
+        ValueError: Si le fichier est mal formé (les blocs précédents
+            restent chargés)
+    """
+    records = iter_sensor_records(path, file_format)
+    total = 0
+    while True:
+        added = network.add_sensors(islice(records, max(1, chunk_size)))
+        if not added:
+            return total
+        total += added
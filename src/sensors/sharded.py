@@ -0,0 +1,259 @@
+"""
+Simulation du parc de capteurs répartie sur plusieurs processus.
+
+Chaque capteur dispose de son propre flux aléatoire, dérivé de la graine
+maîtresse et de son identifiant : sa n-ième lecture est une fonction pure
+de (graine, sensor_id, n). Un capteur n'avance dans son flux que lorsqu'il
+est lu ; lire un groupe de capteurs ne modifie donc pas les lectures des
+autres. Les capteurs sont découpés en tranches contiguës, une par
+processus ; chaque processus conserve les caractéristiques et les
+compteurs de lecture de sa tranche et ne calcule que les capteurs
+demandés. Les résultats sont identiques quel que soit le nombre de
+processus.
+"""
+import hashlib
+import multiprocessing
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from src.config.settings import SENSOR_CONFIG
+from src.core.measurement_batch import MeasurementBatch, datetime_to_micros
+from src.sensors.fleet import SensorFleet
+
+# Constantes de splitmix64
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+# Nombre de tirages par capteur et par cycle (variation, pic, facteur)
+_DRAWS_PER_CYCLE = 3
+
+
+def sensor_keys(seed: int, sensor_ids: Sequence[str]) -> np.ndarray:
+    """
+    Dérive la clé du flux aléatoire de chaque capteur.
+
+    Le hachage ne dépend pas de PYTHONHASHSEED : les clés sont les mêmes
+    dans tous les processus et d'une exécution à l'autre.
+
+    Args:
+        seed: Graine maîtresse
+        sensor_ids: Identifiants des capteurs
+
+    Returns:
+        Clés 64 bits, dans l'ordre des identifiants
+    """
+    prefix = (int(seed) % (1 << 128)).to_bytes(16, 'little')
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(prefix + sensor_id.encode(),
+                                        digest_size=8).digest(), 'little')
+         for sensor_id in sensor_ids),
+        dtype=np.uint64, count=len(sensor_ids)
+    )
+
+
+def _uniform(keys: np.ndarray, counters: np.ndarray) -> np.ndarray:
+    """
+    Tirage uniforme dans [0, 1) du flux de chaque clé (splitmix64).
+
+    Args:
+        keys: Clés des flux
+        counters: Position dans le flux de chaque clé
+
+    Returns:
+        Un tirage par clé
+    """
+    z = keys + counters.astype(np.uint64) * np.uint64(_GOLDEN)
+    z = (z ^ (z >> np.uint64(30))) * _MIX_1
+    z = (z ^ (z >> np.uint64(27))) * _MIX_2
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def simulate_shard(keys: np.ndarray, base_consumption: np.ndarray,
+                   variance: np.ndarray, reads: np.ndarray) -> np.ndarray:
+    """
+    Génère une lecture de chaque capteur d'une tranche.
+
+    La distribution est celle de SensorFleet.read_cycle : variation
+    uniforme autour de la consommation de base, puis pic occasionnel
+    multiplicatif.
+
+    Args:
+        keys: Clés des flux aléatoires des capteurs
+        base_consumption: Consommations de base en kWh
+        variance: Variances de la consommation
+        reads: Nombre de lectures déjà faites de chaque capteur
+
+    Returns:
+        Consommation de chaque capteur de la tranche
+    """
+    counters = reads * _DRAWS_PER_CYCLE
+    consumption = base_consumption + variance * (
+        2.0 * _uniform(keys, counters) - 1.0
+    )
+    spikes = _uniform(keys, counters + 1) < \
+        SENSOR_CONFIG['anomaly_probability']
+    low, high = SENSOR_CONFIG['anomaly_factor_range']
+    consumption[spikes] *= low + (high - low) * \
+        _uniform(keys[spikes], counters[spikes] + 2)
+    return np.round(consumption, 2)
+
+
+def _shard_worker(connection, keys: np.ndarray,
+                  base_consumption: np.ndarray, variance: np.ndarray,
+                  reads: np.ndarray):
+    """
+    Boucle d'un processus : des capteurs demandés, leurs lectures rendues.
+
+    Args:
+        connection: Extrémité du tube vers le processus principal
+        keys: Clés des flux aléatoires de la tranche
+        base_consumption: Consommations de base de la tranche
+        variance: Variances de la tranche
+        reads: Compteurs de lecture de la tranche (mis à jour)
+    """
+    try:
+        while True:
+            local = connection.recv()
+            if local is None:
+                return
+            connection.send(simulate_shard(keys[local],
+                                           base_consumption[local],
+                                           variance[local], reads[local]))
+            reads[local] += 1
+    except (EOFError, KeyboardInterrupt):
+        return
+    finally:
+        connection.close()
+
+
+class ShardedSimulator:
+    """Lecture d'un parc de capteurs répartie entre processus."""
+
+    def __init__(self, fleet: SensorFleet, seed: int, workers: int = 1):
+        """
+        Initialise le simulateur.
+
+        Les consommations de base et variances sont figées à start() ;
+        les changements d'état (activation, retrait) sont pris en compte
+        à chaque cycle. Les compteurs de lecture sont conservés d'un
+        redécoupage à l'autre.
+
+        Args:
+            fleet: Parc de capteurs à simuler
+            seed: Graine maîtresse
+            workers: Nombre de processus ; 1 calcule dans le processus
+                courant
+        """
+        self.fleet = fleet
+        self.seed = seed
+        self.workers = max(1, workers)
+        self.cycle = 0
+        self._size = 0
+        self._bounds: List[int] = []
+        self._reads = np.zeros(0, dtype=np.int64)
+        self._connections = []
+        self._processes: List[multiprocessing.Process] = []
+        self._keys: Optional[np.ndarray] = None
+        self._base: Optional[np.ndarray] = None
+        self._variance: Optional[np.ndarray] = None
+
+    @property
+    def running(self) -> bool:
+        """Indique si le simulateur a été démarré."""
+        return self._keys is not None
+
+    def start(self):
+        """Découpe le parc en tranches et lance les processus."""
+        self.stop()
+        size = len(self.fleet)
+        self._size = size
+        self._keys = sensor_keys(self.seed, self.fleet.sensor_ids)
+        self._base = self.fleet.base_consumption[:size].copy()
+        self._variance = self.fleet.variance[:size].copy()
+        if self._reads.shape[0] < size:
+            self._reads = np.concatenate([
+                self._reads,
+                np.zeros(size - self._reads.shape[0], dtype=np.int64)
+            ])
+        self._bounds = np.linspace(0, size,
+                                   self.workers + 1).astype(int).tolist()
+        if self.workers == 1:
+            return
+        for low, high in zip(self._bounds, self._bounds[1:]):
+            shard = slice(low, high)
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_shard_worker,
+                args=(child, self._keys[shard], self._base[shard],
+                      self._variance[shard], self._reads[shard].copy()),
+                daemon=True
+            )
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def stop(self):
+        """Arrête les processus (les compteurs sont conservés)."""
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+        self._connections = []
+        self._processes = []
+        self._keys = None
+
+    def read_cycle(self, indexes: Optional[np.ndarray] = None
+                   ) -> MeasurementBatch:
+        """
+        Produit les lectures suivantes des capteurs demandés.
+
+        Seuls les capteurs lisibles demandés sont calculés, chacun
+        avançant d'une position dans son propre flux.
+
+        Args:
+            indexes: Capteurs à lire (tous si absent)
+
+        Returns:
+            Lot des mesures des capteurs actifs, dans l'ordre des index,
+            partageant un horodatage commun
+        """
+        if not self.running:
+            self.start()
+        self.cycle += 1
+
+        readable = self.fleet.readable(indexes)
+        readable = readable[readable < self._size]
+        if self._processes:
+            consumption = np.empty(readable.shape[0])
+            shard = np.searchsorted(self._bounds, readable, 'right') - 1
+            pending = []
+            for number, connection in enumerate(self._connections):
+                rows = np.flatnonzero(shard == number)
+                if rows.shape[0]:
+                    connection.send(readable[rows] - self._bounds[number])
+                    pending.append((connection, rows))
+            for connection, rows in pending:
+                consumption[rows] = connection.recv()
+        else:
+            consumption = simulate_shard(
+                self._keys[readable], self._base[readable],
+                self._variance[readable], self._reads[readable]
+            )
+        self._reads[readable] += 1
+
+        timestamp = np.full(readable.shape[0],
+                            datetime_to_micros(datetime.now()),
+                            dtype=np.int64)
+        return MeasurementBatch(self.fleet.registry, readable, consumption,
+                                timestamp)
@@ -0,0 +1,113 @@
+"""
+Agrégats de mesures par capteur et par intervalle de temps.
+
+Fonctions sans dépendance à un moteur de stockage, partagées par les
+rollups MongoDB et le stockage en colonnes embarqué.
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.measurement_batch import MeasurementBatch
+
+MICROS_PER_SECOND = 1_000_000
+
+# Granularités, de la plus grossière à la plus fine (durée en secondes)
+ROLLUP_GRANULARITIES = (
+    ('day', 86400),
+    ('hour', 3600),
+    ('minute', 60),
+)
+
+
+def aggregate_buckets(batch: MeasurementBatch, bucket_seconds: int
+                      ) -> Tuple[np.ndarray, ...]:
+    """
+    Agrège un lot par capteur et par intervalle de temps.
+
+    Args:
+        batch: Lot de mesures
+        bucket_seconds: Durée d'un intervalle en secondes
+
+    Returns:
+        Tuple (index capteur, début d'intervalle en microsecondes, nombre,
+        somme, somme des carrés, minimum, maximum)
+    """
+    bucket_micros = bucket_seconds * MICROS_PER_SECOND
+    buckets = (batch.timestamp // bucket_micros) * bucket_micros
+    keys, inverse = np.unique(
+        np.stack([batch.sensor_index.astype(np.int64), buckets]), axis=1,
+        return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    size = keys.shape[1]
+    values = batch.consumption
+    count = np.bincount(inverse, minlength=size)
+    total = np.bincount(inverse, weights=values, minlength=size)
+    total_sq = np.bincount(inverse, weights=values * values, minlength=size)
+    minimum = np.full(size, np.inf)
+    maximum = np.full(size, -np.inf)
+    np.minimum.at(minimum, inverse, values)
+    np.maximum.at(maximum, inverse, values)
+    return keys[0], keys[1], count, total, total_sq, minimum, maximum
+
+
+def summarize(count: float, total: float, total_sq: float,
+              minimum: float, maximum: float) -> Optional[Dict]:
+    """
+    Convertit des agrégats en statistiques au format de get_statistics.
+
+    Args:
+        count: Nombre de mesures
+        total: Somme des consommations
+        total_sq: Somme des carrés des consommations
+        minimum: Consommation minimale
+        maximum: Consommation maximale
+
+    Returns:
+        Statistiques ou None si aucune mesure
+    """
+    if not count:
+        return None
+    mean = total / count
+    variance = (total_sq - count * mean * mean) / (count - 1) \
+        if count > 1 else 0.0
+    return {
+        'avg_consumption': mean,
+        'max_consumption': maximum,
+        'min_consumption': minimum,
+        'stdev_consumption': math.sqrt(max(variance, 0.0)),
+        'count': int(count)
+    }
+
+
+def plan_segments(start: int, end: int,
+                  levels=ROLLUP_GRANULARITIES) -> List[Tuple[str, int, int]]:
+    """
+    Découpe un intervalle [start, end) en intervalles de rollups : jours
+    complets au centre, heures puis minutes sur les bords.
+
+    Args:
+        start: Début en microsecondes depuis l'epoch
+        end: Fin (exclue) en microsecondes depuis l'epoch
+        levels: Granularités disponibles, de la plus grossière à la plus
+            fine
+
+    Returns:
+        Liste de (granularité, début, fin) ; la granularité la plus fine
+        est étendue aux intervalles qui chevauchent les bornes
+    """
+    if start >= end:
+        return []
+    name, seconds = levels[0]
+    size = seconds * MICROS_PER_SECOND
+    if len(levels) == 1:
+        return [(name, (start // size) * size, -(-end // size) * size)]
+    inner_start = -(-start // size) * size
+    inner_end = (end // size) * size
+    if inner_start >= inner_end:
+        return plan_segments(start, end, levels[1:])
+    return (plan_segments(start, inner_start, levels[1:])
+            + [(name, inner_start, inner_end)]
+            + plan_segments(inner_end, end, levels[1:]))
@@ -0,0 +1,228 @@
+"""
+Interface commune des moteurs de stockage des mesures.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import (
+    Dict, Iterable, Iterator, List, Optional, Tuple, Union
+)
+
+from src.core.measurement_batch import MeasurementBatch
+from src.core.metrics import timed_storage
+
+Measurements = Union[List[Dict], MeasurementBatch]
+
+# Champs nécessaires à l'analyse, utilisés par défaut en mode colonnes
+ANALYSIS_FIELDS = ('sensor_id', 'location', 'consumption_kwh', 'timestamp')
+
+
+class StorageBackend(ABC):
+    """Stockage des mesures énergétiques (MongoDB, fichiers embarqués...)."""
+
+    # Nom du moteur, étiquette des métriques de stockage
+    backend_name = 'storage'
+
+    def connect(self) -> bool:
+        """
+        Prépare le stockage.
+
+        Returns:
+            True si le stockage est utilisable, False sinon
+        """
+        return True
+
+    def disconnect(self):
+        """Libère les ressources du stockage."""
+
+    @abstractmethod
+    def insert_measurements(self, measurements: Measurements,
+                            ordered: bool = True) -> int:
+        """
+        Insère plusieurs mesures.
+
+        Args:
+            measurements: Liste de mesures ou lot en colonnes
+            ordered: Arrêter l'insertion à la première erreur
+
+        Returns:
+            Nombre de mesures insérées
+        """
+
+    @abstractmethod
+    def get_measurements(self, sensor_id: Optional[str] = None,
+                         limit: int = 100) -> List[Dict]:
+        """
+        Récupère les mesures les plus récentes.
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            limit: Nombre maximum de résultats
+
+        Returns:
+            Liste des mesures, de la plus récente à la plus ancienne
+        """
+
+    @abstractmethod
+    def get_recent_measurements(self, hours: int = 24) -> List[Dict]:
+        """
+        Récupère les mesures récentes.
+
+        Args:
+            hours: Nombre d'heures à remonter
+
+        Returns:
+            Liste des mesures récentes
+        """
+
+    @abstractmethod
+    def iter_measurements(self, sensor_id: Optional[str] = None,
+                          start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          batch_size: int = 1000, **options
+                          ) -> Iterator[Measurements]:
+        """
+        Parcourt les mesures par blocs de taille bornée.
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            start: Début de l'intervalle de temps (inclus, optionnel)
+            end: Fin de l'intervalle de temps (exclue, optionnelle)
+            batch_size: Nombre de mesures par bloc
+            **options: Options propres au moteur (fields, columnar,
+                ascending, registry)
+
+        Yields:
+            Blocs de mesures (listes de documents ou lots en colonnes)
+        """
+
+    def iter_recent_measurements(self, hours: int = 24, **kwargs
+                                 ) -> Iterator[Measurements]:
+        """
+        Parcourt par blocs les mesures récentes.
+
+        Args:
+            hours: Nombre d'heures à remonter
+            **kwargs: Options de iter_measurements (batch_size, fields,
+                columnar, ascending, registry, sensor_id)
+
+        Yields:
+            Blocs de mesures (listes de documents ou lots en colonnes)
+        """
+        cutoff_time = datetime.now() - timedelta(hours=hours)
+        return self.iter_measurements(start=cutoff_time, **kwargs)
+
+    @timed_storage('get_statistics')
+    def get_statistics(self, sensor_id: str) -> Optional[Dict]:
+        """
+        Calcule les statistiques pour un capteur.
+
+        Args:
+            sensor_id: Identifiant du capteur
+
+        Returns:
+            Dictionnaire de statistiques
+        """
+        return self.get_statistics_bulk([sensor_id]).get(sensor_id)
+
+    @abstractmethod
+    def get_statistics_bulk(self, sensor_ids: Optional[Iterable[str]] = None
+                            ) -> Dict[str, Dict]:
+        """
+        Calcule les statistiques de plusieurs capteurs.
+
+        Args:
+            sensor_ids: Capteurs concernés (tous si absent)
+
+        Returns:
+            Statistiques par identifiant de capteur (les capteurs sans
+            mesure sont absents)
+        """
+
+    @abstractmethod
+    def insert_anomalies(self, anomalies: List[Dict],
+                         run_id: Optional[str] = None) -> int:
+        """
+        Enregistre des anomalies dans la collection des anomalies.
+
+        Args:
+            anomalies: Anomalies au format de detect_anomaly
+            run_id: Identifiant du rejeu ou de l'exécution (optionnel)
+
+        Returns:
+            Nombre d'anomalies enregistrées
+        """
+
+    @abstractmethod
+    def get_anomalies(self, sensor_id: Optional[str] = None,
+                      run_id: Optional[str] = None,
+                      limit: int = 100) -> List[Dict]:
+        """
+        Récupère les anomalies enregistrées les plus récentes.
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            run_id: Filtrer par identifiant d'exécution (optionnel)
+            limit: Nombre maximum de résultats
+
+        Returns:
+            Liste des anomalies, de la plus récente à la plus ancienne
+        """
+
+    @abstractmethod
+    def save_snapshot(self, data: bytes, metadata: Optional[Dict] = None,
+                      keep: int = 3) -> int:
+        """
+        Enregistre une nouvelle version de l'instantané des baselines.
+
+        Args:
+            data: Contenu de l'instantané
+            metadata: Métadonnées enregistrées avec lui
+            keep: Nombre de versions conservées
+
+        Returns:
+            Numéro de la version écrite (0 en cas d'erreur)
+        """
+
+    @abstractmethod
+    def load_snapshot(self, version: Optional[int] = None
+                      ) -> Optional[Tuple[bytes, Dict]]:
+        """
+        Lit une version complète de l'instantané des baselines.
+
+        Args:
+            version: Version demandée (la plus récente si absente)
+
+        Returns:
+            Tuple (contenu, métadonnées : version, size, created_at...),
+            ou None si aucun instantané
+        """
+
+    @abstractmethod
+    def clear_collection(self):
+        """Supprime toutes les mesures."""
+
+
+def create_storage(backend: str = 'mongodb', **options) -> StorageBackend:
+    """
+    Instancie un moteur de stockage.
+
+    Les modules des moteurs sont importés à la demande : le stockage en
+    colonnes fonctionne sans pymongo installé.
+
+    Args:
+        backend: 'mongodb' ou 'columnar'
+        **options: Paramètres du constructeur du moteur
+
+    Returns:
+        Moteur de stockage (non connecté)
+
+    Raises:
+        ValueError: Si le moteur est inconnu
+    """
+    if backend == 'mongodb':
+        from src.storage.mongodb_handler import MongoDBHandler
+        return MongoDBHandler(**options)
+    if backend == 'columnar':
+        from src.storage.columnar_store import ColumnarStore
+        return ColumnarStore(**options)
+    raise ValueError(f"Moteur de stockage inconnu: {backend}")
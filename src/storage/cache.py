@@ -0,0 +1,101 @@
+"""
+Cache de résultats en mémoire avec durée de vie et taille bornée.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+
+class TTLCache:
+    """Cache LRU dont les entrées expirent après une durée de vie."""
+
+    def __init__(self, ttl: float, maxsize: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialise le cache.
+
+        Args:
+            ttl: Durée de vie d'une entrée en secondes
+            maxsize: Nombre maximal d'entrées (les moins récemment
+                utilisées sont évincées)
+            clock: Horloge utilisée pour l'expiration
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = \
+            OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Nombre d'entrées (expirées comprises)."""
+        return len(self._entries)
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Recherche une entrée valide.
+
+        Args:
+            key: Clé recherchée
+
+        Returns:
+            Tuple (trouvée, valeur) ; la valeur peut être None lorsqu'un
+            résultat vide a été mis en cache
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """
+        Retourne la valeur d'une entrée valide.
+
+        Args:
+            key: Clé recherchée
+            default: Valeur retournée si absente ou expirée
+
+        Returns:
+            Valeur en cache ou `default`
+        """
+        found, value = self.lookup(key)
+        return value if found else default
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Ajoute ou remplace une entrée.
+
+        Args:
+            key: Clé
+            value: Valeur à mettre en cache
+        """
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: Iterable[Hashable]):
+        """
+        Supprime des entrées.
+
+        Args:
+            keys: Clés à invalider
+        """
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """Vide le cache."""
+        with self._lock:
+            self._entries.clear()
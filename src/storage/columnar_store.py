@@ -0,0 +1,935 @@
+"""
+Stockage embarqué des mesures en colonnes, sans serveur.
+
+Chaque capteur possède ses propres segments en ajout seul : un fichier
+d'horodatages int64 (microsecondes depuis l'epoch) et un fichier de
+consommations float64 par segment. Les lectures passent par des projections
+mémoire (np.memmap) : une lecture d'intervalle sur des données
+chronologiques est une simple vue, sans copie.
+
+Un index JSON décrit les capteurs, leurs segments et des agrégats
+(nombre, somme, somme des carrés, min, max) mis à jour à l'insertion,
+ce qui rend les statistiques globales indépendantes du volume stocké.
+Chaque insertion n'ajoute au journal de l'index que les entrées des
+capteurs modifiés ; l'index complet n'est réécrit que lorsque le journal
+dépasse sa taille, et à la déconnexion.
+
+Les lectures parcourent les segments par fenêtres de temps : la mémoire
+utilisée dépend de la taille des blocs rendus, pas du volume stocké.
+
+Les anomalies enregistrées sont ajoutées à un fichier JSON Lines, un
+document par ligne ; les instantanés des baselines sont des fichiers
+versionnés du sous-répertoire `snapshots`.
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from functools import partial
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+)
+
+import numpy as np
+
+from src.core.measurement_batch import (
+    MeasurementBatch, SensorRegistry, datetime_to_micros, micros_to_datetime
+)
+from src.core.metrics import (
+    DOCUMENTS_INSERTED, INSERT_FAILURES, timed_storage
+)
+from src.storage.aggregates import summarize
+from src.storage.base import Measurements, StorageBackend
+from src.storage.snapshots import SnapshotFiles
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+JOURNAL_FILE = 'index.journal'
+ANOMALIES_FILE = 'anomalies.jsonl'
+SNAPSHOTS_DIRECTORY = 'snapshots'
+# Taille du journal, relative à l'index, au-delà de laquelle l'index est
+# réécrit
+JOURNAL_RATIO = 4
+TIMESTAMP_SUFFIX = '.ts'
+CONSUMPTION_SUFFIX = '.kwh'
+ITEM_SIZE = 8
+# Au-delà, les lectures ne gardent pas un segment projeté par capteur
+# (le nombre de projections d'un processus est limité par le système)
+MAX_MAPPED_CURSORS = 4096
+
+
+class _SensorCursor:
+    """
+    Position de lecture chronologique dans les segments d'un capteur.
+
+    Le segment courant reste projeté en mémoire entre deux lectures si
+    keep_open est vrai (deux projections par curseur) ; seules les
+    tranches rendues par take() sont copiées.
+    """
+
+    def __init__(self, index: int, parts: List[Callable], ascending: bool,
+                 low: Optional[int], high: Optional[int],
+                 keep_open: bool = True):
+        """
+        Initialise le curseur.
+
+        Args:
+            index: Index du capteur dans le registre des lots rendus
+            parts: Fonctions rendant les colonnes triées de chaque
+                segment, dans l'ordre chronologique
+            ascending: Sens du parcours
+            low: Début de l'intervalle en microsecondes (inclus)
+            high: Fin de l'intervalle en microsecondes (exclue)
+            keep_open: Garder le segment courant projeté en mémoire
+        """
+        self.index = index
+        self.keep_open = keep_open
+        self._current = None
+        self.ascending = ascending
+        self.low = low
+        self.high = high
+        self._parts = deque(parts if ascending else reversed(parts))
+        self._position: Optional[int] = None
+
+    def first(self) -> int:
+        """Retourne l'horodatage de la plus ancienne mesure du capteur."""
+        part = self._parts[0] if self.ascending else self._parts[-1]
+        return int(part()[0][0])
+
+    @property
+    def exhausted(self) -> bool:
+        """Indique si toutes les mesures ont été rendues."""
+        return not self._parts
+
+    def take(self, cutoff: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Avance jusqu'à une borne de temps.
+
+        Args:
+            cutoff: Borne en microsecondes : les mesures antérieures sont
+                rendues (postérieures ou égales en ordre décroissant)
+
+        Returns:
+            Tranches (horodatages, consommations) parcourues, dans l'ordre
+            chronologique de chaque tranche
+        """
+        taken = []
+        while self._parts:
+            columns = self._current or self._parts[0]()
+            if self.keep_open:
+                self._current = columns
+            timestamps, consumption = columns
+            size = timestamps.shape[0]
+            if self.ascending:
+                if self._position is None:
+                    self._position = 0 if self.low is None \
+                        else int(np.searchsorted(timestamps, self.low))
+                bound = cutoff if self.high is None \
+                    else min(cutoff, self.high)
+                start = self._position
+                stop = self._position = int(np.searchsorted(timestamps,
+                                                            bound))
+                done = stop == size
+                finished = not done and self.high is not None \
+                    and timestamps[stop] >= self.high
+            else:
+                if self._position is None:
+                    self._position = size if self.high is None \
+                        else int(np.searchsorted(timestamps, self.high))
+                bound = cutoff if self.low is None else max(cutoff, self.low)
+                stop = self._position
+                start = self._position = int(np.searchsorted(timestamps,
+                                                             bound))
+                done = start == 0
+                finished = not done and self.low is not None \
+                    and timestamps[start - 1] < self.low
+            if stop > start:
+                taken.append((timestamps[start:stop],
+                              consumption[start:stop]))
+            if finished:
+                self._parts.clear()
+                self._current = None
+            elif done:
+                self._parts.popleft()
+                self._position = self._current = None
+                continue
+            break
+        return taken
+
+
+class ColumnarStore(StorageBackend):
+    """Stockage des mesures en segments colonnes projetés en mémoire."""
+
+    backend_name = 'columnar'
+
+    def __init__(self, directory: str = 'data/columnar',
+                 segment_rows: int = 1_000_000,
+                 max_open_segments: int = 256):
+        """
+        Initialise le stockage.
+
+        Args:
+            directory: Répertoire des segments et de l'index
+            segment_rows: Nombre de mesures au-delà duquel un capteur
+                ouvre un nouveau segment
+            max_open_segments: Nombre de segments en cours d'écriture
+                gardés ouverts (deux fichiers chacun), les moins récemment
+                utilisés étant fermés
+        """
+        self.directory = directory
+        self.segment_rows = max(1, segment_rows)
+        self.max_open_segments = max(1, max_open_segments)
+        self._sensors: Dict[str, Dict] = {}
+        self._handles: 'OrderedDict[str, Tuple]' = OrderedDict()
+        self._journal = None
+        self._index_size = 0
+        self._lock = threading.RLock()
+        self._snapshots = SnapshotFiles(os.path.join(directory,
+                                                     SNAPSHOTS_DIRECTORY))
+
+    def connect(self) -> bool:
+        """
+        Crée le répertoire si nécessaire et charge l'index.
+
+        Returns:
+            True si le stockage est utilisable, False sinon
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, INDEX_FILE)
+            with self._lock:
+                self._close_handles()
+                if os.path.exists(path):
+                    with open(path, encoding='utf-8') as handle:
+                        self._sensors = json.load(handle)['sensors']
+                    self._index_size = os.path.getsize(path)
+                else:
+                    self._sensors = {}
+                    self._index_size = 0
+                if self._replay_journal():
+                    self.checkpoint()
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Erreur d'ouverture du stockage en colonnes: {e}")
+            return False
+
+    def disconnect(self):
+        """Réécrit l'index complet et ferme les fichiers ouverts."""
+        with self._lock:
+            self._close_handles()
+            if self._journal is None:
+                return
+            try:
+                self.checkpoint()
+            except OSError as e:
+                logger.error(f"Erreur d'écriture de l'index: {e}")
+
+    def _replay_journal(self) -> bool:
+        """
+        Applique à l'index les entrées journalisées depuis sa dernière
+        écriture. Une dernière ligne incomplète (arrêt pendant l'écriture)
+        est ignorée : les mesures correspondantes seront écrasées.
+
+        Returns:
+            True si un journal a été relu ; l'index doit alors être
+            réécrit (checkpoint) avant tout nouvel ajout, qui serait
+            sinon collé à une éventuelle ligne incomplète
+        """
+        path = os.path.join(self.directory, JOURNAL_FILE)
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    self._sensors.update(json.loads(line))
+                except ValueError:
+                    break
+        return True
+
+    def _log_entries(self, sensor_ids: Iterable[str]):
+        """
+        Journalise les entrées d'index de capteurs modifiés.
+
+        Le coût est proportionnel au nombre de capteurs modifiés ; l'index
+        complet est réécrit lorsque le journal dépasse JOURNAL_RATIO fois
+        sa taille, ce qui amortit sa réécriture même quand chaque
+        insertion touche tout le parc.
+        """
+        path = os.path.join(self.directory, JOURNAL_FILE)
+        if self._journal is None:
+            self._journal = open(path, 'a', encoding='utf-8')
+        position = self._journal.tell()
+        try:
+            self._journal.write(json.dumps(
+                {sensor_id: self._sensors[sensor_id]
+                 for sensor_id in sensor_ids}
+            ) + '\n')
+            self._journal.flush()
+        except OSError:
+            # Pas de ligne incomplète avant les entrées suivantes
+            journal, self._journal = self._journal, None
+            try:
+                journal.close()
+            except OSError:
+                pass
+            try:
+                os.truncate(path, position)
+            except OSError:
+                pass
+            raise
+        if self._journal.tell() > JOURNAL_RATIO * self._index_size:
+            try:
+                self.checkpoint()
+            except OSError as e:  # entrées déjà journalisées
+                logger.error(f"Erreur d'écriture de l'index: {e}")
+
+    def checkpoint(self):
+        """Écrit l'index complet de façon atomique et supprime le journal."""
+        with self._lock:
+            path = os.path.join(self.directory, INDEX_FILE)
+            temporary = path + '.tmp'
+            content = json.dumps({'sensors': self._sensors})
+            with open(temporary, 'w', encoding='utf-8') as handle:
+                handle.write(content)
+                self._index_size = handle.tell()
+            os.replace(temporary, path)
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            journal = os.path.join(self.directory, JOURNAL_FILE)
+            if os.path.exists(journal):
+                os.remove(journal)
+
+    def _segment_path(self, entry: Dict, segment: int, suffix: str) -> str:
+        """Chemin d'une colonne d'un segment."""
+        return os.path.join(self.directory, entry['directory'],
+                            f"{segment:06d}{suffix}")
+
+    def _entry(self, sensor_id: str, location: Optional[str]) -> Dict:
+        """Retourne l'entrée d'index d'un capteur, en la créant au besoin."""
+        entry = self._sensors.get(sensor_id)
+        if entry is None:
+            entry = {
+                'directory': f"sensor_{len(self._sensors):06d}",
+                'location': location,
+                'segments': [],
+                'sorted': True,
+                'last_timestamp': None,
+                'count': 0, 'sum': 0.0, 'sum_sq': 0.0,
+                'min': math.inf, 'max': -math.inf
+            }
+            os.makedirs(os.path.join(self.directory, entry['directory']),
+                        exist_ok=True)
+            self._sensors[sensor_id] = entry
+        elif location is not None:
+            entry['location'] = location
+        return entry
+
+    def _append(self, entry: Dict, timestamps: np.ndarray,
+                consumption: np.ndarray):
+        """
+        Ajoute des mesures triées aux segments d'un capteur.
+
+        Les données sont écrites après les lignes référencées par l'index
+        et le fichier est tronqué : un ajout interrompu avant la mise à
+        jour de l'index est ainsi écrasé au suivant.
+        """
+        position = 0
+        while position < timestamps.shape[0]:
+            segments = entry['segments']
+            if not segments or segments[-1] >= self.segment_rows:
+                segments.append(0)
+            segment = len(segments) - 1
+            rows = segments[segment]
+            stop = position + min(self.segment_rows - rows,
+                                  timestamps.shape[0] - position)
+            for handle, column in zip(self._segment_handles(entry, segment),
+                                      (timestamps, consumption)):
+                handle.seek(rows * ITEM_SIZE)
+                handle.write(column[position:stop].tobytes())
+                handle.truncate()
+            segments[segment] = rows + stop - position
+            position = stop
+
+    def _segment_handles(self, entry: Dict, segment: int) -> Tuple:
+        """
+        Fichiers (horodatages, consommations) du segment en cours
+        d'écriture d'un capteur, gardés ouverts entre les insertions.
+
+        Les fichiers ne sont pas tamponnés : les écritures sont visibles
+        des projections mémoire dès le retour de write().
+        """
+        key = entry['directory']
+        cached = self._handles.get(key)
+        if cached is not None and cached[0] == segment:
+            self._handles.move_to_end(key)
+            return cached[1:]
+        if cached is not None:
+            self._close_handles(key)
+        handles = []
+        for suffix in (TIMESTAMP_SUFFIX, CONSUMPTION_SUFFIX):
+            path = self._segment_path(entry, segment, suffix)
+            handles.append(open(path, 'r+b' if os.path.exists(path)
+                                else 'w+b', buffering=0))
+        self._handles[key] = (segment, *handles)
+        while len(self._handles) > self.max_open_segments:
+            self._close_handles(next(iter(self._handles)))
+        return tuple(handles)
+
+    def _close_handles(self, key: Optional[str] = None):
+        """Ferme les fichiers d'un capteur (de tous si absent)."""
+        keys = list(self._handles) if key is None else [key]
+        for name in keys:
+            for handle in self._handles.pop(name)[1:]:
+                handle.close()
+
+    def insert_measurement(self, measurement: Dict) -> Optional[str]:
+        """
+        Insère une mesure.
+
+        Args:
+            measurement: Dictionnaire contenant les données de mesure
+
+        Returns:
+            Identifiant du capteur si la mesure est écrite, None sinon
+        """
+        if self.insert_measurements([measurement]):
+            return measurement['sensor_id']
+        return None
+
+    @timed_storage('insert_measurements')
+    def insert_measurements(self, measurements: Measurements,
+                            ordered: bool = True) -> int:
+        """
+        Ajoute des mesures aux segments de leurs capteurs.
+
+        Args:
+            measurements: Liste de mesures ou lot en colonnes
+            ordered: Ignoré, les écritures d'un appel sont toujours
+                appliquées dans l'ordre
+
+        Returns:
+            Nombre de mesures écrites
+        """
+        if not measurements:
+            return 0
+        batch = measurements if isinstance(measurements, MeasurementBatch) \
+            else MeasurementBatch.from_dicts(measurements)
+        if not len(batch):
+            return 0
+
+        # Regroupement par capteur, chronologique au sein de chaque groupe
+        order = np.lexsort((batch.timestamp, batch.sensor_index))
+        sensor_index = batch.sensor_index[order]
+        timestamps = batch.timestamp[order]
+        consumption = batch.consumption[order]
+        bounds = np.flatnonzero(np.diff(sensor_index)) + 1
+        starts = np.concatenate([[0], bounds]).tolist()
+        stops = np.concatenate([bounds, [len(batch)]]).tolist()
+
+        registry = batch.registry
+        with self._lock:
+            # Entrées avant l'appel, rétablies si l'écriture échoue (les
+            # données écrites au-delà sont écrasées à l'ajout suivant)
+            previous: Dict[str, Optional[Dict]] = {}
+            try:
+                for start, stop in zip(starts, stops):
+                    index = int(sensor_index[start])
+                    sensor_id = registry.ids[index]
+                    entry = self._sensors.get(sensor_id)
+                    previous[sensor_id] = None if entry is None else dict(
+                        entry, segments=list(entry['segments'])
+                    )
+                    entry = self._entry(sensor_id,
+                                        registry.locations[index])
+                    ts = timestamps[start:stop]
+                    values = consumption[start:stop]
+                    self._append(entry, ts, values)
+                    last = entry['last_timestamp']
+                    if last is not None and int(ts[0]) < last:
+                        entry['sorted'] = False
+                    entry['last_timestamp'] = int(ts[-1]) if last is None \
+                        else max(last, int(ts[-1]))
+                    entry['count'] += stop - start
+                    entry['sum'] += float(values.sum())
+                    entry['sum_sq'] += float(np.dot(values, values))
+                    entry['min'] = min(entry['min'], float(values.min()))
+                    entry['max'] = max(entry['max'], float(values.max()))
+                self._log_entries(previous)
+            except OSError as e:
+                logger.error(f"Erreur d'écriture: {e}")
+                self._restore_entries(previous)
+                INSERT_FAILURES.inc(len(batch), (self.backend_name,))
+                return 0
+        DOCUMENTS_INSERTED.inc(len(batch), (self.backend_name,))
+        return len(batch)
+
+    def _restore_entries(self, previous: Dict[str, Optional[Dict]]):
+        """
+        Rétablit les entrées d'index d'une insertion en échec.
+
+        Args:
+            previous: Entrée de chaque capteur avant l'insertion (None si
+                le capteur a été créé par l'insertion)
+        """
+        for sensor_id, entry in previous.items():
+            current = self._sensors.get(sensor_id)
+            if current is not None and current['directory'] in self._handles:
+                self._close_handles(current['directory'])
+            if entry is None:
+                self._sensors.pop(sensor_id, None)
+            else:
+                self._sensors[sensor_id] = entry
+
+    def _columns(self, entry: Dict, segment: int, rows: int
+                 ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Projette en mémoire les colonnes d'un segment.
+
+        Les tableaux rendus sont des vues ndarray sur les projections, ce
+        qui évite le surcoût de np.memmap à chaque découpage.
+        """
+        return (
+            np.memmap(self._segment_path(entry, segment, TIMESTAMP_SUFFIX),
+                      dtype=np.int64, mode='r', shape=(rows,)
+                      ).view(np.ndarray),
+            np.memmap(self._segment_path(entry, segment, CONSUMPTION_SUFFIX),
+                      dtype=np.float64, mode='r', shape=(rows,)
+                      ).view(np.ndarray)
+        )
+
+    def iter_segments(self, sensor_id: str,
+                      start: Optional[datetime] = None,
+                      end: Optional[datetime] = None
+                      ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Parcourt les colonnes d'un capteur segment par segment.
+
+        Pour un capteur alimenté chronologiquement, l'intervalle est
+        trouvé par recherche dichotomique et les tableaux rendus sont des
+        vues sur les fichiers projetés en mémoire ; sinon un masque est
+        appliqué (copie).
+
+        Args:
+            sensor_id: Identifiant du capteur
+            start: Début de l'intervalle (inclus, optionnel)
+            end: Fin de l'intervalle (exclue, optionnelle)
+
+        Yields:
+            Couples (horodatages en microsecondes, consommations)
+        """
+        with self._lock:
+            entry = self._sensors.get(sensor_id)
+            if entry is None:
+                return
+            segments = list(enumerate(entry['segments']))
+            is_sorted = entry['sorted']
+        low = datetime_to_micros(start) if start is not None else None
+        high = datetime_to_micros(end) if end is not None else None
+
+        for segment, rows in segments:
+            if not rows:
+                continue
+            timestamps, consumption = self._columns(entry, segment, rows)
+            if low is None and high is None:
+                yield timestamps, consumption
+            elif is_sorted:
+                first = 0 if low is None \
+                    else int(np.searchsorted(timestamps, low, 'left'))
+                last = rows if high is None \
+                    else int(np.searchsorted(timestamps, high, 'left'))
+                if first < last:
+                    yield timestamps[first:last], consumption[first:last]
+            else:
+                mask = np.ones(rows, dtype=bool)
+                if low is not None:
+                    mask &= timestamps >= low
+                if high is not None:
+                    mask &= timestamps < high
+                if mask.any():
+                    yield timestamps[mask], consumption[mask]
+
+    def read_range(self, sensor_id: str,
+                   start: Optional[datetime] = None,
+                   end: Optional[datetime] = None
+                   ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lit les colonnes d'un capteur sur un intervalle de temps.
+
+        Sans copie lorsque l'intervalle tient dans un seul segment d'un
+        capteur alimenté chronologiquement.
+
+        Args:
+            sensor_id: Identifiant du capteur
+            start: Début de l'intervalle (inclus, optionnel)
+            end: Fin de l'intervalle (exclue, optionnelle)
+
+        Returns:
+            Couple (horodatages en microsecondes, consommations)
+        """
+        parts = list(self.iter_segments(sensor_id, start, end))
+        if not parts:
+            return (np.empty(0, dtype=np.int64),
+                    np.empty(0, dtype=np.float64))
+        if len(parts) == 1:
+            return parts[0]
+        return (np.concatenate([part[0] for part in parts]),
+                np.concatenate([part[1] for part in parts]))
+
+    def _cursor(self, sensor_id: str, registry: SensorRegistry,
+                ascending: bool, low: Optional[int], high: Optional[int],
+                keep_open: bool) -> Optional[_SensorCursor]:
+        """
+        Ouvre un curseur chronologique sur les segments d'un capteur.
+
+        Les mesures d'un capteur alimenté dans le désordre sont lues et
+        triées à l'ouverture (mémoire proportionnelle à ce seul capteur).
+        """
+        with self._lock:
+            entry = self._sensors.get(sensor_id)
+            if entry is None or not entry['count']:
+                return None
+            segments = [(segment, rows) for segment, rows
+                        in enumerate(entry['segments']) if rows]
+            is_sorted = entry['sorted']
+            location = entry['location']
+        if is_sorted:
+            parts = [partial(self._columns, entry, segment, rows)
+                     for segment, rows in segments]
+        else:
+            timestamps, consumption = self.read_range(sensor_id)
+            order = np.argsort(timestamps, kind='stable')
+            columns = (timestamps[order], consumption[order])
+            parts = [lambda: columns]
+        return _SensorCursor(registry.intern(sensor_id, location), parts,
+                             ascending, low, high, keep_open)
+
+    def _sensor_ids(self, sensor_id: Optional[str] = None) -> List[str]:
+        """Capteurs concernés par une requête."""
+        with self._lock:
+            if sensor_id:
+                return [sensor_id] if sensor_id in self._sensors else []
+            return list(self._sensors)
+
+    def get_measurements(self, sensor_id: Optional[str] = None,
+                         limit: int = 100) -> List[Dict]:
+        """
+        Récupère les mesures les plus récentes.
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            limit: Nombre maximum de résultats
+
+        Returns:
+            Liste des mesures, de la plus récente à la plus ancienne
+        """
+        if limit <= 0:
+            return []
+        return next(self.iter_measurements(sensor_id, batch_size=limit),
+                    [])
+
+    def get_recent_measurements(self, hours: int = 24) -> List[Dict]:
+        """
+        Récupère les mesures récentes.
+
+        Args:
+            hours: Nombre d'heures à remonter
+
+        Returns:
+            Liste des mesures récentes
+        """
+        cutoff_time = datetime.now() - timedelta(hours=hours)
+        return [measurement for chunk
+                in self.iter_measurements(start=cutoff_time,
+                                          batch_size=10000)
+                for measurement in chunk]
+
+    def iter_measurements(self, sensor_id: Optional[str] = None,
+                          start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          batch_size: int = 1000,
+                          fields: Optional[Sequence[str]] = None,
+                          columnar: bool = False,
+                          ascending: bool = False,
+                          registry: Optional[SensorRegistry] = None
+                          ) -> Iterator[Measurements]:
+        """
+        Parcourt les mesures par blocs, sans tout charger en mémoire.
+
+        Les capteurs sont parcourus ensemble par fenêtres de temps dont la
+        durée s'ajuste pour contenir environ max(batch_size, nombre de
+        capteurs) mesures : seules les mesures d'une fenêtre sont copiées
+        hors des segments projetés en mémoire.
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            start: Début de l'intervalle de temps (inclus, optionnel)
+            end: Fin de l'intervalle de temps (exclue, optionnelle)
+            batch_size: Nombre de mesures par bloc
+            fields: Champs à conserver dans les documents (tous si absent,
+                ignoré en mode colonnes)
+            columnar: Rendre des MeasurementBatch au lieu de listes
+            ascending: Ordre chronologique croissant
+            registry: Registre partagé par les blocs en mode colonnes
+                (nouveau si absent)
+
+        Yields:
+            Blocs de mesures (listes de documents ou lots en colonnes)
+        """
+        registry = registry if registry is not None else SensorRegistry()
+        low = datetime_to_micros(start) if start is not None else None
+        high = datetime_to_micros(end) if end is not None else None
+        sensor_ids = self._sensor_ids(sensor_id)
+        with self._lock:
+            entries = [self._sensors[name] for name in sensor_ids]
+            total = sum(entry['count'] for entry in entries)
+            latest = max((entry['last_timestamp'] for entry in entries
+                          if entry['last_timestamp'] is not None),
+                         default=None)
+        keep_open = len(sensor_ids) <= MAX_MAPPED_CURSORS
+        cursors = [cursor for cursor in (
+            self._cursor(name, registry, ascending, low, high, keep_open)
+            for name in sensor_ids
+        ) if cursor is not None]
+        if not cursors:
+            return
+
+        # Première fenêtre à partir de la mesure la plus ancienne (la plus
+        # récente en ordre décroissant), durée estimée d'après la densité
+        earliest = min(cursor.first() for cursor in cursors)
+        if ascending:
+            cutoff = earliest if low is None else max(earliest, low)
+        else:
+            cutoff = latest + 1 if high is None else min(latest + 1, high)
+        target = max(batch_size, len(cursors))
+        span = max(1, (latest + 1 - earliest) * target // max(total, 1))
+
+        pending: Tuple[np.ndarray, ...] = ()
+        while cursors:
+            cutoff = cutoff + span if ascending else cutoff - span
+            indexes, sizes, timestamps, consumption = [], [], [], []
+            for cursor in cursors:
+                for ts, values in cursor.take(cutoff):
+                    indexes.append(cursor.index)
+                    sizes.append(ts.shape[0])
+                    timestamps.append(ts)
+                    consumption.append(values)
+            cursors = [cursor for cursor in cursors if not cursor.exhausted]
+            rows = sum(sizes)
+            if rows < target // 2:
+                span *= 2
+            elif rows > 2 * target:
+                span = max(1, span // 2)
+            if not rows:
+                continue
+
+            window = MeasurementBatch(registry,
+                                      np.repeat(np.array(indexes,
+                                                         dtype=np.int32),
+                                                sizes),
+                                      np.concatenate(consumption),
+                                      np.concatenate(timestamps))
+            order = np.argsort(window.timestamp, kind='stable')
+            if not ascending:
+                order = order[::-1]
+            window = window.select(order)
+            if pending:
+                window = MeasurementBatch.concat([pending[0], window])
+            full = len(window) - len(window) % batch_size if cursors \
+                else len(window)
+            for position in range(0, full, batch_size):
+                yield self._format_chunk(
+                    window.select(np.arange(position,
+                                            min(position + batch_size,
+                                                full))),
+                    fields, columnar
+                )
+            pending = (window.select(np.arange(full, len(window))),) \
+                if full < len(window) else ()
+        if pending:
+            yield self._format_chunk(pending[0], fields, columnar)
+
+    @staticmethod
+    def _format_chunk(chunk: MeasurementBatch,
+                      fields: Optional[Sequence[str]], columnar: bool
+                      ) -> Measurements:
+        """Met un bloc au format demandé par iter_measurements."""
+        if columnar:
+            return chunk
+        if fields is None:
+            return chunk.to_dicts()
+        return [{field: document[field] for field in fields
+                 if field in document}
+                for document in chunk.to_dicts()]
+
+    @timed_storage('get_statistics_bulk')
+    def get_statistics_bulk(self, sensor_ids: Optional[Iterable[str]] = None
+                            ) -> Dict[str, Dict]:
+        """
+        Calcule les statistiques de plusieurs capteurs à partir des
+        agrégats de l'index, sans lire les segments.
+
+        Args:
+            sensor_ids: Capteurs concernés (tous si absent)
+
+        Returns:
+            Statistiques par identifiant de capteur (les capteurs sans
+            mesure sont absents)
+        """
+        results = {}
+        with self._lock:
+            wanted = self._sensors if sensor_ids is None \
+                else dict.fromkeys(sensor_ids)
+            for sensor_id in wanted:
+                entry = self._sensors.get(sensor_id)
+                if entry is None:
+                    continue
+                stats = summarize(entry['count'], entry['sum'],
+                                  entry['sum_sq'], entry['min'],
+                                  entry['max'])
+                if stats:
+                    stats['_id'] = sensor_id
+                    results[sensor_id] = stats
+        return results
+
+    def get_statistics_range(self, sensor_id: str,
+                             start: Optional[datetime] = None,
+                             end: Optional[datetime] = None
+                             ) -> Optional[Dict]:
+        """
+        Calcule les statistiques d'un capteur sur un intervalle de temps.
+
+        Args:
+            sensor_id: Identifiant du capteur
+            start: Début de l'intervalle (inclus, optionnel)
+            end: Fin de l'intervalle (exclue, optionnelle)
+
+        Returns:
+            Dictionnaire de statistiques ou None
+        """
+        _, values = self.read_range(sensor_id, start, end)
+        if not values.shape[0]:
+            return None
+        stats = summarize(values.shape[0], float(values.sum()),
+                          float(np.dot(values, values)),
+                          float(values.min()), float(values.max()))
+        stats['_id'] = sensor_id
+        return stats
+
+    @timed_storage('insert_anomalies')
+    def insert_anomalies(self, anomalies: List[Dict],
+                         run_id: Optional[str] = None) -> int:
+        """
+        Enregistre des anomalies à la fin du fichier des anomalies.
+
+        Args:
+            anomalies: Anomalies au format de detect_anomaly
+            run_id: Identifiant du rejeu ou de l'exécution (optionnel)
+
+        Returns:
+            Nombre d'anomalies enregistrées
+        """
+        if not anomalies:
+            return 0
+        lines = []
+        for anomaly in anomalies:
+            document = dict(anomaly,
+                            timestamp=datetime_to_micros(anomaly['timestamp']))
+            if run_id is not None:
+                document['run_id'] = run_id
+            lines.append(json.dumps(document))
+        try:
+            with self._lock, open(os.path.join(self.directory,
+                                               ANOMALIES_FILE),
+                                  'a', encoding='utf-8') as handle:
+                handle.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.error(f"Erreur d'écriture des anomalies: {e}")
+            return 0
+        return len(lines)
+
+    def get_anomalies(self, sensor_id: Optional[str] = None,
+                      run_id: Optional[str] = None,
+                      limit: int = 100) -> List[Dict]:
+        """
+        Récupère les anomalies enregistrées les plus récentes.
+
+        Le fichier est parcouru ligne à ligne ; seules les `limit`
+        anomalies les plus récentes sont gardées en mémoire.
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            run_id: Filtrer par identifiant d'exécution (optionnel)
+            limit: Nombre maximum de résultats
+
+        Returns:
+            Liste des anomalies, de la plus récente à la plus ancienne
+        """
+        path = os.path.join(self.directory, ANOMALIES_FILE)
+        if not os.path.exists(path):
+            return []
+
+        def matching(handle):
+            for line in handle:
+                document = json.loads(line)
+                if (sensor_id and document['sensor_id'] != sensor_id) or \
+                        (run_id is not None
+                         and document.get('run_id') != run_id):
+                    continue
+                yield document
+
+        with open(path, encoding='utf-8') as handle:
+            documents = heapq.nlargest(limit, matching(handle),
+                                       key=lambda d: d['timestamp'])
+        for document in documents:
+            document['timestamp'] = micros_to_datetime(document['timestamp'])
+            document['expected_range'] = tuple(document['expected_range'])
+        return documents
+
+    def save_snapshot(self, data: bytes, metadata: Optional[Dict] = None,
+                      keep: int = 3) -> int:
+        """
+        Enregistre une nouvelle version de l'instantané des baselines.
+
+        Args:
+            data: Contenu de l'instantané
+            metadata: Métadonnées enregistrées avec lui
+            keep: Nombre de versions conservées
+
+        Returns:
+            Numéro de la version écrite (0 en cas d'erreur)
+        """
+        return self._snapshots.save_snapshot(data, metadata, keep)
+
+    def load_snapshot(self, version: Optional[int] = None
+                      ) -> Optional[Tuple[bytes, Dict]]:
+        """
+        Lit une version complète de l'instantané des baselines.
+
+        Args:
+            version: Version demandée (la plus récente si absente)
+
+        Returns:
+            Tuple (contenu, métadonnées), ou None si aucun instantané
+        """
+        return self._snapshots.load_snapshot(version)
+
+    def clear_collection(self):
+        """Supprime tous les segments et l'index."""
+        with self._lock:
+            try:
+                self._close_handles()
+                for entry in self._sensors.values():
+                    shutil.rmtree(os.path.join(self.directory,
+                                               entry['directory']),
+                                  ignore_errors=True)
+                self._sensors = {}
+                self.checkpoint()
+            except OSError as e:
+                logger.error(f"Erreur de suppression: {e}")
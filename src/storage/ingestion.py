@@ -0,0 +1,400 @@
+"""
+Ingestion asynchrone (write-behind) des mesures vers le stockage.
+
+La boucle de surveillance dépose ses lots dans une file bornée ; un ou
+plusieurs threads d'écriture les regroupent par taille ou par délai et
+les insèrent en mode non ordonné, sans bloquer la détection.
+
+Les lots en colonnes (MeasurementBatch) d'un même groupe sont concaténés
+et transmis tels quels au stockage, qui ne les convertit en documents
+qu'au besoin.
+
+En mode 'spill', les lots débordés sur disque sont relus en alternance
+avec la file : ils sont écrits même sous charge continue. Un fichier de
+débordement n'est supprimé qu'après l'écriture réussie de son lot ; les
+fichiers restant après une fermeture interrompue ou une écriture en
+échec sont repris au démarrage suivant avec le même répertoire.
+"""
+import logging
+import os
+import pickle
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from src.core.measurement_batch import MeasurementBatch
+from src.core.metrics import QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+BACKPRESSURE_POLICIES = ('block', 'drop_oldest', 'spill')
+
+# Délai maximal (s) pendant lequel un thread d'écriture attend la file
+# avant de vérifier les demandes de vidange et le débordement disque
+_POLL_INTERVAL = 0.05
+
+_STOP = object()
+
+# Extension des fichiers de débordement
+_SPILL_SUFFIX = '.pkl'
+
+Measurements = Union[List[Dict], MeasurementBatch]
+
+
+class WriteBehindIngestor:
+    """File d'écriture asynchrone autour d'un gestionnaire de stockage."""
+
+    def __init__(self, handler, max_queue_size: int = 1000,
+                 writers: int = 1, batch_size: int = 5000,
+                 flush_interval: float = 0.5,
+                 backpressure: str = 'block',
+                 spill_directory: Optional[str] = None):
+        """
+        Initialise l'ingestion.
+
+        Args:
+            handler: Gestionnaire exposant insert_measurements(measurements,
+                ordered=...) (MongoDBHandler par exemple)
+            max_queue_size: Nombre maximal de lots en attente
+            writers: Nombre de threads d'écriture
+            batch_size: Nombre de mesures regroupées par insertion
+            flush_interval: Délai maximal (s) avant d'écrire un groupe
+                incomplet
+            backpressure: Comportement quand la file est pleine :
+                'block' (attendre), 'drop_oldest' (abandonner le lot le
+                plus ancien) ou 'spill' (déborder sur disque)
+            spill_directory: Répertoire de débordement (mode 'spill',
+                temporaire si absent)
+
+        Raises:
+            ValueError: Si la politique de contre-pression est inconnue
+        """
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(
+                f"Politique de contre-pression inconnue: {backpressure}"
+            )
+        self.handler = handler
+        self.writers = max(1, writers)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure = backpressure
+        self.spill_directory = spill_directory
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._flush_requested = threading.Event()
+        self._pending_lock = threading.Condition()
+        self._pending = 0
+        self._spill_lock = threading.Lock()
+        self._spill_sequence = 0
+        self._spill_files: List[str] = []
+        self._temporary_spill = False
+        self.stats = {'submitted': 0, 'written': 0, 'failed': 0,
+                      'dropped': 0, 'spilled': 0}
+        self._recover_spills()
+
+        # Jauge calculée à l'export (somme des ingestions vivantes)
+        QUEUE_DEPTH.track(self, lambda ingestor: ingestor.queue_depth,
+                          ('ingestion',))
+
+    @property
+    def queue_depth(self) -> int:
+        """Nombre de lots en attente dans la file."""
+        return self._queue.qsize()
+
+    @property
+    def spilled_batches(self) -> int:
+        """Nombre de lots en attente sur disque."""
+        with self._spill_lock:
+            return len(self._spill_files)
+
+    def _recover_spills(self):
+        """Reprend les lots laissés sur disque par une exécution passée."""
+        if self.spill_directory is None \
+                or not os.path.isdir(self.spill_directory):
+            return
+        names = sorted(name for name in os.listdir(self.spill_directory)
+                       if name.endswith(_SPILL_SUFFIX))
+        if not names:
+            return
+        self._spill_files = [os.path.join(self.spill_directory, name)
+                             for name in names]
+        self._spill_sequence = int(names[-1][:-len(_SPILL_SUFFIX)])
+        self._add_pending(len(names))
+        logger.info(f"{len(names)} lots débordés repris depuis "
+                    f"{self.spill_directory}")
+
+    def start(self):
+        """Démarre les threads d'écriture."""
+        if self._threads:
+            return
+        for number in range(self.writers):
+            thread = threading.Thread(target=self._run_writer,
+                                      name=f"ingestion-writer-{number}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, measurements: Measurements) -> bool:
+        """
+        Dépose un lot de mesures pour écriture asynchrone.
+
+        Args:
+            measurements: Liste de mesures ou lot en colonnes
+
+        Returns:
+            True si le lot a été accepté (file ou débordement disque)
+
+        Raises:
+            RuntimeError: Si l'ingestion est fermée
+        """
+        if self._closed:
+            raise RuntimeError("L'ingestion est fermée")
+        if not measurements:
+            return True
+
+        self._add_pending(1)
+        self._count('submitted', len(measurements))
+        if self.backpressure == 'block':
+            self._queue.put(measurements)
+            return True
+
+        while True:
+            try:
+                self._queue.put_nowait(measurements)
+                return True
+            except queue.Full:
+                if self.backpressure == 'spill':
+                    self._spill(measurements)
+                    return True
+                self._drop_oldest()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Attend l'écriture de tous les lots déposés.
+
+        Args:
+            timeout: Délai maximal d'attente en secondes
+
+        Returns:
+            True si tout a été écrit dans le délai
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._flush_requested.set()
+        try:
+            with self._pending_lock:
+                while self._pending:
+                    remaining = None if deadline is None \
+                        else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._pending_lock.wait(remaining)
+            return True
+        finally:
+            self._flush_requested.clear()
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Vide la file puis arrête les threads d'écriture.
+
+        Args:
+            timeout: Délai maximal d'attente pour la vidange
+
+        Returns:
+            True si toutes les mesures ont été écrites
+        """
+        if self._closed:
+            return True
+        drained = self.flush(timeout)
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+        with self._spill_lock:
+            leftover = len(self._spill_files)
+            if self.spill_directory is not None \
+                    and os.path.isdir(self.spill_directory):
+                leftover = sum(name.endswith(_SPILL_SUFFIX) for name
+                               in os.listdir(self.spill_directory))
+        if leftover:
+            logger.warning(
+                f"{leftover} lots restent sur disque dans "
+                f"{self.spill_directory} ; ils seront repris par une "
+                f"ingestion utilisant ce répertoire"
+            )
+        elif self._temporary_spill:
+            shutil.rmtree(self.spill_directory, ignore_errors=True)
+            self.spill_directory = None
+            self._temporary_spill = False
+        return drained and not leftover
+
+    def _run_writer(self):
+        """Boucle d'un thread d'écriture."""
+        buffer: List[Measurements] = []
+        spill_paths: List[str] = []
+        size = 0
+        first_at = None
+        stopping = False
+        from_spill = False
+        while not stopping:
+            item, path = self._next(from_spill, wait=True)
+
+            # Regroupement glouton des lots déjà disponibles
+            while item is not None:
+                if item is _STOP:
+                    stopping = True
+                    break
+                buffer.append(item)
+                size += len(item)
+                if path is not None:
+                    spill_paths.append(path)
+                from_spill = not from_spill
+                if first_at is None:
+                    first_at = time.monotonic()
+                if size >= self.batch_size:
+                    break
+                item, path = self._next(from_spill, wait=False)
+
+            if buffer and (
+                stopping
+                or size >= self.batch_size
+                or self._flush_requested.is_set()
+                or time.monotonic() - first_at >= self.flush_interval
+            ):
+                self._write(buffer, spill_paths)
+                buffer, spill_paths, size, first_at = [], [], 0, None
+
+    def _next(self, from_spill: bool, wait: bool):
+        """
+        Retourne le lot suivant, en alternant file et débordement disque.
+
+        Args:
+            from_spill: Commencer par le plus ancien lot débordé
+            wait: Attendre la file au plus _POLL_INTERVAL secondes
+
+        Returns:
+            Tuple (lot, _STOP ou None si rien n'est disponible ; fichier
+            de débordement du lot ou None)
+        """
+        if from_spill:
+            spilled = self._unspill()
+            if spilled[0] is not None:
+                return spilled
+        try:
+            if wait and not self._spill_files:
+                return self._queue.get(timeout=_POLL_INTERVAL), None
+            return self._queue.get_nowait(), None
+        except queue.Empty:
+            return (None, None) if from_spill else self._unspill()
+
+    @staticmethod
+    def _merge(items: List[Measurements]) -> Measurements:
+        """
+        Réunit les lots d'un groupe en une seule insertion.
+
+        Des lots en colonnes partageant un registre restent en colonnes ;
+        sinon le groupe est converti en documents.
+        """
+        if all(isinstance(item, MeasurementBatch) for item in items):
+            if len(items) == 1:
+                return items[0]
+            try:
+                return MeasurementBatch.concat(items)
+            except ValueError:  # registres différents
+                pass
+        documents: List[Dict] = []
+        for item in items:
+            documents.extend(item.to_dicts()
+                             if isinstance(item, MeasurementBatch) else item)
+        return documents
+
+    def _write(self, items: List[Measurements], spill_paths: List[str]):
+        """
+        Insère un groupe de lots et met à jour les compteurs.
+
+        Les fichiers de débordement du groupe ne sont supprimés que si
+        toutes ses mesures ont été écrites.
+        """
+        measurements = self._merge(items)
+        try:
+            written = self.handler.insert_measurements(measurements,
+                                                       ordered=False)
+        except Exception as e:  # le thread d'écriture doit survivre
+            logger.error(f"Erreur d'ingestion asynchrone: {e}")
+            written = 0
+        self._count('written', written)
+        self._count('failed', len(measurements) - written)
+        if written == len(measurements):
+            for path in spill_paths:
+                os.remove(path)
+        elif spill_paths:
+            logger.warning(f"{len(spill_paths)} lots débordés conservés "
+                           f"dans {self.spill_directory} après une "
+                           f"écriture en échec")
+        self._add_pending(-len(items))
+
+    def _drop_oldest(self):
+        """Abandonne le lot le plus ancien de la file."""
+        try:
+            oldest = self._queue.get_nowait()
+        except queue.Empty:
+            return
+        if oldest is _STOP:
+            self._queue.put_nowait(oldest)
+            return
+        self._count('dropped', len(oldest))
+        self._add_pending(-1)
+
+    def _spill(self, measurements: Measurements):
+        """Écrit un lot sur disque quand la file est pleine."""
+        if isinstance(measurements, MeasurementBatch):
+            measurements = measurements.to_dicts()
+        with self._spill_lock:
+            if self.spill_directory is None:
+                self.spill_directory = tempfile.mkdtemp(prefix='ingestion-')
+                self._temporary_spill = True
+            os.makedirs(self.spill_directory, exist_ok=True)
+            self._spill_sequence += 1
+            path = os.path.join(self.spill_directory,
+                                f"{self._spill_sequence:012d}"
+                                f"{_SPILL_SUFFIX}")
+            with open(path, 'wb') as spill_file:
+                pickle.dump(measurements, spill_file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            self._spill_files.append(path)
+        self._count('spilled', len(measurements))
+
+    def _unspill(self) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """
+        Relit le plus ancien lot débordé sur disque, s'il existe.
+
+        Le fichier reste sur disque jusqu'à l'écriture du lot (_write).
+
+        Returns:
+            Tuple (lot ou None, chemin du fichier ou None)
+        """
+        with self._spill_lock:
+            if not self._spill_files:
+                return None, None
+            path = self._spill_files.pop(0)
+        with open(path, 'rb') as spill_file:
+            return pickle.load(spill_file), path
+
+    def _count(self, name: str, value: int):
+        """Incrémente un compteur de statistiques."""
+        with self._pending_lock:
+            self.stats[name] += value
+
+    def _add_pending(self, delta: int):
+        """Met à jour le nombre de lots non encore écrits."""
+        with self._pending_lock:
+            self._pending += delta
+            if not self._pending:
+                self._pending_lock.notify_all()
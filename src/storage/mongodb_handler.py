@@ -1,29 +1,101 @@
 """
 Module de gestion du stockage MongoDB pour les données énergétiques.
 """
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, PyMongoError
-from typing import List, Dict, Optional
-from datetime import datetime
+import heapq
+import logging
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import (
+    BulkWriteError, CollectionInvalid, ConnectionFailure, PyMongoError
+)
+from itertools import islice
+from typing import (
+    Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+)
+from datetime import datetime, timedelta
 
+import numpy as np
 
-class MongoDBHandler:
+from src.core.measurement_batch import MeasurementBatch, SensorRegistry
+from src.core.metrics import (
+    DOCUMENTS_INSERTED, INSERT_FAILURES, timed_storage
+)
+from src.storage.base import ANALYSIS_FIELDS, Measurements, StorageBackend
+from src.storage.aggregates import summarize
+from src.storage.cache import TTLCache
+from src.storage.retention import RetentionManager
+from src.storage.rollups import RollupManager
+
+logger = logging.getLogger(__name__)
+
+# Clé de cache des statistiques de tous les capteurs
+_ALL_SENSORS = ('__all__',)
+
+# Taille des morceaux des instantanés (documents limités à 16 Mo)
+SNAPSHOT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class MongoDBHandler(StorageBackend):
     """Gestionnaire de base de données MongoDB."""
 
+    backend_name = 'mongodb'
+
     def __init__(self, connection_string: str = "mongodb://localhost:27017/",
-                 database_name: str = "energy_monitoring"):
+                 database_name: str = "energy_monitoring",
+                 collection_name: str = "measurements",
+                 anomalies_collection_name: str = "anomalies",
+                 snapshots_collection_name: str = "baseline_snapshots",
+                 time_series: bool = False,
+                 granularity: str = "seconds",
+                 rollups: bool = False,
+                 stats_cache_ttl: float = 5.0,
+                 stats_cache_size: int = 100000,
+                 retention: Optional[Dict] = None):
         """
         Initialise la connexion MongoDB.
 
         Args:
             connection_string: URL de connexion MongoDB
             database_name: Nom de la base de données
+            collection_name: Nom de la collection des mesures
+            anomalies_collection_name: Nom de la collection des anomalies
+            snapshots_collection_name: Nom de la collection des
+                instantanés des baselines (les données sont découpées
+                dans la collection suffixée par _chunks)
+            time_series: Créer la collection en collection time-series
+                (timestamp comme timeField, sensor_id comme metaField)
+            granularity: Granularité time-series ('seconds', 'minutes'
+                ou 'hours')
+            rollups: Maintenir les agrégats minute/heure/jour à chaque
+                insertion et calculer les statistiques à partir d'eux ;
+                à la connexion, les rollups sont reconstruits à partir des
+                mesures existantes s'ils ne les couvrent pas encore
+            stats_cache_ttl: Durée de vie (s) des statistiques en cache ;
+                0 désactive le cache
+            stats_cache_size: Nombre maximal de capteurs en cache
+            retention: Compacter les mesures brutes expirées en agrégats
+                (options de RetentionManager : retention_days,
+                bucket_seconds, slice_seconds, batch_size ; aucune
+                suppression si absent)
         """
         self.connection_string = connection_string
         self.database_name = database_name
+        self.collection_name = collection_name
+        self.anomalies_collection_name = anomalies_collection_name
+        self.snapshots_collection_name = snapshots_collection_name
+        self.time_series = time_series
+        self.granularity = granularity
+        self.rollups_enabled = rollups
         self.client = None
         self.db = None
         self.collection = None
+        self.anomalies = None
+        self.snapshots = None
+        self.snapshot_chunks = None
+        self.rollups: Optional[RollupManager] = None
+        self.retention_options = retention
+        self.retention: Optional[RetentionManager] = None
+        self.stats_cache = TTLCache(stats_cache_ttl, stats_cache_size) \
+            if stats_cache_ttl > 0 else None
 
     def connect(self) -> bool:
         """
@@ -38,14 +110,141 @@ class MongoDBHandler:
             # Test de connexion
             self.client.admin.command('ping')
             self.db = self.client[self.database_name]
-            self.collection = self.db['measurements']
+            if self.time_series:
+                self._create_time_series_collection()
+            self.collection = self.db[self.collection_name]
+            self.anomalies = self.db[self.anomalies_collection_name]
+            self.snapshots = self.db[self.snapshots_collection_name]
+            self.snapshot_chunks = \
+                self.db[f"{self.snapshots_collection_name}_chunks"]
+            if self.rollups_enabled:
+                self.rollups = RollupManager(self.db, self.collection_name)
+            if self.retention_options is not None:
+                self.retention = RetentionManager(
+                    self.db, self.collection, self.collection_name,
+                    **self.retention_options
+                )
+            self.ensure_indexes()
+            if self.rollups and not self.rollups.complete:
+                self.backfill_rollups()
             return True
         except ConnectionFailure as e:
-            print(f"Erreur de connexion MongoDB: {e}")
+            logger.error(f"Erreur de connexion MongoDB: {e}")
             return False
 
+    def _create_time_series_collection(self):
+        """Crée la collection des mesures en time-series si absente."""
+        if self.collection_name in self.db.list_collection_names():
+            return
+        try:
+            self.db.create_collection(self.collection_name, timeseries={
+                'timeField': 'timestamp',
+                'metaField': 'sensor_id',
+                'granularity': self.granularity
+            })
+        except CollectionInvalid:
+            # Collection créée entre-temps par un autre processus
+            pass
+        except PyMongoError as e:
+            logger.error(
+                f"Erreur de création de la collection time-series: {e}"
+            )
+
+    def ensure_indexes(self):
+        """
+        Crée les index utilisés par les requêtes (opération idempotente).
+
+        - (sensor_id, timestamp) : get_measurements et get_statistics
+        - timestamp : get_recent_measurements
+        - anomalies (run_id, sensor_id, timestamp) et (sensor_id,
+          timestamp) : get_anomalies
+        - morceaux d'instantanés (snapshot, chunk) : load_snapshot
+        - agrégats de rétention (sensor_id, bucket) et bucket
+        """
+        try:
+            self.collection.create_index(
+                [('sensor_id', ASCENDING), ('timestamp', DESCENDING)],
+                name='sensor_id_timestamp'
+            )
+            self.collection.create_index([('timestamp', DESCENDING)],
+                                         name='timestamp')
+            if self.anomalies is not None:
+                self.anomalies.create_index(
+                    [('run_id', ASCENDING), ('sensor_id', ASCENDING),
+                     ('timestamp', DESCENDING)],
+                    name='run_id_sensor_id_timestamp'
+                )
+                self.anomalies.create_index(
+                    [('sensor_id', ASCENDING), ('timestamp', DESCENDING)],
+                    name='sensor_id_timestamp'
+                )
+            if self.snapshot_chunks is not None:
+                self.snapshot_chunks.create_index(
+                    [('snapshot', ASCENDING), ('chunk', ASCENDING)],
+                    name='snapshot_chunk', unique=True
+                )
+            if self.rollups:
+                self.rollups.ensure_indexes()
+            if self.retention:
+                self.retention.ensure_indexes()
+        except PyMongoError as e:
+            logger.error(f"Erreur de création des index: {e}")
+
+    def backfill_rollups(self, batch_size: int = 10000) -> int:
+        """
+        Reconstruit les rollups à partir des mesures brutes.
+
+        Les mesures sont lues par blocs (mémoire bornée). Jusqu'à la fin
+        de la reconstruction, les statistiques sont calculées sur les
+        mesures brutes ; une erreur de lecture interrompt la
+        reconstruction, qui n'est alors pas marquée terminée.
+
+        Args:
+            batch_size: Nombre de mesures lues par bloc
+
+        Returns:
+            Nombre de mesures intégrées, -1 en cas d'erreur ou sans rollups
+        """
+        if not self.rollups:
+            return -1
+        try:
+            total = self.rollups.backfill(self.iter_measurements(
+                batch_size=batch_size, columnar=True, ascending=True,
+                fields=('sensor_id', 'timestamp', 'consumption_kwh'),
+                raise_errors=True
+            ))
+        except PyMongoError as e:
+            logger.error(f"Erreur de reconstruction des rollups: {e}")
+            return -1
+        if self.stats_cache is not None:
+            self.stats_cache.clear()
+        return total
+
+    def compact(self, now: Optional[datetime] = None,
+                max_steps: Optional[int] = None) -> int:
+        """
+        Compacte les mesures brutes expirées (voir RetentionManager).
+
+        Args:
+            now: Instant de référence (maintenant si absent)
+            max_steps: Nombre maximal de tranches (toutes si absent)
+
+        Returns:
+            Nombre de mesures compactées, -1 en cas d'erreur ou sans
+            rétention
+        """
+        if not self.retention:
+            return -1
+        try:
+            return self.retention.compact(now, max_steps)
+        except PyMongoError as e:
+            logger.error(f"Erreur de compactage: {e}")
+            return -1
+
     def disconnect(self):
         """Ferme la connexion MongoDB."""
+        if self.retention:
+            self.retention.stop()
         if self.client:
             self.client.close()
 
@@ -61,17 +260,26 @@ class MongoDBHandler:
         """
         try:
             result = self.collection.insert_one(measurement)
+            DOCUMENTS_INSERTED.inc(1, (self.backend_name,))
+            self._update_rollups(MeasurementBatch.from_dicts([measurement]))
+            self._invalidate_statistics([measurement['sensor_id']])
             return str(result.inserted_id)
         except PyMongoError as e:
-            print(f"Erreur d'insertion: {e}")
+            logger.error(f"Erreur d'insertion: {e}")
+            INSERT_FAILURES.inc(1, (self.backend_name,))
             return None
 
-    def insert_measurements(self, measurements: List[Dict]) -> int:
+    @timed_storage('insert_measurements')
+    def insert_measurements(self, measurements: Measurements,
+                            ordered: bool = True) -> int:
         """
         Insère plusieurs mesures dans la base.
 
         Args:
-            measurements: Liste de mesures
+            measurements: Liste de mesures ou lot en colonnes, converti en
+                documents uniquement au moment de l'écriture
+            ordered: Arrêter l'insertion à la première erreur ; False
+                laisse le serveur paralléliser et insérer le reste
 
         Returns:
             Nombre de documents insérés
@@ -79,13 +287,75 @@ class MongoDBHandler:
         if not measurements:
             return 0
 
+        batch = None
+        if isinstance(measurements, MeasurementBatch):
+            batch = measurements
+            measurements = measurements.to_dicts()
+
         try:
-            result = self.collection.insert_many(measurements)
-            return len(result.inserted_ids)
+            result = self.collection.insert_many(measurements,
+                                                 ordered=ordered)
+            inserted = len(result.inserted_ids)
+            failed = ()
+        except BulkWriteError as e:
+            logger.error(f"Erreur d'insertion multiple: {e}")
+            inserted = e.details.get('nInserted', 0)
+            failed = [error['index'] for error in e.details['writeErrors']]
+            if ordered and failed:
+                # En mode ordonné, rien n'est inséré après la première erreur
+                failed = range(failed[0], len(measurements))
         except PyMongoError as e:
-            print(f"Erreur d'insertion multiple: {e}")
+            logger.error(f"Erreur d'insertion multiple: {e}")
+            INSERT_FAILURES.inc(len(measurements), (self.backend_name,))
             return 0
 
+        DOCUMENTS_INSERTED.inc(inserted, (self.backend_name,))
+        INSERT_FAILURES.inc(len(measurements) - inserted,
+                            (self.backend_name,))
+
+        if self.rollups and inserted:
+            if batch is None:
+                batch = MeasurementBatch.from_dicts(measurements)
+            if failed:
+                kept = np.ones(len(batch), dtype=bool)
+                kept[list(failed)] = False
+                batch = batch.select(kept)
+            self._update_rollups(batch)
+
+        if inserted and self.stats_cache is not None:
+            if batch is not None:
+                ids = batch.registry.ids
+                touched = [ids[index] for index
+                           in np.unique(batch.sensor_index).tolist()]
+            else:
+                touched = {m['sensor_id'] for m in measurements}
+            self._invalidate_statistics(touched)
+        return inserted
+
+    def _invalidate_statistics(self, sensor_ids: Iterable[str]):
+        """
+        Invalide les statistiques en cache de capteurs modifiés.
+
+        Args:
+            sensor_ids: Capteurs ayant reçu de nouvelles mesures
+        """
+        if self.stats_cache is not None:
+            self.stats_cache.invalidate(list(sensor_ids) + [_ALL_SENSORS])
+
+    def _update_rollups(self, batch: MeasurementBatch):
+        """
+        Répercute des mesures insérées sur les rollups.
+
+        Args:
+            batch: Mesures effectivement insérées
+        """
+        if not self.rollups:
+            return
+        try:
+            self.rollups.apply(batch)
+        except PyMongoError as e:
+            logger.error(f"Erreur de mise à jour des rollups: {e}")
+
     def get_measurements(self, sensor_id: Optional[str] = None,
                          limit: int = 100) -> List[Dict]:
         """
@@ -105,7 +375,7 @@ class MongoDBHandler:
             ).limit(limit)
             return list(cursor)
         except PyMongoError as e:
-            print(f"Erreur de lecture: {e}")
+            logger.error(f"Erreur de lecture: {e}")
             return []
 
     def get_recent_measurements(self, hours: int = 24) -> List[Dict]:
@@ -119,45 +389,467 @@ class MongoDBHandler:
             Liste des mesures récentes
         """
         try:
-            from datetime import timedelta
             cutoff_time = datetime.now() - timedelta(hours=hours)
             query = {'timestamp': {'$gte': cutoff_time}}
             cursor = self.collection.find(query).sort('timestamp', -1)
             return list(cursor)
         except PyMongoError as e:
-            print(f"Erreur de lecture: {e}")
+            logger.error(f"Erreur de lecture: {e}")
             return []
 
-    def get_statistics(self, sensor_id: str) -> Optional[Dict]:
+    def iter_measurements(self, sensor_id: Optional[str] = None,
+                          start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          batch_size: int = 1000,
+                          fields: Optional[Sequence[str]] = None,
+                          columnar: bool = False,
+                          ascending: bool = False,
+                          registry: Optional[SensorRegistry] = None,
+                          raise_errors: bool = False
+                          ) -> Iterator[Measurements]:
+        """
+        Parcourt les mesures par blocs, sans tout charger en mémoire.
+
+        Le curseur MongoDB est lu par lots de `batch_size` documents et
+        chaque bloc est rendu dès qu'il est complet : la mémoire utilisée
+        ne dépend que de la taille d'un bloc.
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            start: Début de l'intervalle de temps (inclus, optionnel)
+            end: Fin de l'intervalle de temps (exclue, optionnelle)
+            batch_size: Nombre de mesures par bloc
+            fields: Champs à récupérer (tous si absent ; ANALYSIS_FIELDS
+                par défaut en mode colonnes)
+            columnar: Rendre des MeasurementBatch au lieu de listes
+            ascending: Ordre chronologique croissant
+            registry: Registre partagé par les blocs en mode colonnes
+                (nouveau si absent)
+            raise_errors: Propager les erreurs de lecture au lieu
+                d'arrêter le parcours (lecteurs qui doivent tout lire)
+
+        Yields:
+            Blocs de mesures (listes de documents ou lots en colonnes)
+
+        Raises:
+            PyMongoError: En cas d'erreur de lecture, si raise_errors
+        """
+        query = {'sensor_id': sensor_id} if sensor_id else {}
+        if start is not None or end is not None:
+            query['timestamp'] = {}
+            if start is not None:
+                query['timestamp']['$gte'] = start
+            if end is not None:
+                query['timestamp']['$lt'] = end
+
+        if fields is None and columnar:
+            fields = ANALYSIS_FIELDS
+        projection = None
+        if fields is not None:
+            projection = {field: 1 for field in fields}
+            projection.setdefault('_id', 0)
+
+        if columnar and registry is None:
+            registry = SensorRegistry()
+
+        try:
+            cursor = iter(self.collection.find(query, projection).sort(
+                'timestamp', 1 if ascending else -1
+            ).batch_size(batch_size))
+            while True:
+                chunk = list(islice(cursor, batch_size))
+                if not chunk:
+                    return
+                if columnar:
+                    yield MeasurementBatch.from_dicts(chunk, registry)
+                else:
+                    yield chunk
+        except PyMongoError as e:
+            if raise_errors:
+                raise
+            logger.error(f"Erreur de lecture: {e}")
+
+    @timed_storage('get_statistics_bulk')
+    def get_statistics_bulk(self, sensor_ids: Optional[Iterable[str]] = None
+                            ) -> Dict[str, Dict]:
+        """
+        Calcule les statistiques de plusieurs capteurs en une requête.
+
+        Les résultats sont mis en cache (durée de vie et taille bornées) et
+        invalidés pour les capteurs qui reçoivent de nouvelles mesures ;
+        seuls les capteurs absents du cache sont demandés à MongoDB, en
+        un seul pipeline $group.
+
+        Args:
+            sensor_ids: Capteurs concernés (tous si absent)
+
+        Returns:
+            Statistiques par identifiant de capteur (les capteurs sans
+            mesure sont absents)
+        """
+        cache = self.stats_cache
+        if sensor_ids is None:
+            if cache is not None:
+                found, known = cache.lookup(_ALL_SENSORS)
+                if found:
+                    cached = {sensor_id: cache.get(sensor_id)
+                              for sensor_id in known}
+                    if all(cached.values()):
+                        return cached
+            results = self._query_statistics(None)
+            if results is not None and cache is not None:
+                for sensor_id, stats in results.items():
+                    cache.set(sensor_id, stats)
+                cache.set(_ALL_SENSORS, list(results))
+            return results or {}
+
+        results = {}
+        missing = []
+        for sensor_id in dict.fromkeys(sensor_ids):
+            found, stats = (False, None) if cache is None \
+                else cache.lookup(sensor_id)
+            if not found:
+                missing.append(sensor_id)
+            elif stats is not None:
+                results[sensor_id] = stats
+
+        if missing:
+            fetched = self._query_statistics(missing)
+            if fetched is None:
+                return results
+            for sensor_id in missing:
+                stats = fetched.get(sensor_id)
+                if cache is not None:
+                    # Les capteurs sans mesure sont aussi mis en cache
+                    cache.set(sensor_id, stats)
+                if stats is not None:
+                    results[sensor_id] = stats
+        return results
+
+    def _query_statistics(self, sensor_ids: Optional[List[str]]
+                          ) -> Optional[Dict[str, Dict]]:
+        """
+        Calcule les statistiques de capteurs en une seule agrégation.
+
+        Args:
+            sensor_ids: Capteurs concernés (tous si None)
+
+        Returns:
+            Statistiques par capteur, ou None en cas d'erreur
+        """
+        try:
+            if self.rollups and self.rollups.complete:
+                return self.rollups.statistics(sensor_ids)
+            match = {} if sensor_ids is None \
+                else {'sensor_id': {'$in': sensor_ids}}
+            return self._with_downsampled(self._aggregate_measurements(match),
+                                          sensor_ids)
+        except PyMongoError as e:
+            logger.error(f"Erreur de calcul des statistiques: {e}")
+            return None
+
+    def _aggregate_measurements(self, match: Dict) -> Dict[str, Dict]:
+        """
+        Calcule les statistiques par capteur sur les mesures brutes.
+
+        Args:
+            match: Filtre des mesures
+
+        Returns:
+            Statistiques par capteur
+        """
+        pipeline = [
+            {'$match': match},
+            {'$group': {
+                '_id': '$sensor_id',
+                'avg_consumption': {'$avg': '$consumption_kwh'},
+                'max_consumption': {'$max': '$consumption_kwh'},
+                'min_consumption': {'$min': '$consumption_kwh'},
+                'stdev_consumption': {'$stdDevSamp': '$consumption_kwh'},
+                'count': {'$sum': 1}
+            }}
+        ]
+        return {
+            stats['_id']: stats
+            for stats in self.collection.aggregate(pipeline)
+        }
+
+    def _with_downsampled(self, results: Dict[str, Dict],
+                          sensor_ids: Optional[Iterable[str]],
+                          start: Optional[datetime] = None,
+                          end: Optional[datetime] = None
+                          ) -> Dict[str, Dict]:
+        """
+        Complète des statistiques de mesures brutes par les intervalles
+        compactés par la rétention.
+
+        Args:
+            results: Statistiques des mesures brutes par capteur
+            sensor_ids: Capteurs concernés (tous si None)
+            start: Début de l'intervalle (inclus, optionnel)
+            end: Fin de l'intervalle (exclue, optionnelle)
+
+        Returns:
+            Statistiques de toutes les mesures par capteur
+        """
+        if not self.retention:
+            return results
+        merged = self.retention.statistics(sensor_ids, start, end)
+        if not merged:
+            return results
+        for sensor_id, stats in results.items():
+            count = stats['count']
+            mean = stats['avg_consumption']
+            stdev = stats.get('stdev_consumption') or 0.0
+            raw = [count, mean * count,
+                   stdev * stdev * (count - 1) + count * mean * mean,
+                   stats['min_consumption'], stats['max_consumption']]
+            current = merged.setdefault(sensor_id, raw)
+            if current is not raw:
+                merged[sensor_id] = [
+                    current[0] + raw[0], current[1] + raw[1],
+                    current[2] + raw[2], min(current[3], raw[3]),
+                    max(current[4], raw[4])
+                ]
+        combined = {}
+        for sensor_id, values in merged.items():
+            stats = summarize(*values)
+            if stats:
+                stats['_id'] = sensor_id
+                combined[sensor_id] = stats
+        return combined
+
+    def iter_consumption(self, sensor_id: Optional[str] = None,
+                         start: Optional[datetime] = None,
+                         end: Optional[datetime] = None,
+                         batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Parcourt la consommation d'un intervalle, mesures brutes et
+        intervalles compactés confondus, par ordre chronologique.
+
+        Les intervalles compactés sont retenus d'après leur début
+        (précision d'un intervalle d'agrégation aux bornes).
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            start: Début de l'intervalle (inclus, optionnel)
+            end: Fin de l'intervalle (exclue, optionnelle)
+            batch_size: Nombre de documents lus par bloc
+
+        Yields:
+            Points de consommation : sensor_id, location, timestamp,
+            resolution (durée agrégée en secondes, 0 pour une mesure
+            brute), count, avg_consumption, min_consumption et
+            max_consumption
         """
-        Calcule les statistiques pour un capteur.
+        raw = (
+            {'sensor_id': document['sensor_id'],
+             'location': document.get('location'),
+             'timestamp': document['timestamp'],
+             'resolution': 0,
+             'count': 1,
+             'avg_consumption': document['consumption_kwh'],
+             'min_consumption': document['consumption_kwh'],
+             'max_consumption': document['consumption_kwh']}
+            for chunk in self.iter_measurements(
+                sensor_id, start, end, batch_size=batch_size,
+                fields=ANALYSIS_FIELDS, ascending=True
+            )
+            for document in chunk
+        )
+        if not self.retention:
+            yield from raw
+            return
+        try:
+            downsampled = self.retention.iter_downsampled(sensor_id, start,
+                                                          end)
+            yield from heapq.merge(downsampled, raw,
+                                   key=lambda point: point['timestamp'])
+        except PyMongoError as e:
+            logger.error(f"Erreur de lecture: {e}")
+
+    def get_statistics_range(self, sensor_id: str,
+                             start: Optional[datetime] = None,
+                             end: Optional[datetime] = None
+                             ) -> Optional[Dict]:
+        """
+        Calcule les statistiques d'un capteur sur un intervalle de temps,
+        à partir des rollups (précision d'une minute), ou des mesures
+        brutes tant que les rollups sont en reconstruction.
 
         Args:
             sensor_id: Identifiant du capteur
+            start: Début de l'intervalle (inclus, optionnel)
+            end: Fin de l'intervalle (exclue, optionnelle)
+
+        Returns:
+            Dictionnaire de statistiques ou None
+        """
+        if not self.rollups:
+            logger.warning("Les rollups ne sont pas activés")
+            return None
+        try:
+            if not self.rollups.complete:
+                match = {'sensor_id': {'$in': [sensor_id]}}
+                if start is not None or end is not None:
+                    match['timestamp'] = {}
+                    if start is not None:
+                        match['timestamp']['$gte'] = start
+                    if end is not None:
+                        match['timestamp']['$lt'] = end
+                return self._with_downsampled(
+                    self._aggregate_measurements(match), [sensor_id],
+                    start, end
+                ).get(sensor_id)
+            return self.rollups.statistics([sensor_id], start, end).get(
+                sensor_id
+            )
+        except PyMongoError as e:
+            logger.error(f"Erreur de calcul des statistiques: {e}")
+            return None
+
+    @timed_storage('insert_anomalies')
+    def insert_anomalies(self, anomalies: List[Dict],
+                         run_id: Optional[str] = None) -> int:
+        """
+        Enregistre des anomalies dans la collection des anomalies.
+
+        L'insertion n'est pas ordonnée : une erreur sur un document
+        n'empêche pas l'écriture des autres.
+
+        Args:
+            anomalies: Anomalies au format de detect_anomaly
+            run_id: Identifiant du rejeu ou de l'exécution (optionnel)
+
+        Returns:
+            Nombre d'anomalies enregistrées
+        """
+        if not anomalies:
+            return 0
+        documents = [
+            dict(anomaly, run_id=run_id) if run_id is not None
+            else dict(anomaly)
+            for anomaly in anomalies
+        ]
+        try:
+            result = self.anomalies.insert_many(documents, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            logger.error(f"Erreur d'insertion des anomalies: {e}")
+            return e.details.get('nInserted', 0)
+        except PyMongoError as e:
+            logger.error(f"Erreur d'insertion des anomalies: {e}")
+            return 0
+
+    def get_anomalies(self, sensor_id: Optional[str] = None,
+                      run_id: Optional[str] = None,
+                      limit: int = 100) -> List[Dict]:
+        """
+        Récupère les anomalies enregistrées les plus récentes.
+
+        Args:
+            sensor_id: Filtrer par ID de capteur (optionnel)
+            run_id: Filtrer par identifiant d'exécution (optionnel)
+            limit: Nombre maximum de résultats
+
+        Returns:
+            Liste des anomalies, de la plus récente à la plus ancienne
+        """
+        query = {}
+        if run_id is not None:
+            query['run_id'] = run_id
+        if sensor_id:
+            query['sensor_id'] = sensor_id
+        try:
+            cursor = self.anomalies.find(query).sort(
+                'timestamp', -1
+            ).limit(limit)
+            return list(cursor)
+        except PyMongoError as e:
+            logger.error(f"Erreur de lecture des anomalies: {e}")
+            return []
+
+    def save_snapshot(self, data: bytes, metadata: Optional[Dict] = None,
+                      keep: int = 3) -> int:
+        """
+        Enregistre une nouvelle version de l'instantané des baselines.
+
+        Les données sont découpées en morceaux de SNAPSHOT_CHUNK_SIZE
+        octets (les documents MongoDB sont limités à 16 Mo) ; l'en-tête
+        n'est écrit qu'après les morceaux, si bien qu'une écriture
+        interrompue n'est jamais lue.
+
+        Args:
+            data: Contenu de l'instantané
+            metadata: Métadonnées enregistrées avec lui
+            keep: Nombre de versions conservées
+
+        Returns:
+            Numéro de la version écrite (0 en cas d'erreur)
+        """
+        try:
+            latest = list(self.snapshots.find({}, {'_id': 1})
+                          .sort('_id', DESCENDING).limit(1))
+            version = latest[0]['_id'] + 1 if latest else 1
+            self.snapshot_chunks.delete_many({'snapshot': version})
+            self.snapshot_chunks.insert_many([
+                {'snapshot': version, 'chunk': number,
+                 'data': data[start:start + SNAPSHOT_CHUNK_SIZE]}
+                for number, start in enumerate(
+                    range(0, max(len(data), 1), SNAPSHOT_CHUNK_SIZE)
+                )
+            ])
+            header = dict(metadata or {}, version=version, size=len(data),
+                          created_at=datetime.now())
+            self.snapshots.insert_many([dict(header, _id=version)])
+            oldest = {'$lt': version - max(1, keep) + 1}
+            self.snapshots.delete_many({'_id': oldest})
+            self.snapshot_chunks.delete_many({'snapshot': oldest})
+            return version
+        except PyMongoError as e:
+            logger.error(f"Erreur d'écriture de l'instantané: {e}")
+            return 0
+
+    def load_snapshot(self, version: Optional[int] = None
+                      ) -> Optional[Tuple[bytes, Dict]]:
+        """
+        Lit une version complète de l'instantané des baselines.
+
+        Args:
+            version: Version demandée (la plus récente si absente)
 
         Returns:
-            Dictionnaire de statistiques
+            Tuple (contenu, métadonnées), ou None si aucun instantané
         """
+        query = {} if version is None else {'_id': version}
         try:
-            pipeline = [
-                {'$match': {'sensor_id': sensor_id}},
-                {'$group': {
-                    '_id': '$sensor_id',
-                    'avg_consumption': {'$avg': '$consumption_kwh'},
-                    'max_consumption': {'$max': '$consumption_kwh'},
-                    'min_consumption': {'$min': '$consumption_kwh'},
-                    'count': {'$sum': 1}
-                }}
-            ]
-            result = list(self.collection.aggregate(pipeline))
-            return result[0] if result else None
+            headers = list(self.snapshots.find(query)
+                           .sort('_id', DESCENDING).limit(1))
+            if not headers:
+                return None
+            header = headers[0]
+            chunks = self.snapshot_chunks.find(
+                {'snapshot': header['_id']}
+            ).sort('chunk', ASCENDING)
+            data = b''.join(bytes(chunk['data']) for chunk in chunks)
         except PyMongoError as e:
-            print(f"Erreur de calcul des statistiques: {e}")
+            logger.error(f"Erreur de lecture de l'instantané: {e}")
+            return None
+        if len(data) != header['size']:
+            logger.error(f"Instantané {header['_id']} incomplet")
             return None
+        header.pop('_id')
+        return data, header
 
     def clear_collection(self):
         """Supprime toutes les données de la collection."""
         try:
             self.collection.delete_many({})
         except PyMongoError as e:
-            print(f"Erreur de suppression: {e}")
+            logger.error(f"Erreur de suppression: {e}")
+        if self.rollups:
+            self.rollups.clear()
+        if self.retention:
+            self.retention.clear()
+        if self.stats_cache is not None:
+            self.stats_cache.clear()
@@ -0,0 +1,485 @@
+"""
+Rétention des mesures brutes et sous-échantillonnage des plus anciennes.
+
+Les mesures brutes plus anciennes que la durée de rétention sont
+compactées en agrégats par capteur et par intervalle (5 minutes par
+défaut : nombre, somme, somme des carrés, minimum, maximum), puis
+supprimées. Le compactage avance par tranches de temps bornées, lues
+par blocs, de sorte qu'une étape ne bloque jamais longtemps
+l'ingestion ; un thread d'arrière-plan enchaîne les étapes.
+
+Un filigrane (compacted_until) sépare les intervalles déjà compactés
+des mesures brutes. Au-delà du filigrane, une tranche est recalculée
+entièrement à partir des mesures brutes ($set) : une étape interrompue
+avant la suppression est simplement rejouée. La suppression elle-même
+est enregistrée avant d'être lancée et terminée à l'étape suivante si
+elle a été interrompue.
+
+Les mesures arrivées en retard sous le filigrane sont fusionnées aux
+agrégats existants ($inc/$min/$max). La fusion est enregistrée avant
+l'écriture, avec un jeton propre à la fusion : chaque agrégat fusionné
+garde le jeton de sa dernière fusion et n'est pas modifié une seconde
+fois si la fusion est rejouée après une interruption.
+
+Les mesures brutes étant supprimées une fois agrégées, l'union des
+agrégats et des mesures brutes d'un intervalle ne compte chaque mesure
+qu'une fois. La suppression par intervalle de temps d'une collection
+time-series demande MongoDB 7.0.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from src.core.measurement_batch import (
+    MeasurementBatch, SensorRegistry, datetime_to_micros, micros_to_datetime
+)
+from src.storage.aggregates import MICROS_PER_SECOND, aggregate_buckets
+
+logger = logging.getLogger(__name__)
+
+# Document d'état du compactage
+_RETENTION_STATE = 'retention'
+
+_FIELDS = ('sensor_id', 'location', 'consumption_kwh', 'timestamp')
+
+# Code d'erreur MongoDB d'une clé unique en double
+_DUPLICATE_KEY = 11000
+
+
+def _reduce(parts: List[Tuple[np.ndarray, ...]]) -> Tuple[np.ndarray, ...]:
+    """
+    Fusionne des agrégats partiels par (capteur, intervalle).
+
+    Args:
+        parts: Agrégats au format de aggregate_buckets
+
+    Returns:
+        Agrégats fusionnés, au même format
+    """
+    if len(parts) == 1:
+        return parts[0]
+    columns = [np.concatenate(column) for column in zip(*parts)]
+    keys, inverse = np.unique(np.stack(columns[:2]), axis=1,
+                              return_inverse=True)
+    inverse = inverse.reshape(-1)
+    size = keys.shape[1]
+    count, total, total_sq = (
+        np.bincount(inverse, weights=column, minlength=size)
+        for column in columns[2:5]
+    )
+    minimum = np.full(size, np.inf)
+    maximum = np.full(size, -np.inf)
+    np.minimum.at(minimum, inverse, columns[5])
+    np.maximum.at(maximum, inverse, columns[6])
+    return (keys[0], keys[1], count.astype(np.int64), total, total_sq,
+            minimum, maximum)
+
+
+class RetentionManager:
+    """Compactage des mesures brutes anciennes en agrégats."""
+
+    def __init__(self, db, collection, collection_name: str = 'measurements',
+                 retention_days: float = 30.0, bucket_seconds: int = 300,
+                 slice_seconds: int = 3600, batch_size: int = 10000):
+        """
+        Initialise le gestionnaire.
+
+        Args:
+            db: Base MongoDB
+            collection: Collection des mesures brutes
+            collection_name: Nom de la collection des mesures (préfixe
+                des collections d'agrégats et d'état)
+            retention_days: Durée de conservation des mesures brutes
+            bucket_seconds: Durée d'un intervalle d'agrégation (s)
+            slice_seconds: Durée de la tranche traitée par étape (s,
+                arrondie à un multiple de bucket_seconds)
+            batch_size: Nombre de mesures lues et d'agrégats écrits par
+                bloc
+
+        Raises:
+            ValueError: Si une durée n'est pas strictement positive
+        """
+        if retention_days <= 0 or bucket_seconds <= 0 or slice_seconds <= 0:
+            raise ValueError("Les durées de rétention doivent être "
+                             "strictement positives")
+        self.collection = collection
+        self.downsampled = db[f"{collection_name}_downsampled"]
+        self.state = db[f"{collection_name}_retention_state"]
+        self.retention = timedelta(days=retention_days)
+        self.bucket_seconds = bucket_seconds
+        self.bucket = bucket_seconds * MICROS_PER_SECOND
+        self.slice = max(1, slice_seconds // bucket_seconds) * self.bucket
+        self.batch_size = batch_size
+        self._watermark: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def ensure_indexes(self):
+        """Crée l'index unique (sensor_id, bucket) et l'index bucket."""
+        self.downsampled.create_index(
+            [('sensor_id', ASCENDING), ('bucket', ASCENDING)],
+            name='sensor_id_bucket', unique=True
+        )
+        self.downsampled.create_index([('bucket', ASCENDING)],
+                                      name='bucket')
+
+    @property
+    def watermark(self) -> Optional[datetime]:
+        """Fin (exclue) des intervalles compactés, None avant le premier
+        compactage."""
+        micros = self._read_watermark()
+        return micros_to_datetime(micros) if micros else None
+
+    def _read_watermark(self) -> int:
+        """Filigrane en microsecondes (0 si absent), lu une fois."""
+        if self._watermark is None:
+            document = self.state.find_one({'_id': _RETENTION_STATE})
+            self._watermark = int(document.get('compacted_until') or 0) \
+                if document else 0
+        return self._watermark
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        """
+        Limite de conservation des mesures brutes.
+
+        Args:
+            now: Instant de référence (maintenant si absent)
+
+        Returns:
+            Début du premier intervalle entièrement conservé en brut
+        """
+        micros = datetime_to_micros((now or datetime.now()) - self.retention)
+        return micros_to_datetime(micros - micros % self.bucket)
+
+    def compact_step(self, now: Optional[datetime] = None) -> int:
+        """
+        Compacte la plus ancienne tranche de mesures brutes expirées.
+
+        Args:
+            now: Instant de référence (maintenant si absent)
+
+        Returns:
+            Nombre de mesures brutes compactées, y compris celles d'une
+            tranche interrompue reprise (0 s'il n'y a plus rien à
+            compacter)
+        """
+        resumed = self._finish_pending()
+        cutoff = datetime_to_micros(self.cutoff(now))
+        oldest = next(iter(self.collection.find(
+            {'timestamp': {'$lt': micros_to_datetime(cutoff)}},
+            {'timestamp': 1, '_id': 0}
+        ).sort('timestamp', ASCENDING).limit(1)), None)
+        if oldest is None:
+            return resumed
+        start = datetime_to_micros(oldest['timestamp'])
+        start -= start % self.bucket
+        watermark = self._read_watermark()
+        if start < watermark:
+            # Sous le filigrane : mesures arrivées après le compactage,
+            # fusionnées par _finish_pending
+            end = min(start + self.slice, watermark)
+            self._set_pending(start, end, merge=str(ObjectId()))
+            compacted = self._finish_pending()
+        else:
+            end = min(start + self.slice, cutoff)
+            compacted, aggregates, registry = self._aggregate(
+                self._window(start, end)
+            )
+            self._write(aggregates, registry)
+            self._set_pending(start, end)
+            self._finish_pending()
+        logger.info(f"Rétention: {compacted} mesures compactées entre "
+                    f"{micros_to_datetime(start)} et "
+                    f"{micros_to_datetime(end)}")
+        return resumed + compacted
+
+    @staticmethod
+    def _window(start: int, end: int) -> Dict:
+        """Filtre des mesures brutes d'une tranche [start, end)."""
+        return {'timestamp': {'$gte': micros_to_datetime(start),
+                              '$lt': micros_to_datetime(end)}}
+
+    def _set_pending(self, start: int, end: int,
+                     merge: Optional[str] = None):
+        """
+        Enregistre la tranche en cours avant suppression (ou fusion).
+
+        Args:
+            start: Début de la tranche (µs)
+            end: Fin de la tranche (µs, exclue)
+            merge: Jeton de fusion d'une tranche sous le filigrane ;
+                sans jeton, la tranche est déjà agrégée et le filigrane
+                avance après la suppression
+        """
+        pending = {'start': start, 'end': end, 'advance': merge is None}
+        if merge is not None:
+            pending['merge'] = merge
+        self.state.update_one({'_id': _RETENTION_STATE},
+                              {'$set': {'pending': pending}}, upsert=True)
+
+    def _aggregate(self, window: Dict
+                   ) -> Tuple[int, Tuple[np.ndarray, ...], SensorRegistry]:
+        """
+        Agrège par blocs les mesures brutes d'une tranche.
+
+        Args:
+            window: Filtre de la tranche
+
+        Returns:
+            Tuple (nombre de mesures, agrégats au format de
+            aggregate_buckets, registre des capteurs agrégés)
+        """
+        registry = SensorRegistry()
+        projection = dict.fromkeys(_FIELDS, 1)
+        projection['_id'] = 0
+        cursor = iter(self.collection.find(window, projection).batch_size(
+            self.batch_size
+        ))
+        parts: List[Tuple[np.ndarray, ...]] = []
+        pending = 0
+        total = 0
+        while True:
+            chunk = list(islice(cursor, self.batch_size))
+            if not chunk:
+                break
+            total += len(chunk)
+            parts.append(aggregate_buckets(
+                MeasurementBatch.from_dicts(chunk, registry),
+                self.bucket_seconds
+            ))
+            pending += parts[-1][0].shape[0]
+            if pending > 4 * self.batch_size:
+                # Mémoire bornée par le nombre d'agrégats distincts
+                parts = [_reduce(parts)]
+                pending = parts[0][0].shape[0]
+        if not parts:
+            return 0, (), registry
+        return total, _reduce(parts), registry
+
+    def _write(self, aggregates: Tuple[np.ndarray, ...],
+               registry: SensorRegistry, merge: Optional[str] = None):
+        """
+        Écrit des agrégats par blocs d'upserts.
+
+        Args:
+            aggregates: Agrégats au format de aggregate_buckets
+            registry: Registre des capteurs des agrégats
+            merge: Jeton de fusion : fusionner aux agrégats existants au
+                lieu de les remplacer, en ignorant ceux qui portent déjà
+                ce jeton
+
+        Raises:
+            BulkWriteError: Pour toute erreur autre qu'un agrégat déjà
+                fusionné
+        """
+        if not aggregates:
+            return
+        rows = zip(*(column.tolist() for column in aggregates))
+        while True:
+            operations = []
+            for index, bucket, count, total, total_sq, minimum, maximum \
+                    in islice(rows, self.batch_size):
+                key = {'sensor_id': registry.ids[index],
+                       'bucket': micros_to_datetime(bucket)}
+                values = {'count': int(count), 'sum': total,
+                          'sum_sq': total_sq}
+                location = {'location': registry.locations[index]}
+                if merge is not None:
+                    # Un agrégat déjà fusionné ne correspond plus au
+                    # filtre : l'upsert échoue sur l'index unique
+                    key['merge'] = {'$ne': merge}
+                    update = {'$inc': values, '$min': {'min': minimum},
+                              '$max': {'max': maximum},
+                              '$set': dict(location, merge=merge)}
+                else:
+                    update = {'$set': dict(values, min=minimum,
+                                           max=maximum, **location)}
+                operations.append(UpdateOne(key, update, upsert=True))
+            if not operations:
+                return
+            try:
+                self.downsampled.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if merge is None or any(error.get('code') != _DUPLICATE_KEY
+                                        for error in errors):
+                    raise
+
+    def _finish_pending(self) -> int:
+        """
+        Termine la tranche enregistrée : fusionne ses mesures s'il s'agit
+        d'une fusion, supprime les mesures brutes et avance le filigrane.
+
+        Returns:
+            Nombre de mesures fusionnées (0 pour une tranche déjà agrégée)
+        """
+        document = self.state.find_one({'_id': _RETENTION_STATE})
+        pending = document.get('pending') if document else None
+        if not pending:
+            return 0
+        window = self._window(pending['start'], pending['end'])
+        merged = 0
+        if pending.get('merge'):
+            merged, aggregates, registry = self._aggregate(window)
+            self._write(aggregates, registry, merge=pending['merge'])
+        self.collection.delete_many(window)
+        update = {'$unset': {'pending': ''}}
+        if pending['advance']:
+            update['$max'] = {'compacted_until': pending['end']}
+            self._watermark = max(self._read_watermark(), pending['end'])
+        self.state.update_one({'_id': _RETENTION_STATE}, update)
+        return merged
+
+    def compact(self, now: Optional[datetime] = None,
+                max_steps: Optional[int] = None,
+                pause: float = 0.0) -> int:
+        """
+        Compacte toutes les mesures brutes expirées, tranche par tranche.
+
+        Args:
+            now: Instant de référence (maintenant si absent)
+            max_steps: Nombre maximal de tranches (toutes si absent)
+            pause: Attente entre deux tranches (s), pour laisser la
+                base à l'ingestion
+
+        Returns:
+            Nombre de mesures brutes compactées
+        """
+        total = 0
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            compacted = self.compact_step(now)
+            total += compacted
+            steps += 1
+            if not compacted or self._stop.wait(pause):
+                break
+        return total
+
+    def start(self, interval: float = 3600.0, pause: float = 0.1):
+        """
+        Lance le compactage périodique dans un thread d'arrière-plan.
+
+        Args:
+            interval: Période entre deux passes (s)
+            pause: Attente entre deux tranches d'une passe (s)
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.compact(pause=pause)
+                except PyMongoError as e:
+                    logger.error(f"Erreur de compactage: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name='retention',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Arrête le thread de compactage après la tranche en cours.
+
+        Args:
+            timeout: Délai maximal d'attente
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _match(self, sensor_ids: Optional[Iterable[str]],
+               start: Optional[datetime], end: Optional[datetime]) -> Dict:
+        """Filtre des agrégats de capteurs sur un intervalle."""
+        match = {} if sensor_ids is None \
+            else {'sensor_id': {'$in': list(sensor_ids)}}
+        if start is not None or end is not None:
+            match['bucket'] = {}
+            if start is not None:
+                match['bucket']['$gte'] = start
+            if end is not None:
+                match['bucket']['$lt'] = end
+        return match
+
+    def statistics(self, sensor_ids: Optional[Iterable[str]] = None,
+                   start: Optional[datetime] = None,
+                   end: Optional[datetime] = None
+                   ) -> Dict[str, List[float]]:
+        """
+        Agrège les intervalles compactés par capteur.
+
+        Args:
+            sensor_ids: Capteurs concernés (tous si absent)
+            start: Début de l'intervalle (inclus, précision d'un
+                intervalle d'agrégation)
+            end: Fin de l'intervalle (exclue)
+
+        Returns:
+            [nombre, somme, somme des carrés, minimum, maximum] par
+            capteur
+        """
+        pipeline = [
+            {'$match': self._match(sensor_ids, start, end)},
+            {'$group': {
+                '_id': '$sensor_id',
+                'count': {'$sum': '$count'},
+                'sum': {'$sum': '$sum'},
+                'sum_sq': {'$sum': '$sum_sq'},
+                'min': {'$min': '$min'},
+                'max': {'$max': '$max'}
+            }}
+        ]
+        return {group['_id']: [group['count'], group['sum'],
+                               group['sum_sq'], group['min'], group['max']]
+                for group in self.downsampled.aggregate(pipeline)}
+
+    def iter_downsampled(self, sensor_id: Optional[str] = None,
+                         start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> Iterator[Dict]:
+        """
+        Parcourt les intervalles compactés par ordre chronologique.
+
+        Args:
+            sensor_id: Filtrer par capteur (optionnel)
+            start: Début de l'intervalle (inclus)
+            end: Fin de l'intervalle (exclue)
+
+        Yields:
+            Agrégats au format de MongoDBHandler.iter_consumption
+        """
+        match = self._match(None if sensor_id is None else [sensor_id],
+                            start, end)
+        cursor = self.downsampled.find(match, {'_id': 0}).sort(
+            'bucket', ASCENDING
+        ).batch_size(self.batch_size)
+        for document in cursor:
+            yield {
+                'sensor_id': document['sensor_id'],
+                'location': document.get('location'),
+                'timestamp': document['bucket'],
+                'resolution': self.bucket_seconds,
+                'count': document['count'],
+                'avg_consumption': document['sum'] / document['count'],
+                'min_consumption': document['min'],
+                'max_consumption': document['max']
+            }
+
+    def clear(self):
+        """Supprime les agrégats et l'état du compactage."""
+        try:
+            self.downsampled.delete_many({})
+            self.state.delete_many({})
+        except PyMongoError as e:
+            logger.error(f"Erreur de suppression des agrégats: {e}")
+        self._watermark = None
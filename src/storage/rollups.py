@@ -0,0 +1,220 @@
+"""
+Collections d'agrégats (rollups) par minute, heure et jour.
+
+Chaque document résume un capteur sur un intervalle : nombre de mesures,
+somme, somme des carrés, minimum et maximum. Les agrégats sont mis à jour
+par upserts groupés ($inc/$min/$max) à chaque insertion, ce qui permet de
+calculer les statistiques en O(intervalles) au lieu de O(mesures).
+
+Des mesures insérées avant l'activation des rollups n'y figurent pas :
+les rollups sont alors reconstruits à partir des mesures brutes
+(backfill), et tant que la reconstruction n'est pas terminée, les
+statistiques doivent être calculées sur les mesures brutes. L'état de la
+reconstruction est enregistré dans une collection dédiée.
+"""
+import logging
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+from src.core.measurement_batch import (
+    MeasurementBatch, datetime_to_micros, micros_to_datetime
+)
+from src.storage.aggregates import (
+    ROLLUP_GRANULARITIES, aggregate_buckets, plan_segments, summarize
+)
+
+logger = logging.getLogger(__name__)
+
+# Document d'état de la reconstruction des rollups
+_BACKFILL_STATE = 'backfill'
+
+
+class RollupManager:
+    """Maintenance et lecture des collections de rollups."""
+
+    def __init__(self, db, collection_name: str = 'measurements'):
+        """
+        Initialise le gestionnaire.
+
+        Args:
+            db: Base MongoDB
+            collection_name: Collection des mesures brutes (préfixe des
+                collections de rollups)
+        """
+        self.db = db
+        self.collections = {
+            name: db[f"{collection_name}_rollup_{name}"]
+            for name, _ in ROLLUP_GRANULARITIES
+        }
+        self.state = db[f"{collection_name}_rollup_state"]
+        self._complete: Optional[bool] = None
+
+    @property
+    def complete(self) -> bool:
+        """
+        Indique si les rollups couvrent toutes les mesures brutes.
+
+        L'état est lu une fois dans la base puis conservé.
+        """
+        if self._complete is None:
+            document = self.state.find_one({'_id': _BACKFILL_STATE})
+            self._complete = bool(document and document.get('complete'))
+        return self._complete
+
+    def backfill(self, batches: Iterable[MeasurementBatch]) -> int:
+        """
+        Reconstruit les rollups à partir des mesures brutes.
+
+        Les rollups existants sont vidés, puis chaque lot est intégré ; la
+        reconstruction n'est marquée terminée qu'après le dernier lot. Une
+        reconstruction interrompue est reprise depuis le début au prochain
+        appel. Aucune autre insertion ne doit avoir lieu pendant l'appel.
+
+        Args:
+            batches: Mesures brutes, par lots ; le parcours doit lever
+                une exception en cas d'erreur de lecture plutôt que
+                s'arrêter (sinon des rollups partiels seraient marqués
+                complets)
+
+        Returns:
+            Nombre de mesures intégrées
+        """
+        self._complete = False
+        self.state.update_one({'_id': _BACKFILL_STATE},
+                              {'$set': {'complete': False}}, upsert=True)
+        for collection in self.collections.values():
+            collection.delete_many({})
+        total = 0
+        for batch in batches:
+            self.apply(batch)
+            total += len(batch)
+        self.state.update_one(
+            {'_id': _BACKFILL_STATE},
+            {'$set': {'complete': True, 'measurements': total,
+                      'completed_at': datetime.now()}},
+            upsert=True
+        )
+        self._complete = True
+        logger.info(f"Rollups reconstruits à partir de {total} mesures")
+        return total
+
+    def ensure_indexes(self):
+        """Crée l'index unique (sensor_id, bucket) de chaque rollup."""
+        for collection in self.collections.values():
+            collection.create_index(
+                [('sensor_id', ASCENDING), ('bucket', ASCENDING)],
+                name='sensor_id_bucket', unique=True
+            )
+
+    def apply(self, batch: MeasurementBatch):
+        """
+        Intègre un lot de mesures aux rollups par upserts groupés.
+
+        Args:
+            batch: Mesures effectivement insérées
+        """
+        if not len(batch):
+            return
+        sensor_ids = batch.registry.ids
+        for name, seconds in ROLLUP_GRANULARITIES:
+            operations = [
+                UpdateOne(
+                    {'sensor_id': sensor_ids[index],
+                     'bucket': micros_to_datetime(bucket)},
+                    {'$inc': {'count': count, 'sum': total,
+                              'sum_sq': total_sq},
+                     '$min': {'min': minimum},
+                     '$max': {'max': maximum}},
+                    upsert=True
+                )
+                for index, bucket, count, total, total_sq, minimum, maximum
+                in zip(*(column.tolist() for column in
+                         aggregate_buckets(batch, seconds)))
+            ]
+            self.collections[name].bulk_write(operations, ordered=False)
+
+    def _group(self, granularity: str, match: Dict) -> List[Dict]:
+        """Agrège les documents d'un rollup par capteur."""
+        pipeline = [
+            {'$match': match},
+            {'$group': {
+                '_id': '$sensor_id',
+                'count': {'$sum': '$count'},
+                'sum': {'$sum': '$sum'},
+                'sum_sq': {'$sum': '$sum_sq'},
+                'min': {'$min': '$min'},
+                'max': {'$max': '$max'}
+            }}
+        ]
+        return list(self.collections[granularity].aggregate(pipeline))
+
+    def statistics(self, sensor_ids: Optional[Iterable[str]] = None,
+                   start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Dict[str, Dict]:
+        """
+        Calcule les statistiques de capteurs à partir des rollups.
+
+        Sans bornes, seuls les rollups journaliers sont lus. Avec des
+        bornes, l'intervalle est couvert par des jours complets puis des
+        heures et des minutes sur les bords (précision d'une minute).
+
+        Args:
+            sensor_ids: Capteurs concernés (tous si absent)
+            start: Début de l'intervalle (inclus)
+            end: Fin de l'intervalle (exclue)
+
+        Returns:
+            Statistiques par identifiant de capteur
+        """
+        sensor_filter = {} if sensor_ids is None \
+            else {'sensor_id': {'$in': list(sensor_ids)}}
+
+        if start is None and end is None:
+            groups = self._group('day', sensor_filter)
+        else:
+            start_us = datetime_to_micros(start) if start is not None \
+                else datetime_to_micros(datetime(1970, 1, 1))
+            end_us = datetime_to_micros(end if end is not None
+                                        else datetime.now())
+            ranges: Dict[str, List[Dict]] = {}
+            for name, low, high in plan_segments(start_us, end_us):
+                ranges.setdefault(name, []).append({'bucket': {
+                    '$gte': micros_to_datetime(low),
+                    '$lt': micros_to_datetime(high)
+                }})
+            groups = []
+            for name, clauses in ranges.items():
+                groups.extend(self._group(
+                    name, dict(sensor_filter, **{'$or': clauses})
+                ))
+
+        merged: Dict[str, List[float]] = {}
+        for group in groups:
+            current = merged.setdefault(
+                group['_id'], [0, 0.0, 0.0, math.inf, -math.inf]
+            )
+            current[0] += group['count']
+            current[1] += group['sum']
+            current[2] += group['sum_sq']
+            current[3] = min(current[3], group['min'])
+            current[4] = max(current[4], group['max'])
+
+        results = {}
+        for sensor_id, values in merged.items():
+            stats = summarize(*values)
+            if stats:
+                stats['_id'] = sensor_id
+                results[sensor_id] = stats
+        return results
+
+    def clear(self):
+        """Supprime tous les rollups."""
+        try:
+            for collection in self.collections.values():
+                collection.delete_many({})
+        except PyMongoError as e:
+            logger.error(f"Erreur de suppression des rollups: {e}")
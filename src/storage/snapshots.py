@@ -0,0 +1,116 @@
+"""
+Instantanés binaires versionnés enregistrés dans un répertoire.
+
+Chaque version est un fichier de données suivi d'un fichier de
+métadonnées JSON : les métadonnées sont écrites en dernier, par
+renommage atomique, si bien qu'une écriture interrompue ne laisse jamais
+d'instantané partiel lisible. Seules les `keep` dernières versions sont
+conservées.
+"""
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_NAME = re.compile(r'^baselines-(\d+)\.json$')
+
+
+class SnapshotFiles:
+    """Instantanés versionnés dans un répertoire local."""
+
+    def __init__(self, directory: str = 'data/snapshots'):
+        """
+        Initialise le répertoire des instantanés.
+
+        Args:
+            directory: Répertoire des fichiers (créé au besoin)
+        """
+        self.directory = directory
+
+    def _path(self, version: int, suffix: str) -> str:
+        """Chemin d'un fichier d'une version."""
+        return os.path.join(self.directory, f"baselines-{version:06d}{suffix}")
+
+    def versions(self) -> List[int]:
+        """
+        Liste les versions complètes.
+
+        Returns:
+            Numéros de version, du plus ancien au plus récent
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(match.group(1))
+                      for match in map(_NAME.match,
+                                       os.listdir(self.directory))
+                      if match)
+
+    def save_snapshot(self, data: bytes, metadata: Optional[Dict] = None,
+                      keep: int = 3) -> int:
+        """
+        Enregistre une nouvelle version.
+
+        Args:
+            data: Contenu de l'instantané
+            metadata: Métadonnées (valeurs JSON) enregistrées avec lui
+            keep: Nombre de versions conservées
+
+        Returns:
+            Numéro de la version écrite (0 en cas d'erreur)
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            versions = self.versions()
+            version = versions[-1] + 1 if versions else 1
+            header = dict(metadata or {}, version=version, size=len(data),
+                          created_at=datetime.now().isoformat())
+            for suffix, content in (('.bin', data),
+                                    ('.json', json.dumps(header).encode())):
+                path = self._path(version, suffix)
+                with open(path + '.tmp', 'wb') as handle:
+                    handle.write(content)
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.error(f"Erreur d'écriture de l'instantané: {e}")
+            return 0
+        for old in (versions + [version])[:-max(1, keep)]:
+            for suffix in ('.json', '.bin'):
+                try:
+                    os.remove(self._path(old, suffix))
+                except FileNotFoundError:
+                    pass
+        return version
+
+    def load_snapshot(self, version: Optional[int] = None
+                      ) -> Optional[Tuple[bytes, Dict]]:
+        """
+        Lit une version.
+
+        Args:
+            version: Version demandée (la plus récente si absente)
+
+        Returns:
+            Tuple (contenu, métadonnées), ou None si absente
+        """
+        if version is None:
+            versions = self.versions()
+            if not versions:
+                return None
+            version = versions[-1]
+        try:
+            with open(self._path(version, '.json'), encoding='utf-8') \
+                    as handle:
+                header = json.load(handle)
+            with open(self._path(version, '.bin'), 'rb') as handle:
+                data = handle.read()
+        except OSError as e:
+            logger.error(f"Erreur de lecture de l'instantané {version}: {e}")
+            return None
+        header['created_at'] = datetime.fromisoformat(header['created_at'])
+        return data, header
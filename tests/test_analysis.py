@@ -1,7 +1,24 @@
 """Tests unitaires pour le module d'analyse."""
+import statistics
+
+import numpy as np
 import pytest
-from datetime import datetime
-from src.analysis.anomaly_detector import AnomalyDetector
+from datetime import datetime, timedelta
+from src.analysis.anomaly_detector import AnomalyDetector, seasonal_buckets
+from src.analysis.location_aggregator import FLEET, LocationAggregator
+from src.analysis.parallel_detector import ParallelAnomalyDetector
+from src.analysis.replay import AnomalyReplay
+from src.analysis.snapshots import (
+    BaselineSnapshots, dump_baselines, load_baselines
+)
+from src.analysis.streaming_stats import (
+    EWMAArray, QuantileSketchArray, RollingWindowArray, RunningStats
+)
+from src.core.measurement_batch import (
+    MeasurementBatch, SensorRegistry, datetime_to_micros
+)
+from src.storage.columnar_store import ColumnarStore
+from src.storage.snapshots import SnapshotFiles
 
 
 class TestAnomalyDetector:
@@ -46,3 +63,892 @@ class TestAnomalyDetector:
         anomaly = detector.detect_anomaly(test_measurement)
         assert anomaly is not None
         assert anomaly['type'] == 'HIGH'
+
+    def test_analyze_batch_columnar_matches_dicts(self):
+        """Test que l'analyse d'un lot en colonnes équivaut aux dicts."""
+        detector = AnomalyDetector(threshold_multiplier=1.0)
+        history = [
+            {'sensor_id': 'TEST_001', 'consumption_kwh': value,
+             'timestamp': datetime.now()}
+            for value in (90.0, 100.0, 110.0, 95.0, 105.0)
+        ]
+        detector.calculate_baseline(history, 'TEST_001')
+        measurements = [
+            {'sensor_id': 'TEST_001', 'consumption_kwh': value,
+             'timestamp': datetime(2024, 1, 1, 0, 0, i)}
+            for i, value in enumerate((100.0, 250.0, 20.0, 101.0))
+        ]
+        measurements.append({'sensor_id': 'UNKNOWN',
+                             'consumption_kwh': 1000.0,
+                             'timestamp': datetime(2024, 1, 1)})
+        batch = MeasurementBatch.from_dicts(measurements)
+        assert detector.analyze_batch(batch) == \
+            detector.analyze_batch(measurements)
+        assert len(detector.analyze_batch(batch)) == 2
+
+    def test_calculate_baselines_single_pass(self):
+        """Test le calcul des baselines de tous les capteurs en un passage."""
+        rng = np.random.default_rng(0)
+        measurements = [
+            {'sensor_id': f'TEST_{i % 5:03d}',
+             'consumption_kwh': float(rng.normal(100.0 + i % 5, 10.0)),
+             'timestamp': datetime.now()}
+            for i in range(500)
+        ]
+        reference = AnomalyDetector()
+        for i in range(5):
+            sensor_data = [m['consumption_kwh'] for m in measurements
+                           if m['sensor_id'] == f'TEST_{i:03d}']
+            reference_mean = statistics.mean(sensor_data)
+            reference_stdev = statistics.stdev(sensor_data)
+            reference.calculate_baseline(measurements, f'TEST_{i:03d}')
+            baseline = reference.get_sensor_baseline(f'TEST_{i:03d}')
+            assert baseline['mean'] == pytest.approx(reference_mean)
+            assert baseline['stdev'] == pytest.approx(reference_stdev)
+
+        detector = AnomalyDetector()
+        detector.calculate_baselines(MeasurementBatch.from_dicts(measurements))
+        for sensor_id, baseline in reference.baseline_stats.items():
+            streamed = detector.get_sensor_baseline(sensor_id)
+            assert streamed['mean'] == pytest.approx(baseline['mean'])
+            assert streamed['threshold_high'] == \
+                pytest.approx(baseline['threshold_high'])
+
+    def test_incremental_and_merged_baselines(self):
+        """Test l'ingestion incrémentale et la fusion de baselines."""
+        values = [float(v) for v in range(1, 41)]
+        measurements = [
+            {'sensor_id': 'TEST_001', 'consumption_kwh': value,
+             'timestamp': datetime.now()}
+            for value in values
+        ]
+        incremental = AnomalyDetector()
+        for start in range(0, 40, 7):
+            incremental.ingest(measurements[start:start + 7])
+
+        first, second = AnomalyDetector(), AnomalyDetector()
+        first.ingest(measurements[:15])
+        second.ingest(measurements[15:])
+        first.merge_baselines(second)
+
+        updated = AnomalyDetector()
+        updated.calculate_baseline(measurements[:10], 'TEST_001')
+        updated.update_baseline('TEST_001', measurements[10:])
+
+        for detector in (incremental, first, updated):
+            baseline = detector.get_sensor_baseline('TEST_001')
+            assert baseline['count'] == 40
+            assert baseline['mean'] == pytest.approx(statistics.mean(values))
+            assert baseline['stdev'] == \
+                pytest.approx(statistics.stdev(values))
+
+    def test_detect_batch_matches_detect_anomaly(self):
+        """Test que la détection vectorisée reproduit detect_anomaly."""
+        rng = np.random.default_rng(1)
+        detector = AnomalyDetector(threshold_multiplier=1.5)
+        history = MeasurementBatch.from_dicts([
+            {'sensor_id': f'TEST_{i % 20:03d}',
+             'consumption_kwh': float(rng.uniform(80.0, 120.0)),
+             'timestamp': datetime(2024, 1, 1)}
+            for i in range(400)
+        ])
+        detector.calculate_baselines(history)
+        detector.baseline_stats['MANUAL'] = {
+            'mean': 10.0, 'stdev': 1.0,
+            'threshold_high': 12.0, 'threshold_low': 8.0
+        }
+        measurements = [
+            {'sensor_id': sensor_id, 'consumption_kwh': value,
+             'timestamp': datetime(2024, 1, 2, 0, 0, i % 60)}
+            for i, (sensor_id, value) in enumerate(
+                [(f'TEST_{i % 20:03d}', float(rng.choice(
+                    [rng.uniform(0.0, 400.0), rng.uniform(80.0, 120.0)]
+                ))) for i in range(2000)]
+                + [('MANUAL', 13.0), ('MANUAL', 5.0), ('UNKNOWN', 1.0)]
+            )
+        ]
+        expected = [
+            anomaly for anomaly in map(detector.detect_anomaly, measurements)
+            if anomaly
+        ]
+        batch = MeasurementBatch.from_dicts(measurements)
+        assert detector.analyze_batch(measurements) == expected
+        assert detector.analyze_batch(batch) == expected
+        assert len(detector.detect_batch(batch)) == len(expected)
+        assert {a['severity'] for a in expected} >= {'LOW', 'CRITICAL'}
+        assert {a['type'] for a in expected} == {'HIGH', 'LOW'}
+
+    def test_unknown_sensors_are_not_registered(self):
+        """Test l'analyse de capteurs sans baseline et le format des
+        valeurs entières."""
+        detector = AnomalyDetector(threshold_multiplier=1.5)
+        detector.calculate_baseline([
+            {'sensor_id': 'TEST_001', 'consumption_kwh': 100,
+             'timestamp': datetime(2024, 1, 1)}
+            for _ in range(10)
+        ], 'TEST_001')
+        measurements = [
+            {'sensor_id': f'NEW_{i:03d}', 'consumption_kwh': 1000,
+             'timestamp': datetime(2024, 1, 2)}
+            for i in range(5)
+        ] + [{'sensor_id': 'TEST_001', 'consumption_kwh': 200,
+              'timestamp': datetime(2024, 1, 2)}]
+        expected = [detector.detect_anomaly(measurements[-1])]
+        assert detector.analyze_batch(measurements) == expected
+        assert expected[0]['message'] == \
+            "Consommation élevée détectée: 200 kWh"
+        assert len(detector.registry) == 1
+        assert len(detector.baseline_stats) == 1
+
+
+class TestRunningStats:
+    """Tests pour la classe RunningStats."""
+
+    def test_running_stats_merge(self):
+        """Test la fusion de deux accumulateurs de Welford."""
+        left, right = RunningStats(), RunningStats()
+        left.update_many([1.0, 2.0, 3.0])
+        right.update_many([10.0, 20.0])
+        left.merge(right)
+        assert left.count == 5
+        assert left.mean == pytest.approx(7.2)
+        assert left.stdev == pytest.approx(
+            statistics.stdev([1.0, 2.0, 3.0, 10.0, 20.0])
+        )
+
+
+class TestAdaptiveBaselines:
+    """Tests pour les baselines EWMA et fenêtre glissante."""
+
+    def _batch(self, values, sensor_id='TEST_001'):
+        return MeasurementBatch.from_dicts([
+            {'sensor_id': sensor_id, 'consumption_kwh': value,
+             'timestamp': datetime(2024, 1, 1)}
+            for value in values
+        ])
+
+    def test_rolling_window_matches_last_values(self):
+        """Test que la fenêtre ne retient que les dernières mesures."""
+        window = RollingWindowArray(window_size=5)
+        indexes = np.zeros(12, dtype=np.int32)
+        window.update(indexes[:7], np.arange(7, dtype=np.float64))
+        window.update(indexes[7:], np.arange(7, 12, dtype=np.float64))
+        last = np.arange(7, 12, dtype=np.float64)
+        assert window.count[0] == 5
+        assert window.mean[0] == pytest.approx(last.mean())
+        assert window.stdev(np.array([0]))[0] == \
+            pytest.approx(statistics.stdev(last))
+        assert window.buffer.shape == (1, 5)
+
+    def test_ewma_forgets_old_level(self):
+        """Test que l'EWMA suit un changement de niveau."""
+        ewma = EWMAArray(half_life=10)
+        indexes = np.zeros(200, dtype=np.int32)
+        values = np.r_[np.full(100, 100.0), np.full(100, 200.0)]
+        ewma.update(indexes, values)
+        assert ewma.mean[0] == pytest.approx(200.0, abs=0.1)
+        assert len(ewma) == 1
+
+    def test_ewma_long_series_matches_recurrence(self):
+        """Test une longue série d'un index, mêlée à d'autres index."""
+        rng = np.random.default_rng(4)
+        indexes = np.r_[np.zeros(3000, dtype=np.int64),
+                        rng.integers(1, 40, 2000)]
+        rng.shuffle(indexes)
+        values = rng.normal(100.0, 5.0, indexes.shape[0])
+        ewma = EWMAArray(half_life=20)
+        ewma.update(indexes[:1000], values[:1000])
+        ewma.update(indexes[1000:], values[1000:])
+
+        alpha = ewma.alpha
+        for index in (0, 7):
+            count, mean, variance = 0, 0.0, 0.0
+            for value in values[indexes == index]:
+                count += 1
+                weight = max(alpha, 1.0 / count)
+                diff = value - mean
+                mean += weight * diff
+                variance = (1.0 - weight) * (variance + diff * weight * diff)
+            assert ewma.count[index] == count
+            assert ewma.mean[index] == pytest.approx(mean, rel=1e-12)
+            assert ewma.variance[index] == pytest.approx(variance, rel=1e-9)
+
+    def test_adaptive_detector_tracks_drift(self):
+        """Test qu'une dérive lente n'est pas signalée en continu."""
+        rng = np.random.default_rng(3)
+        detector = AnomalyDetector(threshold_multiplier=3.0,
+                                   baseline_mode='window', window_size=50)
+        static = AnomalyDetector(threshold_multiplier=3.0)
+        history = self._batch(100.0 + rng.normal(0.0, 2.0, 50))
+        detector.ingest(history)
+        static.ingest(history)
+
+        adaptive_alerts = static_alerts = 0
+        for cycle in range(500):
+            level = 100.0 + cycle * 0.1
+            batch = self._batch([level + rng.normal(0.0, 2.0)])
+            adaptive_alerts += len(detector.analyze_batch(batch))
+            static_alerts += len(static.analyze_batch(batch))
+        assert static_alerts > 400
+        assert adaptive_alerts < 10
+        assert detector.get_sensor_baseline('TEST_001')['mean'] > 140.0
+
+    def test_invalid_baseline_mode(self):
+        """Test le refus d'un mode de baseline incomplet."""
+        with pytest.raises(ValueError):
+            AnomalyDetector(baseline_mode='ewma')
+        with pytest.raises(ValueError):
+            AnomalyDetector(baseline_mode='unknown')
+
+
+def _spiky_batch(count, seed, sensor_id='TEST_001'):
+    """Mesures simulées comme IoTSensor : 150 ± 30 kWh, 5 % de pics x2-3."""
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(120.0, 180.0, count)
+    spikes = rng.random(count) < 0.05
+    values[spikes] *= rng.uniform(2.0, 3.0, int(spikes.sum()))
+    registry = SensorRegistry()
+    registry.intern(sensor_id)
+    return MeasurementBatch(registry, np.zeros(count, dtype=np.int32),
+                            values, np.zeros(count, dtype=np.int64)), spikes
+
+
+class TestRobustBaselines:
+    """Tests pour les baselines robustes (médiane/MAD, quantiles)."""
+
+    def test_sketch_accuracy_size_and_merge(self):
+        """Test la précision relative, la taille et la fusion."""
+        rng = np.random.default_rng(5)
+        values = rng.lognormal(4.0, 1.0, 200_000)
+        indexes = rng.integers(0, 3, values.shape[0])
+        sketch = QuantileSketchArray(relative_accuracy=0.01)
+        sketch.update(indexes, values)
+        fractions = (0.01, 0.25, 0.5, 0.75, 0.99)
+        estimated = sketch.quantiles(np.arange(3), fractions)
+        for sensor in range(3):
+            exact = np.quantile(values[indexes == sensor], fractions)
+            assert np.allclose(estimated[:, sensor], exact, rtol=0.02)
+        assert sketch.counts.nbytes / len(sketch) < 5 * 1024
+
+        median = estimated[2]
+        exact_mad = [np.median(np.abs(values[indexes == sensor]
+                                      - median[sensor]))
+                     for sensor in range(3)]
+        assert np.allclose(sketch.mad(np.arange(3), median), exact_mad,
+                           rtol=0.02)
+
+        first = QuantileSketchArray(relative_accuracy=0.01)
+        second = QuantileSketchArray(relative_accuracy=0.01)
+        half = values.shape[0] // 2
+        first.update(indexes[:half], values[:half])
+        second.update(indexes[half:] + 1, values[half:])
+        first.merge(second, np.array([0, 0, 1, 2]))
+        assert np.array_equal(first.counts, sketch.counts)
+        assert np.array_equal(first.count, sketch.count)
+        with pytest.raises(ValueError):
+            first.merge(QuantileSketchArray(relative_accuracy=0.02))
+
+    def test_mad_mode_resists_spikes(self):
+        """Test des seuils étroits malgré les pics de la référence."""
+        history, _ = _spiky_batch(20_000, seed=1)
+        fresh, spikes = _spiky_batch(20_000, seed=2)
+        static = AnomalyDetector(threshold_multiplier=2.0)
+        robust = AnomalyDetector(threshold_multiplier=2.0,
+                                 baseline_mode='mad')
+        static.ingest(history)
+        robust.ingest(history)
+
+        baseline = robust.get_sensor_baseline('TEST_001')
+        assert baseline['mean'] == pytest.approx(150.0, rel=0.02)
+        assert baseline['threshold_high'] < \
+            static.get_sensor_baseline('TEST_001')['threshold_high'] - 50
+
+        flagged = np.zeros(len(fresh), dtype=bool)
+        flagged[robust.detect_batch(fresh).rows] = True
+        assert np.array_equal(flagged, spikes)
+        missed = np.zeros(len(fresh), dtype=bool)
+        missed[static.detect_batch(fresh).rows] = True
+        assert np.count_nonzero(spikes & ~missed) > 0
+
+    def test_quantile_mode_and_detection_api(self):
+        """Test la bande de quantiles et l'API de détection."""
+        history, _ = _spiky_batch(20_000, seed=3)
+        detector = AnomalyDetector(baseline_mode='quantile',
+                                   quantiles=(0.02, 0.9))
+        detector.ingest(history)
+        baseline = detector.get_sensor_baseline('TEST_001')
+        exact = np.quantile(history.consumption, (0.02, 0.9))
+        assert baseline['threshold_low'] == pytest.approx(exact[0], rel=0.02)
+        assert baseline['threshold_high'] == pytest.approx(exact[1],
+                                                           rel=0.02)
+
+        measurements = [
+            {'sensor_id': 'TEST_001', 'consumption_kwh': value,
+             'timestamp': datetime(2024, 1, 1)}
+            for value in (150.0, 450.0, 20.0)
+        ]
+        single = [detector.detect_anomaly(m) for m in measurements]
+        assert single[0] is None
+        assert [a['type'] for a in single[1:]] == ['HIGH', 'LOW']
+        assert single[1]['severity'] == 'HIGH'
+        assert detector.analyze_batch(measurements) == single[1:]
+        # Mode figé : l'analyse ne modifie pas la baseline
+        assert detector.get_sensor_baseline('TEST_001') == baseline
+
+        with pytest.raises(ValueError):
+            AnomalyDetector(baseline_mode='quantile', quantiles=(0.9, 0.1))
+
+    def test_merge_robust_baselines(self):
+        """Test la fusion de baselines robustes partielles."""
+        history, _ = _spiky_batch(10_000, seed=4)
+        halves = [history.select(np.arange(0, 5_000)),
+                  history.select(np.arange(5_000, 10_000))]
+        whole = AnomalyDetector(baseline_mode='mad')
+        whole.ingest(history)
+        merged = AnomalyDetector(baseline_mode='mad')
+        merged.ingest(halves[0])
+        partial = AnomalyDetector(baseline_mode='mad')
+        partial.ingest(halves[1])
+        merged.merge_baselines(partial)
+        assert merged.get_sensor_baseline('TEST_001') == \
+            whole.get_sensor_baseline('TEST_001')
+        with pytest.raises(ValueError):
+            merged.merge_baselines(AnomalyDetector())
+
+
+def _cafeteria_history(weeks=4, sensors=('CAFE', 'BUREAU'), seed=6):
+    """Mesures horaires : 300 kWh de 11 h à 13 h, 100 kWh sinon."""
+    rng = np.random.default_rng(seed)
+    registry = SensorRegistry()
+    for sensor_id in sensors:
+        registry.intern(sensor_id)
+    hours = np.arange(weeks * 168)
+    indexes = np.tile(np.arange(len(sensors)), hours.shape[0])
+    timestamps = datetime_to_micros(datetime(2024, 1, 1)) \
+        + np.repeat(hours, len(sensors)) * 3_600_000_000
+    lunch = np.isin(np.repeat(hours, len(sensors)) % 24, (11, 12, 13))
+    consumption = np.where(lunch, 300.0, 100.0) \
+        + rng.normal(0, 10, indexes.shape[0])
+    return MeasurementBatch(registry, indexes, consumption, timestamps)
+
+
+def _assert_same_profiles(detector, reference):
+    """Vérifie que deux détecteurs ont les mêmes baselines."""
+    expected = dict(reference.baseline_stats)
+    assert list(detector.baseline_stats) == list(expected)
+    for key, baseline in detector.baseline_stats.items():
+        assert baseline == pytest.approx(expected[key])
+
+
+class TestSeasonalProfiles:
+    """Tests pour les profils saisonniers par heure."""
+
+    def test_seasonal_buckets(self):
+        """Test l'heure de la semaine (lundi 0 h = 0) et de la journée."""
+        moments = [datetime(2024, 1, 1), datetime(2024, 1, 7, 23, 30),
+                   datetime(2024, 1, 10, 13, 5), datetime(1969, 12, 31, 1)]
+        assert seasonal_buckets(moments, 168).tolist() == \
+            [0, 167, 2 * 24 + 13, 2 * 24 + 1]
+        assert seasonal_buckets(moments, 24).tolist() == [0, 23, 13, 1]
+        micros = np.array([datetime_to_micros(m) for m in moments])
+        assert seasonal_buckets(micros, 168).tolist() == \
+            seasonal_buckets(moments, 168).tolist()
+        with pytest.raises(ValueError):
+            AnomalyDetector(seasonality='monthly')
+
+    def test_profile_follows_time_of_day(self):
+        """Test qu'un pic habituel est accepté et un pic nocturne signalé."""
+        history = _cafeteria_history()
+        flat = AnomalyDetector(threshold_multiplier=3.0)
+        seasonal = AnomalyDetector(threshold_multiplier=3.0,
+                                   seasonality='hour_of_week')
+        flat.ingest(history)
+        seasonal.ingest(history)
+        assert seasonal.baseline_stats.sensor_count() == 2
+        assert len(seasonal.baseline_stats) == 2 * 168
+
+        readings = [
+            {'sensor_id': 'CAFE', 'consumption_kwh': 305.0,
+             'timestamp': datetime(2024, 2, 7, 12, 15)},
+            {'sensor_id': 'CAFE', 'consumption_kwh': 250.0,
+             'timestamp': datetime(2024, 2, 8, 3, 0)},
+        ]
+        assert [a['timestamp'] for a in seasonal.analyze_batch(readings)] \
+            == [readings[1]['timestamp']]
+        assert [seasonal.detect_anomaly(r) is not None
+                for r in readings] == [False, True]
+        assert flat.detect_anomaly(readings[1]) is None
+
+        lunch = seasonal.get_sensor_baseline('CAFE',
+                                             datetime(2024, 2, 7, 12))
+        assert lunch['mean'] == pytest.approx(300.0, abs=15.0)
+        assert lunch['count'] == 4
+        profile = seasonal.get_sensor_profile('CAFE')
+        assert len(profile) == 168
+        assert profile[3]['mean'] == pytest.approx(100.0, abs=10.0)
+
+    def test_train_from_storage_and_persist(self, tmp_path):
+        """Test l'apprentissage en un passage et la relecture du profil."""
+        history = _cafeteria_history()
+        store = ColumnarStore(str(tmp_path / 'store'))
+        store.connect()
+        store.insert_measurements(history)
+
+        reference = AnomalyDetector(seasonality='hour_of_week')
+        reference.ingest(history)
+        trained = AnomalyDetector(seasonality='hour_of_week')
+        assert trained.train(store.iter_measurements(
+            batch_size=100, columnar=True, ascending=True,
+            registry=trained.registry
+        )) == len(history)
+        _assert_same_profiles(trained, reference)
+
+        path = str(tmp_path / 'profiles.npz')
+        trained.baseline_stats.save(path)
+        registry = SensorRegistry()
+        registry.intern('AUTRE')
+        loaded = AnomalyDetector(seasonality='hour_of_week',
+                                 registry=registry)
+        loaded.baseline_stats.load(path)
+        assert dict(loaded.baseline_stats) == dict(trained.baseline_stats)
+        assert loaded.baseline_stats.sensor_count() == 2
+        with pytest.raises(ValueError):
+            AnomalyDetector(seasonality='hour_of_day').baseline_stats \
+                .load(path)
+
+    def test_seasonal_merge_and_parallel(self):
+        """Test la fusion de profils et la détection répartie."""
+        history = _cafeteria_history()
+        half = len(history) // 2
+        whole = AnomalyDetector(seasonality='hour_of_day')
+        whole.ingest(history)
+        merged = AnomalyDetector(seasonality='hour_of_day')
+        merged.ingest(history.select(np.arange(half)))
+        other = AnomalyDetector(seasonality='hour_of_day')
+        other.ingest(history.select(np.arange(half, len(history))))
+        merged.merge_baselines(other)
+        _assert_same_profiles(merged, whole)
+        with pytest.raises(ValueError):
+            merged.merge_baselines(AnomalyDetector())
+
+        fresh = _cafeteria_history(weeks=1, seed=8)
+        parallel = ParallelAnomalyDetector(workers=2, min_parallel_rows=1,
+                                           seasonality='hour_of_day')
+        try:
+            parallel.ingest(history)
+            expected = whole.detect_batch(fresh)
+            result = parallel.detect_batch(fresh)
+        finally:
+            parallel.close()
+        assert result.rows.tolist() == expected.rows.tolist()
+        assert result.to_dicts() == expected.to_dicts()
+
+
+class TestParallelAnomalyDetector:
+    """Tests pour la détection répartie entre processus."""
+
+    def _fleet(self, registry, sensors, samples, rng):
+        ids = np.repeat(np.arange(sensors), samples)
+        base = rng.uniform(50.0, 500.0, sensors)
+        for index in range(sensors):
+            registry.intern(f"S{index:04d}")
+        history = MeasurementBatch(registry, ids,
+                                   base[ids] + rng.normal(0, 5, ids.size),
+                                   np.zeros(ids.size, dtype=np.int64))
+        return base, history
+
+    def test_matches_serial_detection(self):
+        """Test l'identité avec AnomalyDetector, lot trié ou non."""
+        rng = np.random.default_rng(5)
+        registry = SensorRegistry()
+        base, history = self._fleet(registry, 300, 4, rng)
+        serial = AnomalyDetector(registry=registry, baseline_mode='ewma',
+                                 half_life=20)
+        parallel = ParallelAnomalyDetector(
+            workers=3, min_parallel_rows=0, registry=registry,
+            baseline_mode='ewma', half_life=20
+        )
+        try:
+            serial.ingest(history)
+            parallel.ingest(history)
+            for cycle in range(3):
+                order = np.arange(300) if cycle == 0 \
+                    else rng.permutation(300)
+                batch = MeasurementBatch(
+                    registry, order, base[order] + rng.normal(0, 15, 300),
+                    np.full(300, cycle, dtype=np.int64)
+                )
+                expected = serial.analyze_batch(batch)
+                assert expected
+                assert parallel.analyze_batch(batch) == expected
+            assert parallel.running
+        finally:
+            parallel.close()
+        assert not parallel.running
+        assert parallel.get_sensor_baseline('S0000') == \
+            serial.get_sensor_baseline('S0000')
+
+    def test_table_growth_is_shared(self):
+        """Test la prise en compte de capteurs ajoutés après le départ."""
+        rng = np.random.default_rng(8)
+        registry = SensorRegistry()
+        base, history = self._fleet(registry, 10, 3, rng)
+        detector = ParallelAnomalyDetector(workers=2, min_parallel_rows=0,
+                                           registry=registry)
+        try:
+            detector.ingest(history)
+            detector.analyze_batch(MeasurementBatch(
+                registry, np.arange(10), base, np.zeros(10, np.int64)
+            ))
+            late = registry.intern('LATE')
+            detector.ingest(MeasurementBatch(
+                registry, [late, late], [10.0, 12.0], [0, 1]
+            ))
+            anomalies = detector.analyze_batch(MeasurementBatch(
+                registry, [0, late], [base[0], 100.0], [2, 2]
+            ))
+            assert [a['sensor_id'] for a in anomalies] == ['LATE']
+        finally:
+            detector.close()
+
+    def test_worker_error_leaves_no_stale_results(self):
+        """Test qu'une erreur d'un processus ne décale pas les lots
+        suivants."""
+        rng = np.random.default_rng(11)
+        registry = SensorRegistry()
+        base, history = self._fleet(registry, 100, 4, rng)
+        serial = AnomalyDetector(registry=registry)
+        parallel = ParallelAnomalyDetector(workers=2, min_parallel_rows=0,
+                                           registry=registry)
+
+        class Failing:
+            """Tube dont la prochaine requête est invalide."""
+
+            def __init__(self, connection):
+                self.connection = connection
+
+            def send(self, request):
+                layout, start, _ = request
+                self.connection.send((layout, start, 'invalide'))
+
+            def __getattr__(self, name):
+                return getattr(self.connection, name)
+
+        try:
+            serial.ingest(history)
+            parallel.ingest(history)
+            batches = [MeasurementBatch(
+                registry, np.arange(100),
+                base + rng.normal(0, 15, 100) * (cycle + 1),
+                np.full(100, cycle, dtype=np.int64)
+            ) for cycle in range(2)]
+            parallel.start()
+            connection = parallel._connections[0]
+            parallel._connections[0] = Failing(connection)
+            with pytest.raises(TypeError):
+                parallel.analyze_batch(batches[0])
+            parallel._connections[0] = connection
+            # Laisse à l'autre processus le temps de répondre au lot
+            # en erreur avant que le suivant n'écrase le tampon
+            parallel._connections[1].poll(1.0)
+            expected = serial.analyze_batch(batches[1])
+            assert expected
+            assert parallel.analyze_batch(batches[1]) == expected
+        finally:
+            parallel.close()
+
+
+def _replay_history(sensors=20, minutes=2 * 1440, seed=3):
+    """Une mesure par minute et par capteur, avec des pics rares."""
+    rng = np.random.default_rng(seed)
+    registry = SensorRegistry()
+    for sensor in range(sensors):
+        registry.intern(f'REPLAY_{sensor:03d}')
+    start = datetime_to_micros(datetime(2024, 3, 1))
+    indexes = np.tile(np.arange(sensors), minutes)
+    timestamps = start + np.repeat(np.arange(minutes), sensors) * 60_000_000
+    consumption = 100.0 + 10.0 * indexes + rng.normal(0, 5, indexes.shape[0])
+    spikes = rng.random(indexes.shape[0]) < 0.01
+    consumption[spikes] *= 3
+    return MeasurementBatch(registry, indexes, consumption, timestamps)
+
+
+class TestAnomalyReplay:
+    """Tests pour le rejeu de la détection sur les mesures stockées."""
+
+    def test_replay_matches_offline_detection(self, tmp_path):
+        """Test l'apprentissage sur la fenêtre et la détection du reste."""
+        history = _replay_history()
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        store.insert_measurements(history)
+
+        detector = AnomalyDetector(threshold_multiplier=2.5)
+        replay = AnomalyReplay(store, detector, batch_size=7_000,
+                               write_batch_size=500)
+        summary = replay.run(timedelta(hours=24), run_id='essai')
+
+        cutoff = datetime_to_micros(datetime(2024, 3, 2))
+        learning = history.timestamp < cutoff
+        reference = AnomalyDetector(threshold_multiplier=2.5)
+        reference.ingest(history.select(np.flatnonzero(learning)))
+        expected = reference.detect_batch(
+            history.select(np.flatnonzero(~learning))
+        )
+        assert summary['trained'] == int(learning.sum())
+        assert summary['analyzed'] == int((~learning).sum())
+        assert summary['anomalies'] == len(expected) > 0
+        assert summary['speedup'] > 1
+
+        stored = store.get_anomalies(run_id='essai', limit=len(expected))
+        assert len(stored) == len(expected)
+        assert {(a['sensor_id'], a['timestamp']) for a in stored} == \
+            {(a['sensor_id'], a['timestamp'])
+             for a in expected.to_dicts()}
+        assert store.get_anomalies(run_id='autre') == []
+        store.disconnect()
+
+    def test_replay_window_and_parallel_detector(self, tmp_path):
+        """Test les bornes du rejeu avec une détection répartie."""
+        history = _replay_history(sensors=8, minutes=600)
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        store.insert_measurements(history)
+
+        detector = ParallelAnomalyDetector(workers=2, min_parallel_rows=1)
+        try:
+            summary = AnomalyReplay(store, detector, batch_size=1_000).run(
+                timedelta(hours=2), start=datetime(2024, 3, 1, 1),
+                end=datetime(2024, 3, 1, 8)
+            )
+        finally:
+            detector.close()
+        assert summary['trained'] == 8 * 120
+        assert summary['analyzed'] == 8 * 300
+        assert len(store.get_anomalies(run_id=summary['run_id'],
+                                       limit=10_000)) == \
+            summary['anomalies']
+
+
+class TestBaselineSnapshots:
+    """Tests pour les instantanés et la reprise des baselines."""
+
+    def test_state_round_trip(self):
+        """Test la restauration dans un registre d'un autre ordre."""
+        history = _cafeteria_history()
+        detector = AnomalyDetector(seasonality='hour_of_day',
+                                   baseline_mode='mad')
+        detector.ingest(history)
+        data = dump_baselines(detector)
+
+        registry = SensorRegistry()
+        registry.intern('AUTRE')
+        restored = AnomalyDetector(seasonality='hour_of_day',
+                                   baseline_mode='mad', registry=registry)
+        assert load_baselines(restored, data) == 2
+        _assert_same_profiles(restored, detector)
+        assert restored.updated_at[1:3].tolist() == \
+            [int(history.timestamp[-2]), int(history.timestamp[-1])]
+
+        fresh = _cafeteria_history(weeks=1, seed=8)
+        assert restored.detect_batch(fresh).to_dicts() == \
+            detector.detect_batch(fresh).to_dicts()
+        # Les esquisses sont restaurées : l'apprentissage continue
+        restored.ingest(fresh)
+        detector.ingest(fresh)
+        _assert_same_profiles(restored, detector)
+
+        with pytest.raises(ValueError):
+            load_baselines(AnomalyDetector(baseline_mode='mad'), data)
+
+    def test_thresholds_follow_current_settings(self):
+        """Test le recalcul des seuils si le multiplicateur a changé."""
+        detector = AnomalyDetector(threshold_multiplier=2.0)
+        detector.ingest(_spiky_batch(200, seed=1)[0])
+        wider = AnomalyDetector(threshold_multiplier=3.0)
+        load_baselines(wider, dump_baselines(detector))
+        before = detector.get_sensor_baseline('TEST_001')
+        after = wider.get_sensor_baseline('TEST_001')
+        assert after['mean'] == before['mean']
+        assert after['threshold_high'] == \
+            pytest.approx(before['mean'] + 3.0 * before['stdev'])
+
+    def test_periodic_and_final_saves(self, tmp_path):
+        """Test la période des sauvegardes et l'instantané final."""
+        detector = AnomalyDetector()
+        files = SnapshotFiles(str(tmp_path))
+        snapshots = BaselineSnapshots(detector, [files], interval=3600.0,
+                                      keep=2)
+        detector.ingest(_spiky_batch(50, seed=2)[0])
+        assert not snapshots.maybe_save()
+        snapshots.interval = 0.0
+        assert snapshots.maybe_save()
+        detector.ingest(_spiky_batch(50, seed=3)[0])
+        snapshots.close()
+        assert files.versions() == [1, 2]
+
+        restored = AnomalyDetector()
+        resumed = BaselineSnapshots(restored, [files]).restore()
+        assert resumed['version'] == 2
+        assert resumed['sensors'] == 1
+        assert restored.get_sensor_baseline('TEST_001') == \
+            detector.get_sensor_baseline('TEST_001')
+
+    def test_warm_start_catches_up(self, tmp_path):
+        """Test la reprise d'un instantané puis des mesures suivantes."""
+        history = _cafeteria_history()
+        half = len(history) // 2
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        store.insert_measurements(history.select(np.arange(half)))
+
+        detector = AnomalyDetector(seasonality='hour_of_week')
+        detector.train(store.iter_measurements(
+            columnar=True, ascending=True, registry=detector.registry
+        ))
+        BaselineSnapshots(detector, [store]).close()
+        store.insert_measurements(
+            history.select(np.arange(half, len(history)))
+        )
+
+        restarted = AnomalyDetector(seasonality='hour_of_week')
+        summary = BaselineSnapshots(restarted, [store]).warm_start(
+            store, batch_size=100
+        )
+        assert summary['source'] == 'snapshot'
+        assert summary['version'] == 1
+        assert summary['measurements'] == len(history) - half
+        assert summary['sensors'] == 2
+        reference = AnomalyDetector(seasonality='hour_of_week')
+        reference.ingest(history)
+        _assert_same_profiles(restarted, reference)
+
+    def test_warm_start_without_snapshot(self, tmp_path):
+        """Test l'initialisation par agrégation ou par l'historique."""
+        history = _cafeteria_history()
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        empty = AnomalyDetector()
+        assert BaselineSnapshots(empty, [store]).warm_start(store)[
+            'source'] is None
+        store.insert_measurements(history)
+
+        reference = AnomalyDetector()
+        reference.ingest(history)
+        seeded = AnomalyDetector()
+        summary = BaselineSnapshots(seeded, [store]).warm_start(store)
+        assert (summary['source'], summary['sensors']) == ('statistics', 2)
+        for sensor_id in ('CAFE', 'BUREAU'):
+            assert seeded.get_sensor_baseline(sensor_id) == \
+                pytest.approx(reference.get_sensor_baseline(sensor_id))
+
+        seasonal = AnomalyDetector(seasonality='hour_of_day')
+        summary = BaselineSnapshots(seasonal, [store]).warm_start(store)
+        assert summary['source'] == 'history'
+        assert summary['measurements'] == len(history)
+
+    def test_parallel_detector_restore(self):
+        """Test la restauration dans la table partagée."""
+        history = _cafeteria_history()
+        detector = AnomalyDetector(seasonality='hour_of_day')
+        detector.ingest(history)
+        parallel = ParallelAnomalyDetector(workers=2, min_parallel_rows=1,
+                                           seasonality='hour_of_day')
+        try:
+            load_baselines(parallel, dump_baselines(detector))
+            fresh = _cafeteria_history(weeks=1, seed=8)
+            result = parallel.detect_batch(fresh)
+        finally:
+            parallel.close()
+        assert result.to_dicts() == detector.detect_batch(fresh).to_dicts()
+
+
+def _site_cycle(start, cycle, loads=None, interval=10):
+    """Mesures d'un cycle : deux capteurs au Bureau, un à l'Entrepôt."""
+    timestamp = start + timedelta(seconds=interval * cycle)
+    loads = loads or {'B1': 100.0 + cycle % 3, 'B2': 50.0, 'E1': 200.0}
+    locations = {'B1': 'Bureau', 'B2': 'Bureau', 'E1': 'Entrepôt'}
+    return [{'sensor_id': sensor_id, 'location': locations[sensor_id],
+             'consumption_kwh': value, 'timestamp': timestamp}
+            for sensor_id, value in loads.items()]
+
+
+class TestLocationAggregator:
+    """Tests pour l'agrégation par localisation."""
+
+    START = datetime(2024, 3, 4, 8, 0)
+
+    def test_tumbling_windows(self):
+        """Test les totaux des fenêtres fixes et leur clôture."""
+        aggregator = LocationAggregator(tumbling_window=60,
+                                        sliding_window=300)
+        for cycle in range(7):
+            aggregator.update(_site_cycle(self.START, cycle))
+        closed = aggregator.completed_windows()
+        assert len(closed) == 1
+        assert aggregator.completed_windows() == []
+        bureau = closed[0]['Bureau']
+        assert bureau['window_start'] == self.START
+        assert bureau['window_end'] == self.START + timedelta(minutes=1)
+        assert bureau['cycles'] == 6
+        assert bureau['count'] == 12
+        assert bureau['total_kwh'] == pytest.approx(906.0)
+        assert bureau['mean_load_kwh'] == pytest.approx(151.0)
+        assert (bureau['min_kwh'], bureau['max_kwh']) == (50.0, 102.0)
+        assert closed[0][FLEET]['total_kwh'] == pytest.approx(2106.0)
+        assert aggregator.tumbling()['Entrepôt']['cycles'] == 1
+
+    def test_sliding_window_evicts_old_cycles(self):
+        """Test le retrait des cycles sortis de la fenêtre glissante."""
+        aggregator = LocationAggregator(sliding_window=30)
+        aggregator.update(_site_cycle(self.START, 0,
+                                      {'B1': 500.0, 'E1': 200.0}))
+        for cycle in range(1, 6):
+            aggregator.update(_site_cycle(self.START, cycle))
+        sliding = aggregator.sliding()
+        assert sliding['Bureau']['cycles'] == 3
+        assert sliding['Bureau']['max_kwh'] == 102.0
+        assert sliding[FLEET]['count'] == 9
+        assert sliding[FLEET]['window_end'] == \
+            self.START + timedelta(seconds=50)
+
+    def test_batches_match_dicts(self):
+        """Test que lots en colonnes et dictionnaires donnent les mêmes
+        agrégats."""
+        by_dicts = LocationAggregator()
+        by_batch = LocationAggregator()
+        registry = SensorRegistry()
+        for cycle in range(4):
+            measurements = _site_cycle(self.START, cycle)
+            by_dicts.update(measurements)
+            by_batch.update(MeasurementBatch.from_dicts(measurements,
+                                                        registry))
+        assert by_dicts.sliding() == by_batch.sliding()
+        assert by_dicts.tumbling() == by_batch.tumbling()
+
+    def test_location_load_anomaly(self):
+        """Test la détection d'une charge anormale de localisation."""
+        aggregator = LocationAggregator(threshold_multiplier=3.0,
+                                        min_cycles=10)
+        for cycle in range(20):
+            assert aggregator.update(_site_cycle(self.START, cycle)) == []
+        baseline = aggregator.get_location_baseline('Bureau')
+        assert baseline['mean'] == pytest.approx(151.0, abs=1.0)
+        # Chaque capteur reste dans sa bande, mais la somme dépasse celle
+        # du Bureau
+        anomalies = aggregator.update(_site_cycle(
+            self.START, 20, {'B1': 102.0, 'B2': 80.0, 'E1': 200.0}
+        ))
+        locations = {anomaly['location']: anomaly for anomaly in anomalies}
+        assert set(locations) == {'Bureau', FLEET}
+        assert locations['Bureau']['type'] == 'HIGH'
+        assert locations['Bureau']['load'] == pytest.approx(182.0)
+        assert locations['Bureau']['sensors'] == 2
+        # La charge anormale n'est pas intégrée à la baseline
+        assert aggregator.get_location_baseline('Bureau')['mean'] == \
+            pytest.approx(baseline['mean'])
+
+    def test_invalid_windows(self):
+        """Test le refus des fenêtres nulles."""
+        with pytest.raises(ValueError):
+            LocationAggregator(tumbling_window=0)
@@ -0,0 +1,94 @@
+"""Tests unitaires pour le module benchmarks."""
+import json
+import os
+
+from benchmarks.pipeline import (
+    CASES, DEFAULT_TOLERANCE, _network, compare, measure, run
+)
+
+BASELINE = os.path.join(os.path.dirname(__file__), os.pardir, 'benchmarks',
+                        'baseline.json')
+
+
+def _results(**metrics):
+    result = {'case': 'read_batch', 'fleet_size': 1000, 'batch_size': None,
+              'ops_per_sec': 1000.0, 'p50_ms': 1.0, 'p99_ms': 2.0,
+              'peak_memory_mb': 10.0, 'repeats': 5}
+    result.update(metrics)
+    return {'environment': {}, 'results': [result]}
+
+
+class TestCompare:
+    """Tests pour la détection des régressions."""
+
+    def test_within_tolerance(self):
+        """Test qu'un écart inférieur à la tolérance est accepté."""
+        baseline = _results()
+        current = _results(ops_per_sec=810.0, p99_ms=2.35,
+                           peak_memory_mb=12.9)
+        assert compare(current, baseline) == []
+
+    def test_throughput_regression(self):
+        """Test le signalement d'une baisse de débit."""
+        regressions = compare(_results(ops_per_sec=790.0), _results())
+        assert [r['metric'] for r in regressions] == ['ops_per_sec']
+        assert regressions[0]['baseline'] == 1000.0
+        assert regressions[0]['current'] == 790.0
+
+    def test_latency_and_memory_regressions(self):
+        """Test les seuils relatifs et les marges absolues."""
+        regressions = compare(_results(p99_ms=2.5, peak_memory_mb=13.1),
+                              _results())
+        assert [r['metric'] for r in regressions] == \
+            ['p99_ms', 'peak_memory_mb']
+        # Les marges absolues couvrent le bruit des petites valeurs
+        assert compare(_results(p99_ms=0.06, peak_memory_mb=0.9),
+                       _results(p99_ms=0.01, peak_memory_mb=0.1)) == []
+
+    def test_tolerance_and_unknown_cases(self):
+        """Test la tolérance fournie et les cas absents de la référence."""
+        current = _results(ops_per_sec=850.0)
+        assert compare(current, _results()) == []
+        assert len(compare(current, _results(), tolerance=0.1)) == 1
+        assert compare(_results(fleet_size=10), _results()) == []
+
+
+class TestBaseline:
+    """Tests pour la référence enregistrée."""
+
+    def test_baseline_matches_cases(self):
+        """Test que la référence couvre les cas et leur format."""
+        with open(BASELINE, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        assert {result['case'] for result in baseline['results']} == \
+            set(CASES)
+        assert compare(baseline, baseline, DEFAULT_TOLERANCE) == []
+
+    def test_run_small_case(self):
+        """Test l'exécution d'un cas et le format de ses résultats."""
+        results = run(fleet_sizes=[20], batch_sizes=[40],
+                      cases=['calculate_baseline',
+                             'get_statistics[mongodb]'],
+                      min_time=0.0, verbose=False)
+        assert [(r['case'], r['batch_size']) for r in results['results']] \
+            == [('calculate_baseline', 40), ('get_statistics[mongodb]', None)]
+        for result in results['results']:
+            assert result['ops_per_sec'] > 0
+            assert set(result) >= {'p50_ms', 'p99_ms', 'peak_memory_mb'}
+
+    def test_baseline_history_per_sensor(self):
+        """Test l'historique de calculate_baseline et le nombre de
+        mesures rapporté."""
+        case, _ = CASES['calculate_baseline']
+        call, ops = case(_network(20), 40)
+        assert ops == 8 * 40
+        call()
+
+    def test_measure_counts_operations(self):
+        """Test le débit rapporté par appel."""
+        calls = []
+        result = measure(lambda: calls.append(1), 100, min_repeats=3,
+                         max_repeats=3, min_time=0.0)
+        assert result['repeats'] == 3
+        assert len(calls) == 5
+        assert result['ops_per_sec'] > 0
@@ -0,0 +1,163 @@
+"""Tests unitaires pour la configuration et la ligne de commande."""
+import copy
+import os
+import subprocess
+import sys
+
+import pytest
+from src.config import overrides, settings
+
+import main
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+@pytest.fixture(autouse=True)
+def restore_settings():
+    """Restaure les sections de configuration modifiées par un test."""
+    saved = {name: copy.deepcopy(section)
+             for name, section in overrides.sections().items()}
+    yield
+    for name, section in overrides.sections().items():
+        section.clear()
+        section.update(saved[name])
+
+
+class TestOverrides:
+    """Tests pour les surcharges de configuration."""
+
+    def test_sections_cover_config_dicts(self):
+        """Test que chaque *_CONFIG forme une section."""
+        sections = overrides.sections()
+        assert sections['anomaly'] is settings.ANOMALY_CONFIG
+        assert sections['storage'] is settings.STORAGE_CONFIG
+        assert 'snapshot' in sections
+
+    def test_values_keep_their_type(self):
+        """Test la conversion d'après la valeur actuelle."""
+        overrides.apply_assignments([
+            'anomaly.threshold_multiplier=3',
+            'anomaly.monitoring_cycles=7',
+            'snapshot.enabled=off',
+            'anomaly.baseline_mode=ewma',
+        ])
+        assert settings.ANOMALY_CONFIG['threshold_multiplier'] == 3.0
+        assert isinstance(settings.ANOMALY_CONFIG['threshold_multiplier'],
+                          float)
+        assert settings.ANOMALY_CONFIG['monitoring_cycles'] == 7
+        assert settings.SNAPSHOT_CONFIG['enabled'] is False
+        assert settings.ANOMALY_CONFIG['baseline_mode'] == 'ewma'
+
+    def test_nested_keys_and_json(self):
+        """Test les clés imbriquées et les valeurs JSON."""
+        overrides.apply_assignments([
+            'storage.columnar.directory=/tmp/store',
+            'snapshot.directory="/tmp/snapshots"',
+        ])
+        assert settings.STORAGE_CONFIG['columnar']['directory'] == \
+            '/tmp/store'
+        assert settings.SNAPSHOT_CONFIG['directory'] == '/tmp/snapshots'
+
+    def test_environment(self):
+        """Test les variables d'environnement ENERGY_<SECTION>__<CLÉ>."""
+        applied = overrides.apply_environment({
+            'ENERGY_STORAGE__BACKEND': 'columnar',
+            'ENERGY_ANOMALY__MONITORING_CYCLES': '4',
+            'ENERGY_UNRELATED': 'x',
+            'PATH': '/bin',
+        })
+        assert applied == ['anomaly.monitoring_cycles', 'storage.backend']
+        assert settings.STORAGE_CONFIG['backend'] == 'columnar'
+        assert settings.ANOMALY_CONFIG['monitoring_cycles'] == 4
+
+    @pytest.mark.parametrize('assignment', [
+        'unknown.key=1', 'anomaly.unknown=1', 'anomaly=1',
+        'anomaly.monitoring_cycles', 'anomaly.monitoring_cycles=many',
+        'snapshot.enabled=maybe',
+    ])
+    def test_invalid_assignments(self, assignment):
+        """Test le refus des affectations invalides."""
+        with pytest.raises(ValueError):
+            overrides.apply_assignments([assignment])
+
+
+class TestCommandLine:
+    """Tests pour la ligne de commande."""
+
+    def test_flags_override_environment(self):
+        """Test que les options priment sur l'environnement."""
+        args = main.build_parser().parse_args(
+            ['--storage', 'columnar', '--log-level', 'debug',
+             '--set', 'anomaly.monitoring_cycles=9', 'stats']
+        )
+        main.configure(args, {'ENERGY_STORAGE__BACKEND': 'mongodb',
+                              'ENERGY_ANOMALY__MONITORING_CYCLES': '2'})
+        assert settings.STORAGE_CONFIG['backend'] == 'columnar'
+        assert settings.LOGGING_CONFIG['level'] == 'DEBUG'
+        assert settings.ANOMALY_CONFIG['monitoring_cycles'] == 9
+
+    def test_simulate_writes_measurements(self, tmp_path, monkeypatch):
+        """Test la simulation sans stockage."""
+        monkeypatch.setattr(main, 'configure', lambda args: [])
+        output = tmp_path / 'measurements.jsonl'
+        main.main(['simulate', '--sensors', '5', '--cycles', '2',
+                   '--interval', '0', '--output', str(output)])
+        lines = output.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 10
+        assert '"SENSOR_000005"' in lines[-1]
+
+    def test_stats_on_columnar_store(self, tmp_path, monkeypatch, capsys):
+        """Test les statistiques lues dans le stockage en colonnes."""
+        monkeypatch.setattr(main, 'configure', lambda args: [])
+        overrides.apply_assignments([
+            'storage.backend=columnar',
+            f'storage.columnar.directory={tmp_path}',
+        ])
+        storage = main.open_storage()
+        network = main.create_network(verbose=False)
+        storage.insert_measurements(network.read_batch())
+        storage.disconnect()
+        capsys.readouterr()
+        main.main(['stats', '--limit', '2'])
+        output = capsys.readouterr().out
+        assert 'SENSOR_001: 1 mesures' in output
+        assert '... 2 autres capteurs' in output
+
+    def test_replay_uses_configured_training_window(self, tmp_path,
+                                                    monkeypatch, capsys):
+        """Test le rejeu sans --training-hours (valeur de replay)."""
+        monkeypatch.setattr(main, 'configure', lambda args: [])
+        overrides.apply_assignments([
+            'storage.backend=columnar',
+            f'storage.columnar.directory={tmp_path}',
+            'replay.training_hours=1',
+        ])
+        storage = main.open_storage()
+        network = main.create_network(verbose=False)
+        storage.insert_measurements(network.read_batch())
+        storage.disconnect()
+        capsys.readouterr()
+        main.main(['replay', '--run-id', 'test'])
+        output = capsys.readouterr().out
+        assert 'Rejeu test:' in output
+        assert "Mesures d'apprentissage: 4" in output
+
+    def test_help_imports_no_heavy_modules(self):
+        """Test que l'aide s'affiche sans importer NumPy ni pymongo."""
+        code = (
+            "import sys, time\n"
+            "started = time.perf_counter()\n"
+            "import main\n"
+            "try:\n"
+            "    main.main(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "elapsed = time.perf_counter() - started\n"
+            "heavy = {'numpy', 'pymongo'} & set(sys.modules)\n"
+            "print(elapsed, sorted(heavy), file=sys.stderr)\n"
+            "assert not heavy, heavy\n"
+            "assert elapsed < 0.1, elapsed\n"
+        )
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                                capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
@@ -0,0 +1,401 @@
+"""Tests unitaires pour le module core."""
+import asyncio
+import gc
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+import pytest
+from src.core.measurement_batch import (
+    MeasurementBatch, SensorRegistry, datetime_to_micros, micros_to_datetime
+)
+from src.core.metrics import (
+    ANOMALIES, READINGS, SENSORS_WITH_BASELINE, MetricsRegistry,
+    MetricsServer
+)
+from src.core.profiling import CycleProfiler
+from src.core.runtime import MonitoringRuntime, SensorGroup, group_by_interval
+
+
+class TestSensorRegistry:
+    """Tests pour la classe SensorRegistry."""
+
+    def test_intern_is_stable(self):
+        """Test que l'internement retourne des index stables."""
+        registry = SensorRegistry()
+        assert registry.intern("TEST_001", "Bureau") == 0
+        assert registry.intern("TEST_002", "Entrepôt") == 1
+        assert registry.intern("TEST_001") == 0
+        assert registry.locations[0] == "Bureau"
+        assert len(registry) == 2
+
+    def test_translate(self):
+        """Test la correspondance entre deux registres."""
+        source = SensorRegistry()
+        source.intern("B")
+        source.intern("A")
+        target = SensorRegistry()
+        target.intern("A")
+        assert target.translate(source).tolist() == [1, 0]
+        source.intern("C")
+        assert target.translate(source).tolist() == [1, 0, 2]
+
+
+class TestMeasurementBatch:
+    """Tests pour la classe MeasurementBatch."""
+
+    def _measurements(self):
+        return [
+            {'sensor_id': 'TEST_001', 'location': 'Bureau',
+             'consumption_kwh': 100.5,
+             'timestamp': datetime(2024, 1, 1, 12, 0, 0, 123456),
+             'status': 'active'},
+            {'sensor_id': 'TEST_002', 'location': 'Entrepôt',
+             'consumption_kwh': 200.25,
+             'timestamp': datetime(2024, 1, 1, 12, 0, 1),
+             'status': 'active'},
+        ]
+
+    def test_round_trip_dicts(self):
+        """Test la conversion aller-retour avec les dictionnaires."""
+        measurements = self._measurements()
+        batch = MeasurementBatch.from_dicts(measurements)
+        assert len(batch) == 2
+        assert batch.consumption.dtype == np.float64
+        assert batch.timestamp.dtype == np.int64
+        assert batch.to_dicts() == measurements
+        assert batch.row(1) == measurements[1]
+
+    def test_timestamp_conversion(self):
+        """Test la conversion des horodatages."""
+        value = datetime(2024, 3, 15, 8, 30, 0, 42)
+        assert micros_to_datetime(datetime_to_micros(value)) == value
+
+    def test_concat_and_select(self):
+        """Test la concaténation et la sélection de lignes."""
+        batch = MeasurementBatch.from_dicts(self._measurements())
+        merged = MeasurementBatch.concat([batch, batch])
+        assert len(merged) == 4
+        assert merged.values_for('TEST_002').tolist() == [200.25, 200.25]
+        assert len(merged.select(merged.consumption > 150.0)) == 2
+
+    def test_concat_rejects_foreign_registry(self):
+        """Test le refus de concaténer des registres différents."""
+        first = MeasurementBatch.from_dicts(self._measurements())
+        second = MeasurementBatch.from_dicts(self._measurements())
+        with pytest.raises(ValueError):
+            MeasurementBatch.concat([first, second])
+
+    def test_with_registry(self):
+        """Test la réexpression d'un lot dans un autre registre."""
+        batch = MeasurementBatch.from_dicts(self._measurements())
+        registry = SensorRegistry()
+        registry.intern('TEST_002')
+        moved = batch.with_registry(registry)
+        assert moved.sensor_index.tolist() == [1, 0]
+        assert moved.to_dicts() == batch.to_dicts()
+
+
+class TestMonitoringRuntime:
+    """Tests pour la boucle de surveillance à cadence fixe."""
+
+    @staticmethod
+    def _reader(calls):
+        registry = SensorRegistry()
+
+        def read(sensor_ids):
+            calls.append((time.monotonic(), sensor_ids))
+            return MeasurementBatch.empty(registry)
+        return read
+
+    def test_group_by_interval(self):
+        """Test le regroupement des capteurs par intervalle."""
+        groups = group_by_interval(['A', 'B', 'C'], 1.0, {'B': 0.5})
+        assert [(g.interval, g.sensor_ids) for g in groups] == \
+            [(0.5, ['B']), (1.0, ['A', 'C'])]
+        with pytest.raises(ValueError):
+            SensorGroup('bad', 0.0)
+
+    def test_fixed_rate_despite_slow_stages(self):
+        """Test que la cadence ne dérive pas quand les étapes sont lentes."""
+        calls = []
+        runtime = MonitoringRuntime(
+            self._reader(calls), persist=lambda batch: time.sleep(0.03),
+            groups=[SensorGroup('fast', 0.05)]
+        )
+        report = runtime.run(cycles=8, detect=lambda batch: time.sleep(0.03))
+        elapsed = calls[-1][0] - calls[0][0]
+        assert len(calls) == 8
+        assert elapsed == pytest.approx(7 * 0.05, abs=0.03)
+        assert report['fast']['missed'] == 0
+
+    def test_groups_and_results(self):
+        """Test les intervalles par groupe et la remontée des résultats."""
+        calls = []
+        results = []
+        runtime = MonitoringRuntime(self._reader(calls), groups=[
+            SensorGroup('a', 0.02, ['A']), SensorGroup('b', 0.05, ['B'])
+        ])
+        report = runtime.run(duration=0.2, detect=lambda batch: len(batch),
+                             on_result=lambda b, r: results.append(r))
+        counts = {ids[0]: 0 for _, ids in calls}
+        for _, ids in calls:
+            counts[ids[0]] += 1
+        assert counts['A'] > counts['B'] >= 3
+        assert report['a']['ticks'] == counts['A']
+        assert len(results) == len(calls)
+
+    def test_missed_ticks_are_counted(self):
+        """Test le comptage des échéances manquées."""
+        calls = []
+        read = self._reader(calls)
+
+        def slow_read(sensor_ids):
+            time.sleep(0.12)
+            return read(sensor_ids)
+
+        runtime = MonitoringRuntime(slow_read,
+                                    groups=[SensorGroup('slow', 0.05)])
+        report = runtime.run(cycles=3)
+        assert report['slow']['ticks'] == 3
+        assert report['slow']['missed'] >= 2
+        assert report['slow']['max_lag'] < 0.05
+
+    def test_stage_failure_propagates(self):
+        """Test qu'une étape en échec interrompt le pipeline."""
+        def fail(batch):
+            raise RuntimeError("stockage indisponible")
+
+        runtime = MonitoringRuntime(self._reader([]), persist=fail,
+                                    groups=[SensorGroup('a', 0.01)],
+                                    queue_size=1)
+        with pytest.raises(RuntimeError):
+            runtime.run(cycles=50)
+
+    def test_stage_failure_after_last_cycle(self):
+        """Test qu'une étape en échec après la lecture du dernier cycle,
+        file pleine, ne bloque pas l'arrêt du pipeline."""
+        def slow_fail(batch):
+            time.sleep(0.05)
+            raise RuntimeError("stockage indisponible")
+
+        runtime = MonitoringRuntime(self._reader([]), persist=slow_fail,
+                                    groups=[SensorGroup('a', 0.001)],
+                                    queue_size=1)
+        unraisable = []
+        loop = asyncio.new_event_loop()
+        loop.set_exception_handler(lambda _, context: unraisable.append(
+            context
+        ))
+        try:
+            with pytest.raises(RuntimeError):
+                loop.run_until_complete(asyncio.wait_for(
+                    runtime.run_async(cycles=2), timeout=5.0
+                ))
+            gc.collect()
+        finally:
+            loop.close()
+        assert unraisable == []
+
+
+class TestMetrics:
+    """Tests pour les métriques et leur export Prometheus."""
+
+    def test_render_prometheus_text(self):
+        """Test le format texte des compteurs, jauges et histogrammes."""
+        registry = MetricsRegistry()
+        counter = registry.counter('test_total', 'Aide', ('kind',))
+        gauge = registry.gauge('test_depth', 'Profondeur')
+        histogram = registry.histogram('test_seconds', 'Durée',
+                                       buckets=(0.1, 1.0))
+        counter.inc(2, ('a"b',))
+        counter.inc(0, ('ignored',))
+        gauge.set_function(lambda: 7)
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value)
+
+        text = registry.render()
+        assert '# TYPE test_total counter' in text
+        assert 'test_total{kind="a\\"b"} 2' in text
+        assert 'ignored' not in text
+        assert 'test_depth 7' in text
+        assert 'test_seconds_bucket{le="0.1"} 1' in text
+        assert 'test_seconds_bucket{le="1.0"} 3' in text
+        assert 'test_seconds_bucket{le="+Inf"} 4' in text
+        assert 'test_seconds_count 4' in text
+        assert 'test_seconds_sum 4.05' in text
+        assert registry.counter('test_total', 'Aide', ('kind',)) is counter
+        with pytest.raises(ValueError):
+            registry.gauge('test_total', 'Aide')
+
+    def test_special_values(self):
+        """Test le format des valeurs infinies et indéfinies."""
+        registry = MetricsRegistry()
+        gauge = registry.gauge('test_value', 'Valeur', ('case',))
+        gauge.set(float('-inf'), ('low',))
+        gauge.set(float('inf'), ('high',))
+        gauge.set(float('nan'), ('undefined',))
+        gauge.set(3, ('integer',))
+        text = registry.render()
+        assert 'test_value{case="low"} -Inf' in text
+        assert 'test_value{case="high"} +Inf' in text
+        assert 'test_value{case="undefined"} NaN' in text
+        assert 'test_value{case="integer"} 3' in text
+
+    def test_tracked_gauge_sums_live_instances(self):
+        """Test qu'une jauge suivie additionne les instances vivantes."""
+        class Source:
+            def __init__(self, value):
+                self.value = value
+
+        registry = MetricsRegistry()
+        gauge = registry.gauge('test_tracked', 'Somme', ('queue',))
+        first, second = Source(2), Source(5)
+        gauge.track(first, lambda owner: owner.value, ('a',))
+        gauge.track(second, lambda owner: owner.value, ('a',))
+        assert gauge.value(('a',)) == 7
+        del second
+        gc.collect()
+        assert gauge.value(('a',)) == 2
+        gauge.untrack(first, ('a',))
+        assert 'test_tracked{queue="a"} 0' in registry.render()
+
+    def test_http_endpoint(self):
+        """Test l'exposition du registre sur /metrics."""
+        registry = MetricsRegistry()
+        registry.counter('served_total', 'Aide').inc()
+        server = MetricsServer(registry, port=0)
+        port = server.start()
+        try:
+            with urllib.request.urlopen(
+                f"http://127.0.0.1:{port}/metrics", timeout=5
+            ) as response:
+                body = response.read().decode('utf-8')
+                assert response.headers['Content-Type'].startswith(
+                    'text/plain; version=0.0.4'
+                )
+            assert 'served_total 1' in body
+        finally:
+            server.stop()
+
+    def test_pipeline_instrumentation(self):
+        """Test les compteurs alimentés par les lectures et la détection."""
+        from src.analysis.anomaly_detector import AnomalyDetector
+
+        registry = SensorRegistry()
+        registry.intern('A')
+        detector = AnomalyDetector(registry=registry)
+        detector.ingest(MeasurementBatch(registry, [0, 0, 0],
+                                         [10.0, 11.0, 12.0], [0, 1, 2]))
+        high_before = sum(ANOMALIES.value(('HIGH', level))
+                          for level in ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL'))
+        detector.analyze_batch(MeasurementBatch(registry, [0, 0],
+                                                [11.0, 100.0], [3, 4]))
+        high_after = sum(ANOMALIES.value(('HIGH', level))
+                         for level in ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL'))
+        assert high_after == high_before + 1
+        assert ANOMALIES.value(('HIGH', 'CRITICAL')) >= 1
+
+        # Un second détecteur s'ajoute à la jauge au lieu de la remplacer
+        gc.collect()
+        with_baseline = SENSORS_WITH_BASELINE.value()
+        other = AnomalyDetector(registry=registry)
+        other.ingest(MeasurementBatch(registry, [0, 0], [1.0, 2.0], [0, 1]))
+        assert SENSORS_WITH_BASELINE.value() == with_baseline + 1
+        del other
+        gc.collect()
+        assert SENSORS_WITH_BASELINE.value() == with_baseline
+
+        from src.sensors.iot_sensor import IoTSensor, SensorNetwork
+
+        network = SensorNetwork(vectorized=True, seed=1)
+        network.add_sensor(IoTSensor("TEST_001", "Bureau"))
+        network.add_sensor(IoTSensor("TEST_002", "Bureau"))
+        readings = READINGS.value()
+        network.read_all_sensors()
+        network.read_batch(["TEST_002"])
+        assert READINGS.value() == readings + 3
+
+
+class TestCycleProfiler:
+    """Tests pour le profilage échantillonné des cycles."""
+
+    def test_sampling_fraction(self):
+        """Test la répartition régulière des cycles profilés."""
+        profiler = CycleProfiler(sample_rate=0.25, output_dir=None,
+                                 memory=False)
+        sampled = [c for c in range(20) if profiler.is_sampled(c)]
+        assert sampled == [0, 4, 8, 12, 16]
+        with pytest.raises(ValueError):
+            CycleProfiler(sample_rate=1.5)
+
+    def test_disabled_leaves_stages_untouched(self):
+        """Test qu'une fraction nulle n'enveloppe pas les étapes."""
+        def stage(batch):
+            return batch
+
+        profiler = CycleProfiler(sample_rate=0, output_dir=None)
+        assert profiler.wrap('sensors', stage) is stage
+        assert profiler.report() == {}
+
+    def test_stage_reports(self, tmp_path):
+        """Test l'attribution du temps et des allocations par étape."""
+        registry = SensorRegistry()
+        registry.intern('A')
+
+        def read(sensor_ids=None):
+            return MeasurementBatch(registry, [0], [1.0], [0])
+
+        def analyze(batch):
+            return [bytearray(100_000)]
+
+        profiler = CycleProfiler(sample_rate=0.5,
+                                 output_dir=str(tmp_path), top=5)
+        runtime = MonitoringRuntime(profiler.wrap('sensors', read),
+                                    groups=[SensorGroup('g', 0.001)])
+        runtime.run(cycles=4, detect=profiler.wrap('analysis', analyze))
+        summary_path = profiler.close()
+
+        report = profiler.report()
+        assert report['sensors']['samples'] == 2
+        assert report['analysis']['samples'] == 2
+        assert report['analysis']['allocated_bytes'] >= 200_000
+        assert any('analyze' in name
+                   for name, _ in report['analysis']['functions'])
+        assert (tmp_path / 'cycle_000002.analysis.prof').exists()
+        assert 'Cycle 0' in (tmp_path / 'cycle_000000.sensors.txt') \
+            .read_text(encoding='utf-8')
+        assert not (tmp_path / 'cycle_000001.sensors.txt').exists()
+        with open(summary_path, encoding='utf-8') as summary:
+            assert '== analysis: 2 cycles profilés' in summary.read()
+
+    def test_profiled_call_does_not_block_others(self):
+        """Test qu'un appel profilé ne bloque ni les appels non
+        échantillonnés ni le rapport."""
+        profiler = CycleProfiler(sample_rate=0.5, output_dir=None,
+                                 memory=False)
+        entered = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            entered.set()
+            release.wait(5.0)
+
+        storage = profiler.wrap('storage', slow)
+        analysis = profiler.wrap('analysis', lambda: 'fait')
+        analysis()
+        thread = threading.Thread(target=storage)
+        thread.start()
+        try:
+            assert entered.wait(5.0)
+            started = time.perf_counter()
+            # Cycle 1 non échantillonné : exécuté sans attendre
+            assert analysis() == 'fait'
+            assert profiler.report().keys() == {'analysis'}
+            assert time.perf_counter() - started < 1.0
+        finally:
+            release.set()
+            thread.join()
+        assert profiler.report()['storage']['samples'] == 1
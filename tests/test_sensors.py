@@ -1,6 +1,10 @@
 """Tests unitaires pour le module sensors."""
+import random
+
+import numpy as np
 import pytest
 from src.sensors.iot_sensor import IoTSensor, SensorNetwork
+from src.sensors.loader import iter_sensor_records, load_fleet
 
 
 class TestIoTSensor:
@@ -51,3 +55,301 @@ class TestSensorNetwork:
         network.add_sensor(sensor2)
         measurements = network.read_all_sensors()
         assert len(measurements) == 2
+
+
+class TestVectorizedSensorNetwork:
+    """Tests pour le mode de lecture vectorisé."""
+
+    @staticmethod
+    def _ks_statistic(sample_a, sample_b):
+        """Statistique de Kolmogorov-Smirnov à deux échantillons."""
+        sample_a = np.sort(sample_a)
+        sample_b = np.sort(sample_b)
+        values = np.concatenate([sample_a, sample_b])
+        cdf_a = np.searchsorted(sample_a, values, side='right') / \
+            sample_a.size
+        cdf_b = np.searchsorted(sample_b, values, side='right') / \
+            sample_b.size
+        return np.max(np.abs(cdf_a - cdf_b))
+
+    def test_read_all_sensors_vectorized(self):
+        """Test la lecture vectorisée d'un réseau."""
+        network = SensorNetwork(vectorized=True, seed=1)
+        network.add_sensor(IoTSensor("TEST_001", "Bureau", 100.0, 20.0))
+        network.add_sensor(IoTSensor("TEST_002", "Entrepôt", 200.0, 30.0))
+        network.get_sensor("TEST_002").deactivate()
+        measurements = network.read_all_sensors()
+        assert len(measurements) == 1
+        assert measurements[0]['sensor_id'] == "TEST_001"
+        assert measurements[0]['location'] == "Bureau"
+        assert isinstance(measurements[0]['consumption_kwh'], float)
+
+    def test_vectorized_cycle_shares_timestamp(self):
+        """Test que toutes les lectures d'un cycle partagent l'horodatage."""
+        network = SensorNetwork(vectorized=True, seed=2)
+        for i in range(10):
+            network.add_sensor(IoTSensor(f"TEST_{i:03d}", "Bureau"))
+        timestamps = {m['timestamp'] for m in network.read_all_sensors()}
+        assert len(timestamps) == 1
+
+    def test_remove_sensor_vectorized(self):
+        """Test le retrait d'un capteur en mode vectorisé."""
+        network = SensorNetwork(vectorized=True, seed=3)
+        sensor = IoTSensor("TEST_001", "Bureau", 100.0, 20.0)
+        network.add_sensor(sensor)
+        network.add_sensor(IoTSensor("TEST_002", "Entrepôt", 200.0, 30.0))
+        network.remove_sensor("TEST_001")
+        measurements = network.read_all_sensors()
+        assert [m['sensor_id'] for m in measurements] == ["TEST_002"]
+        assert sensor.base_consumption == 100.0
+
+    def test_vectorized_distribution_matches_scalar(self):
+        """Test que le mode vectorisé suit la même distribution."""
+        samples = 20000
+        random.seed(42)
+        sensor = IoTSensor("TEST_001", "Bureau", 100.0, 20.0)
+        scalar = np.array([
+            sensor.read_consumption()['consumption_kwh']
+            for _ in range(samples)
+        ])
+
+        network = SensorNetwork(vectorized=True, seed=42)
+        for i in range(samples):
+            network.add_sensor(IoTSensor(f"TEST_{i:05d}", "Bureau",
+                                         100.0, 20.0))
+        vectorized = np.array([
+            m['consumption_kwh'] for m in network.read_all_sensors()
+        ])
+
+        # Seuil critique du test KS pour alpha = 0.001
+        critical = 1.95 * np.sqrt(2.0 / samples)
+        assert self._ks_statistic(scalar, vectorized) < critical
+        assert vectorized.min() >= 80.0
+        assert vectorized.max() <= 360.0
+        spike_rate = np.mean(vectorized > 120.0)
+        assert abs(spike_rate - np.mean(scalar > 120.0)) < 0.01
+
+    def test_read_batch_vectorized(self):
+        """Test la lecture d'un cycle sous forme de lot en colonnes."""
+        network = SensorNetwork(vectorized=True, seed=4)
+        network.add_sensor(IoTSensor("TEST_001", "Bureau", 100.0, 20.0))
+        network.add_sensor(IoTSensor("TEST_002", "Entrepôt", 200.0, 30.0))
+        batch = network.read_batch()
+        assert len(batch) == 2
+        assert batch.registry is network.registry
+        assert batch.to_dicts()[1]['location'] == "Entrepôt"
+
+
+class TestShardedSensorNetwork:
+    """Tests pour la simulation répartie sur plusieurs processus."""
+
+    @staticmethod
+    def _run(workers, seed=7, sensors=50, cycles=3):
+        network = SensorNetwork(seed=seed, workers=workers)
+        for i in range(sensors):
+            network.add_sensor(IoTSensor(f"TEST_{i:03d}", "Bureau",
+                                         100.0 + i, 20.0))
+        try:
+            return [network.read_batch().consumption for _ in range(cycles)]
+        finally:
+            network.close()
+
+    def test_identical_regardless_of_worker_count(self):
+        """Test que les lectures ne dépendent pas du nombre de processus."""
+        reference = self._run(workers=1)
+        for workers in (2, 3):
+            runs = self._run(workers=workers)
+            for expected, actual in zip(reference, runs):
+                np.testing.assert_array_equal(expected, actual)
+        assert not np.array_equal(reference[0], reference[1])
+        assert not np.array_equal(reference[0], self._run(1, seed=8)[0])
+
+    def test_sharded_distribution_matches_vectorized(self):
+        """Test que le mode réparti suit la même distribution."""
+        samples = 20000
+        readings = {}
+        for mode, options in (('sharded', {'workers': 1}),
+                              ('vectorized', {'vectorized': True})):
+            network = SensorNetwork(seed=42, **options)
+            for i in range(samples):
+                network.add_sensor(IoTSensor(f"TEST_{i:05d}", "Bureau",
+                                             100.0, 20.0))
+            readings[mode] = network.read_batch().consumption
+            network.close()
+        sharded, vectorized = readings['sharded'], readings['vectorized']
+
+        # Seuil critique du test KS pour alpha = 0.001
+        critical = 1.95 * np.sqrt(2.0 / samples)
+        ks = TestVectorizedSensorNetwork._ks_statistic(sharded, vectorized)
+        assert ks < critical
+        normal = sharded <= 120.0
+        assert TestVectorizedSensorNetwork._ks_statistic(
+            sharded[normal], vectorized[vectorized <= 120.0]
+        ) < critical
+        assert sharded.min() >= 80.0
+        assert abs(np.mean(~normal) - np.mean(vectorized > 120.0)) < 0.01
+
+    def test_groups_have_independent_streams(self):
+        """Test qu'un groupe de capteurs lu seul n'affecte pas les
+        lectures des autres."""
+        readings = []
+        for extra_reads in (0, 3):
+            network = SensorNetwork(seed=11, workers=2)
+            for i in range(10):
+                network.add_sensor(IoTSensor(f"TEST_{i:03d}", "Bureau",
+                                             100.0, 20.0))
+            for _ in range(extra_reads):
+                network.read_batch(["TEST_000", "TEST_007"])
+            batch = network.read_batch(["TEST_003", "TEST_008", "TEST_001"])
+            network.close()
+            assert [m['sensor_id'] for m in batch.to_dicts()] == \
+                ["TEST_003", "TEST_008", "TEST_001"]
+            readings.append(batch.consumption)
+        np.testing.assert_array_equal(readings[0], readings[1])
+
+    def test_reshard_after_changes(self):
+        """Test la prise en compte des ajouts et désactivations."""
+        network = SensorNetwork(seed=5, workers=2)
+        network.add_sensor(IoTSensor("TEST_001", "Bureau", 100.0, 20.0))
+        assert len(network.read_batch()) == 1
+        network.add_sensor(IoTSensor("TEST_002", "Entrepôt", 200.0, 30.0))
+        network.get_sensor("TEST_001").deactivate()
+        batch = network.read_batch()
+        network.close()
+        assert [m['sensor_id'] for m in batch.to_dicts()] == ["TEST_002"]
+        assert network.simulator.cycle == 2
+
+
+def _zoned_network(sensors=30, **options):
+    """Réseau de capteurs répartis sur trois localisations."""
+    network = SensorNetwork(**options)
+    network.add_sensors(
+        (f"TEST_{i:03d}", ("Bureau", "Entrepôt", "Cafétéria")[i % 3],
+         100.0 + i, 10.0, True)
+        for i in range(sensors)
+    )
+    return network
+
+
+class TestLocationIndexes:
+    """Tests pour les index secondaires du réseau."""
+
+    def test_sensor_uses_slots(self):
+        """Test que les capteurs n'ont pas de __dict__."""
+        sensor = IoTSensor("TEST_001", "Bureau")
+        assert not hasattr(sensor, '__dict__')
+        with pytest.raises(AttributeError):
+            sensor.firmware = "1.0"
+
+    def test_add_sensors_attaches_to_fleet(self):
+        """Test l'ajout en masse."""
+        network = _zoned_network(vectorized=True, seed=1)
+        sensor = network.get_sensor("TEST_004")
+        assert sensor.location == "Entrepôt"
+        assert sensor.base_consumption == 104.0
+        assert network.locations() == {"Bureau": 10, "Entrepôt": 10,
+                                       "Cafétéria": 10}
+        assert len(network.read_batch()) == 30
+
+    def test_replaced_sensor_keeps_its_values(self):
+        """Test qu'un capteur remplacé garde ses caractéristiques."""
+        network = SensorNetwork(vectorized=True, seed=3)
+        network.add_sensors([("TEST_001", "Bureau", 250.0, 5.0, False)])
+        previous = network.get_sensor("TEST_001")
+        network.add_sensors([("TEST_001", "Entrepôt", 80.0, 2.0, True)])
+        assert (previous.base_consumption, previous.variance,
+                previous.is_active) == (250.0, 5.0, False)
+        sensor = network.get_sensor("TEST_001")
+        assert sensor is not previous
+        assert (sensor.base_consumption, sensor.variance,
+                sensor.is_active) == (80.0, 2.0, True)
+        assert len(network.sensors) == 1
+
+    def test_selective_read_by_location(self):
+        """Test la lecture des capteurs actifs d'une localisation."""
+        for options in ({}, {'vectorized': True, 'seed': 2}):
+            network = _zoned_network(**options)
+            network.get_sensor("TEST_001").deactivate()
+            batch = network.read_batch(location="Entrepôt")
+            ids = sorted(m['sensor_id'] for m in batch.to_dicts())
+            assert ids == [f"TEST_{i:03d}" for i in range(4, 30, 3)]
+            assert network.sensor_ids_at("Entrepôt", active=False) == \
+                ["TEST_001"]
+
+    def test_bulk_activation(self):
+        """Test l'activation et la désactivation en masse."""
+        network = _zoned_network(vectorized=True, seed=3)
+        assert network.set_active(False, location="Bureau") == 10
+        assert network.set_active(False, location="Bureau") == 0
+        assert network.get_sensor("TEST_003").is_active is False
+        assert len(network.inactive_sensor_ids()) == 10
+        assert network.set_active(True, sensor_ids=["TEST_000", "NONE"]) \
+            == 1
+        assert len(network.read_batch()) == 21
+        assert network.inactive_sensor_ids()[0] == "TEST_003"
+        with pytest.raises(ValueError):
+            network.set_active(True)
+
+    def test_indexes_follow_changes(self):
+        """Test la mise à jour des index au déplacement et au retrait."""
+        network = _zoned_network(sensors=6, vectorized=True, seed=4)
+        network.get_sensor("TEST_000").deactivate()
+        network.add_sensor(IoTSensor("TEST_000", "Entrepôt", 50.0, 5.0))
+        network.remove_sensor("TEST_001")
+        assert network.sensor_ids_at("Bureau") == ["TEST_003"]
+        assert network.sensor_ids_at("Entrepôt") == ["TEST_000", "TEST_004"]
+        assert network.inactive_sensor_ids() == []
+
+
+class TestFleetLoader:
+    """Tests pour le chargement d'un parc depuis un fichier."""
+
+    def test_load_csv_in_chunks(self, tmp_path):
+        """Test le chargement d'un fichier CSV par blocs."""
+        path = tmp_path / 'fleet.csv'
+        path.write_text(
+            "sensor_id,location,base_consumption,variance,is_active\n"
+            + "".join(f"S{i},Zone {i % 4},{100 + i},5,{i % 5 != 0}\n"
+                      for i in range(25)),
+            encoding='utf-8'
+        )
+        network = SensorNetwork(vectorized=True, seed=1)
+        assert load_fleet(network, str(path), chunk_size=7) == 25
+        assert len(network.sensors) == 25
+        assert network.get_sensor("S3").base_consumption == 103.0
+        assert network.sensor_ids_at("Zone 0", active=False) == \
+            ["S0", "S20"]
+        assert len(network.read_batch()) == 20
+
+    def test_load_jsonl_with_defaults(self, tmp_path):
+        """Test les valeurs par défaut et le format JSON Lines."""
+        path = tmp_path / 'fleet.jsonl'
+        path.write_text(
+            '{"sensor_id": "A", "location": "Bureau"}\n\n'
+            '{"sensor_id": "B", "location": "Bureau", "is_active": false,'
+            ' "variance": 2}\n',
+            encoding='utf-8'
+        )
+        records = list(iter_sensor_records(str(path)))
+        assert records == [("A", "Bureau", 100.0, 20.0, True),
+                           ("B", "Bureau", 100.0, 2.0, False)]
+
+    def test_records_are_streamed(self, tmp_path):
+        """Test que le fichier est lu au fil de l'eau."""
+        path = tmp_path / 'fleet.jsonl'
+        path.write_text('{"sensor_id": "A", "location": "Bureau"}\n'
+                        'pas du json\n', encoding='utf-8')
+        records = iter_sensor_records(str(path))
+        assert next(records)[0] == "A"
+        with pytest.raises(ValueError, match="Ligne 2"):
+            next(records)
+
+    def test_invalid_files(self, tmp_path):
+        """Test le refus des fichiers mal formés."""
+        path = tmp_path / 'fleet.csv'
+        path.write_text("sensor_id,base_consumption\nS1,10\n",
+                        encoding='utf-8')
+        with pytest.raises(ValueError, match="Ligne 2"):
+            list(iter_sensor_records(str(path)))
+        with pytest.raises(ValueError, match="Format"):
+            list(iter_sensor_records(str(tmp_path / 'fleet.xml')))
@@ -0,0 +1,1189 @@
+"""Tests unitaires pour le module storage."""
+import json
+import os
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from pymongo.errors import BulkWriteError, CollectionInvalid, PyMongoError
+from src.core.measurement_batch import (
+    MeasurementBatch, SensorRegistry, datetime_to_micros, micros_to_datetime
+)
+from src.storage.base import create_storage
+from src.storage.cache import TTLCache
+from src.storage.columnar_store import ColumnarStore
+from src.storage.ingestion import WriteBehindIngestor
+from src.storage import mongodb_handler
+from src.storage.mongodb_handler import MongoDBHandler
+from src.storage.retention import RetentionManager
+from src.storage.rollups import RollupManager
+from src.storage.snapshots import SnapshotFiles
+from src.storage.aggregates import (
+    aggregate_buckets, plan_segments, summarize
+)
+
+
+class RecordingHandler:
+    """Gestionnaire de stockage en mémoire simulant la latence réseau."""
+
+    def __init__(self, latency: float = 0.0, failures: int = 0):
+        self.latency = latency
+        self.failures = failures
+        self.documents = []
+        self.calls = []
+        self.received = []
+        self._lock = threading.Lock()
+
+    def insert_measurements(self, measurements, ordered=True):
+        time.sleep(self.latency)
+        with self._lock:
+            self.received.append(type(measurements))
+            if self.failures:
+                self.failures -= 1
+                raise OSError("stockage indisponible")
+            if isinstance(measurements, MeasurementBatch):
+                measurements = measurements.to_dicts()
+            self.documents.extend(measurements)
+            self.calls.append((len(measurements), ordered))
+        return len(measurements)
+
+
+def _measurements(count, offset=0):
+    return [
+        {'sensor_id': f'TEST_{i % 4:03d}', 'location': 'Bureau',
+         'consumption_kwh': float(offset + i),
+         'timestamp': datetime(2024, 1, 1), 'status': 'active'}
+        for i in range(count)
+    ]
+
+
+class TestWriteBehindIngestor:
+    """Tests pour la classe WriteBehindIngestor."""
+
+    def test_coalesces_and_flushes(self):
+        """Test le regroupement des lots en insertions non ordonnées."""
+        handler = RecordingHandler()
+        ingestor = WriteBehindIngestor(handler, batch_size=100,
+                                       flush_interval=5.0)
+        ingestor.start()
+        for cycle in range(10):
+            ingestor.submit(_measurements(25, cycle * 25))
+        ingestor.submit(MeasurementBatch.from_dicts(_measurements(10)))
+        assert ingestor.close(timeout=5.0)
+        assert len(handler.documents) == 260
+        assert all(not ordered for _, ordered in handler.calls)
+        assert len(handler.calls) < 11
+        assert ingestor.stats['written'] == 260
+
+    def test_columnar_batches_are_not_converted(self):
+        """Test la transmission en colonnes des lots MeasurementBatch."""
+        handler = RecordingHandler()
+        ingestor = WriteBehindIngestor(handler, batch_size=100,
+                                       flush_interval=5.0)
+        registry = SensorRegistry()
+        for cycle in range(4):
+            ingestor.submit(MeasurementBatch.from_dicts(
+                _measurements(10, cycle * 10), registry
+            ))
+        ingestor.start()
+        assert ingestor.close(timeout=5.0)
+        assert handler.received == [MeasurementBatch]
+        assert [d['consumption_kwh'] for d in handler.documents] == \
+            [float(i) for i in range(40)]
+
+    def test_submit_does_not_wait_for_database(self):
+        """Test que le dépôt ne subit pas la latence et que les
+        écritures se répartissent entre les threads."""
+        handler = RecordingHandler(latency=0.2)
+        ingestor = WriteBehindIngestor(handler, writers=5, batch_size=1,
+                                       flush_interval=0.01)
+        ingestor.start()
+        started = time.monotonic()
+        for _ in range(5):
+            ingestor.submit(_measurements(4))
+        assert time.monotonic() - started < 0.1
+        assert ingestor.close(timeout=5.0)
+        assert time.monotonic() - started < 0.6
+        assert len(handler.documents) == 20
+
+    def test_drop_oldest(self):
+        """Test l'abandon des lots les plus anciens quand la file sature."""
+        handler = RecordingHandler()
+        ingestor = WriteBehindIngestor(handler, max_queue_size=2,
+                                       backpressure='drop_oldest')
+        for cycle in range(5):
+            ingestor.submit(_measurements(3, cycle * 3))
+        assert ingestor.stats['dropped'] == 9
+        ingestor.start()
+        assert ingestor.close(timeout=5.0)
+        assert [d['consumption_kwh'] for d in handler.documents] == \
+            [9.0, 10.0, 11.0, 12.0, 13.0, 14.0]
+
+    def test_spill_to_disk(self, tmp_path):
+        """Test le débordement sur disque puis sa vidange."""
+        handler = RecordingHandler()
+        ingestor = WriteBehindIngestor(handler, max_queue_size=1,
+                                       flush_interval=0.01,
+                                       backpressure='spill',
+                                       spill_directory=str(tmp_path))
+        for cycle in range(4):
+            ingestor.submit(_measurements(2, cycle * 2))
+        assert ingestor.spilled_batches == 3
+        ingestor.start()
+        assert ingestor.close(timeout=5.0)
+        assert len(handler.documents) == 8
+        assert list(tmp_path.iterdir()) == []
+
+    def test_spill_drains_under_sustained_load(self):
+        """Test l'écriture des lots débordés pendant que la file reste
+        alimentée."""
+        handler = RecordingHandler(latency=0.005)
+        ingestor = WriteBehindIngestor(handler, max_queue_size=2,
+                                       batch_size=1, flush_interval=0.0,
+                                       backpressure='spill')
+        ingestor.start()
+        for cycle in range(40):
+            ingestor.submit(_measurements(1, cycle))
+            time.sleep(0.002)
+        spill_directory = ingestor.spill_directory
+        # Des lots débordés ont été relus alors que la file restait pleine
+        assert 0 < ingestor.spilled_batches < ingestor.stats['spilled']
+        assert ingestor.close(timeout=5.0)
+        assert len(handler.documents) == 40
+        assert not os.path.exists(spill_directory)
+
+    def test_leftover_spills_are_recovered(self, tmp_path):
+        """Test la reprise des lots restés sur disque après une fermeture
+        interrompue."""
+        handler = RecordingHandler()
+        ingestor = WriteBehindIngestor(handler, max_queue_size=1,
+                                       backpressure='spill',
+                                       spill_directory=str(tmp_path))
+        for cycle in range(3):
+            ingestor.submit(_measurements(2, cycle * 2))
+        assert not ingestor.close(timeout=0.05)
+        assert len(list(tmp_path.iterdir())) == 2
+
+        resumed = WriteBehindIngestor(handler, backpressure='spill',
+                                      flush_interval=0.01,
+                                      spill_directory=str(tmp_path))
+        assert resumed.spilled_batches == 2
+        resumed.start()
+        assert resumed.close(timeout=5.0)
+        assert sorted(d['consumption_kwh'] for d in handler.documents) == \
+            [2.0, 3.0, 4.0, 5.0]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_spill_kept_until_written(self, tmp_path):
+        """Test la conservation des lots débordés si l'écriture échoue."""
+        handler = RecordingHandler(failures=10)
+        ingestor = WriteBehindIngestor(handler, max_queue_size=1,
+                                       flush_interval=0.01,
+                                       backpressure='spill',
+                                       spill_directory=str(tmp_path))
+        for cycle in range(3):
+            ingestor.submit(_measurements(2, cycle * 2))
+        ingestor.start()
+        assert not ingestor.close(timeout=5.0)
+        assert ingestor.stats['failed'] == 6
+        assert len(list(tmp_path.iterdir())) == 2
+
+        handler.failures = 0
+        resumed = WriteBehindIngestor(handler, backpressure='spill',
+                                      flush_interval=0.01,
+                                      spill_directory=str(tmp_path))
+        resumed.start()
+        assert resumed.close(timeout=5.0)
+        assert sorted(d['consumption_kwh'] for d in handler.documents) == \
+            [2.0, 3.0, 4.0, 5.0]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_invalid_policy(self):
+        """Test le refus d'une politique de contre-pression inconnue."""
+        with pytest.raises(ValueError):
+            WriteBehindIngestor(RecordingHandler(), backpressure='ignore')
+
+
+class TestRollups:
+    """Tests pour les fonctions d'agrégation des rollups."""
+
+    def test_aggregate_buckets(self):
+        """Test l'agrégation d'un lot par capteur et par minute."""
+        batch = MeasurementBatch.from_dicts([
+            {'sensor_id': 'A', 'consumption_kwh': 1.0,
+             'timestamp': datetime(2024, 1, 1, 0, 0, 10)},
+            {'sensor_id': 'A', 'consumption_kwh': 3.0,
+             'timestamp': datetime(2024, 1, 1, 0, 0, 50)},
+            {'sensor_id': 'A', 'consumption_kwh': 5.0,
+             'timestamp': datetime(2024, 1, 1, 0, 1, 0)},
+            {'sensor_id': 'B', 'consumption_kwh': 7.0,
+             'timestamp': datetime(2024, 1, 1, 0, 0, 30)},
+        ])
+        sensors, buckets, count, total, total_sq, low, high = \
+            aggregate_buckets(batch, 60)
+        assert sensors.tolist() == [0, 0, 1]
+        assert buckets[0] == datetime_to_micros(datetime(2024, 1, 1))
+        assert count.tolist() == [2, 1, 1]
+        assert total.tolist() == [4.0, 5.0, 7.0]
+        assert total_sq.tolist() == [10.0, 25.0, 49.0]
+        assert low.tolist() == [1.0, 5.0, 7.0]
+        assert high.tolist() == [3.0, 5.0, 7.0]
+
+    def test_summarize(self):
+        """Test le calcul des statistiques à partir des agrégats."""
+        stats = summarize(4, 10.0, 30.0, 1.0, 4.0)
+        assert stats['avg_consumption'] == 2.5
+        assert stats['stdev_consumption'] == pytest.approx(1.2909944)
+        assert stats['count'] == 4
+        assert summarize(0, 0.0, 0.0, 0.0, 0.0) is None
+
+    def test_plan_segments(self):
+        """Test le découpage d'un intervalle en jours, heures, minutes."""
+        start = datetime_to_micros(datetime(2024, 1, 1, 22, 30, 20))
+        end = datetime_to_micros(datetime(2024, 1, 4, 1, 15, 0))
+        segments = [
+            (name, (high - low) // 60_000_000)
+            for name, low, high in plan_segments(start, end)
+        ]
+        assert segments == [
+            ('minute', 30), ('hour', 60), ('day', 2 * 1440),
+            ('hour', 60), ('minute', 15)
+        ]
+
+
+class _InsertResult:
+    def __init__(self, count):
+        self.inserted_ids = list(range(count))
+
+
+class _Cursor:
+    """Curseur en mémoire enregistrant la taille de lot demandée."""
+
+    def __init__(self, documents, projection=None):
+        self.documents = documents
+        self.projection = projection
+        self.requested_batch_size = None
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def batch_size(self, size):
+        self.requested_batch_size = size
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    def __iter__(self):
+        for document in self.documents:
+            if self.projection:
+                document = {key: value for key, value in document.items()
+                            if self.projection.get(key)}
+            yield document
+
+
+class AggregatingCollection:
+    """Collection en mémoire comptant les agrégations reçues."""
+
+    def __init__(self):
+        self.documents = []
+        self.pipelines = []
+        self.cursors = []
+
+    def find(self, query, projection=None):
+        documents = [
+            dict(document) for document in self.documents
+            if all(document.get(key) == value
+                   for key, value in query.items()
+                   if not isinstance(value, dict))
+        ]
+        cursor = _Cursor(documents, projection)
+        self.cursors.append(cursor)
+        return cursor
+
+    def insert_many(self, documents, ordered=True):
+        self.documents.extend(documents)
+        return _InsertResult(len(documents))
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        wanted = pipeline[0]['$match'].get('sensor_id', {}).get('$in')
+        groups = {}
+        for document in self.documents:
+            if wanted is None or document['sensor_id'] in wanted:
+                groups.setdefault(document['sensor_id'], []).append(
+                    document['consumption_kwh']
+                )
+        return [
+            {'_id': sensor_id, 'avg_consumption': sum(values) / len(values),
+             'max_consumption': max(values), 'min_consumption': min(values),
+             'stdev_consumption': statistics.stdev(values)
+             if len(values) > 1 else None,
+             'count': len(values)}
+            for sensor_id, values in groups.items()
+        ]
+
+
+class IndexedCollection(AggregatingCollection):
+    """Collection en mémoire enregistrant les index créés."""
+
+    def __init__(self):
+        super().__init__()
+        self.indexes = []
+
+    def create_index(self, keys, **options):
+        self.indexes.append((keys, options))
+        return options.get('name')
+
+
+class FakeDatabase:
+    """Base en mémoire enregistrant les créations de collection."""
+
+    def __init__(self, existing=(), raced=False):
+        self.existing = list(existing)
+        self.raced = raced
+        self.created = []
+        self.collections = {}
+
+    def list_collection_names(self):
+        return list(self.existing)
+
+    def create_collection(self, name, **options):
+        if self.raced:
+            raise CollectionInvalid(f"collection {name} already exists")
+        self.created.append((name, options))
+        self.existing.append(name)
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, IndexedCollection())
+
+
+def _matches(document, match):
+    """Évalue un filtre MongoDB simple ($in, $ne, $gte, $lt, $or)."""
+    for key, condition in match.items():
+        if key == '$or':
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+        elif not isinstance(condition, dict):
+            if document.get(key) != condition:
+                return False
+        elif '$in' in condition and document[key] not in condition['$in']:
+            return False
+        elif '$ne' in condition and document.get(key) == condition['$ne']:
+            return False
+        elif '$gte' in condition and document[key] < condition['$gte']:
+            return False
+        elif '$lt' in condition and document[key] >= condition['$lt']:
+            return False
+    return True
+
+
+class RollupCollection(IndexedCollection):
+    """Collection de rollups en mémoire (upserts $inc/$min/$max)."""
+
+    def find_one(self, query):
+        return next((document for document in self.documents
+                     if _matches(document, query)), None)
+
+    def update_one(self, query, update, upsert=False):
+        document = self.find_one(query)
+        if document is None:
+            document = dict(query)
+            self.documents.append(document)
+        for key, value in update.get('$set', {}).items():
+            document[key] = value
+        for key, value in update.get('$inc', {}).items():
+            document[key] = document.get(key, 0) + value
+        for key, value in update.get('$min', {}).items():
+            document[key] = min(document.get(key, value), value)
+        for key, value in update.get('$max', {}).items():
+            document[key] = max(document.get(key, value), value)
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            self.update_one(operation._filter, operation._doc, upsert=True)
+
+    def delete_many(self, query):
+        self.documents = [document for document in self.documents
+                          if not _matches(document, query)]
+
+    def aggregate(self, pipeline):
+        groups = {}
+        for document in self.documents:
+            if _matches(document, pipeline[0]['$match']):
+                group = groups.setdefault(document['sensor_id'], {
+                    '_id': document['sensor_id'], 'count': 0, 'sum': 0.0,
+                    'sum_sq': 0.0, 'min': document['min'],
+                    'max': document['max']
+                })
+                for key in ('count', 'sum', 'sum_sq'):
+                    group[key] += document[key]
+                group['min'] = min(group['min'], document['min'])
+                group['max'] = max(group['max'], document['max'])
+        return list(groups.values())
+
+
+class RollupDatabase(FakeDatabase):
+    """Base en mémoire dont les collections acceptent les upserts."""
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, RollupCollection())
+
+
+def _spread_measurements(count):
+    return [
+        {'sensor_id': f'TEST_{i % 2:03d}', 'location': 'Bureau',
+         'consumption_kwh': float(i),
+         'timestamp': datetime(2024, 1, 1, i // 60, i % 60),
+         'status': 'active'}
+        for i in range(count)
+    ]
+
+
+class TestRollupManager:
+    """Tests pour la maintenance et la lecture des rollups."""
+
+    def test_apply_and_statistics(self):
+        """Test l'intégration d'un lot et les statistiques par intervalle."""
+        rollups = RollupManager(RollupDatabase())
+        measurements = _spread_measurements(150)
+        rollups.apply(MeasurementBatch.from_dicts(measurements[:100]))
+        rollups.apply(MeasurementBatch.from_dicts(measurements[100:]))
+        assert len(rollups.collections['minute'].documents) == 150
+        assert len(rollups.collections['hour'].documents) == 6
+        assert len(rollups.collections['day'].documents) == 2
+
+        values = np.arange(150, dtype=float)
+        stats = rollups.statistics()
+        assert sorted(stats) == ['TEST_000', 'TEST_001']
+        assert stats['TEST_001']['count'] == 75
+        assert stats['TEST_001']['avg_consumption'] == \
+            pytest.approx(values[1::2].mean())
+        assert stats['TEST_001']['stdev_consumption'] == \
+            pytest.approx(values[1::2].std(ddof=1))
+        assert stats['TEST_000']['max_consumption'] == 148.0
+
+        # Minutes 30 à 89 : bords en minutes, heure complète au centre
+        ranged = rollups.statistics(['TEST_000'],
+                                    datetime(2024, 1, 1, 0, 30),
+                                    datetime(2024, 1, 1, 1, 30))
+        assert list(ranged) == ['TEST_000']
+        assert ranged['TEST_000']['count'] == 30
+        assert ranged['TEST_000']['min_consumption'] == 30.0
+        assert ranged['TEST_000']['max_consumption'] == 88.0
+
+    def test_backfill_and_raw_fallback(self):
+        """Test la reconstruction et les statistiques brutes en attendant."""
+        handler = MongoDBHandler(rollups=True, stats_cache_ttl=60.0)
+        handler.collection = AggregatingCollection()
+        handler.insert_measurements(_spread_measurements(120))
+
+        handler.rollups = RollupManager(RollupDatabase())
+        assert not handler.rollups.complete
+        stats = handler.get_statistics_bulk(['TEST_000'])
+        assert stats['TEST_000']['count'] == 60
+        assert len(handler.collection.pipelines) == 1
+
+        assert handler.backfill_rollups(batch_size=50) == 120
+        assert handler.rollups.complete
+        assert handler.rollups.state.documents[0]['measurements'] == 120
+        stats = handler.get_statistics_bulk(['TEST_000'])
+        assert stats['TEST_000']['count'] == 60
+        assert stats['TEST_000']['stdev_consumption'] > 0
+        assert len(handler.collection.pipelines) == 1
+
+        # Les insertions suivantes alimentent les rollups
+        handler.insert_measurements(_spread_measurements(2))
+        assert handler.get_statistics('TEST_000')['count'] == 61
+
+        # Une reconstruction repart de rollups vides
+        handler.backfill_rollups()
+        assert handler.get_statistics('TEST_000')['count'] == 61
+
+    def test_backfill_read_error_is_not_complete(self, monkeypatch):
+        """Test qu'une lecture interrompue ne marque pas les rollups
+        complets."""
+        handler = MongoDBHandler(rollups=True, stats_cache_ttl=0)
+        handler.collection = AggregatingCollection()
+        handler.insert_measurements(_spread_measurements(120))
+        handler.rollups = RollupManager(RollupDatabase())
+        find = handler.collection.find
+
+        class BrokenCursor(_Cursor):
+            def __iter__(self):
+                yield from list(super().__iter__())[:60]
+                raise PyMongoError("connexion perdue")
+
+        def broken_find(query, projection=None):
+            cursor = find(query, projection)
+            return BrokenCursor(cursor.documents, cursor.projection)
+
+        monkeypatch.setattr(handler.collection, 'find', broken_find)
+        assert handler.backfill_rollups(batch_size=50) == -1
+        assert not handler.rollups.complete
+        assert not handler.rollups.state.documents[0]['complete']
+        assert handler.get_statistics('TEST_000')['count'] == 60
+
+
+class TestCollectionSetup:
+    """Tests pour la création de la collection et de ses index."""
+
+    def test_ensure_indexes(self):
+        """Test les index créés pour les requêtes par capteur et date."""
+        handler = MongoDBHandler()
+        handler.collection = IndexedCollection()
+        handler.ensure_indexes()
+        assert handler.collection.indexes == [
+            ([('sensor_id', 1), ('timestamp', -1)],
+             {'name': 'sensor_id_timestamp'}),
+            ([('timestamp', -1)], {'name': 'timestamp'})
+        ]
+
+    def test_anomaly_indexes(self):
+        """Test les index de la collection des anomalies."""
+        handler = MongoDBHandler()
+        handler.collection = IndexedCollection()
+        handler.anomalies = IndexedCollection()
+        handler.ensure_indexes()
+        assert handler.anomalies.indexes == [
+            ([('run_id', 1), ('sensor_id', 1), ('timestamp', -1)],
+             {'name': 'run_id_sensor_id_timestamp'}),
+            ([('sensor_id', 1), ('timestamp', -1)],
+             {'name': 'sensor_id_timestamp'})
+        ]
+
+    def test_time_series_options(self):
+        """Test les options de la collection time-series."""
+        handler = MongoDBHandler(time_series=True, granularity='minutes')
+        handler.db = FakeDatabase()
+        handler._create_time_series_collection()
+        assert handler.db.created == [('measurements', {'timeseries': {
+            'timeField': 'timestamp', 'metaField': 'sensor_id',
+            'granularity': 'minutes'
+        }})]
+
+    def test_time_series_existing_collection(self):
+        """Test qu'une collection existante est conservée."""
+        handler = MongoDBHandler(time_series=True)
+        handler.db = FakeDatabase(existing=['measurements'])
+        handler._create_time_series_collection()
+        assert handler.db.created == []
+
+        # Collection créée par un autre processus entre les deux appels
+        handler.db = FakeDatabase(raced=True)
+        handler._create_time_series_collection()
+        assert handler.db.created == []
+
+
+def _anomalies(count):
+    return [
+        {'sensor_id': f'TEST_{i % 2:03d}',
+         'timestamp': datetime(2024, 1, 1, 0, i), 'consumption': 300.0,
+         'expected_range': (80.0, 120.0), 'type': 'HIGH',
+         'severity': 'CRITICAL',
+         'message': 'Consommation élevée détectée: 300.0 kWh'}
+        for i in range(count)
+    ]
+
+
+class TestAnomalyStorage:
+    """Tests pour l'enregistrement des anomalies."""
+
+    def test_mongodb_anomalies(self):
+        """Test l'insertion non ordonnée et la lecture filtrée."""
+        handler = MongoDBHandler()
+        handler.anomalies = AggregatingCollection()
+        assert handler.insert_anomalies([], run_id='a') == 0
+        assert handler.insert_anomalies(_anomalies(4), run_id='a') == 4
+        assert handler.insert_anomalies(_anomalies(2)) == 2
+        assert all(document['run_id'] == 'a'
+                   for document in handler.anomalies.documents[:4])
+        assert 'run_id' not in handler.anomalies.documents[4]
+
+        latest = handler.get_anomalies(sensor_id='TEST_001', run_id='a')
+        assert [a['timestamp'].minute for a in latest] == [3, 1]
+        assert len(handler.get_anomalies(limit=3)) == 3
+
+    def test_columnar_anomalies(self, tmp_path):
+        """Test l'ajout au fichier et la relecture des plus récentes."""
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        assert store.get_anomalies() == []
+        assert store.insert_anomalies(_anomalies(4), run_id='a') == 4
+        assert store.insert_anomalies(_anomalies(2)) == 2
+
+        latest = store.get_anomalies(sensor_id='TEST_001', run_id='a')
+        assert latest == [dict(anomaly, run_id='a')
+                          for anomaly in _anomalies(4)[3::-2]]
+        assert [a['timestamp'].minute
+                for a in store.get_anomalies(limit=3)] == [3, 2, 1]
+        assert len(store.get_anomalies(limit=10)) == 6
+
+
+class TestSnapshotStorage:
+    """Tests pour les instantanés versionnés des baselines."""
+
+    def test_snapshot_files(self, tmp_path):
+        """Test les versions conservées et l'écriture interrompue."""
+        files = SnapshotFiles(str(tmp_path / 'snapshots'))
+        assert files.load_snapshot() is None
+        for number in range(4):
+            assert files.save_snapshot(bytes([number]) * 10,
+                                       {'sensors': number}, keep=2) \
+                == number + 1
+        assert files.versions() == [3, 4]
+        data, metadata = files.load_snapshot()
+        assert data == bytes([3]) * 10
+        assert (metadata['version'], metadata['sensors'],
+                metadata['size']) == (4, 3, 10)
+        assert isinstance(metadata['created_at'], datetime)
+        assert files.load_snapshot(3)[0] == bytes([2]) * 10
+
+        # Données sans métadonnées : version incomplète ignorée
+        with open(files._path(5, '.bin'), 'wb') as handle:
+            handle.write(b'partiel')
+        assert files.load_snapshot()[1]['version'] == 4
+
+        store = ColumnarStore(str(tmp_path / 'store'))
+        store.connect()
+        assert store.save_snapshot(b'abc') == 1
+        assert store.load_snapshot()[0] == b'abc'
+
+    def test_mongodb_snapshot_chunks(self, monkeypatch):
+        """Test le découpage en morceaux et la purge des versions."""
+        monkeypatch.setattr(mongodb_handler, 'SNAPSHOT_CHUNK_SIZE', 4)
+        handler = MongoDBHandler()
+        handler.snapshots = RollupCollection()
+        handler.snapshot_chunks = RollupCollection()
+        assert handler.load_snapshot() is None
+        for number in range(3):
+            payload = bytes(range(number, number + 10))
+            assert handler.save_snapshot(payload, {'sensors': 2},
+                                         keep=2) == number + 1
+        assert [d['_id'] for d in handler.snapshots.documents] == [2, 3]
+        assert sorted({d['snapshot'] for d in
+                       handler.snapshot_chunks.documents}) == [2, 3]
+        assert len(handler.snapshot_chunks.documents) == 2 * 3
+
+        data, metadata = handler.load_snapshot()
+        assert data == bytes(range(2, 12))
+        assert (metadata['version'], metadata['size'],
+                metadata['sensors']) == (3, 10, 2)
+        assert handler.load_snapshot(2)[0] == bytes(range(1, 11))
+        assert handler.load_snapshot(1) is None
+
+
+class TestStatisticsCache:
+    """Tests pour le cache des statistiques."""
+
+    def test_ttl_cache_expiry_and_eviction(self):
+        """Test l'expiration et l'éviction LRU des entrées."""
+        now = [0.0]
+        cache = TTLCache(ttl=10.0, maxsize=2, clock=lambda: now[0])
+        cache.set('a', 1)
+        cache.set('b', None)
+        assert cache.lookup('b') == (True, None)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.lookup('b') == (False, None)
+        now[0] = 11.0
+        assert cache.get('a') is None
+
+    def test_bulk_statistics_single_query_and_invalidation(self):
+        """Test le calcul groupé, le cache et son invalidation."""
+        handler = MongoDBHandler(stats_cache_ttl=60.0)
+        handler.collection = AggregatingCollection()
+        handler.insert_measurements(_measurements(40))
+
+        sensor_ids = [f'TEST_{i:03d}' for i in range(4)] + ['UNKNOWN']
+        stats = handler.get_statistics_bulk(sensor_ids)
+        assert sorted(stats) == sensor_ids[:4]
+        assert stats['TEST_001']['count'] == 10
+        assert len(handler.collection.pipelines) == 1
+
+        handler.get_statistics_bulk(sensor_ids)
+        assert handler.get_statistics('TEST_002')['count'] == 10
+        assert len(handler.collection.pipelines) == 1
+
+        handler.insert_measurements(_measurements(1))
+        assert handler.get_statistics_bulk(sensor_ids)['TEST_000'][
+            'count'] == 11
+        assert handler.collection.pipelines[-1][0]['$match'] == \
+            {'sensor_id': {'$in': ['TEST_000']}}
+
+
+class TestStreamingQueries:
+    """Tests pour la lecture des mesures par blocs."""
+
+    def test_iter_measurements_chunks_and_projection(self):
+        """Test le découpage en blocs et la projection des champs."""
+        handler = MongoDBHandler()
+        handler.collection = AggregatingCollection()
+        handler.insert_measurements(_measurements(25))
+
+        chunks = list(handler.iter_measurements(
+            batch_size=10, fields=('sensor_id', 'consumption_kwh')
+        ))
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+        assert handler.collection.cursors[-1].requested_batch_size == 10
+        assert set(chunks[0][0]) == {'sensor_id', 'consumption_kwh'}
+
+        sensor_chunks = list(handler.iter_measurements(
+            sensor_id='TEST_001', batch_size=100
+        ))
+        assert len(sensor_chunks) == 1 and len(sensor_chunks[0]) == 6
+
+    def test_iter_measurements_columnar_shares_registry(self):
+        """Test le mode colonnes avec un registre commun aux blocs."""
+        handler = MongoDBHandler()
+        handler.collection = AggregatingCollection()
+        measurements = _measurements(12)
+        for second, measurement in enumerate(reversed(measurements)):
+            measurement['timestamp'] = datetime(2024, 1, 1, 0, 0, second)
+        handler.insert_measurements(measurements)
+
+        batches = list(handler.iter_measurements(batch_size=5,
+                                                 columnar=True,
+                                                 ascending=True))
+        assert all(isinstance(b, MeasurementBatch) for b in batches)
+        assert len({id(b.registry) for b in batches}) == 1
+        combined = MeasurementBatch.concat(batches)
+        assert len(combined) == 12
+        assert np.all(np.diff(combined.timestamp) >= 0)
+
+
+def _timed_measurements(count, sensors=2):
+    return [
+        {'sensor_id': f'TEST_{i % sensors:03d}', 'location': 'Bureau',
+         'consumption_kwh': float(i),
+         'timestamp': datetime(2024, 1, 1, 0, 0, i // sensors)}
+        for i in range(count)
+    ]
+
+
+class TestColumnarStore:
+    """Tests pour le stockage embarqué en colonnes."""
+
+    def test_insert_read_and_persist(self, tmp_path):
+        """Test l'écriture en segments et la relecture après réouverture."""
+        store = create_storage('columnar', directory=str(tmp_path),
+                               segment_rows=4)
+        assert isinstance(store, ColumnarStore)
+        assert store.connect()
+        assert store.insert_measurements(_timed_measurements(10)) == 10
+        assert store.insert_measurements(
+            MeasurementBatch.from_dicts(_timed_measurements(20)[10:])
+        ) == 10
+
+        reopened = ColumnarStore(str(tmp_path), segment_rows=4)
+        assert reopened.connect()
+        latest = reopened.get_measurements(sensor_id='TEST_001', limit=3)
+        assert [m['consumption_kwh'] for m in latest] == [19.0, 17.0, 15.0]
+        assert latest[0]['location'] == 'Bureau'
+        assert len(reopened.get_measurements(limit=100)) == 20
+
+        stats = reopened.get_statistics('TEST_000')
+        assert stats['count'] == 10
+        assert stats['avg_consumption'] == 9.0
+        assert stats['min_consumption'] == 0.0
+        assert reopened.get_statistics('UNKNOWN') is None
+
+    def test_range_reads_are_views(self, tmp_path):
+        """Test la lecture d'intervalle sans copie sur un segment."""
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        store.insert_measurements(_timed_measurements(20))
+        timestamps, values = store.read_range(
+            'TEST_000', datetime(2024, 1, 1, 0, 0, 2),
+            datetime(2024, 1, 1, 0, 0, 5)
+        )
+        assert values.tolist() == [4.0, 6.0, 8.0]
+        assert not values.flags.owndata
+        assert isinstance(values.base.base, np.memmap)
+        assert timestamps[0] == datetime_to_micros(
+            datetime(2024, 1, 1, 0, 0, 2)
+        )
+        stats = store.get_statistics_range(
+            'TEST_000', start=datetime(2024, 1, 1, 0, 0, 2)
+        )
+        assert stats['count'] == 8
+
+    def test_out_of_order_inserts(self, tmp_path):
+        """Test les lectures d'intervalle après des ajouts désordonnés."""
+        store = ColumnarStore(str(tmp_path), segment_rows=3)
+        store.connect()
+        measurements = _timed_measurements(10, sensors=1)
+        store.insert_measurements(measurements[5:])
+        store.insert_measurements(measurements[:5])
+        _, values = store.read_range('TEST_000',
+                                     datetime(2024, 1, 1, 0, 0, 3),
+                                     datetime(2024, 1, 1, 0, 0, 7))
+        assert sorted(values.tolist()) == [3.0, 4.0, 5.0, 6.0]
+
+        batches = list(store.iter_measurements(batch_size=4, columnar=True,
+                                               ascending=True))
+        assert [len(batch) for batch in batches] == [4, 4, 2]
+        combined = MeasurementBatch.concat(batches)
+        assert combined.consumption.tolist() == [float(i) for i in range(10)]
+
+    def test_streaming_matches_sorted_read(self, tmp_path):
+        """Test le parcours par fenêtres contre un tri de toutes les
+        mesures, dans les deux sens et sur un intervalle."""
+        rng = np.random.default_rng(7)
+        base = datetime_to_micros(datetime(2024, 1, 1))
+        store = ColumnarStore(str(tmp_path), segment_rows=50)
+        store.connect()
+        expected = []
+        for chunk in range(6):
+            size = 120
+            # Capteurs très inégaux, avec un trou d'une journée
+            sensors = rng.choice(5, size, p=[.6, .2, .1, .05, .05])
+            offsets = np.sort(rng.integers(0, 3_600_000_000, size))
+            offsets += chunk * 3_600_000_000 + (chunk > 3) * 86_400_000_000
+            values = rng.random(size)
+            expected.extend(zip(offsets.tolist(), sensors.tolist(),
+                                values.tolist()))
+            store.insert_measurements(MeasurementBatch.from_dicts([
+                {'sensor_id': f'S{sensor}', 'consumption_kwh': value,
+                 'timestamp': micros_to_datetime(base + offset)}
+                for offset, sensor, value
+                in zip(offsets.tolist(), sensors.tolist(), values.tolist())
+            ]))
+        # Capteur alimenté dans le désordre
+        store.insert_measurements([
+            {'sensor_id': 'S9', 'consumption_kwh': float(i),
+             'timestamp': micros_to_datetime(base + (20 - i) * 60_000_000)}
+            for i in range(20)
+        ])
+        expected.extend(((20 - i) * 60_000_000, 9, float(i))
+                        for i in range(20))
+        offsets = np.array([row[0] for row in expected])
+
+        for ascending in (True, False):
+            chunks = list(store.iter_measurements(
+                batch_size=64, columnar=True, ascending=ascending
+            ))
+            assert all(len(chunk) == 64 for chunk in chunks[:-1])
+            combined = MeasurementBatch.concat(chunks)
+            ordered = np.sort(offsets)
+            if not ascending:
+                ordered = ordered[::-1]
+            assert (combined.timestamp - base).tolist() == ordered.tolist()
+            assert len(combined) == len(expected)
+
+        start = micros_to_datetime(base + 1_800_000_000)
+        end = micros_to_datetime(base + 5 * 3_600_000_000)
+        rows = list(store.iter_measurements(start=start, end=end,
+                                            batch_size=100))
+        documents = [document for chunk in rows for document in chunk]
+        inside = np.sort(offsets[(offsets >= 1_800_000_000)
+                                 & (offsets < 5 * 3_600_000_000)])[::-1]
+        assert [datetime_to_micros(d['timestamp']) - base
+                for d in documents] == inside.tolist()
+
+        latest = store.get_measurements(sensor_id='S0', limit=5)
+        assert len(latest) == 5
+        assert [datetime_to_micros(d['timestamp']) for d in latest] == \
+            sorted((datetime_to_micros(d['timestamp']) for chunk
+                    in store.iter_measurements(sensor_id='S0')
+                    for d in chunk), reverse=True)[:5]
+
+    def test_index_journal_and_open_segments(self, tmp_path):
+        """Test la journalisation de l'index et les fichiers ouverts."""
+        store = ColumnarStore(str(tmp_path), max_open_segments=2)
+        store.connect()
+        store.insert_measurements(_timed_measurements(40, sensors=4))
+        index_size = os.path.getsize(tmp_path / 'index.json')
+        for second in range(3):
+            store.insert_measurement({
+                'sensor_id': 'TEST_001', 'consumption_kwh': 1.0,
+                'timestamp': datetime(2024, 1, 1, 0, 1, second)
+            })
+        # Seule l'entrée du capteur modifié est journalisée
+        assert os.path.getsize(tmp_path / 'index.json') == index_size
+        with open(tmp_path / 'index.journal', encoding='utf-8') as journal:
+            assert [list(json.loads(line)) for line in journal] == \
+                [['TEST_001']] * 3
+        assert len(store._handles) == 2
+
+        reopened = ColumnarStore(str(tmp_path))
+        assert reopened.connect()
+        assert reopened.get_statistics('TEST_001')['count'] == 13
+
+        store.disconnect()
+        assert not store._handles
+        assert not os.path.exists(tmp_path / 'index.journal')
+        reopened.connect()
+        assert reopened.get_statistics('TEST_001')['count'] == 13
+
+    def test_torn_journal_line_is_checkpointed(self, tmp_path):
+        """Test la réécriture de l'index après une ligne de journal
+        incomplète."""
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        store.insert_measurements(_timed_measurements(4, sensors=2))
+        store.insert_measurement({
+            'sensor_id': 'TEST_001', 'consumption_kwh': 1.0,
+            'timestamp': datetime(2024, 1, 1, 0, 1)
+        })
+        store._journal.write('{"TEST_001": {"cou')
+        store._journal.close()
+
+        reopened = ColumnarStore(str(tmp_path))
+        assert reopened.connect()
+        assert not os.path.exists(tmp_path / 'index.journal')
+        reopened.insert_measurement({
+            'sensor_id': 'TEST_001', 'consumption_kwh': 2.0,
+            'timestamp': datetime(2024, 1, 1, 0, 2)
+        })
+        again = ColumnarStore(str(tmp_path))
+        assert again.connect()
+        assert again.get_statistics('TEST_001')['count'] == 4
+
+    def test_failed_insert_restores_index(self, tmp_path, monkeypatch):
+        """Test le rétablissement de l'index après une écriture en
+        échec."""
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        store.insert_measurements(_timed_measurements(4, sensors=2))
+        append = store._append
+        calls = []
+
+        def failing_append(entry, timestamps, consumption):
+            calls.append(entry['directory'])
+            if len(calls) == 2:
+                raise OSError("disque plein")
+            append(entry, timestamps, consumption)
+
+        monkeypatch.setattr(store, '_append', failing_append)
+        batch = _timed_measurements(4, sensors=2) + [{
+            'sensor_id': 'TEST_NEW', 'consumption_kwh': 1.0,
+            'timestamp': datetime(2024, 1, 1)
+        }]
+        assert store.insert_measurements(batch) == 0
+        assert store.get_statistics('TEST_000')['count'] == 2
+        assert store.get_statistics('TEST_001')['count'] == 2
+        assert store.get_statistics('TEST_NEW') is None
+        monkeypatch.undo()
+
+        assert store.insert_measurements(batch) == 5
+        store.disconnect()
+        reopened = ColumnarStore(str(tmp_path))
+        reopened.connect()
+        assert reopened.get_statistics('TEST_000')['count'] == 4
+        assert len(reopened.get_measurements(sensor_id='TEST_000',
+                                             limit=10)) == 4
+
+    def test_clear_collection(self, tmp_path):
+        """Test la suppression des segments et de l'index."""
+        store = ColumnarStore(str(tmp_path))
+        store.connect()
+        store.insert_measurements(_timed_measurements(6))
+        store.clear_collection()
+        assert store.get_measurements() == []
+        assert store.get_statistics_bulk() == {}
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['index.json']
+
+    def test_unknown_backend(self):
+        """Test le refus d'un moteur de stockage inconnu."""
+        with pytest.raises(ValueError):
+            create_storage('sqlite')
+
+
+def _find(documents, query, projection):
+    """Curseur des documents vérifiant un filtre ($gte, $lt...)."""
+    if projection and not any(projection.values()):
+        projection = None
+    return _Cursor([dict(document) for document in documents
+                    if _matches(document, query)], projection)
+
+
+class RawCollection(AggregatingCollection):
+    """Mesures brutes en mémoire, filtrées par intervalle de temps."""
+
+    def find(self, query, projection=None):
+        return _find(self.documents, query, projection)
+
+    def delete_many(self, query):
+        self.documents = [document for document in self.documents
+                          if not _matches(document, query)]
+
+
+class DownsampledCollection(RollupCollection):
+    """Agrégats de rétention en mémoire ($unset et filtres d'intervalle)."""
+
+    def find(self, query, projection=None):
+        return _find(self.documents, query, projection)
+
+    def update_one(self, query, update, upsert=False):
+        super().update_one(query, update, upsert)
+        document = self.find_one({key: value for key, value in query.items()
+                                  if not isinstance(value, dict)})
+        for key in update.get('$unset', {}):
+            document.pop(key, None)
+
+    def bulk_write(self, operations, ordered=True):
+        """Upserts ; un filtre non vérifié sur une clé (sensor_id, bucket)
+        existante est une erreur de clé unique, comme dans MongoDB."""
+        errors = []
+        for index, operation in enumerate(operations):
+            query = operation._filter
+            if self.find_one(query) is None and self.find_one(
+                {'sensor_id': query['sensor_id'], 'bucket': query['bucket']}
+            ):
+                errors.append({'index': index, 'code': 11000})
+                continue
+            self.update_one(query, operation._doc, upsert=True)
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': 0})
+
+
+class RetentionDatabase(FakeDatabase):
+    """Base en mémoire des collections de rétention."""
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, DownsampledCollection())
+
+
+class TestRetention:
+    """Tests pour la rétention et le sous-échantillonnage."""
+
+    NOW = datetime(2024, 1, 2, 1, 0)
+
+    @staticmethod
+    def _handler(count=150):
+        handler = MongoDBHandler(stats_cache_ttl=0)
+        handler.collection = RawCollection()
+        handler.insert_measurements(_spread_measurements(count))
+        handler.retention = RetentionManager(
+            RetentionDatabase(), handler.collection, retention_days=1,
+            slice_seconds=1800, batch_size=7
+        )
+        return handler
+
+    def test_compaction_keeps_statistics(self):
+        """Test le compactage et les statistiques brutes + agrégats."""
+        handler = self._handler()
+        before = handler.get_statistics_bulk()
+        assert handler.compact(self.NOW) == 60
+        assert len(handler.collection.documents) == 90
+        assert min(d['timestamp'] for d in handler.collection.documents) \
+            == datetime(2024, 1, 1, 1, 0)
+        retention = handler.retention
+        assert retention.watermark == datetime(2024, 1, 1, 1, 0)
+        assert len(retention.downsampled.documents) == 24
+        after = handler.get_statistics_bulk()
+        for sensor_id, stats in before.items():
+            for key in ('count', 'avg_consumption', 'stdev_consumption',
+                        'min_consumption', 'max_consumption'):
+                assert after[sensor_id][key] == pytest.approx(stats[key])
+        assert handler.compact(self.NOW) == 0
+
+    def test_combined_query(self):
+        """Test le parcours des agrégats puis des mesures brutes."""
+        handler = self._handler()
+        handler.compact(self.NOW)
+        points = list(handler.iter_consumption('TEST_000'))
+        timestamps = [point['timestamp'] for point in points]
+        assert timestamps == sorted(timestamps)
+        assert sum(point['count'] for point in points) == 75
+        assert {point['resolution'] for point in points[:12]} == {300}
+        assert points[0]['count'] == 3
+        assert points[0]['avg_consumption'] == pytest.approx(2.0)
+        assert (points[0]['min_consumption'],
+                points[0]['max_consumption']) == (0.0, 4.0)
+        assert points[12]['resolution'] == 0
+        assert points[12]['timestamp'] == datetime(2024, 1, 1, 1, 0)
+
+        ranged = list(handler.iter_consumption(
+            'TEST_001', datetime(2024, 1, 1, 0, 50),
+            datetime(2024, 1, 1, 1, 10)
+        ))
+        assert [point['count'] for point in ranged] == [2, 3] + [1] * 5
+
+    def test_late_measurements_are_merged(self):
+        """Test la fusion des mesures arrivées sous le filigrane."""
+        handler = self._handler()
+        handler.compact(self.NOW)
+        handler.insert_measurements([
+            {'sensor_id': 'TEST_000', 'location': 'Bureau',
+             'consumption_kwh': 1000.0,
+             'timestamp': datetime(2024, 1, 1, 0, 7), 'status': 'active'}
+        ])
+        assert handler.compact(self.NOW) == 1
+        assert handler.retention.watermark == datetime(2024, 1, 1, 1, 0)
+        bucket = handler.retention.downsampled.find_one(
+            {'sensor_id': 'TEST_000', 'bucket': datetime(2024, 1, 1, 0, 5)}
+        )
+        assert (bucket['count'], bucket['max']) == (3, 1000.0)
+        assert handler.get_statistics('TEST_000')['count'] == 76
+
+    def test_interrupted_deletion_is_resumed(self, monkeypatch):
+        """Test la reprise d'une suppression interrompue sans double
+        comptage."""
+        handler = self._handler()
+        raw = handler.collection
+
+        def fail(query):
+            raise PyMongoError("interruption")
+
+        monkeypatch.setattr(raw, 'delete_many', fail)
+        assert handler.compact(self.NOW) == -1
+        assert len(raw.documents) == 150
+        monkeypatch.undo()
+
+        assert handler.compact(self.NOW) == 30
+        assert len(raw.documents) == 90
+        stats = handler.get_statistics_bulk()
+        assert stats['TEST_000']['count'] == 75
+        assert stats['TEST_001']['count'] == 75
+
+    def test_interrupted_merge_is_not_counted_twice(self, monkeypatch):
+        """Test la reprise d'une fusion interrompue après l'écriture des
+        agrégats."""
+        handler = self._handler()
+        handler.compact(self.NOW)
+        handler.insert_measurements([
+            {'sensor_id': sensor_id, 'location': 'Bureau',
+             'consumption_kwh': 1000.0,
+             'timestamp': datetime(2024, 1, 1, 0, 7), 'status': 'active'}
+            for sensor_id in ('TEST_000', 'TEST_001')
+        ])
+        raw = handler.collection
+        downsampled = handler.retention.downsampled
+        bulk_write = downsampled.bulk_write
+
+        def interrupted(operations, ordered=True):
+            bulk_write(operations, ordered)
+            raise PyMongoError("interruption")
+
+        monkeypatch.setattr(downsampled, 'bulk_write', interrupted)
+        assert handler.compact(self.NOW) == -1
+        monkeypatch.undo()
+        # Les agrégats ont été fusionnés, les mesures brutes restent
+        assert len(raw.documents) == 92
+
+        assert handler.compact(self.NOW) == 2
+        assert len(raw.documents) == 90
+        stats = handler.get_statistics_bulk()
+        assert stats['TEST_000']['count'] == 76
+        assert stats['TEST_001']['count'] == 76
+        assert stats['TEST_001']['max_consumption'] == 1000.0
+
+    def test_background_compaction(self):
+        """Test le compactage par le thread d'arrière-plan."""
+        handler = self._handler()
+        retention = handler.retention
+        retention.retention = datetime.now() - self.NOW + timedelta(days=1)
+        retention.start(interval=60.0, pause=0.0)
+        deadline = time.monotonic() + 5
+        while retention.watermark is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        handler.disconnect()
+        assert retention._thread is None
+        assert len(handler.collection.documents) == 90